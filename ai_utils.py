@@ -7,18 +7,26 @@ Enhanced with robust error handling, general question support, RAG, and Security
 import os
 import re
 import time
-import json
 import hashlib
+import threading
 from datetime import datetime
 from google import genai
-from db_utils import get_database_schema, execute_query
+from google.genai import types
+from collections import Counter
+from db_utils import get_database_schema, get_departments
+from llm_cache import get_llm_cache, context_version, normalize_question
+from llm_gateway import LLMGateway
+from rate_limiter import backoff_delay
+from result_formatter import format_results
+from sql_validator import QueryTimeoutError, SQLRejectedError, validate_sql
+from query_engine import get_query_engine
 
 # Import document processor for RAG
 try:
     from document_processor import (
         get_context_for_query, 
         has_uploaded_documents,
-        simple_search
+        RetrievalContext
     )
     RAG_AVAILABLE = True
 except ImportError:
@@ -97,6 +105,24 @@ class HRSecurityGuardrails:
         'address_zip': r'\b\d{5}(-\d{4})?\b',
     }
     
+    # Compiled matchers: one pass over the text instead of one per pattern
+    _BLOCKED_REGEX = re.compile('|'.join(f'(?:{pattern})' for pattern in BLOCKED_PATTERNS), re.IGNORECASE)
+    _SENSITIVE_REGEX = re.compile('|'.join(map(re.escape, SENSITIVE_TOPICS)))
+    # SSN, phone and card patterns share their first digit and the word
+    # boundary before it ("\d(?<!\w\d)" is "\b\d"); leading with \d lets the
+    # regex engine skip straight to digits
+    _PII_MASK_REGEX = re.compile(
+        r"\d(?<!\w\d)(?:"
+        r"(?P<ssn>\d{2}-\d{2}-\d{4}\b)"
+        r"|(?P<phone>\d{2}[-.]?\d{3}[-.]?\d{4}\b(?!\s*(?:employees?|id|#)))"
+        r"|(?P<card>\d{3}[-\s]?\d{4}[-\s]?\d{4}[-\s]?\d{4}\b))",
+        re.IGNORECASE)
+    _PII_REPLACEMENTS = {
+        'ssn': '[SSN REDACTED]',
+        'phone': '[PHONE REDACTED]',
+        'card': '[CARD REDACTED]',
+    }
+    
     # Allowed HR query intents
     ALLOWED_INTENTS = [
         "employee lookup",
@@ -133,11 +159,9 @@ class HRSecurityGuardrails:
             return None, "⚠️ Query too short. Please provide a more detailed question."
         
         # Check for blocked patterns
-        input_lower = sanitized.lower()
-        for pattern in cls.BLOCKED_PATTERNS:
-            if re.search(pattern, input_lower, re.IGNORECASE):
-                cls._log_security_event("BLOCKED_QUERY", sanitized[:100])
-                return None, "🚫 **Security Notice:** This query type is not permitted for security reasons."
+        if cls._BLOCKED_REGEX.search(sanitized.lower()):
+            cls._log_security_event("BLOCKED_QUERY", sanitized[:100])
+            return None, "🚫 **Security Notice:** This query type is not permitted for security reasons."
         
         return sanitized, None
     
@@ -148,9 +172,12 @@ class HRSecurityGuardrails:
         Returns (is_sensitive, topic_matched)
         """
         query_lower = query.lower()
-        for topic in cls.SENSITIVE_TOPICS:
-            if topic in query_lower:
-                return True, topic
+        # The regex only rules queries out; the topic is the first listed one
+        # that matches, so overlapping topics keep their list priority
+        if cls._SENSITIVE_REGEX.search(query_lower):
+            for topic in cls.SENSITIVE_TOPICS:
+                if topic in query_lower:
+                    return True, topic
         return False, None
     
     @classmethod
@@ -161,17 +188,9 @@ class HRSecurityGuardrails:
         if not text:
             return text
         
-        masked = text
-        
-        # Mask SSN
-        masked = re.sub(cls.PII_PATTERNS['ssn'], '[SSN REDACTED]', masked)
-        
-        # Mask phone numbers (but be careful not to mask employee IDs)
-        # Only mask if it looks like a phone format
-        masked = re.sub(r'\b\d{3}[-.]?\d{3}[-.]?\d{4}\b(?!\s*(employees?|id|#))', '[PHONE REDACTED]', masked, flags=re.IGNORECASE)
-        
-        # Mask credit card numbers
-        masked = re.sub(cls.PII_PATTERNS['credit_card'], '[CARD REDACTED]', masked)
+        # SSNs, phone numbers (not followed by "employees", "id" or "#", so
+        # counts and employee IDs survive) and card numbers in one pass
+        masked = cls._PII_MASK_REGEX.sub(lambda m: cls._PII_REPLACEMENTS[m.lastgroup], text)
         
         return masked
     
@@ -181,25 +200,13 @@ class HRSecurityGuardrails:
         Validate generated SQL query for safety.
         Returns (is_safe, reason)
         """
-        if not sql_query:
-            return False, "Empty query"
-        
-        sql_upper = sql_query.upper().strip()
-        
-        # Must be a SELECT query only
-        if not sql_upper.startswith('SELECT'):
-            return False, "Only SELECT queries are permitted"
-        
-        # Block dangerous operations that might be injected
-        dangerous_keywords = ['DROP', 'DELETE', 'UPDATE', 'INSERT', 'ALTER', 'CREATE', 'TRUNCATE', 'EXEC', 'EXECUTE']
-        for keyword in dangerous_keywords:
-            if keyword in sql_upper:
-                cls._log_security_event("DANGEROUS_SQL", sql_query[:200])
-                return False, f"Query contains forbidden operation: {keyword}"
-        
-        # Limit result size to prevent data exfiltration
-        if 'LIMIT' not in sql_upper:
-            sql_query = sql_query.rstrip(';') + ' LIMIT 100'
+        # Tokenizer-based: a single read-only SELECT over the known tables,
+        # with LIMIT 100 added if missing to prevent data exfiltration
+        try:
+            sql_query = validate_sql(sql_query).sql
+        except SQLRejectedError as e:
+            cls._log_security_event("DANGEROUS_SQL", (sql_query or '')[:200])
+            return False, str(e)
         
         return True, sql_query
     
@@ -312,9 +319,12 @@ def handle_api_error(error):
     
     # Rate limit / quota exhausted
     if '429' in error_str or 'RESOURCE_EXHAUSTED' in error_str or 'quota' in error_str.lower():
+        retry_after = getattr(error, 'retry_after', None)
+        retry_hint = f"\n\nQuota should be available again in about {retry_after:.0f} seconds." if retry_after else ""
         return {
             'is_rate_limit': True,
             'should_retry': False,
+            'retry_after': retry_after,
             'message': """⏳ **API Rate Limit Reached**
 
 The free Gemini API quota has been temporarily exhausted. This is normal for free tier usage.
@@ -326,7 +336,7 @@ The free Gemini API quota has been temporarily exhausted. This is normal for fre
 
 **Tip:** You can still browse employee data and analytics in the other tabs while waiting!
 
-The database and dashboard features work without AI."""
+The database and dashboard features work without AI.""" + retry_hint
         }
     
     # Other API errors
@@ -379,47 +389,90 @@ You are an expert HR assistant with knowledge about:
 GEMINI_MODELS = ['gemini-2.5-flash', 'gemini-2.0-flash', 'gemini-2.0-flash-lite']
 
 
+_gemini_client = None
+_gateway = None
+_client_lock = threading.Lock()
+
+
 def get_gemini_client():
     """
-    Initializes and returns the Gemini client.
+    Returns the shared Gemini client (created once per process).
+    Set GEMINI_BASE_URL to send requests elsewhere, e.g. a local stub server.
     """
-    api_key = os.getenv('GEMINI_API_KEY') or os.getenv('GOOGLE_API_KEY')
-    if not api_key:
-        raise ValueError("GEMINI_API_KEY or GOOGLE_API_KEY environment variable is not set.")
-    
-    return genai.Client(api_key=api_key)
+    global _gemini_client
+    if _gemini_client is None:
+        with _client_lock:
+            if _gemini_client is None:
+                api_key = os.getenv('GEMINI_API_KEY') or os.getenv('GOOGLE_API_KEY')
+                if not api_key:
+                    raise ValueError("GEMINI_API_KEY or GOOGLE_API_KEY environment variable is not set.")
+                
+                base_url = os.getenv('GEMINI_BASE_URL')
+                http_options = types.HttpOptions(base_url=base_url) if base_url else None
+                _gemini_client = genai.Client(api_key=api_key, http_options=http_options)
+    return _gemini_client
 
 
-def call_gemini_with_fallback(client, prompt):
+def get_llm_gateway():
     """
-    Calls Gemini API with automatic model fallback if rate limited.
+    Returns the process-wide LLM gateway (shared client, in-flight limit,
+    request coalescing and hedged model fallback).
     """
-    last_error = None
-    for model_name in GEMINI_MODELS:
-        try:
-            response = client.models.generate_content(
-                model=model_name,
-                contents=prompt
-            )
-            return response
-        except Exception as e:
-            error_str = str(e)
-            if '429' in error_str or 'RESOURCE_EXHAUSTED' in error_str or 'quota' in error_str.lower():
-                last_error = e
-                continue  # Try next model
-            else:
-                raise e  # Non-rate-limit error, raise it
-    
-    # All models failed with rate limit
-    if last_error:
-        raise last_error
-    raise Exception("All Gemini models are unavailable")
+    global _gateway
+    if _gateway is None:
+        with _client_lock:
+            if _gateway is None:
+                _gateway = LLMGateway(get_gemini_client, GEMINI_MODELS)
+    return _gateway
+
+
+def call_gemini_with_fallback(prompt):
+    """
+    Calls Gemini through the gateway on the preferred model with quota left,
+    falling back to the next model if one is rate limited or slow.
+    """
+    return get_llm_gateway().generate(prompt)
+
+
+def get_retry_budget():
+    """
+    Retry budget left after this thread's most recent Gemini request
+    (attempts and seconds left, seconds spent waiting for quota), or None.
+    """
+    if _gateway is None:
+        return None
+    return _gateway.last_retry_budget()
+
 
+_cached_schema_version = None
 
-def classify_question(user_question):
+
+def _schema_cache_context(schema):
+    """
+    Cache context for generated SQL. When the schema text changes, SQL cached
+    for older schemas is purged.
+    """
+    global _cached_schema_version
+    version = context_version(schema)
+    if version != _cached_schema_version:
+        get_llm_cache().invalidate(kind='sql', keep_context=version)
+        _cached_schema_version = version
+    return version
+
+
+def get_llm_cache_stats():
+    """Hit rate and entry counts of the LLM response cache."""
+    return get_llm_cache().stats()
+
+
+def classify_question(user_question, retrieval=None):
     """
     Classifies if a question requires database lookup, document search, or general knowledge.
     
+    Args:
+        user_question: The user's question
+        retrieval: Optional RetrievalContext whose search results are reused later
+    
     Returns:
         str: 'database', 'document', or 'general'
     """
@@ -450,8 +503,9 @@ def classify_question(user_question):
                 return 'document'
         
         # Also check if the question might match uploaded document content
-        search_results = simple_search(user_question, top_k=1)
-        if search_results and search_results[0].get('score', 0) > 5:
+        if retrieval is None:
+            retrieval = RetrievalContext(user_question)
+        if retrieval.top_score() > 5:
             return 'document'
     
     for keyword in db_keywords:
@@ -492,13 +546,195 @@ def fix_sql_quotes(sql_query):
     return sql_query
 
 
+# ============================================================================
+# FAST PATH: templated questions compiled straight to parameterized SQL
+# ============================================================================
+
+_NUMBER_WORDS = {
+    'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6, 'seven': 7,
+    'eight': 8, 'nine': 9, 'ten': 10, 'fifteen': 15, 'twenty': 20,
+}
+_NUMBER = r'(?P<n>\d{1,3}|' + '|'.join(_NUMBER_WORDS) + r')'
+_EACH_DEPARTMENT = r'(?:by|per|for each|in each|for every|across|of each) department'
+_DEPARTMENT = r'(?:the )?(?P<dept>[a-z][a-z &/-]*?)(?: department| team| dept)?'
+_EMPLOYEES = r'(?:employees|staff|people|workers)'
+
+_EMPLOYEE_COLUMNS = 'id, first_name, last_name, email, department, position, salary'
+_TRANSFER_QUERY = """SELECT t.employee_id, e.first_name || ' ' || e.last_name as employee_name, t.from_department, t.to_department, t.transfer_date, t.reason FROM transfers t JOIN employees e ON t.employee_id = e.employee_id ORDER BY t.transfer_date DESC LIMIT ?"""
+
+# (intent, pattern over the normalized question, SQL, parameter builder)
+# Order matters: the first matching intent wins.
+FAST_PATH_INTENTS = [
+    ('count_by_department',
+     rf'(?:how many {_EMPLOYEES} (?:are (?:there )?|do we have )?{_EACH_DEPARTMENT}|(?:employee count|headcount|number of {_EMPLOYEES}) {_EACH_DEPARTMENT})',
+     'SELECT department, COUNT(*) as employee_count FROM employees WHERE removed_at IS NULL GROUP BY department ORDER BY employee_count DESC LIMIT 100',
+     None),
+    ('count_in_department',
+     rf'how many {_EMPLOYEES} (?:are |work )?in {_DEPARTMENT}',
+     'SELECT COUNT(*) as count FROM employees WHERE department = ? AND removed_at IS NULL',
+     lambda m, department: (department,)),
+    ('count_total',
+     rf'how many {_EMPLOYEES} (?:are there|do we have|does the company have|are employed|in total)',
+     'SELECT COUNT(*) as count FROM employees WHERE removed_at IS NULL',
+     None),
+    ('avg_salary_by_department',
+     rf"(?:what(?:'s| is) the )?(?:average|avg|mean) salary {_EACH_DEPARTMENT}",
+     'SELECT department, ROUND(AVG(salary), 2) as avg_salary FROM employees WHERE removed_at IS NULL GROUP BY department ORDER BY avg_salary DESC LIMIT 100',
+     None),
+    ('avg_salary_in_department',
+     rf"(?:what(?:'s| is) the )?(?:average|avg|mean) salary (?:in|of|for) {_DEPARTMENT}",
+     'SELECT ROUND(AVG(salary), 2) as average_salary FROM employees WHERE department = ? AND removed_at IS NULL',
+     lambda m, department: (department,)),
+    ('avg_salary',
+     r"(?:what(?:'s| is) the )?(?:average|avg|mean) (?:employee )?salary",
+     'SELECT ROUND(AVG(salary), 2) as average_salary FROM employees WHERE removed_at IS NULL',
+     None),
+    ('top_paid',
+     rf"(?:who are |show (?:me )?|list )?(?:the )?top {_NUMBER} (?P<dir>highest|best|lowest)[- ]paid(?: {_EMPLOYEES})?(?: in {_DEPARTMENT})?",
+     None,
+     None),
+    ('top_paid',
+     rf"(?:who (?:are|is) |show (?:me )?|list )?(?:the )?(?P<dir>highest|best|lowest)[- ]paid(?: {_EMPLOYEES}| employee)?(?: in {_DEPARTMENT})?",
+     None,
+     None),
+    ('recent_transfers',
+     rf"(?:list|show(?: me)?|what are|get)? ?(?:the )?(?:all )?(?:recent|latest|last|most recent) (?:{_NUMBER} )?(?:employee )?transfers",
+     _TRANSFER_QUERY,
+     lambda m, department: (_fast_path_number(m, 10),)),
+    ('avg_rating',
+     r"(?:what(?:'s| is) the )?(?:average|avg|mean) (?:feedback |performance )?rating",
+     'SELECT ROUND(AVG(rating), 2) as average_rating FROM feedback',
+     None),
+    ('employees_in_department',
+     rf"(?:show|list|display|find)(?: me)?(?: all)?(?: the)? {_EMPLOYEES} in {_DEPARTMENT}",
+     'SELECT first_name, last_name, email, position, salary FROM employees WHERE department = ? AND removed_at IS NULL ORDER BY last_name LIMIT 20',
+     lambda m, department: (department,)),
+]
+FAST_PATH_INTENTS = [
+    (intent, re.compile(pattern + r'$'), sql, params)
+    for intent, pattern, sql, params in FAST_PATH_INTENTS
+]
+
+# Name lookups match the original casing: the lead-in is case-insensitive,
+# the names must be capitalized ("who is available?" is not a lookup)
+_NAME_LOOKUP_PATTERN = re.compile(
+    r"^(?i:is there (?:an |a )?(?:employee|someone|anyone|person) (?:named|called)"
+    r"|(?:find|look ?up|search for) (?:the )?(?:employee )?"
+    r"|(?:who is|tell me about) (?:employee )?)"
+    r"\s*(?P<first>[A-Z][a-zA-Z'-]+)(?:\s+(?P<last>[A-Z][a-zA-Z'-]+))?\s*[?.!]*$")
+
+# Capitalized words after a lookup lead-in that are not names ("Tell me about
+# Benefits", "Who is HR"); words of the stored department names are added
+# at lookup time
+_NAME_LOOKUP_STOPWORDS = frozenset({
+    'the', 'our', 'my', 'all', 'highest', 'lowest', 'top', 'everyone', 'anyone', 'someone',
+    'hr', 'payroll', 'benefits', 'benefit', 'pto', 'leave', 'vacation', 'holidays', 'policy', 'policies',
+    'handbook', 'salary', 'salaries', 'compensation', 'bonus', 'insurance', 'onboarding', 'training',
+    'department', 'departments', 'team', 'teams', 'manager', 'managers', 'management', 'staff',
+    'employees', 'employee', 'people', 'transfers', 'feedback', 'performance', 'ratings', 'headcount',
+    'engineering', 'sales', 'marketing', 'finance', 'operations', 'legal', 'it', 'support', 'ops',
+})
+
+_fast_path_stats = {'hits': 0, 'misses': 0, 'by_intent': Counter()}
+_fast_path_stats_lock = threading.Lock()
+
+
+def _fast_path_number(match, default):
+    value = match.groupdict().get('n')
+    if not value:
+        return default
+    return _NUMBER_WORDS.get(value) or min(int(value), 100)
+
+
+def _resolve_department(name):
+    """Maps a department name from a question onto the stored spelling (or None)."""
+    if name is None:
+        return None
+    name = name.strip()
+    for department in get_departments():
+        if department.lower() == name:
+            return department
+    return None
+
+
+def _is_lookup_stopword(word):
+    """True for department and HR topic words, which are never looked up as names."""
+    word = word.lower()
+    if word in _NAME_LOOKUP_STOPWORDS:
+        return True
+    return any(word in department.lower().split() for department in get_departments())
+
+
+def parse_fast_path(user_question):
+    """
+    Compiles templated questions (counts per department, average salary,
+    top-N paid, employee lookups, recent transfers, average rating) into
+    parameterized SQL without calling the LLM.
+    
+    Returns:
+        (sql, params, intent) or None if the question isn't recognized
+    """
+    question = normalize_question(user_question)
+    
+    for intent, pattern, sql, build_params in FAST_PATH_INTENTS:
+        match = pattern.match(question)
+        if not match:
+            continue
+        groups = match.groupdict()
+        department = None
+        if groups.get('dept') is not None:
+            department = _resolve_department(groups['dept'])
+            if department is None:
+                continue  # Not a known department: let another intent (or the LLM) try
+        
+        if intent == 'top_paid':
+            order = 'ASC' if groups.get('dir') == 'lowest' else 'DESC'
+            limit = _fast_path_number(match, 5 if 'employees' in question or groups.get('n') else 1)
+            where = ' AND department = ?' if department else ''
+            sql = (f'SELECT first_name, last_name, department, position, salary FROM employees '
+                   f'WHERE removed_at IS NULL{where} ORDER BY salary {order} LIMIT ?')
+            params = ((department,) if department else ()) + (limit,)
+        elif build_params is None:
+            params = ()
+        else:
+            params = build_params(match, department)
+        return sql, params, intent
+    
+    match = _NAME_LOOKUP_PATTERN.match(user_question.strip())
+    if match and not any(_is_lookup_stopword(word) for word in (match['first'], match['last']) if word):
+        if match['last']:
+            return (f'SELECT {_EMPLOYEE_COLUMNS} FROM employees WHERE first_name LIKE ? AND last_name LIKE ? AND removed_at IS NULL LIMIT 20',
+                    (f"%{match['first']}%", f"%{match['last']}%"), 'employee_by_name')
+        return (f'SELECT {_EMPLOYEE_COLUMNS} FROM employees WHERE (first_name LIKE ? OR last_name LIKE ?) AND removed_at IS NULL LIMIT 20',
+                (f"%{match['first']}%", f"%{match['first']}%"), 'employee_by_name')
+    return None
+
+
+def get_fast_path_stats():
+    """Hits, misses and hit ratio of the fast path over database questions."""
+    with _fast_path_stats_lock:
+        hits, misses = _fast_path_stats['hits'], _fast_path_stats['misses']
+        by_intent = dict(_fast_path_stats['by_intent'])
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / (hits + misses) if hits + misses else 0.0,
+        'by_intent': by_intent,
+    }
+
+
 def generate_sql_query(user_question):
     """
     Converts a natural language HR question into a SQL query using Gemini.
     """
     try:
-        client = get_gemini_client()
         schema = get_database_schema()
+        cache_context = _schema_cache_context(schema)
+        cached_sql = get_llm_cache().get('sql', user_question, cache_context, GEMINI_MODELS[0])
+        if cached_sql:
+            return cached_sql, "Query loaded from cache"
+        
+        get_gemini_client()  # fail fast (no retries) when no API key is configured
         
         prompt = f"""You are a SQL expert. Generate ONLY a valid SQLite SELECT query.
 
@@ -515,16 +751,17 @@ CRITICAL RULES:
 7. For counts: SELECT COUNT(*) as count FROM table WHERE condition
 8. For averages: SELECT ROUND(AVG(column), 2) as average FROM table
 9. Use LIMIT 20 for list queries unless user specifies a number
+10. Former employees stay in the employees table with removed_at set: add removed_at IS NULL when listing, counting or averaging employees unless the question is about former employees
 
 EXAMPLES:
 Q: "Is there an employee named John Smith?"
-A: SELECT id, first_name, last_name, email, department, position FROM employees WHERE first_name LIKE '%John%' AND last_name LIKE '%Smith%'
+A: SELECT id, first_name, last_name, email, department, position FROM employees WHERE first_name LIKE '%John%' AND last_name LIKE '%Smith%' AND removed_at IS NULL
 
 Q: "How many employees in Engineering?"
-A: SELECT COUNT(*) as count FROM employees WHERE department = 'Engineering'
+A: SELECT COUNT(*) as count FROM employees WHERE department = 'Engineering' AND removed_at IS NULL
 
 Q: "Show top 5 highest paid employees"
-A: SELECT first_name, last_name, department, salary FROM employees ORDER BY salary DESC LIMIT 5
+A: SELECT first_name, last_name, department, salary FROM employees WHERE removed_at IS NULL ORDER BY salary DESC LIMIT 5
 
 Question: {user_question}
 
@@ -533,7 +770,7 @@ SQL Query:"""
         max_retries = 3
         for attempt in range(max_retries):
             try:
-                response = call_gemini_with_fallback(client, prompt)
+                response = call_gemini_with_fallback(prompt)
                 
                 sql_query = response.text.strip()
                 
@@ -552,6 +789,7 @@ SQL Query:"""
                 sql_query = fix_sql_quotes(sql_query)
                 
                 if sql_query.upper().startswith("SELECT"):
+                    get_llm_cache().put('sql', user_question, cache_context, GEMINI_MODELS[0], sql_query)
                     return sql_query, "Query generated successfully"
                     
             except Exception as retry_error:
@@ -560,7 +798,7 @@ SQL Query:"""
                     return None, error_info['message']
                 if attempt == max_retries - 1:
                     return None, f"Error generating SQL: {str(retry_error)}"
-                time.sleep(1)
+                time.sleep(backoff_delay(attempt, base=0.5))
                 continue
         
         return None, "Failed to generate valid SQL query"
@@ -570,14 +808,8 @@ SQL Query:"""
         return None, error_info['message']
 
 
-def answer_general_question(user_question):
-    """
-    Answers general HR questions that don't require database lookup.
-    """
-    try:
-        client = get_gemini_client()
-        
-        prompt = f"""{HR_KNOWLEDGE_BASE}
+def _general_prompt(user_question):
+    return f"""{HR_KNOWLEDGE_BASE}
 
 You are an HR assistant for a company. Answer this question helpfully and professionally.
 If the question is completely unrelated to HR or workplace topics, politely redirect to HR-related topics.
@@ -585,12 +817,50 @@ If the question is completely unrelated to HR or workplace topics, politely redi
 Question: {user_question}
 
 Provide a helpful, concise answer:"""
+
+
+def _document_prompt(user_question, context):
+    return f"""You are an HR assistant answering questions based on company documents.
+
+DOCUMENT CONTEXT:
+{context}
+
+INSTRUCTIONS:
+1. Answer the question based ONLY on the provided document context
+2. If the answer is not in the documents, say so clearly
+3. Quote relevant parts of the documents when helpful
+4. Be concise but thorough
+5. If multiple documents are relevant, synthesize the information
+
+Question: {user_question}
+
+Answer based on the documents:"""
+
+
+def answer_general_question(user_question):
+    """
+    Answers general HR questions that don't require database lookup.
+    """
+    try:
+        cache_context = context_version(HR_KNOWLEDGE_BASE)
+        cached_answer = get_llm_cache().get('general', user_question, cache_context, GEMINI_MODELS[0])
+        if cached_answer:
+            return {
+                'status': 'success',
+                'answer': cached_answer,
+                'sql_query': None,
+                'results': None,
+                'type': 'general',
+                'cached': True
+            }
         
-        response = call_gemini_with_fallback(client, prompt)
+        response = call_gemini_with_fallback(_general_prompt(user_question))
+        answer = response.text.strip()
+        get_llm_cache().put('general', user_question, cache_context, GEMINI_MODELS[0], answer)
         
         return {
             'status': 'success',
-            'answer': response.text.strip(),
+            'answer': answer,
             'sql_query': None,
             'results': None,
             'type': 'general'
@@ -608,12 +878,13 @@ Provide a helpful, concise answer:"""
         }
 
 
-def answer_document_question(user_question):
+def answer_document_question(user_question, retrieval=None):
     """
     Answers questions based on uploaded documents using RAG.
     
     Args:
         user_question: User's question about uploaded documents
+        retrieval: Optional RetrievalContext with this question's search results
         
     Returns:
         dict: Contains answer, sources, and status
@@ -628,8 +899,12 @@ def answer_document_question(user_question):
                 'type': 'document'
             }
         
+        # One search serves both the context and the source list
+        if retrieval is None:
+            retrieval = RetrievalContext(user_question)
+        
         # Get relevant context from documents
-        context = get_context_for_query(user_question, max_chunks=4, max_chars=4000)
+        context = get_context_for_query(user_question, max_chunks=4, max_chars=4000, retrieval=retrieval)
         
         if not context:
             return {
@@ -640,29 +915,10 @@ def answer_document_question(user_question):
                 'type': 'document'
             }
         
-        client = get_gemini_client()
-        
-        prompt = f"""You are an HR assistant answering questions based on company documents.
-
-DOCUMENT CONTEXT:
-{context}
-
-INSTRUCTIONS:
-1. Answer the question based ONLY on the provided document context
-2. If the answer is not in the documents, say so clearly
-3. Quote relevant parts of the documents when helpful
-4. Be concise but thorough
-5. If multiple documents are relevant, synthesize the information
-
-Question: {user_question}
-
-Answer based on the documents:"""
-        
-        response = call_gemini_with_fallback(client, prompt)
+        response = call_gemini_with_fallback(_document_prompt(user_question, context))
         
         # Get source documents
-        search_results = simple_search(user_question, top_k=3)
-        sources = list(set([r['doc_name'] for r in search_results])) if search_results else []
+        sources = retrieval.sources(top_k=3)
         
         answer = response.text.strip()
         if sources:
@@ -689,6 +945,93 @@ Answer based on the documents:"""
         }
 
 
+def _query_database(user_question, use_fast_path=True):
+    """
+    Steps shared by answer_hr_question() and AnswerStream: SQL from the fast
+    path or Gemini, validation and execution. A name lookup that finds no one
+    is asked again through Gemini (the capitalized words may not be a name).
+    
+    Returns:
+        tuple: ((sql_query, sql_params, fast_path_intent, results, query_stats),
+        None) on success, or (None, result) with a finished answer dict otherwise
+    """
+    # Step 1: Compile templated questions directly, ask Gemini for the rest
+    fast_path = parse_fast_path(user_question) if use_fast_path else None
+    if fast_path:
+        sql_query, sql_params, fast_path_intent = fast_path
+        with _fast_path_stats_lock:
+            _fast_path_stats['hits'] += 1
+            _fast_path_stats['by_intent'][fast_path_intent] += 1
+    else:
+        if use_fast_path:
+            with _fast_path_stats_lock:
+                _fast_path_stats['misses'] += 1
+        sql_params, fast_path_intent = (), None
+        sql_query, message = generate_sql_query(user_question)
+    
+    if sql_query is None:
+        # Fall back to general answer if SQL generation fails
+        result = answer_general_question(user_question)
+        if result.get('answer'):
+            result['answer'] = apply_output_guardrails(result['answer'])
+        return None, result
+    
+    # ===== SECURITY: Validate SQL query =====
+    is_safe, sql_result = HRSecurityGuardrails.validate_sql_query(sql_query)
+    if not is_safe and fix_sql_quotes(sql_query) != sql_query:
+        # Smart quotes or an unbalanced quote fail tokenization; retry once fixed
+        is_safe, sql_result = HRSecurityGuardrails.validate_sql_query(fix_sql_quotes(sql_query))
+    if not is_safe:
+        return None, {
+            'status': 'error',
+            'answer': f"🚫 **Security Notice:** Query validation failed. {sql_result}",
+            'sql_query': sql_query,
+            'results': None,
+            'blocked': True
+        }
+    sql_query = sql_result  # Use potentially modified (LIMIT added) query
+    
+    # Step 2: Execute in the read-only, time-boxed query engine with error recovery
+    try:
+        query_result = get_query_engine().execute(sql_query, sql_params)
+        
+    except (SQLRejectedError, QueryTimeoutError) as e:
+        return None, {
+            'status': 'error',
+            'answer': f"🚫 **Query Rejected:** {e}\n\nTry a more specific question.",
+            'sql_query': sql_query,
+            'results': None,
+            'blocked': True
+        }
+    except Exception as e:
+        error_str = str(e)
+        
+        # If SQL execution fails, try to fix common issues and retry
+        if 'unrecognized token' in error_str or 'syntax error' in error_str:
+            # Try fixing the query
+            fixed_sql = fix_sql_quotes(sql_query)
+            try:
+                query_result = get_query_engine().execute(fixed_sql, sql_params)
+                sql_query = fixed_sql
+            except:
+                # Give up and answer generally
+                general_response = answer_general_question(user_question)
+                general_response['answer'] = f"I couldn't query the database directly, but here's what I know:\n\n{general_response['answer']}"
+                return None, general_response
+        else:
+            return None, {
+                'status': 'error',
+                'answer': f"Error executing query: {error_str}\n\nTry rephrasing your question.",
+                'sql_query': sql_query,
+                'results': None
+            }
+    
+    results_list = query_result.to_records()
+    if not results_list and fast_path_intent == 'employee_by_name':
+        return _query_database(user_question, use_fast_path=False)
+    return (sql_query, sql_params, fast_path_intent, results_list, query_result.stats()), None
+
+
 def answer_hr_question(user_question):
     """
     Processes a natural language HR question and returns a formatted answer.
@@ -711,12 +1054,13 @@ def answer_hr_question(user_question):
         # Use sanitized question from here
         user_question = sanitized_question
         
-        # Step 0: Classify the question
-        question_type = classify_question(user_question)
+        # Step 0: Classify the question (search results are computed once per question)
+        retrieval = RetrievalContext(user_question) if RAG_AVAILABLE else None
+        question_type = classify_question(user_question, retrieval)
         
         # Handle document-based questions (RAG)
         if question_type == 'document':
-            result = answer_document_question(user_question)
+            result = answer_document_question(user_question, retrieval)
             # Apply output guardrails
             if result.get('answer'):
                 result['answer'] = apply_output_guardrails(result['answer'])
@@ -734,56 +1078,11 @@ def answer_hr_question(user_question):
                 result['answer'] = sensitivity_warning + "\n\n" + result.get('answer', '')
             return result
         
-        # Step 1: Generate SQL query
-        sql_query, message = generate_sql_query(user_question)
-        
-        if sql_query is None:
-            # Fall back to general answer if SQL generation fails
-            result = answer_general_question(user_question)
-            if result.get('answer'):
-                result['answer'] = apply_output_guardrails(result['answer'])
+        # Steps 1-2: SQL from the fast path or Gemini, validated and executed
+        query, result = _query_database(user_question)
+        if result is not None:
             return result
-        
-        # ===== SECURITY: Validate SQL query =====
-        is_safe, sql_result = HRSecurityGuardrails.validate_sql_query(sql_query)
-        if not is_safe:
-            return {
-                'status': 'error',
-                'answer': f"🚫 **Security Notice:** Query validation failed. {sql_result}",
-                'sql_query': sql_query,
-                'results': None,
-                'blocked': True
-            }
-        sql_query = sql_result  # Use potentially modified (LIMIT added) query
-        
-        # Step 2: Execute the query with error recovery
-        try:
-            results = execute_query(sql_query)
-            results_list = [dict(row) for row in results] if results else []
-            
-        except Exception as e:
-            error_str = str(e)
-            
-            # If SQL execution fails, try to fix common issues and retry
-            if 'unrecognized token' in error_str or 'syntax error' in error_str:
-                # Try fixing the query
-                fixed_sql = fix_sql_quotes(sql_query)
-                try:
-                    results = execute_query(fixed_sql)
-                    results_list = [dict(row) for row in results] if results else []
-                    sql_query = fixed_sql
-                except:
-                    # Give up and answer generally
-                    general_response = answer_general_question(user_question)
-                    general_response['answer'] = f"I couldn't query the database directly, but here's what I know:\n\n{general_response['answer']}"
-                    return general_response
-            else:
-                return {
-                    'status': 'error',
-                    'answer': f"Error executing query: {error_str}\n\nTry rephrasing your question.",
-                    'sql_query': sql_query,
-                    'results': None
-                }
+        sql_query, sql_params, fast_path_intent, results_list, query_stats = query
         
         # Step 3: Format the answer
         if not results_list:
@@ -791,7 +1090,8 @@ def answer_hr_question(user_question):
                 'status': 'success',
                 'answer': f"No results found for your query.\n\nI searched for: *{user_question}*\n\nTry a different search term or check the spelling.",
                 'sql_query': sql_query,
-                'results': []
+                'results': [],
+                'query_stats': query_stats
             }
         
         answer = format_answer(user_question, results_list, sql_query)
@@ -807,7 +1107,11 @@ def answer_hr_question(user_question):
             'status': 'success',
             'answer': answer,
             'sql_query': sql_query,
-            'results': results_list
+            'sql_params': list(sql_params),
+            'results': results_list,
+            'fast_path': fast_path_intent,
+            'query_stats': query_stats,
+            'polishable': len(results_list) > 1
         }
         
     except Exception as e:
@@ -819,9 +1123,179 @@ def answer_hr_question(user_question):
         }
 
 
+# Streamed text is released up to the last whitespace that doesn't follow a digit:
+# the masked PII formats only contain whitespace between digit groups, so a
+# number split across chunks is still seen whole
+_STREAM_BOUNDARY = re.compile(r'.*[^\d\s]\s', re.DOTALL)
+
+
+def _mask_streamed_text(chunks):
+    """
+    Applies the output guardrails to a stream of text chunks, releasing text
+    at the last safe word boundary seen so far.
+    """
+    buffer = ''
+    for chunk in chunks:
+        buffer += chunk
+        match = _STREAM_BOUNDARY.match(buffer)
+        if match:
+            yield apply_output_guardrails(match.group())
+            buffer = buffer[match.end():]
+    if buffer:
+        yield apply_output_guardrails(buffer)
+
+
+def _collect(chunks, into):
+    """Passes chunks through while keeping a copy of each."""
+    for chunk in chunks:
+        into.append(chunk)
+        yield chunk
+
+
+class AnswerStream:
+    """
+    Streaming counterpart of answer_hr_question().
+    
+    Iterating yields the answer text as it is produced: Gemini answers chunk
+    by chunk, locally formatted answers in one piece. For database questions
+    the rows are passed to `on_results` as soon as the query returns, before
+    any text. After iteration, `result` holds the same dict as
+    answer_hr_question() plus 'timings' (ms until the rows, the first text
+    and completion).
+    
+    Usage:
+        stream = AnswerStream(question, on_results=show_table)
+        st.write_stream(stream)
+        response = stream.result
+    """
+    
+    def __init__(self, user_question, on_results=None):
+        self.question = user_question
+        self.on_results = on_results
+        self.result = {'status': 'success', 'answer': '', 'sql_query': None, 'results': None}
+        self.timings = {}
+        self._started = None
+        self._prefix = ''
+    
+    def _mark(self, name):
+        self.timings.setdefault(name, round((time.perf_counter() - self._started) * 1000, 1))
+    
+    def __iter__(self):
+        self._started = time.perf_counter()
+        text = []
+        try:
+            for chunk in self._generate():
+                if not chunk:
+                    continue
+                if not text:
+                    self._mark('first_text_ms')
+                    chunk = self._prefix + chunk
+                text.append(chunk)
+                yield chunk
+        except Exception as e:
+            error_info = handle_api_error(e)
+            self.result.update({
+                'status': 'error',
+                'answer': error_info['message'],
+                'is_rate_limit': error_info.get('is_rate_limit', False)
+            })
+        else:
+            if self.result['status'] == 'success':
+                self.result['answer'] = ''.join(text).strip()
+        finally:
+            self._mark('total_ms')
+            self.result['timings'] = dict(self.timings)
+    
+    def _generate(self):
+        # ===== SECURITY: Apply input guardrails =====
+        question, error_msg, is_sensitive, sensitivity_warning = apply_input_guardrails(self.question)
+        if error_msg:
+            self.result.update({'status': 'error', 'answer': error_msg, 'blocked': True})
+            return
+        if sensitivity_warning:
+            self._prefix = sensitivity_warning + "\n\n"
+        
+        retrieval = RetrievalContext(question) if RAG_AVAILABLE else None
+        question_type = classify_question(question, retrieval)
+        
+        if question_type == 'document':
+            yield from self._document_answer(question, retrieval)
+        elif question_type == 'general':
+            yield from self._general_answer(question)
+        else:
+            yield from self._database_answer(question)
+    
+    def _general_answer(self, question):
+        self.result['type'] = 'general'
+        cache_context = context_version(HR_KNOWLEDGE_BASE)
+        cached_answer = get_llm_cache().get('general', question, cache_context, GEMINI_MODELS[0])
+        if cached_answer:
+            self.result['cached'] = True
+            yield apply_output_guardrails(cached_answer)
+            return
+        
+        raw = []
+        yield from _mask_streamed_text(_collect(get_llm_gateway().stream(_general_prompt(question)), raw))
+        answer = ''.join(raw).strip()
+        if answer:
+            get_llm_cache().put('general', question, cache_context, GEMINI_MODELS[0], answer)
+    
+    def _document_answer(self, question, retrieval):
+        self.result['type'] = 'document'
+        if not RAG_AVAILABLE:
+            self.result.update({
+                'status': 'error',
+                'answer': "Document search is not available. Please check the document_processor module."
+            })
+            return
+        
+        context = get_context_for_query(question, max_chunks=4, max_chars=4000, retrieval=retrieval)
+        if not context:
+            yield "I couldn't find relevant information in the uploaded documents. Try uploading more documents or rephrasing your question."
+            return
+        
+        yield from _mask_streamed_text(get_llm_gateway().stream(_document_prompt(question, context)))
+        
+        sources = retrieval.sources(top_k=3)
+        self.result['sources'] = sources
+        if sources:
+            yield apply_output_guardrails(f"\n\n📄 **Sources:** {', '.join(sources)}")
+    
+    def _database_answer(self, question):
+        query, result = _query_database(question)
+        if result is not None:
+            if result['status'] != 'success':
+                self.result.update(result)
+                return
+            self.result.update({k: v for k, v in result.items() if k != 'answer'})
+            yield result['answer']
+            return
+        
+        sql_query, sql_params, fast_path_intent, results_list, query_stats = query
+        self.result.update({
+            'sql_query': sql_query,
+            'sql_params': list(sql_params),
+            'results': results_list,
+            'fast_path': fast_path_intent,
+            'query_stats': query_stats,
+            'polishable': len(results_list) > 1
+        })
+        self._mark('results_ms')
+        if self.on_results is not None and results_list:
+            self.on_results(results_list)
+        
+        if not results_list:
+            yield f"No results found for your query.\n\nI searched for: *{question}*\n\nTry a different search term or check the spelling."
+            return
+        
+        # ===== SECURITY: Apply output guardrails =====
+        yield apply_output_guardrails(format_answer(question, results_list, sql_query))
+
+
 def format_answer(question, results, sql_query):
     """
-    Formats query results into a natural language answer.
+    Formats query results into a natural language answer, locally.
+    Use polish_answer_stream() for an optional LLM rewrite afterwards.
     """
     if not results:
         return "No data found matching your query."
@@ -856,40 +1330,53 @@ def format_answer(question, results, sql_query):
                             answer += f"- **{label}:** {v}\n"
                 return answer
         
-        # For tabular results - use Gemini for formatting
-        client = get_gemini_client()
-        results_json = json.dumps(results[:15], indent=2, default=str)
+        # For tabular results - local markdown (tables, rankings, group-by summaries)
+        return format_results(results, sql_query)
         
-        prompt = f"""Format this HR data into a clear answer.
+    except Exception as e:
+        # Fallback formatting
+        return _format_results_locally(results)
+
+
+def polish_answer_stream(question, answer):
+    """
+    Optional second pass: streams a Gemini rewrite of a locally formatted
+    answer. The model only sees the answer text, which has already been
+    through the output guardrails; the rewrite goes through them again as it
+    streams.
+    
+    Yields:
+        str: Text chunks of the polished answer
+    """
+    prompt = f"""Rewrite this HR data answer so it reads naturally.
 
 Question: {question}
-Data: {results_json}
+Answer:
+{answer}
 
 Rules:
-1. Start with a brief summary
-2. Use bullet points or numbered lists
-3. Format salaries as $X,XXX
-4. Be concise but include key details
-5. If showing employees, include name and relevant info
+1. Start with a one-sentence summary
+2. Keep every number, name and table row exactly as given
+3. Keep markdown tables and lists
+4. Be concise
 
-Answer:"""
-        
-        response = call_gemini_with_fallback(client, prompt)
-        
-        return response.text.strip()
-        
-    except Exception as e:
-        # Fallback formatting
-        answer = f"**Found {len(results)} result(s):**\n\n"
-        
-        for i, row in enumerate(results[:10], 1):
-            row_text = " | ".join([f"**{k}**: {v}" for k, v in row.items()])
-            answer += f"{i}. {row_text}\n"
-        
-        if len(results) > 10:
-            answer += f"\n_...and {len(results) - 10} more results_"
-        
-        return answer
+Rewritten answer:"""
+    
+    yield from _mask_streamed_text(get_llm_gateway().stream(prompt))
+
+
+def _format_results_locally(results):
+    """Numbered list of result rows, formatted without the LLM."""
+    answer = f"**Found {len(results)} result(s):**\n\n"
+    
+    for i, row in enumerate(results[:10], 1):
+        row_text = " | ".join([f"**{k}**: {v}" for k, v in row.items()])
+        answer += f"{i}. {row_text}\n"
+    
+    if len(results) > 10:
+        answer += f"\n_...and {len(results) - 10} more results_"
+    
+    return answer
 
 
 def calculate_time_saved(num_queries):
@@ -23,8 +23,14 @@ from db_utils import (
     get_feedback_summary
 )
 from ai_utils import (
+    AnswerStream,
     answer_hr_question,
+    apply_output_guardrails,
+    polish_answer_stream,
     calculate_time_saved,
+    get_fast_path_stats,
+    get_llm_cache_stats,
+    get_retry_budget,
     get_sample_questions
 )
 
@@ -645,6 +651,19 @@ def render_sidebar():
             if st.button(question, key=f"sample_{i}", use_container_width=True):
                 st.session_state.selected_question = question
         
+        st.toggle(
+            "⚡ Stream answers",
+            value=True,
+            key="stream_answers",
+            help="Show query results and AI text as they arrive instead of waiting for the complete answer"
+        )
+        
+        st.toggle(
+            "✨ Polish table answers with AI",
+            key="polish_answers",
+            help="Tables are formatted instantly; this adds a streamed Gemini rewrite afterwards (uses extra quota)"
+        )
+        
         st.markdown("---")
         st.markdown("### 📈 Statistics")
         st.metric("Total Queries", st.session_state.query_count)
@@ -656,6 +675,22 @@ def render_sidebar():
                 f"{time_saved['time_saved_hours']} hrs",
                 delta=time_saved['efficiency_improvement']
             )
+        
+        fast_path_stats = get_fast_path_stats()
+        if fast_path_stats['hits'] + fast_path_stats['misses'] > 0:
+            st.metric(
+                "Instant Answers",
+                f"{fast_path_stats['hit_ratio']:.0%}",
+                help=f"{fast_path_stats['hits']} database questions answered without calling Gemini"
+            )
+        
+        cache_stats = get_llm_cache_stats()
+        if cache_stats['hits'] + cache_stats['misses'] > 0:
+            st.metric(
+                "AI Cache Hit Rate",
+                f"{cache_stats['hit_rate']:.0%}",
+                help=f"{cache_stats['hits']} cached answers, {cache_stats['entries']} stored responses"
+            )
     
     return page
 
@@ -1131,36 +1166,91 @@ def process_question(user_question):
     
     # Get AI response
     with st.chat_message("assistant"):
-        with st.spinner("🤔 Thinking..."):
-            response = answer_hr_question(user_question)
+        answer_placeholder = st.empty()
+        
+        if st.session_state.get('stream_answers', True):
+            # Rows render as soon as the query returns; text streams in below them
+            results_area = st.empty()
+            answer_placeholder.caption("🤔 Thinking...")
             
-            if response['status'] == 'success':
-                st.markdown(response['answer'])
-                
-                # Show SQL query and results in expander
-                with st.expander("🔍 View SQL Query & Results"):
+            def show_results(rows):
+                answer_placeholder.empty()
+                results_area.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
+            
+            stream = AnswerStream(user_question, on_results=show_results)
+            answer_placeholder.write_stream(stream)
+            response = stream.result
+        else:
+            with st.spinner("🤔 Thinking..."):
+                response = answer_hr_question(user_question)
+        
+        if response['status'] == 'success':
+            answer_placeholder.markdown(response['answer'])
+            
+            # Optional streamed rewrite of the locally formatted answer
+            if st.session_state.get('polish_answers') and response.get('polishable'):
+                try:
+                    polished = answer_placeholder.write_stream(
+                        polish_answer_stream(user_question, response['answer'])
+                    )
+                    if polished:
+                        response['answer'] = apply_output_guardrails(polished)
+                        answer_placeholder.markdown(response['answer'])
+                except Exception:
+                    answer_placeholder.markdown(response['answer'])
+            
+            # Show SQL query and results in expander
+            with st.expander("🔍 View SQL Query & Results"):
+                if response['sql_query']:
                     st.code(response['sql_query'], language="sql")
-                    if response['results']:
-                        st.json(response['results'][:5])
-                
-                # Add to chat history
-                st.session_state.chat_history.append({
-                    "role": "assistant",
-                    "content": response['answer'],
-                    "sql_query": response['sql_query'],
-                    "results": response['results']
-                })
-                
-                # Increment query count
-                st.session_state.query_count += 1
-                
-            else:
-                error_msg = f"❌ {response['answer']}"
-                st.error(error_msg)
-                st.session_state.chat_history.append({
-                    "role": "assistant",
-                    "content": error_msg
-                })
+                if response.get('sql_params'):
+                    st.caption(f"Parameters: {response['sql_params']}")
+                if response.get('fast_path'):
+                    st.caption(f"⚡ Answered without AI (intent: {response['fast_path']})")
+                if response['results']:
+                    st.json(response['results'][:5])
+                query_stats = response.get('query_stats')
+                if query_stats:
+                    caption = (f"🗄️ {query_stats['rows']} rows in {query_stats['elapsed_ms']:.0f} ms "
+                               f"(~{query_stats['vm_steps']:,} SQLite VM steps, read-only sandbox)")
+                    if query_stats['truncated']:
+                        caption += f" · result capped by {query_stats['truncated']} limit"
+                    st.caption(caption)
+                timings = response.get('timings')
+                if timings:
+                    parts = []
+                    if 'results_ms' in timings:
+                        parts.append(f"rows {timings['results_ms']:.0f} ms")
+                    if 'first_text_ms' in timings:
+                        parts.append(f"first text {timings['first_text_ms']:.0f} ms")
+                    parts.append(f"total {timings['total_ms']:.0f} ms")
+                    st.caption("⏱️ Time to first byte: " + " · ".join(parts))
+                retry_budget = get_retry_budget()
+                if retry_budget:
+                    st.caption(
+                        f"AI retry budget: {retry_budget['attempts_left']} attempts / "
+                        f"{retry_budget['seconds_left']}s left "
+                        f"({retry_budget['seconds_waited']}s waited for quota)"
+                    )
+            
+            # Add to chat history
+            st.session_state.chat_history.append({
+                "role": "assistant",
+                "content": response['answer'],
+                "sql_query": response['sql_query'],
+                "results": response['results']
+            })
+            
+            # Increment query count
+            st.session_state.query_count += 1
+            
+        else:
+            error_msg = f"❌ {response['answer']}"
+            st.error(error_msg)
+            st.session_state.chat_history.append({
+                "role": "assistant",
+                "content": error_msg
+            })
     
     # Rerun to update chat display
     st.rerun()
@@ -1570,9 +1660,10 @@ def render_documents():
     # Import document processor
     try:
         from document_processor import (
-            save_document, 
+            ingest_documents, 
             get_all_documents, 
             delete_document,
+            compact_knowledge_base,
             simple_search,
             has_uploaded_documents
         )
@@ -1619,28 +1710,35 @@ def render_documents():
             if st.button("📤 Upload Documents", type="primary"):
                 progress_bar = st.progress(0)
                 status_text = st.empty()
+                status_text.text(f"Processing {len(uploaded_files)} file(s)...")
                 
-                for i, file in enumerate(uploaded_files):
-                    status_text.text(f"Processing: {file.name}...")
-                    
-                    # Read file content
-                    content = file.read()
-                    
-                    # Save document
-                    try:
-                        doc_info = save_document(
-                            filename=file.name,
-                            content=content,
-                            metadata={'category': category}
-                        )
-                        st.success(f"✅ Uploaded: {file.name} ({doc_info['chunk_count']} chunks)")
-                    except Exception as e:
-                        st.error(f"❌ Error uploading {file.name}: {e}")
-                    
-                    progress_bar.progress((i + 1) / len(uploaded_files))
+                def show_progress(done, total, result):
+                    # Called as each file finishes extracting (in parallel worker processes)
+                    if 'error' in result:
+                        st.error(f"❌ Error uploading {result['filename']}: {result['error']}")
+                    elif result.get('status') == 'unchanged':
+                        st.info(f"⏭️ Unchanged: {result['filename']} is already in the knowledge base")
+                    elif result.get('status') == 'duplicate':
+                        st.warning(f"⏭️ Duplicate: the same content is already stored as {result['filename']}")
+                    else:
+                        st.success(f"✅ Processed: {result['filename']} ({result['chunk_count']} chunks)")
+                    progress_bar.progress(done / total)
+                    status_text.text(f"Processed {done} of {total} file(s)...")
                 
-                status_text.text("Upload complete!")
-                st.rerun()
+                try:
+                    results = ingest_documents(
+                        [(file.name, file.read()) for file in uploaded_files],
+                        metadata={'category': category},
+                        progress=show_progress
+                    )
+                except Exception as e:
+                    st.error(f"❌ Error saving documents: {e}")
+                else:
+                    stored = sum('error' not in result and result.get('status') not in ('unchanged', 'duplicate')
+                                 for result in results)
+                    unchanged = sum(result.get('status') in ('unchanged', 'duplicate') for result in results)
+                    status_text.text(f"Upload complete! {stored} document(s) saved, {unchanged} unchanged.")
+                    st.rerun()
     
     with col2:
         st.subheader("📚 Uploaded Documents")
@@ -1655,6 +1753,7 @@ def render_documents():
             for doc in documents:
                 with st.expander(f"📄 {doc['filename']}", expanded=False):
                     st.write(f"**Chunks:** {doc['chunk_count']}")
+                    st.write(f"**Version:** {doc.get('version', 1)}")
                     st.write(f"**Category:** {doc.get('metadata', {}).get('category', 'N/A')}")
                     
                     if st.button(f"🗑️ Delete", key=f"del_{doc['id']}"):
@@ -1663,6 +1762,13 @@ def render_documents():
                             st.rerun()
                         else:
                             st.error("Failed to delete document")
+            
+            if st.button("🧹 Reclaim Space", help="Compact the knowledge base after deleting or replacing documents"):
+                with st.spinner("Compacting knowledge base..."):
+                    if compact_knowledge_base():
+                        st.success("Knowledge base compacted")
+                    else:
+                        st.info("Little space to reclaim; nothing to do")
     
     st.markdown("---")
     
@@ -0,0 +1,1459 @@
+"""
+Performance benchmarks for the HR Automation Dashboard.
+Run from the project root, e.g.:
+
+    python benchmarks.py db --employees 100000
+    python benchmarks.py dashboard
+    python benchmarks.py sql
+    python benchmarks.py import --rows 1000000
+    python benchmarks.py fastpath
+    python benchmarks.py guardrails
+    python benchmarks.py retrieval --documents 200
+    python benchmarks.py ingest --files 200
+    python benchmarks.py chunker --size-mb 8
+    python benchmarks.py extract --pages 100 500
+    python benchmarks.py synonyms --entries 50000
+    python benchmarks.py scorer --documents 2000
+    python benchmarks.py vectors --rows 1000000
+    python benchmarks.py gateway
+    python benchmarks.py streaming
+    python benchmarks.py stub-server --port 8085   # then GEMINI_BASE_URL=http://127.0.0.1:8085
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import re
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _time_call(func, repeat):
+    """Runs func `repeat` times and returns (median_ms, best_ms)."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), min(timings)
+
+
+def _print_row(label, median_ms, best_ms):
+    print(f"  {label:<38} median {median_ms:9.2f} ms   best {best_ms:9.2f} ms")
+
+
+# ============================================================================
+# DATABASE: indexes and pragmas
+# ============================================================================
+
+def _populate_large_database(conn, num_employees):
+    """Bulk-loads synthetic employees, transfers and feedback."""
+    departments = ['Engineering', 'Sales', 'Marketing', 'HR', 'Finance', 'Operations']
+    statuses = ['Active'] * 8 + ['On Leave', 'Terminated']
+    base_date = datetime.now() - timedelta(days=3650)
+
+    employees = []
+    for i in range(1, num_employees + 1):
+        hire_date = (base_date + timedelta(days=random.randint(0, 3600))).strftime('%Y-%m-%d')
+        employees.append((
+            f'EMP{i:07d}', f'First{i}', f'Last{i}', f'user{i}@company.com',
+            random.choice(departments), 'Analyst', hire_date,
+            random.randint(50000, 250000), random.choice(statuses)
+        ))
+    conn.executemany('''
+        INSERT INTO employees (employee_id, first_name, last_name, email, department,
+                               position, hire_date, salary, status)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', employees)
+
+    transfers = []
+    for _ in range(num_employees // 2):
+        transfer_date = (datetime.now() - timedelta(days=random.randint(1, 3000))).strftime('%Y-%m-%d')
+        from_dept, to_dept = random.sample(departments, 2)
+        transfers.append((f'EMP{random.randint(1, num_employees):07d}', from_dept, to_dept,
+                          transfer_date, 'Career Growth'))
+    conn.executemany('''
+        INSERT INTO transfers (employee_id, from_department, to_department, transfer_date, reason)
+        VALUES (?, ?, ?, ?, ?)
+    ''', transfers)
+
+    feedback = []
+    for _ in range(num_employees * 2):
+        feedback_date = (datetime.now() - timedelta(days=random.randint(1, 365))).strftime('%Y-%m-%d')
+        feedback.append((f'EMP{random.randint(1, num_employees):07d}', feedback_date,
+                         random.randint(1, 5), 'Peer Review', 'Good team player', 'HR Team'))
+    conn.executemany('''
+        INSERT INTO feedback (employee_id, feedback_date, rating, feedback_type, comments, reviewer)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', feedback)
+    conn.commit()
+
+
+def _explain(conn, sql, params=()):
+    rows = conn.execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()
+    return '; '.join(row['detail'] for row in rows)
+
+
+def _explain_fresh(db_path, sql, params=()):
+    """
+    Explains a query on a new connection. EXPLAIN statements do not check the
+    schema cookie, so a pooled connection's cached statement can show a stale plan.
+    """
+    import db_utils
+
+    conn = db_utils.get_db_connection(db_path)
+    try:
+        return _explain(conn, sql, params)
+    finally:
+        conn.close()
+
+
+def benchmark_database(num_employees, repeat):
+    """
+    Compares get_recent_transfers and get_department_stats on a schema without
+    secondary indexes against the fully migrated schema.
+    """
+    import db_utils
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, 'benchmark.db')
+        db_utils.configure_pool(db_path)
+
+        print(f"Building database with {num_employees:,} employees...")
+        with db_utils.write_connection() as conn:
+            db_utils.apply_migrations(conn, target_version=1)
+            _populate_large_database(conn, num_employees)
+
+        # Bypass the result cache: this measures the query plans
+        queries = [
+            ('get_recent_transfers(10)', lambda: db_utils.get_recent_transfers.uncached(10)),
+            ('get_department_stats()', db_utils.get_department_stats.uncached),
+        ]
+
+        def run(title):
+            print(f"\n{title}")
+            print("  plan recent_transfers: " + _explain_fresh(db_path, '''
+                SELECT t.employee_id FROM transfers t
+                JOIN employees e ON t.employee_id = e.employee_id
+                ORDER BY t.transfer_date DESC LIMIT 10'''))
+            print("  plan department_stats: " + _explain_fresh(db_path, '''
+                SELECT department, COUNT(*), AVG(salary), MIN(salary), MAX(salary)
+                FROM employees WHERE status = 'Active' GROUP BY department'''))
+            results = {}
+            for label, func in queries:
+                results[label] = _time_call(func, repeat)
+                _print_row(label, *results[label])
+            return results
+
+        before = run("Baseline schema (no secondary indexes)")
+
+        with db_utils.write_connection() as conn:
+            db_utils.apply_migrations(conn)
+        after = run(f"Migrated schema (version {db_utils.SCHEMA_VERSION})")
+
+        print("\nSpeedup (median):")
+        for label, _ in queries:
+            print(f"  {label:<38} {before[label][0] / max(after[label][0], 1e-9):8.1f}x")
+
+        db_utils.get_pool().close()
+
+
+def _legacy_validate_sql(sql_query):
+    """The keyword-substring check sql_validator replaced."""
+    sql_upper = sql_query.upper().strip()
+    if not sql_upper.startswith('SELECT'):
+        return False
+    return not any(keyword in sql_upper for keyword in
+                   ['DROP', 'DELETE', 'UPDATE', 'INSERT', 'ALTER', 'CREATE', 'TRUNCATE', 'EXEC', 'EXECUTE'])
+
+
+def benchmark_sql_validator(num_employees, repeat):
+    """
+    Tokenizer validator vs the old keyword check (false positives and misses),
+    cross-join rejection, the query engine's time budget, result caps and
+    read-only connections, and validation overhead.
+    """
+    import db_utils
+    import sql_validator
+    from query_engine import QueryEngine
+
+    legitimate = [
+        "SELECT first_name, last_name FROM employees WHERE position = 'Executive Assistant'",
+        "SELECT employee_id, hire_date AS created_at FROM employees ORDER BY created_at DESC",
+        "SELECT * FROM feedback WHERE comments LIKE '%updated goals%'",
+        "SELECT reason, COUNT(*) FROM transfers WHERE reason = 'Team restructure after update' GROUP BY reason",
+        "SELECT e.department, AVG(f.rating) FROM employees e JOIN feedback f "
+        "ON e.employee_id = f.employee_id GROUP BY e.department",
+    ]
+    harmful = [
+        "SELECT * FROM sqlite_master",
+        "SELECT * FROM employees; DROP TABLE employees",
+        "SELECT * FROM employees e, feedback f, transfers t",
+        "SELECT load_extension('/tmp/evil')",
+        "SELECT * FROM pragma_table_info('employees')",
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, 'benchmark.db')
+        db_utils.configure_pool(db_path)
+        print(f"Building database with {num_employees:,} employees...")
+        with db_utils.write_connection() as conn:
+            db_utils.apply_migrations(conn)
+            _populate_large_database(conn, num_employees)
+
+        def new_accepts(sql):
+            try:
+                query = sql_validator.validate_sql(sql)
+                with db_utils.read_connection() as conn:
+                    sql_validator.check_query_plan(conn, query)
+                return True
+            except sql_validator.SQLRejectedError:
+                return False
+
+        print("\nLegitimate queries (accepted?)          old    new")
+        for sql in legitimate:
+            print(f"  {sql[:38]:<38} {str(_legacy_validate_sql(sql)):<6} {new_accepts(sql)}")
+        print("\nHarmful queries (accepted?)             old    new")
+        for sql in harmful:
+            print(f"  {sql[:38]:<38} {str(_legacy_validate_sql(sql)):<6} {new_accepts(sql)}")
+
+        # A plan-valid query whose correlated subquery makes it quadratic
+        runaway = ("SELECT COUNT(*) FROM employees e WHERE "
+                   "(SELECT COUNT(*) FROM feedback f WHERE f.rating * 50000 < e.salary) > 1000")
+        budget = 0.5
+        engine = QueryEngine(db_path, time_budget=budget, max_rows=500, max_bytes=64 * 1024)
+        start = time.perf_counter()
+        try:
+            engine.execute(runaway)
+            outcome = "finished"
+        except sql_validator.QueryTimeoutError:
+            outcome = "interrupted"
+        print(f"\nRunaway correlated subquery, {budget:g}s budget: {outcome} after "
+              f"{(time.perf_counter() - start) * 1000:.0f} ms")
+
+        for label, sql in [
+            ("Aggregate over all feedback", "SELECT rating, COUNT(*) FROM feedback GROUP BY rating"),
+            ("Every employee (LIMIT 100000, 500-row cap)", "SELECT * FROM employees LIMIT 100000"),
+            ("2 KB per row (64 KB cap)", "SELECT employee_id, printf('%.2000c', 'x') AS notes FROM employees LIMIT 100000"),
+        ]:
+            result = engine.execute(sql)
+            print(f"{label}: {result.row_count} rows, truncated={result.truncated}, "
+                  f"{result.elapsed_ms:.1f} ms, ~{result.vm_steps:,} VM steps, {result.result_bytes:,} bytes")
+        try:
+            with engine._pool.reader() as conn:
+                conn.execute("DELETE FROM employees")
+            print("Write through the engine's connection: allowed (!)")
+        except sqlite3.OperationalError as e:
+            print(f"Write through the engine's connection: refused ({e})")
+        print(f"Engine stats: {engine.stats()}")
+        engine.close()
+
+        start = time.perf_counter()
+        accepted = new_accepts("SELECT * FROM employees e, feedback f, transfers t")
+        print(f"Three-table cross join ({num_employees:,} x {num_employees * 2:,} x {num_employees // 2:,} rows): "
+              f"{'accepted' if accepted else 'rejected'} in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        print("\nOverhead per query")
+        _print_row("validate_sql (tokenize + checks)",
+                   *(ms / len(legitimate) for ms in _time_call(
+                       lambda: [sql_validator.validate_sql(sql) for sql in legitimate], repeat)))
+        _print_row("validate_sql + EXPLAIN QUERY PLAN",
+                   *(ms / len(legitimate) for ms in _time_call(
+                       lambda: [new_accepts(sql) for sql in legitimate], repeat)))
+
+        db_utils.get_pool().close()
+
+
+def benchmark_dashboard(num_employees, repeat):
+    """
+    Cost of the queries render_dashboard makes on every Streamlit rerun,
+    uncached vs served from the result cache.
+    """
+    import db_utils
+
+    def queries(uncached):
+        def run():
+            for func, args in ((db_utils.get_department_stats, ()),
+                               (db_utils.get_feedback_summary, ()),
+                               (db_utils.get_recent_transfers, (5,)),
+                               (db_utils.get_all_employees, ())):
+                (func.uncached if uncached else func)(*args)
+        return run
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_utils.configure_pool(os.path.join(tmp_dir, 'benchmark.db'))
+        print(f"Building database with {num_employees:,} employees...")
+        with db_utils.write_connection() as conn:
+            db_utils.apply_migrations(conn)
+            _populate_large_database(conn, num_employees)
+            db_utils.bump_data_version(conn)
+
+        print("\nDashboard rerun (4 queries)")
+        before = _time_call(queries(uncached=True), repeat)
+        _print_row("uncached", *before)
+        after = _time_call(queries(uncached=False), repeat)
+        _print_row("result cache", *after)
+        print(f"\nSpeedup (median): {before[0] / max(after[0], 1e-9):.1f}x")
+        print(f"Cache stats: {db_utils.get_result_cache_stats()}")
+        db_utils.get_pool().close()
+
+
+def benchmark_fast_path(repeat):
+    """
+    Fast-path coverage of the sidebar sample questions plus a few variants,
+    and the latency of answering them without Gemini.
+    """
+    import ai_utils
+    import db_utils
+
+    questions = ai_utils.get_sample_questions() + [
+        "How many employees are in Engineering?",
+        "Average salary in Sales",
+        "Who is the highest paid employee?",
+        "Show me the top 3 lowest paid employees in HR",
+        "List the last 5 transfers",
+        "How many employees do we have?",
+    ]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_utils.configure_pool(os.path.join(tmp_dir, 'benchmark.db'))
+        db_utils.initialize_database()
+
+        print(f"\nFast path over {len(questions)} questions")
+        hits = 0
+        for question in questions:
+            parsed = ai_utils.parse_fast_path(question)
+            hits += parsed is not None
+            print(f"  {'HIT ' if parsed else 'miss'} {parsed[2] if parsed else '-':<26} {question}")
+        print(f"  hit ratio: {hits / len(questions):.0%}")
+
+        def answer_all():
+            for question in questions:
+                parsed = ai_utils.parse_fast_path(question)
+                if parsed:
+                    sql, params, _ = parsed
+                    rows = [dict(row) for row in db_utils.execute_query(sql, params)]
+                    ai_utils.format_answer(question, rows, sql)
+
+        median_ms, best_ms = _time_call(answer_all, repeat)
+        _print_row(f"parse + query + format ({hits} hits)", median_ms / max(hits, 1), best_ms / max(hits, 1))
+        print("  (per question; the Gemini path takes ~1-3 s per question)")
+        db_utils.get_pool().close()
+
+
+# ============================================================================
+# IMPORT: streaming, batched directory importer
+# ============================================================================
+
+def _write_directory_csv(path, num_rows, rng):
+    """Synthetic directory CSV; about 5% of rows repeat an earlier name."""
+    import import_divcowest_data as importer
+
+    departments = list(importer.DEPARTMENT_CODES)
+    titles = [title for title in importer.SALARY_RANGES if title != 'Default'] + ['Property Manager', '']
+    locations = ['San Francisco', 'Cambridge', 'Los Angeles', 'New York', '']
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write('department,team,name,title,location\n')
+        for i in range(1, num_rows + 1):
+            person = rng.randint(1, i - 1) if i > 1 and rng.random() < 0.05 else i
+            f.write(f'"{rng.choice(departments)}",Team,First{person} Last{person},'
+                    f'{rng.choice(titles)},{rng.choice(locations)}\n')
+
+
+def _legacy_import_employees(db_path, csv_path, limit):
+    """The original importer's employee loop: list, Python dedupe, one execute() per row."""
+    import db_utils
+    import import_divcowest_data as importer
+
+    with open(csv_path, 'r', encoding='utf-8') as f:
+        employees = [row for _, row in zip(range(limit), csv.DictReader(f))]
+    seen_names, unique_employees = set(), []
+    for emp in employees:
+        if emp['name'] not in seen_names:
+            seen_names.add(emp['name'])
+            unique_employees.append(emp)
+
+    conn = sqlite3.connect(db_path)
+    db_utils.apply_migrations(conn)
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM employees")
+    conn.commit()
+    for i, emp in enumerate(unique_employees, 1):
+        name_parts = emp['name'].split()
+        title = emp['title'] or 'Employee'
+        salary_range = importer.get_salary_range.__wrapped__(title)
+        cursor.execute("""
+            INSERT INTO employees (employee_id, first_name, last_name, email, department, position, salary, hire_date, status)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (importer.generate_employee_id(i, emp['department']), name_parts[0], name_parts[-1],
+              importer.generate_email(emp['name']), emp['department'], title,
+              random.randint(*salary_range), importer.generate_hire_date(), random.choice(importer.STATUSES)))
+    conn.commit()
+    conn.close()
+    return len(unique_employees)
+
+
+def _edit_directory_csv(source_path, target_path, change_rate, rng, quoting=csv.QUOTE_MINIMAL):
+    """Copies the directory, dropping, retitling and adding about change_rate/3 of the rows each."""
+    with open(source_path, encoding='utf-8', newline='') as source, \
+            open(target_path, 'w', encoding='utf-8', newline='') as target:
+        reader, writer = csv.reader(source), csv.writer(target, quoting=quoting)
+        writer.writerow(next(reader))
+        for i, row in enumerate(reader):
+            roll = rng.random() * 3
+            if roll < change_rate:
+                continue
+            if roll < 2 * change_rate:
+                row[3] = 'Senior ' + row[3]
+            writer.writerow(row)
+            if roll > 3 - change_rate:
+                writer.writerow([row[0], row[1], f'New{i} Hire{i}', 'Analyst', ''])
+
+
+def benchmark_import(num_rows, batch_size, legacy_rows, change_rate):
+    """
+    Imports a synthetic directory of `num_rows` rows with import_directory, and
+    the first `legacy_rows` rows with the original row-at-a-time loop. Then
+    syncs an edited copy of the directory (`change_rate` of rows changed),
+    the same file again, and a byte-different copy with the same rows.
+    """
+    import import_divcowest_data as importer
+
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = os.path.join(tmp_dir, 'directory.csv')
+        print(f"Writing a {num_rows:,}-row directory CSV...")
+        _write_directory_csv(csv_path, num_rows, rng)
+
+        print(f"\nBatched import (batch size {batch_size:,})")
+        stats = importer.import_directory(csv_path, os.path.join(tmp_dir, 'batched.db'), batch_size,
+                                          num_transfers=num_rows // 50, num_feedback=num_rows // 25,
+                                          progress=importer.print_progress)
+        print(f"  {stats['employees']:,} employees ({stats['duplicates']:,} duplicates skipped), "
+              f"{stats['transfers']:,} transfers, {stats['feedback']:,} feedback")
+        print(f"  total {stats['seconds']:.2f} s, employees at {stats['employees_per_second']:,.0f} rows/s")
+
+        db_path = os.path.join(tmp_dir, 'batched.db')
+        edited_path = os.path.join(tmp_dir, 'edited.csv')
+        reformatted_path = os.path.join(tmp_dir, 'reformatted.csv')
+        _edit_directory_csv(csv_path, edited_path, change_rate, rng)
+        # Same rows, different bytes (every field quoted): diffed in full, nothing written
+        _edit_directory_csv(edited_path, reformatted_path, 0, rng, quoting=csv.QUOTE_ALL)
+        print(f"\nIncremental sync of a directory with ~{change_rate:.1%} of rows changed")
+        for label, path in (('edited', edited_path), ('same file', edited_path), ('same rows', reformatted_path)):
+            version_before = sqlite3.connect(db_path).execute('SELECT version FROM data_version').fetchone()[0]
+            summary = importer.sync_directory(path, db_path, batch_size)
+            version_after = sqlite3.connect(db_path).execute('SELECT version FROM data_version').fetchone()[0]
+            counts = ', '.join(f"{kind} {summary[kind]:,}" for kind in importer.SYNC_CHANGE_KINDS if summary[kind])
+            if summary['skipped']:
+                counts = 'skipped (checksum matches the last import)'
+            print(f"  {label:<10} {summary['seconds']:6.2f} s  {counts or 'no changes'}  "
+                  f"(data version {version_before} -> {version_after})")
+
+        legacy_rows = min(legacy_rows, num_rows)
+        print(f"\nOriginal row-at-a-time loop (first {legacy_rows:,} rows, employees only)")
+        start = time.perf_counter()
+        inserted = _legacy_import_employees(os.path.join(tmp_dir, 'legacy.db'), csv_path, legacy_rows)
+        seconds = time.perf_counter() - start
+        print(f"  {inserted:,} employees in {seconds:.2f} s ({inserted / seconds:,.0f} rows/s)")
+
+
+# ============================================================================
+# GUARDRAILS: compiled matchers vs the original per-pattern loops
+# ============================================================================
+
+def _legacy_is_blocked(guardrails, text):
+    input_lower = ' '.join(text.strip().split()).lower()
+    return any(re.search(pattern, input_lower, re.IGNORECASE) for pattern in guardrails.BLOCKED_PATTERNS)
+
+
+def _legacy_mask_pii(guardrails, text):
+    masked = re.sub(guardrails.PII_PATTERNS['ssn'], '[SSN REDACTED]', text)
+    masked = re.sub(r'\b\d{3}[-.]?\d{3}[-.]?\d{4}\b(?!\s*(employees?|id|#))', '[PHONE REDACTED]', masked,
+                    flags=re.IGNORECASE)
+    return re.sub(guardrails.PII_PATTERNS['credit_card'], '[CARD REDACTED]', masked)
+
+
+def _legacy_sensitive_topic(guardrails, text):
+    text_lower = text.lower()
+    return next(((True, topic) for topic in guardrails.SENSITIVE_TOPICS if topic in text_lower), (False, None))
+
+
+def _fuzz_number(rng):
+    """Digit groups shaped like SSNs, phone and card numbers, often slightly off."""
+    shape = rng.choice([(3, 2, 4), (3, 3, 4), (4, 4, 4, 4), (3, 4), (2, 2, 4), (5, 4), (4, 4, 4), (9,), (10,)])
+    groups = [''.join(rng.choice('0123456789') for _ in range(max(1, n + rng.choice([0, 0, 0, 1, -1]))))
+              for n in shape]
+    return ''.join(group + rng.choice(['-', '.', ' ', '', '-', '  ']) for group in groups).rstrip()
+
+
+def _fuzz_text(rng, guardrails):
+    """Random text dense in digit groups, separators and blocked phrases."""
+    pieces = []
+    for _ in range(rng.randint(1, 30)):
+        kind = rng.random()
+        if kind < 0.25:
+            pieces.append(_fuzz_number(rng))
+        elif kind < 0.4:
+            pieces.append(''.join(rng.choice('0123456789') for _ in range(rng.randint(1, 6))))
+        elif kind < 0.5:
+            pieces.append(rng.choice(['-', '.', ' ', '', '#', '/', ';', '--', '/*', '*/', '\n', 'x', '_']))
+        elif kind < 0.6:
+            pieces.append(rng.choice(['employees', 'Employee', 'ID', 'id', 'ids', 'emp', '#']))
+        elif kind < 0.62:
+            phrase = rng.choice(guardrails.BLOCKED_PATTERNS)
+            pieces.append(re.sub(r'\\s[*+]|\\s', ' ', phrase).replace('(', '').replace(')', '')
+                          .split('|')[0].replace('\\', ''))
+        else:
+            pieces.append(rng.choice(HR_VOCABULARY))
+        pieces.append(rng.choice([' ', '', '-', ' ', '. ']))
+    return ''.join(pieces)
+
+
+def benchmark_guardrails(cases, repeat):
+    """
+    Checks the compiled guardrail matchers against the original per-pattern
+    implementations on random inputs, then times both.
+    """
+    import contextlib
+    import io
+    from ai_utils import HRSecurityGuardrails as guardrails
+
+    rng = random.Random(7)
+    texts = [_fuzz_text(rng, guardrails) for _ in range(cases)]
+
+    mismatches = {'blocked': 0, 'pii': 0}
+    positives = {'blocked': 0, 'pii': 0}
+    examples = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for text in texts:
+            valid = 3 <= len(' '.join(text.strip().split())) <= 1000
+            expected = {
+                'blocked': valid and _legacy_is_blocked(guardrails, text),
+                'pii': _legacy_mask_pii(guardrails, text),
+            }
+            actual = {
+                'blocked': valid and guardrails.sanitize_input(text)[0] is None,
+                'pii': guardrails.mask_pii_in_output(text),
+            }
+            positives['blocked'] += expected['blocked']
+            positives['pii'] += expected['pii'] != text
+            for check in mismatches:
+                if actual[check] != expected[check]:
+                    mismatches[check] += 1
+                    examples.append((check, text))
+
+    print(f"\nGuardrail equivalence over {cases} random inputs")
+    for check, count in mismatches.items():
+        result = 'OK' if count == 0 else f'{count} MISMATCHES'
+        print(f"  {check:<10} {result:<14} ({positives[check]} inputs triggered it)")
+    for check, text in examples[:5]:
+        print(f"  {check}: {text!r}")
+
+    # Timing on realistic text: questions and a long answer
+    questions = [f"What is the {word} policy for {rng.choice(HR_VOCABULARY)} in Sales?"
+                 for word in HR_VOCABULARY[:50]]
+    answer = ' '.join(rng.choice(HR_VOCABULARY) for _ in range(2000)) + ' call 555-123-4567 or 4111 1111 1111 1111'
+
+    rows = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for label, legacy, compiled in [
+            ('blocked patterns', lambda: [_legacy_is_blocked(guardrails, q) for q in questions],
+             lambda: [guardrails.sanitize_input(q) for q in questions]),
+            ('PII masking', lambda: _legacy_mask_pii(guardrails, answer),
+             lambda: guardrails.mask_pii_in_output(answer)),
+            ('sensitive topics', lambda: [_legacy_sensitive_topic(guardrails, q) for q in questions],
+             lambda: [guardrails.check_sensitive_topic(q) for q in questions]),
+        ]:
+            rows.append((f"{label}: original", _time_call(legacy, repeat)))
+            rows.append((f"{label}: compiled", _time_call(compiled, repeat)))
+
+    print(f"\nGuardrail latency ({len(questions)} questions, {len(answer):,}-char answer)")
+    for label, (median_ms, best_ms) in rows:
+        _print_row(label, median_ms, best_ms)
+
+
+# ============================================================================
+# DOCUMENTS: retrieval pipeline
+# ============================================================================
+
+HR_VOCABULARY = (
+    "employee employees vacation pto leave policy policies benefits insurance health dental "
+    "salary compensation pay bonus manager review performance onboarding training handbook "
+    "remote hybrid office location schedule hours overtime holiday sick parental expense "
+    "travel reimbursement equipment security conduct harassment complaint procedure request "
+    "approval department team director intern internship requirements skills experience"
+).split()
+
+
+def _synthetic_document(num_words, rng):
+    sentences = []
+    words_left = num_words
+    while words_left > 0:
+        length = rng.randint(8, 20)
+        sentences.append(' '.join(rng.choice(HR_VOCABULARY) for _ in range(length)).capitalize() + '.')
+        words_left -= length
+    return ' '.join(sentences)
+
+
+def _build_knowledge_base(num_documents, words_per_document, seed=42):
+    """Uploads synthetic HR documents into the knowledge base in the current directory."""
+    import document_processor
+
+    rng = random.Random(seed)
+    for i in range(num_documents):
+        text = _synthetic_document(words_per_document, rng)
+        document_processor.save_document(f'policy_{i:04d}.txt', text.encode('utf-8'),
+                                         {'category': 'Policy'})
+
+
+def benchmark_retrieval(num_documents, words_per_document, repeat):
+    """
+    Document-question retrieval before and after RetrievalContext: the old path
+    searched three times (classification, context, sources); the new one once.
+    """
+    import document_processor as dp
+
+    questions = [
+        "What is the vacation policy for parental leave?",
+        "How does the bonus and salary review work?",
+        "What are the remote and hybrid office schedule rules?",
+    ]
+
+    def legacy_pipeline():
+        for question in questions:
+            dp.has_uploaded_documents()
+            dp.simple_search(question, top_k=1)                         # classify_question
+            dp.simple_search(question, top_k=20)[:4]                    # get_context_for_query
+            [r['doc_name'] for r in dp.simple_search(question, top_k=3)]  # sources
+
+    def single_pass_pipeline():
+        for question in questions:
+            dp.has_uploaded_documents()
+            retrieval = dp.RetrievalContext(question)
+            retrieval.top_score()
+            dp.get_context_for_query(question, max_chunks=4, max_chars=4000, retrieval=retrieval)
+            retrieval.sources(top_k=3)
+
+    original_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)
+        try:
+            print(f"Uploading {num_documents} synthetic documents "
+                  f"({words_per_document} words each)...")
+            _build_knowledge_base(num_documents, words_per_document)
+            print(f"Chunks in store: {dp.get_chunk_store().chunk_count():,}")
+            print(f"\nDocument-question retrieval ({len(questions)} questions per run)")
+            before = _time_call(legacy_pipeline, repeat)
+            _print_row("three searches per question", *before)
+            after = _time_call(single_pass_pipeline, repeat)
+            _print_row("RetrievalContext (one search)", *after)
+            print(f"\nSpeedup (median): {before[0] / max(after[0], 1e-9):.1f}x")
+        finally:
+            os.chdir(original_dir)
+
+
+def _synthetic_pdf(pages):
+    """Minimal PDF (Helvetica text, one content stream per page) from lists of lines."""
+    objects = [b'<< /Type /Catalog /Pages 2 0 R >>', None, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    page_ids = []
+    for lines in pages:
+        content = b'BT /F1 9 Tf 11 TL 40 760 Td ' + b''.join(
+            b'(' + line.encode('latin-1') + b') Tj T* ' for line in lines) + b'ET'
+        objects.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(content), content))
+        objects.append(b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+                       b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % (len(objects)))
+        page_ids.append(len(objects))
+    objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+        b' '.join(b'%d 0 R' % page_id for page_id in page_ids), len(page_ids))
+
+    pdf = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+    xref = len(pdf)
+    pdf += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    pdf += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    pdf += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(pdf)
+
+
+def _synthetic_handbook(num_files, pages_per_file, seed):
+    """(filename, PDF bytes) pairs of HR-vocabulary text, ~60 lines per page."""
+    rng = random.Random(seed)
+    files = []
+    for i in range(num_files):
+        pages = [[' '.join(rng.choice(HR_VOCABULARY) for _ in range(rng.randint(8, 14))).capitalize() + '.'
+                  for _ in range(60)] for _ in range(pages_per_file)]
+        files.append((f'handbook_{seed}_{i:04d}.pdf', _synthetic_pdf(pages)))
+    return files
+
+
+def benchmark_ingest(num_files, pages_per_file, workers):
+    """
+    Uploads a synthetic PDF handbook three ways: save_document per file (the
+    old upload loop), ingest_documents inline, and ingest_documents with a
+    process pool. Checks the pooled run stored the same chunks as extracting
+    each file directly.
+    """
+    import document_processor as dp
+
+    workers = workers or os.cpu_count() or 1
+    original_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)
+        try:
+            print(f"{num_files} PDFs x {pages_per_file} pages, {os.cpu_count()} CPU(s)")
+            runs = [
+                ('save_document loop', lambda files: [dp.save_document(name, content, {'category': 'Handbook'})
+                                                      for name, content in files]),
+                ('ingest_documents, 1 worker', lambda files: dp.ingest_documents(
+                    files, {'category': 'Handbook'}, max_workers=1)),
+                (f'ingest_documents, {workers} workers', lambda files: dp.ingest_documents(
+                    files, {'category': 'Handbook'}, max_workers=workers)),
+            ]
+            for seed, (label, run) in enumerate(runs):
+                files = _synthetic_handbook(num_files, pages_per_file, seed)
+                start = time.perf_counter()
+                results = run(files)
+                elapsed = time.perf_counter() - start
+                chunks = sum(result.get('chunk_count', 0) for result in results)
+                print(f"  {label:<32} {elapsed:7.2f} s  ({num_files / elapsed:5.1f} files/s, {chunks:,} chunks)")
+
+            mismatches = 0
+            store = dp.get_chunk_store()
+            for result in results:
+                expected = dp.chunk_text(dp.extract_text_from_file(result['file_path']))
+                stored = store.get_chunks([f"{result['id']}_{i}" for i in range(len(expected))])
+                if [stored.get(f"{result['id']}_{i}", {}).get('text') for i in range(len(expected))] != expected \
+                        or result['chunk_count'] != len(expected):
+                    mismatches += 1
+            print(f"\nPooled run vs direct extraction: {mismatches} of {len(results)} documents differ")
+
+            # Re-uploads: identical folder, then the same folder with one file edited
+            chunks_before = store.chunk_count()
+            start = time.perf_counter()
+            again = dp.ingest_documents(files, {'category': 'Handbook'})
+            elapsed = time.perf_counter() - start
+            unchanged = sum(result.get('status') == 'unchanged' for result in again)
+            print(f"\n  {'re-upload, nothing changed':<32} {elapsed:7.2f} s  ({unchanged} of {num_files} unchanged)")
+
+            edited = list(files)
+            edited[0] = (files[0][0], _synthetic_handbook(1, pages_per_file, seed=len(runs))[0][1])
+            start = time.perf_counter()
+            again = dp.ingest_documents(edited, {'category': 'Handbook'})
+            elapsed = time.perf_counter() - start
+            statuses = [result.get('status') for result in again]
+            print(f"  {'re-upload, one file edited':<32} {elapsed:7.2f} s  "
+                  f"({statuses.count('updated')} updated to version {again[0].get('version')}, "
+                  f"{statuses.count('unchanged')} unchanged)")
+            print(f"  Stored chunks: {chunks_before:,} before, {store.chunk_count():,} after "
+                  f"(edited file: {results[0]['chunk_count']} -> {again[0]['chunk_count']})")
+        finally:
+            os.chdir(original_dir)
+
+
+def _legacy_extract_pdf(content):
+    """extract_text_from_file's PDF branch before page streaming (kept for comparison)."""
+    import io
+
+    import pypdf
+
+    reader = pypdf.PdfReader(io.BytesIO(content))
+    text = ""
+    for page in reader.pages:
+        text += page.extract_text() + "\n"
+    return text
+
+
+def benchmark_extract(page_counts, workers):
+    """
+    Time and traced peak memory of extracting and chunking long PDFs: the
+    original path (bytes in memory, BytesIO copy, concatenated text, then
+    chunking) against pages streamed from a memory-mapped file into the
+    chunker. "Working" memory is the traced peak minus the returned chunks.
+    """
+    import gc
+    import tracemalloc
+
+    import document_processor as dp
+    from chunker import chunk_document
+
+    rng = random.Random(3)
+    workers = workers or os.cpu_count() or 1
+
+    def legacy(path):
+        with open(path, 'rb') as f:
+            content = f.read()
+        text = _legacy_extract_pdf(content)
+        return len(text), chunk_document(text)
+
+    runs = [('bytes + concatenated text', legacy),
+            ('streamed pages, 1 process', lambda path: dp._extract_chunks(path, '.pdf', 1))]
+    if workers > 1:
+        runs.append((f'streamed pages, {workers} processes', lambda path: dp._extract_chunks(path, '.pdf', workers)))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        print(f"{os.cpu_count()} CPU(s); peak = traced Python allocations, working = peak - returned chunks")
+        for num_pages in page_counts:
+            path = os.path.join(tmp_dir, f'handbook_{num_pages}.pdf')
+            pages = [[' '.join(rng.choice(HR_VOCABULARY) for _ in range(rng.randint(8, 14))).capitalize() + '.'
+                      for _ in range(60)] for _ in range(num_pages)]
+            with open(path, 'wb') as f:
+                f.write(_synthetic_pdf(pages))
+            print(f"\n{num_pages}-page PDF ({os.path.getsize(path) / 1024 / 1024:.1f} MB)")
+            for label, run in runs:
+                start = time.perf_counter()
+                total_chars, chunks = run(path)
+                elapsed = time.perf_counter() - start
+                del chunks
+                gc.collect()
+
+                tracemalloc.start()
+                result = run(path)
+                retained, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                del result
+                print(f"  {label:<32} {elapsed:7.2f} s   peak {peak / 1024 / 1024:7.1f} MB   "
+                      f"working {(peak - retained) / 1024 / 1024:6.1f} MB")
+
+
+def _legacy_chunk_text(text, chunk_size=250, overlap=50):
+    """chunk_text as it was before chunker.py (kept for comparison)."""
+    text = re.sub(r'\s+', ' ', text).strip()
+    sentences = re.split(r'(?<=[.!?])\s+', text)
+    chunks = []
+    current_chunk = []
+    current_word_count = 0
+    for sentence in sentences:
+        sentence_word_count = len(sentence.split())
+        if current_word_count + sentence_word_count <= chunk_size:
+            current_chunk.append(sentence)
+            current_word_count += sentence_word_count
+        else:
+            if current_chunk:
+                chunks.append(' '.join(current_chunk))
+            if chunks and overlap > 0:
+                prev_words = chunks[-1].split()[-overlap:]
+                current_chunk = [' '.join(prev_words), sentence]
+                current_word_count = len(prev_words) + sentence_word_count
+            else:
+                current_chunk = [sentence]
+                current_word_count = sentence_word_count
+    if current_chunk:
+        chunks.append(' '.join(current_chunk))
+    return chunks
+
+
+def _synthetic_markdown_handbook(target_bytes, rng):
+    """Markdown handbook of about target_bytes: chapters, sections and paragraphs of varying length."""
+    parts = []
+    size = 0
+    chapter = 0
+    while size < target_bytes:
+        chapter += 1
+        lines = [f"# Chapter {chapter}: {rng.choice(HR_VOCABULARY).title()} Policy", '']
+        for section in range(rng.randint(3, 8)):
+            lines += [f"## {chapter}.{section + 1} {' '.join(rng.sample(HR_VOCABULARY, 3)).title()}", '']
+            for _ in range(rng.randint(1, 6)):
+                lines += [_synthetic_document(rng.randint(20, 400), rng), '']
+        text = '\n'.join(lines)
+        parts.append(text)
+        size += len(text)
+    return '\n'.join(parts)
+
+
+def benchmark_chunker(size_mb, repeat):
+    """
+    Chunking plus the tokenization indexing needs: the original chunk_text
+    followed by tokenize() per chunk for the inverted index and again for the
+    embedder, against chunker.chunk_document, which tokenizes each word once
+    and returns tokens and term frequencies with the chunks.
+    """
+    from collections import Counter
+
+    from chunker import chunk_document
+    from document_index import tokenize
+
+    text = _synthetic_markdown_handbook(int(size_mb * 1024 * 1024), random.Random(7))
+    headings = text.count('\n#') + text.startswith('#')
+    print(f"Synthetic handbook: {len(text) / 1024 / 1024:.1f} MB, {len(text.split()):,} words, "
+          f"{headings:,} headings")
+
+    def legacy():
+        chunks = _legacy_chunk_text(text)
+        term_freqs = [Counter(tokenize(chunk)) for chunk in chunks]
+        tokens = [tokenize(chunk) for chunk in chunks]
+        return chunks, term_freqs, tokens
+
+    def single_pass():
+        return chunk_document(text)
+
+    print(f"\nChunk + tokenize for indexing (median of {repeat})")
+    before = _time_call(legacy, repeat)
+    _print_row("chunk_text + tokenize per chunk", *before)
+    after = _time_call(single_pass, repeat)
+    _print_row("chunk_document (single pass)", *after)
+    print(f"\nSpeedup (median): {before[0] / max(after[0], 1e-9):.1f}x")
+
+    old_chunks = _legacy_chunk_text(text)
+    new_chunks = chunk_document(text)
+    mixed = sum(1 for chunk in old_chunks if re.search(r'\S #{1,6} ', chunk))
+    bad_tokens = sum(1 for chunk in new_chunks if chunk.tokens != tokenize(chunk.text))
+    oversized = max(len(chunk.split()) for chunk in old_chunks)
+    print(f"\nchunk_text:     {len(old_chunks):,} chunks, longest {oversized} words, "
+          f"{mixed:,} run across a heading")
+    print(f"chunk_document: {len(new_chunks):,} chunks, longest {max(c.end - c.start for c in new_chunks)} words, "
+          f"{sum(1 for c in new_chunks if c.section):,} with a section")
+    print(f"Chunks whose tokens differ from tokenize(text): {bad_tokens}")
+
+
+def _legacy_expand_query(query, synonyms, stopwords):
+    """expand_query_with_synonyms before the compiled table (kept for comparison)."""
+    query_words = set(re.findall(r'\b\w+\b', query.lower())) - stopwords
+    expanded = set(query_words)
+    for word in list(query_words):
+        if word in synonyms:
+            expanded.update(synonyms[word])
+        for key, values in synonyms.items():
+            if word in values:
+                expanded.add(key)
+                expanded.update(values)
+    return expanded
+
+
+def benchmark_synonyms(entries, repeat):
+    """
+    Query expansion with the built-in HR synonyms and with a large synthetic
+    thesaurus merged in: the original scan over every entry against lookups
+    in the compiled SynonymTable. Also lists multi-word synonyms found in
+    queries, which the original expansion could never match.
+    """
+    import document_processor as dp
+    from synonyms import SynonymTable
+
+    queries = [
+        "What is the vacation policy for parental leave?",
+        "How many days of time off do interns get?",
+        "Where is the job description for the remote manager role?",
+        "What are the salary and bonus requirements for a director?",
+    ] * 25
+    rng = random.Random(11)
+    thesaurus = {f"term{i}": [f"term{i}x{j}" for j in range(rng.randint(2, 8))] for i in range(entries)}
+    large = {**dp.HR_SYNONYMS, **thesaurus}
+
+    start = time.perf_counter()
+    large_table = SynonymTable(large)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    print(f"{len(queries)} queries per run; synthetic thesaurus: {entries:,} entries "
+          f"(compiled in {build_ms:.0f} ms, {len(large_table):,} terms)")
+    for label, synonyms, table in [("built-in HR_SYNONYMS", dp.HR_SYNONYMS, dp.SYNONYM_TABLE),
+                                   (f"HR + {entries:,}-entry thesaurus", large, large_table)]:
+        print(f"\n{label}")
+        before = _time_call(lambda: [_legacy_expand_query(q, synonyms, dp.STOPWORDS) for q in queries], repeat)
+        _print_row("scan every entry per word", *before)
+        after = _time_call(lambda: [table.expand(dp.tokenize(q), dp.STOPWORDS) for q in queries], repeat)
+        _print_row("compiled table lookups", *after)
+        print(f"  Speedup (median): {before[0] / max(after[0], 1e-9):.1f}x")
+
+    print("\nMulti-word synonyms recognized in queries:")
+    for query in queries[:4]:
+        _, phrases = dp.SYNONYM_TABLE.expand(dp.tokenize(query), dp.STOPWORDS)
+        print(f"  {query!r}: {phrases}")
+
+
+def _synthetic_policy_corpus(num_documents, words_per_document, vocabulary_size, rng):
+    """
+    Policy documents over HR_VOCABULARY plus a Zipf-distributed filler
+    vocabulary (a realistic index size), with some pay figures in the text.
+    """
+    filler = [f"w{i}{rng.choice('aeiou')}{i % 97}" for i in range(vocabulary_size)]
+    filler_weights = [1 / (rank + 1) for rank in range(vocabulary_size)]
+    pay = ["$52,000 per year", "$24.50/hour", "$60,000 - $75,000", "55k-65k", "salary of 48000"]
+    files = []
+    for i in range(num_documents):
+        sentences = []
+        words_left = words_per_document
+        while words_left > 0:
+            length = rng.randint(8, 20)
+            words = [rng.choice(HR_VOCABULARY) if rng.random() < 0.4 else word
+                     for word in rng.choices(filler, filler_weights, k=length)]
+            if rng.random() < 0.03:
+                words.append(rng.choice(pay))
+            sentences.append(' '.join(words).capitalize() + '.')
+            words_left -= length
+        files.append((f'policy_{i:05d}.txt', ' '.join(sentences).encode('utf-8')))
+    return files
+
+
+def benchmark_scorer(num_documents, words_per_document, vocabulary_size, repeat):
+    """
+    simple_search ranking: per-term postings dicts from SQLite with regex
+    compensation features evaluated per query (the original path), the same
+    path with features precomputed at ingest, and the vectorized KeywordScorer.
+    Also checks that the scorer returns the same top-k.
+    """
+    import document_processor as dp
+    from keyword_scorer import KeywordScorer
+
+    queries = [
+        "What is the vacation policy for parental leave?",
+        "How does the bonus and salary review work?",
+        "What are the remote and hybrid office schedule rules?",
+        "time off for interns",
+        "What is the pay for an intern?",
+        "expense reimbursement approval procedure",
+    ]
+    top_k = 20
+
+    original_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)
+        try:
+            print(f"Ingesting {num_documents} synthetic documents ({words_per_document} words each, "
+                  f"{vocabulary_size:,}-word filler vocabulary)...")
+            files = _synthetic_policy_corpus(num_documents, words_per_document, vocabulary_size, random.Random(5))
+            dp.ingest_documents(files, {'category': 'Policy'})
+            all_chunks = dp.load_all_chunks()
+            index = dp._sync_index(all_chunks)
+            start = time.perf_counter()
+            scorer = KeywordScorer.from_index(index)
+            build_ms = (time.perf_counter() - start) * 1000
+            matrix_mb = (scorer.indptr.nbytes + scorer.indices.nbytes + scorer.weights.nbytes) / 1e6
+            print(f"Chunks: {len(all_chunks):,}; terms: {len(scorer.vocabulary):,}; "
+                  f"postings: {len(scorer.indices):,}")
+            print(f"CSR matrix built in {build_ms:.0f} ms ({matrix_mb:.1f} MB)")
+            dp.simple_search(queries[0])  # builds the cached scorer
+            scorer = dp._keyword_scorer(index, all_chunks)
+            without_features = {chunk_id: {**chunk, 'features': None} for chunk_id, chunk in all_chunks.items()}
+            plans = [(query, *dp._query_term_weights(query)) for query in queries]
+
+            def run(rank, *args, chunks=all_chunks):
+                return [rank(*args, chunks, query, weights, phrases, words, top_k)
+                        for query, weights, phrases, words in plans]
+
+            print(f"\n{len(queries)} queries per run, top {top_k}")
+            before = _time_call(lambda: run(dp._rank_with_index, index, chunks=without_features), repeat)
+            _print_row("postings dicts + per-query regex", *before)
+            stored = _time_call(lambda: run(dp._rank_with_index, index), repeat)
+            _print_row("postings dicts + stored features", *stored)
+            after = _time_call(lambda: run(dp._rank_vectorized, scorer), repeat)
+            _print_row("vectorized KeywordScorer", *after)
+            print(f"\nSpeedup (median): {before[0] / max(after[0], 1e-9):.1f}x")
+
+            long_words = [word for _, weights, _, _ in plans for word in weights if len(word) > 3]
+            vocabulary = scorer.vocabulary
+            print(f"\nPartial-match terms for the {len(long_words)} long query words")
+            scan = _time_call(lambda: [[term for term in vocabulary if term != word and len(term) > 3
+                                        and (word in term or term in word)] for word in long_words], repeat)
+            _print_row("vocabulary scan per word", *scan)
+            lookup = _time_call(lambda: [scorer.related_terms(word) for word in long_words], repeat)
+            _print_row("TermLookup (trigram map)", *lookup)
+
+            # Same top-k: equal scores, and equal chunks apart from the order of ties at the cut-off
+            differences = 0
+            for old, new in zip(run(dp._rank_with_index, index), run(dp._rank_vectorized, scorer)):
+                old_scores = [score for _, score, _ in old]
+                new_scores = [score for _, score, _ in new]
+                same_scores = len(old_scores) == len(new_scores) and all(
+                    abs(a - b) <= 1e-9 * max(1.0, abs(a)) for a, b in zip(old_scores, new_scores))
+                cutoff = old_scores[-1] + 1e-9 * max(1.0, abs(old_scores[-1])) if old_scores else 0
+                same_chunks = ({chunk_id for chunk_id, score, _ in old if score > cutoff} ==
+                               {chunk_id for chunk_id, score, _ in new if score > cutoff})
+                differences += not (same_scores and same_chunks)
+            print(f"Queries whose top {top_k} differ: {differences} of {len(queries)}")
+        finally:
+            os.chdir(original_dir)
+
+
+# ============================================================================
+# DOCUMENTS: vector search
+# ============================================================================
+
+def benchmark_vectors(num_rows, dim, repeat):
+    """
+    Exact (full-scan) cosine search against the IVF index, with recall@10 of
+    the approximate search. Vectors are drawn around random topic centres, since
+    real chunk embeddings cluster by subject rather than spreading uniformly.
+    """
+    import numpy as np
+    from document_index import KnowledgeBaseConnection
+    from embeddings import Embedder, VectorStore
+
+    class _RandomEmbedder(Embedder):
+        name = 'benchmark'
+
+        def __init__(self, dim):
+            self.dim = dim
+
+    rng = np.random.default_rng(42)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        kb = KnowledgeBaseConnection(os.path.join(tmp_dir, 'vectors.db'))
+        store = VectorStore(kb, _RandomEmbedder(dim),
+                            vectors_path=os.path.join(tmp_dir, 'vectors.f32'),
+                            ivf_path=os.path.join(tmp_dir, 'vectors.ivf.npz'))
+
+        print(f"Writing {num_rows:,} clustered {dim}-dim vectors...")
+        topics = rng.standard_normal((1000, dim), dtype=np.float32)
+        batch_size = 100000
+        for start in range(0, num_rows, batch_size):
+            count = min(batch_size, num_rows - start)
+            vectors = topics[rng.integers(0, len(topics), count)]
+            vectors += 0.8 * rng.standard_normal((count, dim), dtype=np.float32)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            store.add_vectors([(f'c{start + i}', f'd{(start + i) // 50}') for i in range(count)], vectors)
+
+        queries = topics[rng.integers(0, len(topics), repeat)]
+        queries = queries + 0.8 * rng.standard_normal(queries.shape, dtype=np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+        query_iter = iter(range(10 ** 9))
+
+        def exact():
+            store.search_vector(queries[next(query_iter) % repeat], top_k=10, exact=True)
+
+        def approximate():
+            store.search_vector(queries[next(query_iter) % repeat], top_k=10)
+
+        print(f"\nTop-10 cosine search ({repeat} queries)")
+        _print_row("exact scan", *_time_call(exact, repeat))
+
+        start = time.perf_counter()
+        store.build_ivf()
+        print(f"  IVF build: {time.perf_counter() - start:.1f} s")
+        _print_row("IVF index", *_time_call(approximate, repeat))
+
+        recall = []
+        for query in queries:
+            truth = {c for c, _ in store.search_vector(query, top_k=10, exact=True)}
+            found = {c for c, _ in store.search_vector(query, top_k=10)}
+            recall.append(len(truth & found) / len(truth))
+        print(f"  IVF recall@10: {statistics.mean(recall):.2f}")
+        kb.close()
+
+
+# ============================================================================
+# LLM: gateway against a local Gemini stub
+# ============================================================================
+
+class StubGeminiServer:
+    """
+    Minimal local stand-in for the Gemini REST API (generateContent and
+    streamGenerateContent).
+
+    Args:
+        latency: Seconds each model takes to answer, by model name
+        rate_limited: Models that always answer 429 RESOURCE_EXHAUSTED
+        quota: Requests per minute allowed per model; beyond that the stub
+            answers 429 with QuotaFailure/RetryInfo details like Gemini does
+        default_latency: Latency for models not listed
+    """
+
+    def __init__(self, port=0, latency=None, rate_limited=(), quota=None, default_latency=0.2):
+        self.latency = dict(latency or {})
+        self.rate_limited = set(rate_limited)
+        self.quota = dict(quota or {})
+        self.default_latency = default_latency
+        self.requests = []
+        self.rejected = 0
+        self._accepted = {}
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                # Path: /v1beta/models/<model>:generateContent
+                model = self.path.rsplit('/', 1)[-1].split(':', 1)[0]
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                with stub._lock:
+                    stub.requests.append(model)
+                    now = time.monotonic()
+                    window = [t for t in stub._accepted.get(model, []) if now - t < 60]
+                    over_quota = model in stub.quota and len(window) >= stub.quota[model]
+                    if not over_quota:
+                        window.append(now)
+                    stub._accepted[model] = window
+                    if over_quota or model in stub.rate_limited:
+                        stub.rejected += 1
+                time.sleep(stub.latency.get(model, stub.default_latency))
+                if model in stub.rate_limited:
+                    payload = {'error': {'code': 429, 'status': 'RESOURCE_EXHAUSTED',
+                                         'message': 'Quota exceeded (stub)'}}
+                    status = 429
+                elif over_quota:
+                    payload = {'error': {'code': 429, 'status': 'RESOURCE_EXHAUSTED',
+                                         'message': 'You exceeded your current quota (stub)', 'details': [
+                        {'@type': 'type.googleapis.com/google.rpc.QuotaFailure', 'violations': [
+                            {'quotaId': 'GenerateRequestsPerMinutePerProjectPerModel-FreeTier',
+                             'quotaValue': str(stub.quota[model])}]},
+                        {'@type': 'type.googleapis.com/google.rpc.RetryInfo',
+                         'retryDelay': f'{60 - (now - window[0]):.0f}s'},
+                    ]}}
+                    status = 429
+                else:
+                    prompt = ''.join(part.get('text', '') for content in body.get('contents', [])
+                                     for part in content.get('parts', []))
+                    payload = {'candidates': [{'content': {'role': 'model', 'parts': [
+                        {'text': f'[{model}] stub answer ({len(prompt)} prompt chars)'}]},
+                        'finishReason': 'STOP'}]}
+                    status = 200
+                data = json.dumps(payload).encode('utf-8')
+                try:
+                    if status == 200 and ':streamGenerateContent' in self.path:
+                        # Server-sent events, one word per chunk
+                        self.send_response(200)
+                        self.send_header('Content-Type', 'text/event-stream')
+                        self.end_headers()
+                        text = payload['candidates'][0]['content']['parts'][0]['text']
+                        for word in text.split(' '):
+                            chunk = {'candidates': [{'content': {'role': 'model', 'parts': [{'text': word + ' '}]}}]}
+                            self.wfile.write(f"data: {json.dumps(chunk)}\r\n\r\n".encode('utf-8'))
+                            self.wfile.flush()
+                            time.sleep(0.01)
+                        return
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # client gave up, e.g. a cancelled hedged request
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def benchmark_gateway(concurrency):
+    """
+    Exercises the LLM gateway against the stub: coalescing of identical
+    prompts, the in-flight limit, rate-limit fallback, latency hedging and
+    quota-aware routing.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from google import genai
+    from google.genai import types
+    from llm_gateway import LLMGateway
+    from rate_limiter import RateLimiter
+
+    models = ['model-primary', 'model-secondary', 'model-tertiary']
+
+    def unlimited():
+        return RateLimiter({model: 100000 for model in models})
+
+    def run(title, stub, prompts, rate_limiter=None, **gateway_options):
+        stub.start()
+        gateway = LLMGateway(
+            lambda: genai.Client(api_key='stub', http_options=types.HttpOptions(base_url=stub.url)),
+            models, rate_limiter=rate_limiter or unlimited(), **gateway_options)
+        try:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=len(prompts)) as pool:
+                answers = list(pool.map(lambda p: gateway.generate(p).text, prompts))
+            elapsed = (time.perf_counter() - start) * 1000
+        finally:
+            gateway.close()
+            stub.stop()
+        print(f"\n{title}")
+        print(f"  {len(prompts)} calls in {elapsed:.0f} ms, answered by "
+              f"{sorted(set(a.split(']')[0][1:] for a in answers))}")
+        stats = gateway.stats()
+        limiter = stats.pop('rate_limiter')
+        print(f"  upstream requests: {len(stub.requests)} ({stub.rejected} answered 429)")
+        print(f"  gateway: {stats}")
+        print(f"  rate limiter: {limiter}")
+
+    run(f"{concurrency} identical concurrent prompts (coalesced)",
+        StubGeminiServer(default_latency=0.3), ['How many employees?'] * concurrency)
+    run(f"{concurrency} distinct prompts, max 4 in flight",
+        StubGeminiServer(default_latency=0.3), [f'Question {i}' for i in range(concurrency)],
+        max_in_flight=4)
+    run("Primary model rate limited (fallback)",
+        StubGeminiServer(rate_limited={'model-primary'}), ['Question'])
+    run("Primary model slow (hedged after 0.5 s)",
+        StubGeminiServer(latency={'model-primary': 3.0}), ['Question'], hedge_after=0.5)
+
+    quota = {'model-primary': 5, 'model-secondary': 5, 'model-tertiary': 20}
+    burst = [f'Burst question {i}' for i in range(20)]
+    run("Burst of 20 over per-model quotas, limits unknown (learned from 429s)",
+        StubGeminiServer(quota=quota), burst)
+    run("Burst of 20 over per-model quotas, limits known (quota-aware routing)",
+        StubGeminiServer(quota=quota), burst, rate_limiter=RateLimiter(quota))
+
+
+def benchmark_streaming(latency):
+    """
+    Time to first byte of the streamed answer (AnswerStream) against the
+    blocking answer_hr_question(), using the Gemini stub.
+    """
+    stub = StubGeminiServer(default_latency=latency).start()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.environ['GEMINI_BASE_URL'] = stub.url
+        os.environ.setdefault('GEMINI_API_KEY', 'stub')
+        os.environ['HR_LLM_CACHE_DB'] = os.path.join(tmp_dir, 'llm_cache.db')
+        import ai_utils
+        import db_utils
+        from llm_cache import get_llm_cache
+
+        db_utils.configure_pool(os.path.join(tmp_dir, 'benchmark.db'))
+        db_utils.initialize_database()
+
+        print(f"\nStreaming vs blocking answers (stub latency {latency:.1f} s)")
+        for question in ["What are best practices for onboarding?", "Show all employees in Sales"]:
+            get_llm_cache().invalidate()
+            start = time.perf_counter()
+            ai_utils.answer_hr_question(question)
+            blocking_ms = (time.perf_counter() - start) * 1000
+
+            get_llm_cache().invalidate()
+            stream = ai_utils.AnswerStream(question)
+            chunks = list(stream)
+            timings = stream.result['timings']
+            print(f"  {question}")
+            print(f"    blocking:  {blocking_ms:8.1f} ms until anything is shown")
+            if 'results_ms' in timings:
+                print(f"    streaming: {timings['results_ms']:8.1f} ms to the result rows")
+            print(f"    streaming: {timings['first_text_ms']:8.1f} ms to first text, "
+                  f"{timings['total_ms']:.1f} ms total ({len(chunks)} chunks)")
+        db_utils.get_pool().close()
+    stub.stop()
+
+
+def serve_stub(port, latency):
+    """Runs the Gemini stub in the foreground for manual testing of the app."""
+    stub = StubGeminiServer(port=port, default_latency=latency)
+    print(f"Gemini stub listening on {stub.url} (Ctrl+C to stop)")
+    print(f"  GEMINI_BASE_URL={stub.url} GEMINI_API_KEY=stub python -m streamlit run app.py")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        stub.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HR dashboard performance benchmarks")
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    db_parser = subparsers.add_parser('db', help="Schema indexes and pragmas")
+    db_parser.add_argument('--employees', type=int, default=100000)
+    db_parser.add_argument('--repeat', type=int, default=10)
+
+    dashboard_parser = subparsers.add_parser('dashboard', help="Dashboard result cache")
+    dashboard_parser.add_argument('--employees', type=int, default=10000)
+    dashboard_parser.add_argument('--repeat', type=int, default=20)
+
+    sql_parser = subparsers.add_parser('sql', help="Generated-SQL validator and sandboxed query engine")
+    sql_parser.add_argument('--employees', type=int, default=20000)
+    sql_parser.add_argument('--repeat', type=int, default=50)
+
+    import_parser = subparsers.add_parser('import', help="Streaming, batched directory importer")
+    import_parser.add_argument('--rows', type=int, default=1000000)
+    import_parser.add_argument('--batch-size', type=int, default=5000)
+    import_parser.add_argument('--legacy-rows', type=int, default=200000)
+    import_parser.add_argument('--changes', type=float, default=0.01, help="Share of rows changed for the sync run")
+
+    fastpath_parser = subparsers.add_parser('fastpath', help="Deterministic question fast path")
+    fastpath_parser.add_argument('--repeat', type=int, default=20)
+
+    guardrails_parser = subparsers.add_parser('guardrails', help="Compiled guardrail matchers (equivalence + latency)")
+    guardrails_parser.add_argument('--cases', type=int, default=20000)
+    guardrails_parser.add_argument('--repeat', type=int, default=50)
+
+    retrieval_parser = subparsers.add_parser('retrieval', help="Document-question retrieval pipeline")
+    retrieval_parser.add_argument('--documents', type=int, default=200)
+    retrieval_parser.add_argument('--words', type=int, default=2000)
+    retrieval_parser.add_argument('--repeat', type=int, default=5)
+
+    ingest_parser = subparsers.add_parser('ingest', help="Parallel document ingestion")
+    ingest_parser.add_argument('--files', type=int, default=200)
+    ingest_parser.add_argument('--pages', type=int, default=10)
+    ingest_parser.add_argument('--workers', type=int, default=0, help="Pool size (default: CPU count)")
+
+    extract_parser = subparsers.add_parser('extract', help="Streaming PDF extraction (time and peak memory)")
+    extract_parser.add_argument('--pages', type=int, nargs='+', default=[100, 500])
+    extract_parser.add_argument('--workers', type=int, default=0, help="Page-extraction processes (default: CPU count)")
+
+    chunker_parser = subparsers.add_parser('chunker', help="Single-pass, structure-aware chunker")
+    chunker_parser.add_argument('--size-mb', type=float, default=8.0)
+    chunker_parser.add_argument('--repeat', type=int, default=3)
+
+    synonyms_parser = subparsers.add_parser('synonyms', help="Compiled synonym table vs per-query scan")
+    synonyms_parser.add_argument('--entries', type=int, default=50000)
+    synonyms_parser.add_argument('--repeat', type=int, default=5)
+
+    scorer_parser = subparsers.add_parser('scorer', help="Vectorized keyword scorer vs per-term postings")
+    scorer_parser.add_argument('--documents', type=int, default=2000)
+    scorer_parser.add_argument('--words', type=int, default=2000)
+    scorer_parser.add_argument('--vocabulary', type=int, default=20000)
+    scorer_parser.add_argument('--repeat', type=int, default=5)
+
+    vectors_parser = subparsers.add_parser('vectors', help="Exact vs IVF vector search")
+    vectors_parser.add_argument('--rows', type=int, default=1000000)
+    vectors_parser.add_argument('--dim', type=int, default=256)
+    vectors_parser.add_argument('--repeat', type=int, default=20)
+
+    gateway_parser = subparsers.add_parser('gateway', help="LLM gateway against a local Gemini stub")
+    gateway_parser.add_argument('--concurrency', type=int, default=12)
+
+    streaming_parser = subparsers.add_parser('streaming', help="Time to first byte of streamed answers")
+    streaming_parser.add_argument('--latency', type=float, default=1.0)
+
+    stub_parser = subparsers.add_parser('stub-server', help="Run a local Gemini stub server")
+    stub_parser.add_argument('--port', type=int, default=8085)
+    stub_parser.add_argument('--latency', type=float, default=0.5)
+
+    args = parser.parse_args()
+
+    if args.benchmark == 'db':
+        benchmark_database(args.employees, args.repeat)
+    elif args.benchmark == 'dashboard':
+        benchmark_dashboard(args.employees, args.repeat)
+    elif args.benchmark == 'sql':
+        benchmark_sql_validator(args.employees, args.repeat)
+    elif args.benchmark == 'import':
+        benchmark_import(args.rows, args.batch_size, args.legacy_rows, args.changes)
+    elif args.benchmark == 'fastpath':
+        benchmark_fast_path(args.repeat)
+    elif args.benchmark == 'guardrails':
+        benchmark_guardrails(args.cases, args.repeat)
+    elif args.benchmark == 'retrieval':
+        benchmark_retrieval(args.documents, args.words, args.repeat)
+    elif args.benchmark == 'ingest':
+        benchmark_ingest(args.files, args.pages, args.workers)
+    elif args.benchmark == 'extract':
+        benchmark_extract(args.pages, args.workers)
+    elif args.benchmark == 'chunker':
+        benchmark_chunker(args.size_mb, args.repeat)
+    elif args.benchmark == 'synonyms':
+        benchmark_synonyms(args.entries, args.repeat)
+    elif args.benchmark == 'scorer':
+        benchmark_scorer(args.documents, args.words, args.vocabulary, args.repeat)
+    elif args.benchmark == 'vectors':
+        benchmark_vectors(args.rows, args.dim, args.repeat)
+    elif args.benchmark == 'gateway':
+        benchmark_gateway(args.concurrency)
+    elif args.benchmark == 'streaming':
+        benchmark_streaming(args.latency)
+    elif args.benchmark == 'stub-server':
+        serve_stub(args.port, args.latency)
+
+
+if __name__ == "__main__":
+    main()
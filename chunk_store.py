@@ -0,0 +1,346 @@
+"""
+Chunk Store Module
+SQLite-backed storage for uploaded documents and their text chunks.
+Each upload or delete touches only that document's rows, in one transaction.
+"""
+
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from document_index import KnowledgeBaseConnection
+
+
+# Compact once free pages exceed this share of the file
+COMPACTION_FREE_RATIO = 0.25
+
+
+class ChunkStore:
+    """
+    Document and chunk tables in the knowledge base database.
+
+    Tables:
+        kb_documents:         one row per uploaded document, keyed by content hash
+        kb_chunks:            one row per text chunk, keyed by chunk_id, with its ingest-time search features
+        kb_document_versions: upload history per filename (version, content hash)
+    """
+
+    _DOCUMENT_COLUMNS = 'doc_id, filename, chunk_count, metadata, file_path, file_type, total_chars, version'
+
+    def __init__(self, kb: KnowledgeBaseConnection):
+        self.kb = kb
+        self._write_generation = 0
+        self.ensure_schema()
+
+    def generation(self):
+        """
+        Token that changes whenever the stored chunks change: a counter bumped
+        by this process's writes plus SQLite's data_version, which moves when
+        any connection commits.
+        """
+        return (self._write_generation, self.kb.data_version())
+
+    def ensure_schema(self):
+        """Creates the store tables if needed."""
+        with self.kb.transaction() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS kb_documents (
+                    doc_id TEXT PRIMARY KEY,
+                    filename TEXT NOT NULL,
+                    file_path TEXT,
+                    file_type TEXT,
+                    metadata TEXT NOT NULL DEFAULT '{}',
+                    chunk_count INTEGER NOT NULL DEFAULT 0,
+                    total_chars INTEGER NOT NULL DEFAULT 0,
+                    created_at TEXT NOT NULL
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS kb_chunks (
+                    chunk_id TEXT PRIMARY KEY,
+                    doc_id TEXT NOT NULL,
+                    doc_name TEXT NOT NULL,
+                    chunk_index INTEGER NOT NULL,
+                    text TEXT NOT NULL,
+                    metadata TEXT NOT NULL DEFAULT '{}'
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_kb_chunks_doc ON kb_chunks(doc_id, chunk_index)')
+            if 'features' not in {row[1] for row in conn.execute('PRAGMA table_info(kb_chunks)')}:
+                conn.execute('ALTER TABLE kb_chunks ADD COLUMN features TEXT')
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(kb_documents)')}
+            if 'version' not in columns:
+                conn.execute('ALTER TABLE kb_documents ADD COLUMN version INTEGER NOT NULL DEFAULT 1')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_kb_documents_filename ON kb_documents(filename)')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS kb_document_versions (
+                    filename TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    doc_id TEXT NOT NULL,
+                    chunk_count INTEGER NOT NULL DEFAULT 0,
+                    total_chars INTEGER NOT NULL DEFAULT 0,
+                    uploaded_at TEXT NOT NULL,
+                    PRIMARY KEY (filename, version)
+                )
+            ''')
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def add_document(self, doc_info: Dict, chunks: Dict[str, Dict]):
+        """
+        Inserts a document and its chunks, replacing any previous copy.
+
+        Args:
+            doc_info: Document info dict (id, filename, file_path, ...)
+            chunks: Mapping of chunk IDs to chunk records
+        """
+        with self.kb.transaction() as conn:
+            self._write_generation += 1
+            self._delete_rows(conn, doc_info['id'])
+            conn.execute('''
+                INSERT INTO kb_documents (doc_id, filename, file_path, file_type, metadata,
+                                          chunk_count, total_chars, created_at, version)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                doc_info['id'], doc_info['filename'], doc_info.get('file_path'),
+                doc_info.get('file_type'), json.dumps(doc_info.get('metadata') or {}),
+                len(chunks), doc_info.get('total_chars', 0), datetime.now().isoformat(),
+                doc_info.get('version', 1)
+            ))
+            self._insert_chunks(conn, chunks)
+
+    def update_document_info(self, doc_id: str, filename: str, metadata: Dict):
+        """
+        Renames a document and replaces its metadata in place, without
+        re-chunking; chunks keep their 'section'.
+        """
+        metadata_json = json.dumps(metadata or {})
+        with self.kb.transaction() as conn:
+            self._write_generation += 1
+            conn.execute('UPDATE kb_documents SET filename = ?, metadata = ? WHERE doc_id = ?',
+                         (filename, metadata_json, doc_id))
+            # New document metadata plus the chunk's own section (a null section is dropped)
+            conn.execute('''
+                UPDATE kb_chunks
+                SET doc_name = ?, metadata = json_patch(?, json_object('section', json_extract(metadata, '$.section')))
+                WHERE doc_id = ?
+            ''', (filename, metadata_json, doc_id))
+
+    def record_version(self, filename: str, doc_id: str, chunk_count: int, total_chars: int) -> int:
+        """
+        Appends an upload to the filename's version history.
+
+        Returns:
+            The new version number (1 for a new filename)
+        """
+        with self.kb.transaction() as conn:
+            latest = conn.execute('''
+                SELECT MAX(version) FROM (
+                    SELECT version FROM kb_document_versions WHERE filename = ?
+                    UNION ALL SELECT version FROM kb_documents WHERE filename = ?
+                )
+            ''', (filename, filename)).fetchone()[0]
+            version = (latest or 0) + 1
+            conn.execute('''
+                INSERT INTO kb_document_versions (filename, version, doc_id, chunk_count, total_chars, uploaded_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (filename, version, doc_id, chunk_count, total_chars, datetime.now().isoformat()))
+            return version
+
+    def delete_document(self, doc_id: str) -> int:
+        """
+        Deletes a document and its chunks.
+
+        Returns:
+            Number of chunks removed
+        """
+        with self.kb.transaction() as conn:
+            self._write_generation += 1
+            return self._delete_rows(conn, doc_id)
+
+    def replace_all(self, all_chunks: Dict[str, Dict]):
+        """Replaces the whole store with the given chunks."""
+        with self.kb.transaction() as conn:
+            self._write_generation += 1
+            conn.execute('DELETE FROM kb_chunks')
+            conn.execute('DELETE FROM kb_documents')
+            self._insert_chunks(conn, all_chunks)
+            self._insert_documents_from_chunks(conn)
+
+    @staticmethod
+    def _delete_rows(conn, doc_id: str) -> int:
+        removed = conn.execute('DELETE FROM kb_chunks WHERE doc_id = ?', (doc_id,)).rowcount
+        conn.execute('DELETE FROM kb_documents WHERE doc_id = ?', (doc_id,))
+        return removed
+
+    @staticmethod
+    def _insert_chunks(conn, chunks: Dict[str, Dict]):
+        conn.executemany('''
+            INSERT OR REPLACE INTO kb_chunks (chunk_id, doc_id, doc_name, chunk_index, text, metadata, features)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [
+            (chunk_id, chunk['doc_id'], chunk['doc_name'], chunk.get('chunk_index', 0),
+             chunk['text'], json.dumps(chunk.get('metadata') or {}),
+             json.dumps(chunk['features']) if chunk.get('features') is not None else None)
+            for chunk_id, chunk in chunks.items()
+        ])
+
+    @staticmethod
+    def _insert_documents_from_chunks(conn):
+        """Creates document rows for chunks that have none (e.g. after a migration)."""
+        conn.execute('''
+            INSERT OR IGNORE INTO kb_documents (doc_id, filename, metadata, chunk_count,
+                                                total_chars, created_at)
+            SELECT doc_id, MIN(doc_name), MIN(metadata), COUNT(*), SUM(LENGTH(text)), ?
+            FROM kb_chunks
+            GROUP BY doc_id
+        ''', (datetime.now().isoformat(),))
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _chunk_from_row(row) -> Dict:
+        return {
+            'doc_id': row[1],
+            'doc_name': row[2],
+            'chunk_index': row[3],
+            'text': row[4],
+            'metadata': json.loads(row[5]) if row[5] else {},
+            'features': json.loads(row[6]) if row[6] else None
+        }
+
+    def load_all(self) -> Dict[str, Dict]:
+        """All chunks as chunk_id -> chunk record, in upload order."""
+        rows = self.kb.execute('''
+            SELECT chunk_id, doc_id, doc_name, chunk_index, text, metadata, features
+            FROM kb_chunks ORDER BY rowid
+        ''')
+        return {row[0]: self._chunk_from_row(row) for row in rows}
+
+    def get_chunks(self, chunk_ids: List[str]) -> Dict[str, Dict]:
+        """Chunk records for the given IDs (missing IDs are skipped)."""
+        result = {}
+        chunk_ids = list(chunk_ids)
+        # Stay well below SQLite's bound-parameter limit
+        for start in range(0, len(chunk_ids), 500):
+            batch = chunk_ids[start:start + 500]
+            placeholders = ','.join('?' * len(batch))
+            for row in self.kb.execute(f'''
+                SELECT chunk_id, doc_id, doc_name, chunk_index, text, metadata, features
+                FROM kb_chunks WHERE chunk_id IN ({placeholders})
+            ''', batch):
+                result[row[0]] = self._chunk_from_row(row)
+        return result
+
+    def chunk_count(self) -> int:
+        """Number of stored chunks."""
+        return self.kb.execute('SELECT COUNT(*) FROM kb_chunks')[0][0]
+
+    def list_documents(self) -> List[Dict]:
+        """Stored documents with their chunk counts."""
+        rows = self.kb.execute(f'''
+            SELECT {self._DOCUMENT_COLUMNS} FROM kb_documents ORDER BY rowid
+        ''')
+        return [self._document_from_row(row) for row in rows]
+
+    def get_document(self, doc_id: str) -> Optional[Dict]:
+        """A single stored document, or None."""
+        rows = self.kb.execute(f'''
+            SELECT {self._DOCUMENT_COLUMNS} FROM kb_documents WHERE doc_id = ?
+        ''', (doc_id,))
+        return self._document_from_row(rows[0]) if rows else None
+
+    def find_documents(self, doc_ids: List[str]) -> Dict[str, Dict]:
+        """Registered documents among the given content hashes (doc_id -> document)."""
+        result = {}
+        doc_ids = list(doc_ids)
+        for start in range(0, len(doc_ids), 500):
+            batch = doc_ids[start:start + 500]
+            placeholders = ','.join('?' * len(batch))
+            for row in self.kb.execute(f'''
+                SELECT {self._DOCUMENT_COLUMNS} FROM kb_documents WHERE doc_id IN ({placeholders})
+            ''', batch):
+                result[row[0]] = self._document_from_row(row)
+        return result
+
+    def documents_named(self, filename: str) -> List[str]:
+        """IDs of the stored documents uploaded under a filename."""
+        return [row[0] for row in self.kb.execute(
+            'SELECT doc_id FROM kb_documents WHERE filename = ?', (filename,))]
+
+    def version_history(self, filename: str) -> List[Dict]:
+        """Uploads of a filename, oldest first."""
+        rows = self.kb.execute('''
+            SELECT version, doc_id, chunk_count, total_chars, uploaded_at
+            FROM kb_document_versions WHERE filename = ? ORDER BY version
+        ''', (filename,))
+        return [{'version': row[0], 'id': row[1], 'chunk_count': row[2], 'total_chars': row[3],
+                 'uploaded_at': row[4]} for row in rows]
+
+    @staticmethod
+    def _document_from_row(row) -> Dict:
+        return {
+            'id': row[0],
+            'filename': row[1],
+            'chunk_count': row[2],
+            'metadata': json.loads(row[3]) if row[3] else {},
+            'file_path': row[4],
+            'file_type': row[5],
+            'total_chars': row[6],
+            'version': row[7],
+        }
+
+    # ------------------------------------------------------------------
+    # Maintenance
+    # ------------------------------------------------------------------
+
+    def compact(self, force: bool = False) -> bool:
+        """
+        Reclaims space left by deleted documents (VACUUM + WAL checkpoint).
+        A maintenance call: VACUUM rewrites the whole file while holding the
+        write lock, so deletes and uploads never run it themselves.
+
+        Args:
+            force: Compact even if little space would be reclaimed
+
+        Returns:
+            True if the database was compacted
+        """
+        with self.kb.lock:
+            page_count = self.kb.conn.execute('PRAGMA page_count').fetchone()[0]
+            free_pages = self.kb.conn.execute('PRAGMA freelist_count').fetchone()[0]
+            if not force and (page_count == 0 or free_pages / page_count < COMPACTION_FREE_RATIO):
+                return False
+            self.kb.conn.execute('VACUUM')
+            self.kb.conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchall()
+            return True
+
+    def migrate_from_json(self, json_path: Path) -> int:
+        """
+        One-shot import of the legacy document_chunks.json file.
+        The file is renamed to *.migrated afterwards so it is not imported twice.
+
+        Returns:
+            Number of chunks imported
+        """
+        json_path = Path(json_path)
+        if not json_path.exists():
+            return 0
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                legacy_chunks = json.load(f)
+        except (OSError, ValueError):
+            return 0
+
+        if legacy_chunks:
+            with self.kb.transaction() as conn:
+                self._write_generation += 1
+                self._insert_chunks(conn, legacy_chunks)
+                self._insert_documents_from_chunks(conn)
+        json_path.rename(json_path.with_name(json_path.name + '.migrated'))
+        return len(legacy_chunks)
@@ -0,0 +1,189 @@
+"""
+Chunker Module
+Single-pass, structure-aware document chunking. Text is split into words
+once, as it streams in; chunks are word-offset ranges that end on sentence or heading
+boundaries, never cross a section, and carry their index tokens and term
+frequencies so indexing does not tokenize chunk text again.
+"""
+
+import re
+from bisect import bisect_right
+from collections import Counter
+from itertools import chain
+from typing import Iterable, Iterator, List, Tuple
+
+from document_index import TOKEN_PATTERN
+
+
+DEFAULT_CHUNK_SIZE = 250  # words
+DEFAULT_OVERLAP = 50  # words repeated from the previous chunk
+
+# Markdown ATX headings; DOCX headings are written in this form by extract_text_from_file
+HEADING_PATTERN = re.compile(r'^[ \t]{0,3}(#{1,6})[ \t]+(.+?)[ \t#]*$', re.MULTILINE)
+SENTENCE_END = frozenset('.!?')
+SECTION_SEPARATOR = ' > '
+
+
+class Chunk:
+    """
+    One chunk of a document.
+
+    Attributes:
+        text: Chunk text, words joined by single spaces
+        start: Offset of the chunk's first word in the document
+        end: Offset just past the chunk's last word
+        tokens: Lower-case index tokens (document_index.tokenize of text)
+        term_freqs: Token -> count
+        section: Heading path the chunk belongs to ('Benefits > Leave'), or ''
+    """
+
+    __slots__ = ('text', 'start', 'end', 'tokens', 'term_freqs', 'section')
+
+    def __init__(self, text: str, start: int, end: int, tokens: List[str], section: str = ''):
+        self.text = text
+        self.start = start
+        self.end = end
+        self.tokens = tokens
+        self.term_freqs = Counter(tokens)
+        self.section = section
+
+    def __getstate__(self):
+        # term_freqs is rebuilt on unpickling; workers send tokens only
+        return (self.text, self.start, self.end, self.tokens, self.section)
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def __repr__(self):
+        return f"Chunk(words {self.start}-{self.end}, section={self.section!r})"
+
+
+class _TokenCache(dict):
+    """Word -> index tokens; each distinct word is tokenized once per document."""
+
+    def __missing__(self, word):
+        tokens = self[word] = tuple(TOKEN_PATTERN.findall(word.lower()))
+        return tokens
+
+
+def _split_sections(text: str) -> Iterator[Tuple[int, str, str]]:
+    """Splits text at headings into (level, heading, body) parts; level 0 is text before the first heading."""
+    position = 0
+    level, heading = 0, ''
+    for match in HEADING_PATTERN.finditer(text):
+        yield level, heading, text[position:match.start()]
+        level, heading = len(match.group(1)), match.group(2)
+        position = match.end()
+    yield level, heading, text[position:]
+
+
+def iter_chunks(parts: Iterable[str], chunk_size: int = DEFAULT_CHUNK_SIZE, overlap: int = DEFAULT_OVERLAP,
+                min_section_words: int = None) -> Iterator[Chunk]:
+    """
+    Chunks a document supplied as a stream of text parts (pages, paragraphs).
+
+    Chunks hold up to `chunk_size` words including `overlap` words carried over
+    from the previous chunk, and end at the last sentence end that fits; a
+    sentence longer than a chunk is cut at the word limit. A heading starts a
+    new chunk (without overlap) unless the running section is shorter than
+    `min_section_words`, in which case the two sections share chunks.
+
+    Parts must split the text at line breaks (headings are recognized per
+    part). Only the words of the chunk being built are kept in memory, so
+    chunks are yielded while the document is still being read.
+
+    Args:
+        parts: Document text, in order
+        chunk_size: Target size of each chunk (in words)
+        overlap: Number of words to overlap between chunks
+        min_section_words: Smallest section kept apart (default chunk_size // 5)
+
+    Yields:
+        Chunk objects in document order
+    """
+    overlap = max(0, min(overlap, chunk_size - 1))
+    if min_section_words is None:
+        min_section_words = chunk_size // 5
+
+    # Offsets are document-wide; words[0] is word number `base`
+    words = []
+    word_tokens = []
+    base = 0
+    breaks = []  # word offsets a chunk may end at (after a sentence or heading)
+    section_offsets = []
+    section_paths = []
+    path = []
+    token_cache = _TokenCache()
+    block_start = start = previous_end = 0
+
+    def ready_chunks(block_end):
+        """Yields the chunks decided so far; block_end is None while the block is still open."""
+        nonlocal start, previous_end, base
+        available = base + len(words)
+        while start < available:
+            limit = start + chunk_size
+            if block_end is not None and limit >= block_end:
+                end = block_end
+            elif limit < available:
+                i = bisect_right(breaks, limit) - 1
+                end = breaks[i] if i >= 0 and breaks[i] > previous_end else limit
+            else:
+                break  # need more words to place this chunk's end
+
+            # Section in effect halfway through the words this chunk adds
+            position = bisect_right(section_offsets, (previous_end + end) // 2) - 1
+            yield Chunk(' '.join(words[start - base:end - base]), start, end,
+                        list(chain.from_iterable(word_tokens[start - base:end - base])),
+                        section_paths[position] if position >= 0 else '')
+            if end >= available and block_end is not None:
+                start = previous_end = end
+                break
+            previous_end = end
+            start = max(end - overlap, block_start)
+
+        # Forget words and breaks behind the next chunk (amortized: only once they dominate)
+        if start - base > len(words) // 2:
+            del words[:start - base]
+            del word_tokens[:start - base]
+            del breaks[:bisect_right(breaks, start)]
+            base = start
+
+    def add_words(new_words):
+        words.extend(new_words)
+        word_tokens.extend(map(token_cache.__getitem__, new_words))
+
+    for part in parts:
+        for level, heading, body in _split_sections(part):
+            if level:
+                offset = base + len(words)
+                if offset - block_start >= min_section_words:
+                    yield from ready_chunks(offset)
+                    block_start = start = previous_end = offset
+                path = [entry for entry in path if entry[0] < level] + [(level, heading.strip())]
+                section_offsets.append(offset)
+                section_paths.append(SECTION_SEPARATOR.join(title for _, title in path))
+                add_words(heading.split())
+                breaks.append(base + len(words))
+            body_words = body.split()
+            first = base + len(words) + 1
+            breaks.extend([first + i for i, word in enumerate(body_words) if word[-1] in SENTENCE_END])
+            add_words(body_words)
+        yield from ready_chunks(None)
+    yield from ready_chunks(base + len(words))
+
+
+def chunk_document(text: str, chunk_size: int = DEFAULT_CHUNK_SIZE, overlap: int = DEFAULT_OVERLAP,
+                   min_section_words: int = None) -> List[Chunk]:
+    """
+    Splits a document into overlapping chunks (see iter_chunks).
+
+    Args:
+        text: Full document text
+        chunk_size: Target size of each chunk (in words)
+        overlap: Number of words to overlap between chunks
+        min_section_words: Smallest section kept apart (default chunk_size // 5)
+
+    Returns:
+        List of Chunk objects in document order
+    """
+    return list(iter_chunks([text], chunk_size, overlap, min_section_words))
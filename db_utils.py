@@ -3,33 +3,312 @@ Database Utilities Module
 Handles SQLite database operations for the HR Automation Dashboard
 """
 
+import os
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
 from datetime import datetime, timedelta
 import random
 
 
-def get_db_connection():
+# Database location and pool sizing (overridable through the environment)
+DB_PATH = os.getenv('HR_DB_PATH', 'hr_peopleops.db')
+DEFAULT_POOL_SIZE = int(os.getenv('HR_DB_POOL_SIZE', '8'))
+
+# Idle connections older than this are health-checked before reuse (seconds)
+HEALTH_CHECK_INTERVAL = 30.0
+
+
+def get_db_connection(db_path=None):
     """
-    Creates and returns a connection to the SQLite database.
+    Creates and returns a new connection to the SQLite database.
+    Prefer the pooled helpers (read_connection / write_connection) for queries;
+    this is the raw factory the pool uses to open its connections.
+    
+    Args:
+        db_path (str): Optional database path (defaults to DB_PATH)
     
     Returns:
         sqlite3.Connection: Database connection object
     """
-    conn = sqlite3.connect('hr_peopleops.db', check_same_thread=False)
+    conn = sqlite3.connect(db_path or DB_PATH, check_same_thread=False)
     conn.row_factory = sqlite3.Row  # Enable column access by name
+    apply_connection_pragmas(conn)
     return conn
 
 
-def initialize_database():
+class ConnectionPool:
     """
-    Creates the database schema and populates it with dummy data.
-    Creates three tables: employees, transfers, and feedback.
+    Thread-safe SQLite connection pool.
+    
+    Readers check out one of up to `pool_size` connections; a thread that is
+    already holding a read connection reuses it for nested calls. All writes go
+    through a single connection guarded by a lock, so SQLite never sees two
+    concurrent writers from this process.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
     
-    # Create employees table
-    cursor.execute('''
+    def __init__(self, db_path, pool_size=DEFAULT_POOL_SIZE, connect=None):
+        self.db_path = db_path
+        self.pool_size = max(1, int(pool_size))
+        self._connect = connect or get_db_connection
+        self._idle = []  # [(connection, last_used_timestamp)]
+        self._open_count = 0
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._writer = None
+        self._writer_lock = threading.RLock()
+        self._closed = False
+        self._stats = {
+            'connections_created': 0,
+            'checkouts': 0,
+            'reuses': 0,
+            'waits': 0,
+            'health_check_failures': 0,
+            'writes': 0,
+        }
+    
+    def _new_connection(self):
+        conn = self._connect(self.db_path)
+        with self._cond:
+            self._stats['connections_created'] += 1
+        return conn
+    
+    @staticmethod
+    def _is_healthy(conn):
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+    
+    def _acquire(self):
+        with self._cond:
+            if self._closed:
+                raise sqlite3.ProgrammingError("Connection pool is closed")
+            while not self._idle and self._open_count >= self.pool_size:
+                self._stats['waits'] += 1
+                self._cond.wait()
+            self._stats['checkouts'] += 1
+            if self._idle:
+                conn, last_used = self._idle.pop()
+                self._stats['reuses'] += 1
+            else:
+                conn, last_used = None, None
+                self._open_count += 1
+        
+        if conn is not None and time.monotonic() - last_used > HEALTH_CHECK_INTERVAL:
+            if not self._is_healthy(conn):
+                self._stats['health_check_failures'] += 1
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+                conn = None
+        if conn is None:
+            try:
+                conn = self._new_connection()
+            except Exception:
+                with self._cond:
+                    self._open_count -= 1
+                    self._cond.notify()
+                raise
+        return conn
+    
+    def _release(self, conn, discard=False):
+        with self._cond:
+            if discard or self._closed:
+                self._open_count -= 1
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+    
+    @contextmanager
+    def reader(self):
+        """
+        Checks out a read connection for the duration of the block.
+        Nested calls on the same thread share the outer connection.
+        """
+        held = getattr(self._local, 'conn', None)
+        if held is not None:
+            self._local.depth += 1
+            try:
+                yield held
+            finally:
+                self._local.depth -= 1
+            return
+        
+        conn = self._acquire()
+        self._local.conn = conn
+        self._local.depth = 1
+        broken = False
+        try:
+            yield conn
+        except sqlite3.DatabaseError:
+            broken = not self._is_healthy(conn)
+            raise
+        finally:
+            self._local.conn = None
+            self._local.depth = 0
+            if conn.in_transaction:
+                conn.rollback()
+            self._release(conn, discard=broken)
+    
+    @contextmanager
+    def writer(self):
+        """
+        Yields the single writer connection inside a transaction.
+        Commits on success and rolls back if the block raises.
+        """
+        with self._writer_lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError("Connection pool is closed")
+            if self._writer is None or not self._is_healthy(self._writer):
+                if self._writer is not None:
+                    self._stats['health_check_failures'] += 1
+                self._writer = self._new_connection()
+            conn = self._writer
+            try:
+                yield conn
+                conn.commit()
+                with self._cond:
+                    self._stats['writes'] += 1
+            except Exception:
+                conn.rollback()
+                raise
+    
+    def health_check(self):
+        """
+        Pings every idle connection and drops the ones that fail.
+        
+        Returns:
+            dict: Number of healthy and replaced connections
+        """
+        with self._cond:
+            idle, self._idle = self._idle, []
+        healthy, dropped = [], 0
+        for conn, last_used in idle:
+            if self._is_healthy(conn):
+                healthy.append((conn, last_used))
+            else:
+                dropped += 1
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+        with self._cond:
+            self._idle.extend(healthy)
+            self._open_count -= dropped
+            self._stats['health_check_failures'] += dropped
+            self._cond.notify_all()
+        return {'healthy': len(healthy), 'dropped': dropped}
+    
+    def stats(self):
+        """
+        Returns pool counters for monitoring.
+        
+        Returns:
+            dict: Pool size, open/idle/in-use connections and usage counters
+        """
+        with self._cond:
+            return {
+                'db_path': self.db_path,
+                'pool_size': self.pool_size,
+                'open_connections': self._open_count,
+                'idle_connections': len(self._idle),
+                'in_use_connections': self._open_count - len(self._idle),
+                **self._stats,
+            }
+    
+    def close(self):
+        """Closes all idle connections and the writer connection."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._open_count -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            conn.close()
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    Returns the process-wide connection pool, creating it on first use.
+    
+    Returns:
+        ConnectionPool: Shared pool for DB_PATH
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_PATH, DEFAULT_POOL_SIZE)
+    return _pool
+
+
+def configure_pool(db_path=None, pool_size=None):
+    """
+    Replaces the shared pool, e.g. to point at another database file.
+    
+    Args:
+        db_path (str): Database path (defaults to DB_PATH)
+        pool_size (int): Maximum number of read connections
+    """
+    global _pool, DB_PATH
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        DB_PATH = db_path or DB_PATH
+        _pool = ConnectionPool(DB_PATH, pool_size or DEFAULT_POOL_SIZE)
+
+
+def read_connection():
+    """Context manager yielding a pooled read connection."""
+    return get_pool().reader()
+
+
+def write_connection():
+    """Context manager yielding the serialized writer connection."""
+    return get_pool().writer()
+
+
+def get_pool_stats():
+    """
+    Returns connection pool statistics for monitoring.
+    
+    Returns:
+        dict: Pool counters (see ConnectionPool.stats)
+    """
+    return get_pool().stats()
+
+
+# Per-connection tuning applied to every connection the app opens
+CONNECTION_PRAGMAS = {
+    'cache_size': -32000,        # ~32 MB page cache (negative = KiB)
+    'mmap_size': 268435456,      # memory-map up to 256 MB of the file
+    'synchronous': 'NORMAL',     # safe with WAL, far fewer fsyncs than FULL
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,        # wait up to 5s for the writer instead of failing
+}
+
+# Ordered schema migrations, tracked with PRAGMA user_version.
+# Never edit an applied migration; append a new version instead.
+SCHEMA_MIGRATIONS = [
+    (1, 'Create base tables', [
+        '''
         CREATE TABLE IF NOT EXISTS employees (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             employee_id TEXT UNIQUE NOT NULL,
@@ -42,10 +321,8 @@ def initialize_database():
             salary REAL NOT NULL,
             status TEXT DEFAULT 'Active'
         )
-    ''')
-    
-    # Create transfers table
-    cursor.execute('''
+        ''',
+        '''
         CREATE TABLE IF NOT EXISTS transfers (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             employee_id TEXT NOT NULL,
@@ -55,10 +332,8 @@ def initialize_database():
             reason TEXT,
             FOREIGN KEY (employee_id) REFERENCES employees(employee_id)
         )
-    ''')
-    
-    # Create feedback table
-    cursor.execute('''
+        ''',
+        '''
         CREATE TABLE IF NOT EXISTS feedback (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             employee_id TEXT NOT NULL,
@@ -69,16 +344,221 @@ def initialize_database():
             reviewer TEXT,
             FOREIGN KEY (employee_id) REFERENCES employees(employee_id)
         )
-    ''')
+        ''',
+    ]),
+    (2, 'Secondary indexes for dashboard queries', [
+        # salary rides along so get_department_stats is answered from the index alone
+        'CREATE INDEX IF NOT EXISTS idx_employees_department_status ON employees(department, status, salary)',
+        'CREATE INDEX IF NOT EXISTS idx_employees_hire_date ON employees(hire_date)',
+        'CREATE INDEX IF NOT EXISTS idx_transfers_employee_date ON transfers(employee_id, transfer_date)',
+        # serves the ORDER BY transfer_date DESC LIMIT in get_recent_transfers
+        'CREATE INDEX IF NOT EXISTS idx_transfers_transfer_date ON transfers(transfer_date)',
+        'CREATE INDEX IF NOT EXISTS idx_feedback_employee_date ON feedback(employee_id, feedback_date)',
+        'ANALYZE',
+    ]),
+    (3, 'Data version counter for result caching', [
+        'CREATE TABLE IF NOT EXISTS data_version (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)',
+        'INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0)',
+    ]),
+    (4, 'Directory key and soft delete for incremental imports', [
+        # normalized "name|department" of the directory row the employee came from
+        'ALTER TABLE employees ADD COLUMN source_key TEXT',
+        # set when the person disappears from the directory (status becomes Terminated)
+        'ALTER TABLE employees ADD COLUMN removed_at DATE',
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_employees_source_key ON employees(source_key)',
+        # checksum of the last imported directory CSV, so an unchanged file is skipped
+        'CREATE TABLE IF NOT EXISTS directory_import (id INTEGER PRIMARY KEY CHECK (id = 1), '
+        'csv_sha256 TEXT NOT NULL, imported_at TEXT NOT NULL)',
+    ]),
+]
+
+SCHEMA_VERSION = SCHEMA_MIGRATIONS[-1][0]
+
+
+def apply_connection_pragmas(conn):
+    """
+    Applies the per-connection performance pragmas.
     
-    # Check if data already exists
-    cursor.execute('SELECT COUNT(*) FROM employees')
-    if cursor.fetchone()[0] == 0:
-        # Populate with dummy data
-        _populate_dummy_data(cursor)
+    Args:
+        conn: SQLite connection object
+    """
+    for name, value in CONNECTION_PRAGMAS.items():
+        conn.execute(f'PRAGMA {name} = {value}').fetchall()
+
+
+def get_schema_version(conn):
+    """Returns the schema version recorded in the database file."""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def apply_migrations(conn, target_version=None):
+    """
+    Switches the database to WAL mode and applies pending schema migrations.
+    Each migration runs in its own transaction together with its version bump.
+    
+    Args:
+        conn: SQLite connection object (not inside a transaction)
+        target_version (int): Stop after this version (defaults to latest)
+        
+    Returns:
+        int: Schema version after migrating
+    """
+    if target_version is None:
+        target_version = SCHEMA_VERSION
+    
+    if conn.in_transaction:
+        conn.commit()
+    # WAL lets dashboard readers keep going while the importer writes
+    conn.execute('PRAGMA journal_mode = WAL').fetchall()
+    
+    current = get_schema_version(conn)
+    for version, _description, statements in SCHEMA_MIGRATIONS:
+        if version <= current or version > target_version:
+            continue
+        conn.execute('BEGIN')
+        try:
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f'PRAGMA user_version = {version}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        current = version
+    return current
+
+
+def initialize_database():
+    """
+    Creates the database schema and populates it with dummy data.
+    Creates three tables: employees, transfers, and feedback.
+    """
+    with write_connection() as conn:
+        apply_migrations(conn)
+        
+        # Check if data already exists
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) FROM employees')
+        if cursor.fetchone()[0] == 0:
+            # Populate with dummy data
+            _populate_dummy_data(cursor)
+            bump_data_version(conn)
+
+
+# ============================================================================
+# RESULT CACHE: dashboard aggregates, invalidated by the data version
+# ============================================================================
+
+_result_cache = {}
+_result_cache_lock = threading.Lock()
+_result_cache_stats = {'hits': 0, 'misses': 0, 'invalidations': 0, 'version_checks': 0}
+# (db_path, file signature, data version) the cached results were computed at
+_cache_validated = None
+# Bumped by in-process writes so they invalidate even within one stat tick
+_local_write_count = 0
+
+
+def bump_data_version(conn):
+    """
+    Increments the persistent data version. Every write path calls this inside
+    its write transaction so cached query results are invalidated in this and
+    other processes.
+    
+    Args:
+        conn: SQLite connection with an open write
+    """
+    global _local_write_count
+    conn.execute('UPDATE data_version SET version = version + 1 WHERE id = 1')
+    with _result_cache_lock:
+        _local_write_count += 1
+
+
+def _database_signature(db_path):
+    """mtime/size of the database file and its WAL: changes whenever anyone commits."""
+    signature = [_local_write_count]
+    for path in (db_path, db_path + '-wal'):
+        try:
+            st = os.stat(path)
+            signature.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+def _read_data_version():
+    with read_connection() as conn:
+        try:
+            return conn.execute('SELECT version FROM data_version WHERE id = 1').fetchone()[0]
+        except (sqlite3.Error, TypeError):
+            # Database not migrated yet: never serve cached results
+            return None
+
+
+def _validate_result_cache():
+    """
+    Drops cached results if the data changed. Costs one os.stat pair when the
+    files are untouched, and one tiny query when they changed.
+    """
+    global _cache_validated
+    db_path = DB_PATH
+    signature = _database_signature(db_path)
+    with _result_cache_lock:
+        validated = _cache_validated
+    if validated is not None and validated[:2] == (db_path, signature):
+        return
+    
+    version = _read_data_version()
+    with _result_cache_lock:
+        _result_cache_stats['version_checks'] += 1
+        if validated is None or validated[0] != db_path or version is None or validated[2] != version:
+            if _result_cache:
+                _result_cache_stats['invalidations'] += 1
+            _result_cache.clear()
+        _cache_validated = (db_path, signature, version) if version is not None else None
+
+
+def cached_result(func):
+    """
+    Decorator caching a read-only query function's result per argument tuple,
+    shared by every session in the process, until the data version changes.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        _validate_result_cache()
+        key = (func.__name__, args, tuple(sorted(kwargs.items())))
+        with _result_cache_lock:
+            if key in _result_cache:
+                _result_cache_stats['hits'] += 1
+                result = _result_cache[key]
+                return dict(result) if isinstance(result, dict) else list(result)
+            _result_cache_stats['misses'] += 1
+        result = func(*args, **kwargs)
+        with _result_cache_lock:
+            if _cache_validated is not None:
+                _result_cache[key] = result
+        return dict(result) if isinstance(result, dict) else list(result)
     
-    conn.commit()
-    conn.close()
+    wrapper.uncached = func
+    return wrapper
+
+
+def invalidate_result_cache():
+    """Clears all cached query results."""
+    global _cache_validated
+    with _result_cache_lock:
+        _result_cache.clear()
+        _cache_validated = None
+
+
+def get_result_cache_stats():
+    """
+    Returns result cache counters for monitoring.
+    
+    Returns:
+        dict: hits, misses, invalidations, version checks and cached entries
+    """
+    with _result_cache_lock:
+        return {**_result_cache_stats, 'entries': len(_result_cache)}
 
 
 def _populate_dummy_data(cursor):
@@ -187,21 +667,23 @@ def _populate_dummy_data(cursor):
     ''', feedback_data)
 
 
+@cached_result
 def get_all_employees():
     """
-    Retrieves all employees from the database.
+    Retrieves all current employees from the database (people removed
+    from the directory by a sync are left out).
     
     Returns:
         list: List of employee records
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM employees ORDER BY department, last_name')
-    employees = cursor.fetchall()
-    conn.close()
+    with read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM employees WHERE removed_at IS NULL ORDER BY department, last_name')
+        employees = cursor.fetchall()
     return employees
 
 
+@cached_result
 def get_department_stats():
     """
     Calculates statistics by department.
@@ -209,25 +691,25 @@ def get_department_stats():
     Returns:
         list: Department statistics including count, average salary, and headcount
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT 
-            department,
-            COUNT(*) as employee_count,
-            ROUND(AVG(salary), 2) as avg_salary,
-            MIN(salary) as min_salary,
-            MAX(salary) as max_salary
-        FROM employees
-        WHERE status = 'Active'
-        GROUP BY department
-        ORDER BY employee_count DESC
-    ''')
-    stats = cursor.fetchall()
-    conn.close()
+    with read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT 
+                department,
+                COUNT(*) as employee_count,
+                ROUND(AVG(salary), 2) as avg_salary,
+                MIN(salary) as min_salary,
+                MAX(salary) as max_salary
+            FROM employees
+            WHERE status = 'Active'  -- also excludes people removed by a sync (Terminated)
+            GROUP BY department
+            ORDER BY employee_count DESC
+        ''')
+        stats = cursor.fetchall()
     return stats
 
 
+@cached_result
 def get_recent_transfers(limit=10):
     """
     Retrieves recent employee transfers.
@@ -238,26 +720,26 @@ def get_recent_transfers(limit=10):
     Returns:
         list: Recent transfer records
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT 
-            t.employee_id,
-            e.first_name || ' ' || e.last_name as employee_name,
-            t.from_department,
-            t.to_department,
-            t.transfer_date,
-            t.reason
-        FROM transfers t
-        JOIN employees e ON t.employee_id = e.employee_id
-        ORDER BY t.transfer_date DESC
-        LIMIT ?
-    ''', (limit,))
-    transfers = cursor.fetchall()
-    conn.close()
+    with read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT 
+                t.employee_id,
+                e.first_name || ' ' || e.last_name as employee_name,
+                t.from_department,
+                t.to_department,
+                t.transfer_date,
+                t.reason
+            FROM transfers t
+            JOIN employees e ON t.employee_id = e.employee_id
+            ORDER BY t.transfer_date DESC
+            LIMIT ?
+        ''', (limit,))
+        transfers = cursor.fetchall()
     return transfers
 
 
+@cached_result
 def get_feedback_summary():
     """
     Calculates feedback summary statistics.
@@ -265,37 +747,50 @@ def get_feedback_summary():
     Returns:
         dict: Summary statistics including average rating and total feedback count
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT 
-            COUNT(*) as total_feedback,
-            ROUND(AVG(rating), 2) as avg_rating,
-            COUNT(CASE WHEN rating >= 4 THEN 1 END) as positive_feedback
-        FROM feedback
-    ''')
-    summary = cursor.fetchone()
-    conn.close()
+    with read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT 
+                COUNT(*) as total_feedback,
+                ROUND(AVG(rating), 2) as avg_rating,
+                COUNT(CASE WHEN rating >= 4 THEN 1 END) as positive_feedback
+            FROM feedback
+        ''')
+        summary = cursor.fetchone()
     return dict(summary)
 
 
-def execute_query(query):
+@cached_result
+def get_departments():
+    """
+    Returns the distinct department names.
+    
+    Returns:
+        list: Department names, sorted
+    """
+    with read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT DISTINCT department FROM employees WHERE removed_at IS NULL ORDER BY department')
+        departments = [row[0] for row in cursor.fetchall()]
+    return departments
+
+
+def execute_query(query, params=()):
     """
     Executes a custom SQL query and returns results.
     Used by the AI to answer natural language questions.
     
     Args:
         query (str): SQL query to execute
+        params (tuple): Values for the query's ? placeholders
         
     Returns:
         list: Query results
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(query)
-    results = cursor.fetchall()
-    conn.close()
+    with read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        results = cursor.fetchall()
     return results
 
 
@@ -319,7 +814,10 @@ def get_database_schema():
        - position: TEXT
        - hire_date: DATE
        - salary: REAL
-       - status: TEXT (Active, On Leave)
+       - status: TEXT (Active, On Leave, Terminated)
+       - removed_at: DATE (when the person left the company directory; NULL for current staff)
+       Former employees stay in this table with removed_at set: filter on
+       removed_at IS NULL when listing, counting or averaging current employees.
     
     2. transfers table:
        - id: INTEGER PRIMARY KEY
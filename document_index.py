@@ -0,0 +1,400 @@
+"""
+Inverted Index Module
+Persistent keyword index for uploaded documents: postings lists with term
+frequencies, chunk lengths and BM25 scoring, updated incrementally on upload/delete
+"""
+
+import math
+import re
+import sqlite3
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+
+# Knowledge base storage (chunk store and index share one SQLite file)
+INDEX_DB = Path("knowledge_base.db")
+
+# Same tokenization simple_search has always used
+TOKEN_PATTERN = re.compile(r'\b\w+\b')
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Partial matching only relates terms longer than this
+RELATED_MIN_LENGTH = 4
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case word tokens of a text."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class TermLookup:
+    """
+    Substring lookups over a fixed vocabulary, built once per index version.
+
+    related() finds the terms a query word partially matches (terms containing
+    the word, or contained in it) through a trigram -> term map and direct
+    lookups of the word's substrings, instead of scanning the vocabulary.
+    """
+
+    def __init__(self, terms: List[str]):
+        self.terms = terms
+        self._ids = {term: i for i, term in enumerate(terms)}
+        trigrams = defaultdict(list)
+        for i, term in enumerate(terms):
+            if len(term) >= RELATED_MIN_LENGTH:
+                for gram in {term[j:j + 3] for j in range(len(term) - 2)}:
+                    trigrams[gram].append(i)
+        self._trigrams = dict(trigrams)
+
+    def related(self, word: str) -> List[str]:
+        """
+        Terms of RELATED_MIN_LENGTH or more letters, other than the word,
+        that contain it or are contained in it.
+
+        Returns:
+            Terms in vocabulary order
+        """
+        ids = set()
+        # Terms inside the word: its substrings of a qualifying length
+        for size in range(RELATED_MIN_LENGTH, len(word)):
+            for start in range(len(word) - size + 1):
+                i = self._ids.get(word[start:start + size])
+                if i is not None:
+                    ids.add(i)
+        # Terms containing the word: those holding all its trigrams, then checked
+        if len(word) >= 3:
+            lists = sorted((self._trigrams.get(word[j:j + 3], ()) for j in range(len(word) - 2)), key=len)
+            candidates = set(lists[0]).intersection(*lists[1:]) if lists[0] else ()
+        else:
+            candidates = range(len(self.terms))
+        ids.update(i for i in candidates
+                   if len(self.terms[i]) >= RELATED_MIN_LENGTH and word in self.terms[i] and self.terms[i] != word)
+        return [self.terms[i] for i in sorted(ids)]
+
+
+class KnowledgeBaseConnection:
+    """
+    SQLite connections for the knowledge base.
+
+    The chunk store and the inverted index both write through transaction(),
+    which nests, so one upload or delete commits chunks and postings together.
+    Writes share one connection behind one lock; reads (execute, snapshot)
+    use a connection per thread, which in WAL mode sees the last commit and
+    never waits for the writer. The thread inside a transaction reads through
+    the writer instead, so it sees its own uncommitted changes.
+    """
+
+    def __init__(self, db_path: Path = INDEX_DB):
+        self.db_path = Path(db_path)
+        # Autocommit mode: transactions are opened explicitly in transaction()
+        self.conn = self._connect()
+        self.conn.execute('PRAGMA journal_mode = WAL').fetchall()
+        self.conn.execute('PRAGMA synchronous = NORMAL').fetchall()
+        self.lock = threading.RLock()
+        self._depth = 0
+        self._writer = None  # ident of the thread with the open transaction
+        self._readers = threading.local()
+        self._reader_conns = []
+        # data_version from a single connection: every thread sees the same
+        # value for the same committed state (it is per connection)
+        self._version_conn = self._connect()
+        self._version_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+
+    @contextmanager
+    def transaction(self):
+        """Runs the block in a transaction; nested calls join the outer one."""
+        with self.lock:
+            if self._depth == 0:
+                self.conn.execute('BEGIN IMMEDIATE')
+                self._writer = threading.get_ident()
+            self._depth += 1
+            try:
+                yield self.conn
+            except BaseException:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._writer = None
+                    self.conn.execute('ROLLBACK')
+                raise
+            self._depth -= 1
+            if self._depth == 0:
+                self._writer = None
+                self.conn.execute('COMMIT')
+
+    def in_transaction(self) -> bool:
+        """Whether the calling thread has a transaction open."""
+        return self._writer == threading.get_ident()
+
+    def reader(self) -> sqlite3.Connection:
+        """The calling thread's read connection (the writer inside its transaction)."""
+        if self.in_transaction():
+            return self.conn
+        conn = getattr(self._readers, 'conn', None)
+        if conn is None:
+            conn = self._readers.conn = self._connect()
+            conn.execute('PRAGMA query_only = ON')
+            with self._version_lock:
+                self._reader_conns.append(conn)
+        return conn
+
+    def execute(self, sql: str, params=()):
+        """Runs a read statement and returns all rows."""
+        if self.in_transaction():
+            with self.lock:
+                return self.conn.execute(sql, params).fetchall()
+        return self.reader().execute(sql, params).fetchall()
+
+    @contextmanager
+    def snapshot(self):
+        """Yields a connection whose reads all see the same committed state."""
+        if self.in_transaction():
+            with self.lock:
+                yield self.conn
+            return
+        conn = self.reader()
+        conn.execute('BEGIN')
+        try:
+            yield conn
+        finally:
+            conn.execute('COMMIT')
+
+    def data_version(self):
+        """
+        Changes whenever a connection (this process's writer included)
+        commits. The thread inside a transaction gets a new token on every
+        call: what it reads is not committed, so nothing may be cached on it.
+        """
+        if self.in_transaction():
+            return object()
+        with self._version_lock:
+            return self._version_conn.execute('PRAGMA data_version').fetchone()[0]
+
+    def close(self):
+        with self.lock, self._version_lock:
+            for conn in self._reader_conns:
+                conn.close()
+            self._reader_conns = []
+            self._readers = threading.local()
+            self._version_conn.close()
+            self.conn.close()
+
+
+class InvertedIndex:
+    """
+    On-disk inverted index stored in SQLite.
+
+    Tables:
+        index_postings: (term, chunk_id) -> term frequency
+        index_terms:    term -> document frequency
+        index_chunks:   chunk_id -> doc_id, token count
+
+    Vocabulary (with its TermLookup) and chunk lengths are cached in memory
+    and refreshed whenever the index generation changes. Lookups read
+    through the knowledge base's read connections and do not wait for writes.
+    """
+
+    def __init__(self, kb: KnowledgeBaseConnection):
+        self.kb = kb
+        self._conn = kb.conn
+        self._lock = threading.Lock()  # guards the cache only
+        self._generation = 0
+        self._cached_generation = None
+        self._vocabulary = []
+        self._term_lookup = TermLookup([])
+        self._lengths = {}
+        self._total_length = 0
+        self.ensure_schema()
+
+    def ensure_schema(self):
+        """Creates the index tables if needed."""
+        with self.kb.transaction():
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS index_postings (
+                    term TEXT NOT NULL,
+                    chunk_id TEXT NOT NULL,
+                    tf INTEGER NOT NULL,
+                    PRIMARY KEY (term, chunk_id)
+                ) WITHOUT ROWID
+            ''')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_postings_chunk ON index_postings(chunk_id)')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS index_terms (
+                    term TEXT PRIMARY KEY,
+                    df INTEGER NOT NULL
+                ) WITHOUT ROWID
+            ''')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS index_chunks (
+                    chunk_id TEXT PRIMARY KEY,
+                    doc_id TEXT NOT NULL,
+                    length INTEGER NOT NULL
+                )
+            ''')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_index_chunks_doc ON index_chunks(doc_id)')
+
+    # ------------------------------------------------------------------
+    # Updates
+    # ------------------------------------------------------------------
+
+    def add_chunks(self, chunks: Dict[str, Dict]):
+        """
+        Indexes chunks (chunk_id -> chunk dict with 'doc_id' and 'text').
+        Chunks that are already indexed are replaced. A 'term_freqs' entry
+        (from chunker.chunk_document) is used as is instead of tokenizing text.
+
+        Args:
+            chunks: Mapping of chunk IDs to chunk records
+        """
+        if not chunks:
+            return
+        with self.kb.transaction():
+            self._remove_chunk_ids(list(chunks.keys()))
+            postings = []
+            df_delta = Counter()
+            chunk_rows = []
+            for chunk_id, chunk in chunks.items():
+                term_freqs = chunk.get('term_freqs')
+                if term_freqs is None:
+                    term_freqs = Counter(tokenize(chunk['text']))
+                chunk_rows.append((chunk_id, chunk['doc_id'], sum(term_freqs.values())))
+                for term, tf in term_freqs.items():
+                    postings.append((term, chunk_id, tf))
+                    df_delta[term] += 1
+            self._conn.executemany(
+                'INSERT INTO index_chunks (chunk_id, doc_id, length) VALUES (?, ?, ?)', chunk_rows)
+            self._conn.executemany(
+                'INSERT INTO index_postings (term, chunk_id, tf) VALUES (?, ?, ?)', postings)
+            self._conn.executemany('''
+                INSERT INTO index_terms (term, df) VALUES (?, ?)
+                ON CONFLICT(term) DO UPDATE SET df = df + excluded.df
+            ''', df_delta.items())
+            self._generation += 1
+
+    def remove_document(self, doc_id: str) -> int:
+        """
+        Removes every chunk of a document from the index.
+
+        Returns:
+            Number of chunks removed
+        """
+        with self.kb.transaction():
+            chunk_ids = [row[0] for row in self._conn.execute(
+                'SELECT chunk_id FROM index_chunks WHERE doc_id = ?', (doc_id,))]
+            self._remove_chunk_ids(chunk_ids)
+            self._generation += 1
+            return len(chunk_ids)
+
+    def _remove_chunk_ids(self, chunk_ids: List[str]):
+        for chunk_id in chunk_ids:
+            terms = [row[0] for row in self._conn.execute(
+                'SELECT term FROM index_postings WHERE chunk_id = ?', (chunk_id,))]
+            if not terms:
+                continue
+            self._conn.executemany(
+                'UPDATE index_terms SET df = df - 1 WHERE term = ?', [(t,) for t in terms])
+            self._conn.execute('DELETE FROM index_postings WHERE chunk_id = ?', (chunk_id,))
+            self._conn.execute('DELETE FROM index_chunks WHERE chunk_id = ?', (chunk_id,))
+        self._conn.execute('DELETE FROM index_terms WHERE df <= 0')
+
+    def rebuild(self, all_chunks: Dict[str, Dict]):
+        """Drops the index contents and re-indexes all chunks."""
+        with self.kb.transaction():
+            self._conn.execute('DELETE FROM index_postings')
+            self._conn.execute('DELETE FROM index_terms')
+            self._conn.execute('DELETE FROM index_chunks')
+            self.add_chunks(all_chunks)
+            self._generation += 1
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def generation(self):
+        """Token that changes whenever the index changes (in this process or another)."""
+        return (self._generation, self.kb.data_version())
+
+    def _refresh_cache(self):
+        # data_version also moves when another connection writes to the index
+        generation = self.generation()
+        if self._cached_generation == generation:
+            return
+        with self.kb.snapshot() as conn:
+            self._vocabulary = [row[0] for row in conn.execute('SELECT term FROM index_terms')]
+            self._lengths = dict(conn.execute('SELECT chunk_id, length FROM index_chunks'))
+        self._term_lookup = TermLookup(self._vocabulary)
+        self._total_length = sum(self._lengths.values())
+        self._cached_generation = generation
+
+    def chunk_count(self) -> int:
+        """Number of indexed chunks."""
+        with self._lock:
+            self._refresh_cache()
+            return len(self._lengths)
+
+    def vocabulary(self) -> List[str]:
+        """All indexed terms."""
+        with self._lock:
+            self._refresh_cache()
+            return self._vocabulary
+
+    def related_terms(self, word: str) -> List[str]:
+        """Indexed terms partially matching a word (see TermLookup.related)."""
+        with self._lock:
+            self._refresh_cache()
+            lookup = self._term_lookup
+        return lookup.related(word)
+
+    def postings(self, term: str) -> Dict[str, int]:
+        """Chunk ID -> term frequency for one term."""
+        return dict(self.kb.execute('SELECT chunk_id, tf FROM index_postings WHERE term = ?', (term,)))
+
+    def postings_for_terms(self, terms: Iterable[str]) -> Dict[str, Dict[str, int]]:
+        """Postings lists for several terms in one query."""
+        terms = list(terms)
+        result = {term: {} for term in terms}
+        if not terms:
+            return result
+        placeholders = ','.join('?' * len(terms))
+        for term, chunk_id, tf in self.kb.execute(
+                f'SELECT term, chunk_id, tf FROM index_postings WHERE term IN ({placeholders})', terms):
+            result[term][chunk_id] = tf
+        return result
+
+    def bm25_scores(self, term: str, postings: Dict[str, int] = None) -> Dict[str, float]:
+        """
+        BM25 contribution of a single term for every chunk containing it.
+
+        Args:
+            term: Query term
+            postings: Optional pre-fetched postings for the term
+
+        Returns:
+            Chunk ID -> BM25 score
+        """
+        if postings is None:
+            postings = self.postings(term)
+        if not postings:
+            return {}
+        with self._lock:
+            self._refresh_cache()
+            num_chunks = len(self._lengths) or 1
+            avg_length = (self._total_length / num_chunks) or 1.0
+            lengths = self._lengths
+
+        df = len(postings)
+        idf = math.log(1 + (num_chunks - df + 0.5) / (df + 0.5))
+        scores = {}
+        for chunk_id, tf in postings.items():
+            length = lengths.get(chunk_id, avg_length)
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+            scores[chunk_id] = idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores
@@ -4,16 +4,41 @@ Handles document uploads, text extraction, chunking, and semantic search
 """
 
 import os
-import json
 import hashlib
+import io
+import mmap
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Callable, Iterable, Iterator, List, Dict, Optional, Tuple
 import re
+import threading
+
+from chunk_store import ChunkStore
+from chunker import Chunk, chunk_document, iter_chunks
+from document_index import InvertedIndex, KnowledgeBaseConnection, INDEX_DB, tokenize
+from embeddings import EMBEDDINGS_AVAILABLE, VectorStore, create_embedder
+from keyword_scorer import SCORER_AVAILABLE, KeywordScorer
+from synonyms import build_synonym_table, phrase_pattern
 
 
 # Document storage directory
 DOCUMENTS_DIR = Path("uploaded_documents")
-CHUNKS_FILE = Path("document_chunks.json")
+CHUNKS_FILE = Path("document_chunks.json")  # legacy store, migrated on first use
+
+# Worker processes for batch ingestion (text extraction and chunking)
+INGEST_WORKERS = int(os.getenv('HR_INGEST_WORKERS', '0')) or os.cpu_count() or 1
+# Smaller batches are extracted in-process: starting workers costs more than it saves
+INGEST_POOL_MIN_BYTES = 1024 * 1024
+# In batch ingestion, long PDFs are extracted in page ranges across processes
+PDF_PARALLEL_MIN_PAGES = 64
+PDF_PAGE_BATCH = 64
+# pypdf caches every parsed page; its cached streams are dropped after this many pages
+PDF_CACHE_PAGES = 16
+# Plain-text files are read in blocks of whole lines of about this many characters
+TEXT_READ_CHARS = 1024 * 1024
 
 
 def ensure_documents_dir():
@@ -21,73 +46,210 @@ def ensure_documents_dir():
     DOCUMENTS_DIR.mkdir(exist_ok=True)
 
 
-def extract_text_from_file(file_path: str, file_content: bytes = None, file_type: str = None) -> str:
+_knowledge_base = None
+_store = None
+_index = None
+_vectors = None
+_kb_init_lock = threading.Lock()
+
+
+def _open_knowledge_base():
+    """Open the knowledge base on first use and migrate the legacy JSON file."""
+    global _knowledge_base, _store, _index, _vectors
+    if _knowledge_base is None:
+        with _kb_init_lock:
+            if _knowledge_base is None:
+                kb = KnowledgeBaseConnection(INDEX_DB)
+                store = ChunkStore(kb)
+                index = InvertedIndex(kb)
+                if EMBEDDINGS_AVAILABLE:
+                    _vectors = VectorStore(kb, create_embedder(stopwords=STOPWORDS))
+                if store.chunk_count() == 0:
+                    store.migrate_from_json(CHUNKS_FILE)
+                if _vectors is not None and _vectors.live_count() != store.chunk_count():
+                    # Chunks stored without vectors (migrated, or a new embedder): embed
+                    # them here, once, rather than on the query path
+                    _vectors.rebuild(store.load_all())
+                _store, _index = store, index
+                _knowledge_base = kb
+    return _knowledge_base
+
+
+def get_chunk_store() -> ChunkStore:
+    """Get the shared chunk store."""
+    _open_knowledge_base()
+    return _store
+
+
+def get_document_index() -> InvertedIndex:
+    """Get the shared inverted index."""
+    _open_knowledge_base()
+    return _index
+
+
+def get_vector_store() -> Optional[VectorStore]:
+    """Get the shared vector store (None when numpy is not installed)."""
+    _open_knowledge_base()
+    return _vectors
+
+
+def _sync_index(all_chunks: Dict) -> InvertedIndex:
+    """Return the index, rebuilding it if it is out of step with the chunk store."""
+    index = get_document_index()
+    if index.chunk_count() != len(all_chunks):
+        index.rebuild(all_chunks)
+    return index
+
+
+@contextmanager
+def _mapped_file(file_path: str):
+    """Read-only memory map of a file (pages are shared with the OS cache, not copied)."""
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield io.BytesIO(b'')
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+
+def _trim_pdf_cache(reader):
+    """Drops parsed streams (page contents, images) from pypdf's object cache; they are re-read on demand."""
+    cache = getattr(reader, 'resolved_objects', None)
+    if cache:
+        from pypdf.generic import StreamObject
+        for key in [key for key, obj in cache.items() if isinstance(obj, StreamObject)]:
+            del cache[key]
+
+
+def _iter_pdf_range(reader, start: int, stop: int) -> Iterator[str]:
+    """Yields the text of pages [start, stop), keeping pypdf's cache to PDF_CACHE_PAGES pages."""
+    for i in range(start, stop):
+        yield reader.pages[i].extract_text() + "\n"
+        if (i + 1 - start) % PDF_CACHE_PAGES == 0:
+            _trim_pdf_cache(reader)
+
+
+def _extract_pdf_pages(file_path: str, start: int, stop: int) -> List[str]:
+    """Text of pages [start, stop) of a saved PDF; runs in page-extraction workers."""
+    import pypdf
+    with _mapped_file(file_path) as source:
+        return list(_iter_pdf_range(pypdf.PdfReader(source), start, stop))
+
+
+def _iter_pdf_pages(file_path: str, workers: int) -> Iterator[str]:
     """
-    Extract text from various file formats.
+    Yields a saved PDF's page texts in order, from a memory-mapped file.
+    Long PDFs fan page ranges out to worker processes.
+    """
+    import pypdf
+    with _mapped_file(file_path) as source:
+        reader = pypdf.PdfReader(source)
+        num_pages = len(reader.pages)
+        done = 0
+        if workers > 1 and num_pages >= PDF_PARALLEL_MIN_PAGES:
+            starts = list(range(0, num_pages, PDF_PAGE_BATCH))
+            stops = [min(start + PDF_PAGE_BATCH, num_pages) for start in starts]
+            try:
+                with ProcessPoolExecutor(max_workers=min(workers, len(starts)), mp_context=_ingest_context()) as pool:
+                    path = str(Path(file_path).resolve())
+                    for texts in pool.map(_extract_pdf_pages, [path] * len(starts), starts, stops):
+                        yield from texts
+                        done += len(texts)
+            except BrokenProcessPool:
+                pass  # extract the remaining pages here
+        yield from _iter_pdf_range(reader, done, num_pages)
+
+
+def iter_text_from_file(file_path: str, file_content: bytes = None, file_type: str = None,
+                        workers: int = 1) -> Iterator[str]:
+    """
+    Extract text from various file formats, one piece at a time.
+    
+    PDFs yield one string per page and Word documents one per paragraph;
+    saved files are memory-mapped (or, for Word, read from the zip on disk)
+    rather than loaded, so the whole text is never held at once.
     
     Args:
         file_path: Path to the file or filename
-        file_content: Raw file bytes (for uploaded files)
+        file_content: Raw file bytes (for uploaded files); read instead of the file
         file_type: File extension/type
+        workers: Processes for extracting a long PDF's pages in parallel
         
-    Returns:
-        Extracted text content
+    Yields:
+        Text pieces that concatenate to the document text, each ending at a line break
+        
+    Raises:
+        Whatever the parser raises for an unreadable file (e.g. a corrupt
+        PDF), part way through if earlier pages were readable; no error
+        text is ever yielded as document content
     """
     if file_type is None:
         file_type = Path(file_path).suffix.lower()
     
-    try:
-        # Plain text files
-        if file_type in ['.txt', '.md', '.csv']:
-            if file_content:
-                return file_content.decode('utf-8', errors='ignore')
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                return f.read()
-        
-        # PDF files
-        elif file_type == '.pdf':
-            try:
-                import pypdf
-                if file_content:
-                    import io
-                    pdf_file = io.BytesIO(file_content)
-                    reader = pypdf.PdfReader(pdf_file)
-                else:
-                    reader = pypdf.PdfReader(file_path)
-                
-                text = ""
-                for page in reader.pages:
-                    text += page.extract_text() + "\n"
-                return text
-            except ImportError:
-                return "[PDF support requires pypdf package. Install with: pip install pypdf]"
+    # PDF files
+    if file_type == '.pdf':
+        try:
+            import pypdf
+        except ImportError:
+            yield "[PDF support requires pypdf package. Install with: pip install pypdf]"
+            return
+        if file_content:
+            for page in pypdf.PdfReader(io.BytesIO(file_content)).pages:
+                yield page.extract_text() + "\n"
+            return
+        yield from _iter_pdf_pages(file_path, workers)
+    
+    # Word documents
+    elif file_type in ['.docx', '.doc']:
+        try:
+            import docx
+        except ImportError:
+            yield "[DOCX support requires python-docx package. Install with: pip install python-docx]"
+            return
+        doc = docx.Document(io.BytesIO(file_content) if file_content else file_path)
+        # Headings are kept as markdown so the chunker can split on them
+        for para in doc.paragraphs:
+            level = _docx_heading_level(para)
+            yield (f"{'#' * level} {para.text}" if level and para.text.strip() else para.text) + "\n"
+    
+    # Plain text files (and anything else, read as text)
+    else:
+        if file_content:
+            yield file_content.decode('utf-8', errors='ignore')
+            return
+        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+            while True:
+                lines = f.readlines(TEXT_READ_CHARS)
+                if not lines:
+                    break
+                yield ''.join(lines)
+
+
+def extract_text_from_file(file_path: str, file_content: bytes = None, file_type: str = None) -> str:
+    """
+    Extract text from various file formats.
+    
+    Args:
+        file_path: Path to the file or filename
+        file_content: Raw file bytes (for uploaded files)
+        file_type: File extension/type
         
-        # Word documents
-        elif file_type in ['.docx', '.doc']:
-            try:
-                import docx
-                if file_content:
-                    import io
-                    doc = docx.Document(io.BytesIO(file_content))
-                else:
-                    doc = docx.Document(file_path)
-                
-                text = ""
-                for para in doc.paragraphs:
-                    text += para.text + "\n"
-                return text
-            except ImportError:
-                return "[DOCX support requires python-docx package. Install with: pip install python-docx]"
+    Returns:
+        Extracted text content
         
-        else:
-            # Try to read as text
-            if file_content:
-                return file_content.decode('utf-8', errors='ignore')
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                return f.read()
-                
-    except Exception as e:
-        return f"[Error extracting text: {str(e)}]"
+    Raises:
+        The parser's exception if the file cannot be read
+    """
+    return ''.join(iter_text_from_file(file_path, file_content, file_type))
+
+
+def _docx_heading_level(paragraph) -> int:
+    """Heading level of a DOCX paragraph from its style ('Title' = 1, 'Heading 2' = 2), or 0."""
+    style = paragraph.style.name if paragraph.style is not None else ''
+    if style == 'Title':
+        return 1
+    match = re.match(r'Heading (\d)$', style)
+    return min(int(match.group(1)), 6) if match else 0
 
 
 def chunk_text(text: str, chunk_size: int = 250, overlap: int = 50) -> List[str]:
@@ -101,61 +263,9 @@ def chunk_text(text: str, chunk_size: int = 250, overlap: int = 50) -> List[str]
         overlap: Number of words to overlap between chunks
         
     Returns:
-        List of text chunks
+        List of text chunks (see chunker.chunk_document for tokens and sections)
     """
-    # Clean the text but preserve some structure
-    text = re.sub(r'\s+', ' ', text).strip()
-    
-    # Try to split on sentence boundaries for better chunks
-    sentences = re.split(r'(?<=[.!?])\s+', text)
-    
-    if not sentences:
-        return [text] if text else []
-    
-    chunks = []
-    current_chunk = []
-    current_word_count = 0
-    
-    for sentence in sentences:
-        sentence_words = sentence.split()
-        sentence_word_count = len(sentence_words)
-        
-        if current_word_count + sentence_word_count <= chunk_size:
-            current_chunk.append(sentence)
-            current_word_count += sentence_word_count
-        else:
-            # Save current chunk
-            if current_chunk:
-                chunks.append(' '.join(current_chunk))
-            
-            # Start new chunk with overlap
-            if chunks and overlap > 0:
-                # Get last few words from previous chunk for overlap
-                prev_words = chunks[-1].split()[-overlap:]
-                current_chunk = [' '.join(prev_words), sentence]
-                current_word_count = len(prev_words) + sentence_word_count
-            else:
-                current_chunk = [sentence]
-                current_word_count = sentence_word_count
-    
-    # Don't forget last chunk
-    if current_chunk:
-        chunks.append(' '.join(current_chunk))
-    
-    # If no chunks created, fall back to word-based chunking
-    if not chunks:
-        words = text.split()
-        if len(words) <= chunk_size:
-            return [text] if text else []
-        
-        start = 0
-        while start < len(words):
-            end = start + chunk_size
-            chunk = ' '.join(words[start:end])
-            chunks.append(chunk)
-            start = end - overlap
-    
-    return chunks
+    return [chunk.text for chunk in chunk_document(text, chunk_size, overlap)]
 
 
 def compute_file_hash(content: bytes) -> str:
@@ -163,22 +273,12 @@ def compute_file_hash(content: bytes) -> str:
     return hashlib.md5(content).hexdigest()
 
 
-def save_document(filename: str, content: bytes, metadata: Dict = None) -> Dict:
-    """
-    Save an uploaded document and extract its text chunks.
-    
-    Args:
-        filename: Original filename
-        content: File content as bytes
-        metadata: Optional metadata (category, description, etc.)
-        
-    Returns:
-        Document info dict with id, chunks count, etc.
-    """
+def _write_raw_file(filename: str, content: bytes, file_hash: str = None) -> Tuple[str, str, Path]:
+    """Saves the uploaded bytes; returns (doc_id, file extension, path)."""
     ensure_documents_dir()
     
     # Generate unique ID
-    file_hash = compute_file_hash(content)
+    file_hash = file_hash or compute_file_hash(content)
     file_ext = Path(filename).suffix.lower()
     
     # Save the raw file
@@ -187,17 +287,35 @@ def save_document(filename: str, content: bytes, metadata: Dict = None) -> Dict:
     
     with open(file_path, 'wb') as f:
         f.write(content)
+    return file_hash, file_ext, file_path
+
+
+def _extract_chunks(file_path: str, file_ext: str, workers: int = 1) -> Tuple[int, List[Chunk]]:
+    """
+    Extracts and chunks one saved file; returns (total_chars, chunks).
+    Pages/paragraphs stream straight into the chunker, so the full text is
+    never built. Runs in ingestion worker processes, so it only reads the
+    file from disk.
+    """
+    total_chars = 0
     
-    # Extract text
-    text = extract_text_from_file(str(file_path), content, file_ext)
-    
-    # Create chunks
-    chunks = chunk_text(text)
-    
-    # Load existing chunks database
-    all_chunks = load_all_chunks()
+    def counted(parts):
+        nonlocal total_chars
+        for part in parts:
+            total_chars += len(part)
+            yield part
     
-    # Add new document chunks
+    chunks = list(iter_chunks(counted(iter_text_from_file(file_path, None, file_ext, workers))))
+    return total_chars, chunks
+
+
+def _document_records(file_hash: str, filename: str, file_path: Path, file_ext: str, metadata: Optional[Dict],
+                      total_chars: int, chunks: List[Chunk]) -> Tuple[Dict, Dict]:
+    """
+    Builds the doc_info and chunk records stored for one document.
+    Records carry the chunker's tokens and term frequencies for indexing,
+    and the regex features keyword search scores (chunk_features).
+    """
     doc_info = {
         'id': file_hash,
         'filename': filename,
@@ -205,41 +323,345 @@ def save_document(filename: str, content: bytes, metadata: Dict = None) -> Dict:
         'file_type': file_ext,
         'metadata': metadata or {},
         'chunk_count': len(chunks),
-        'total_chars': len(text)
+        'total_chars': total_chars
     }
     
     # Store chunks with document reference
+    new_chunks = {}
     for i, chunk in enumerate(chunks):
         chunk_id = f"{file_hash}_{i}"
-        all_chunks[chunk_id] = {
+        chunk_metadata = dict(metadata or {})
+        if chunk.section:
+            chunk_metadata['section'] = chunk.section
+        new_chunks[chunk_id] = {
             'doc_id': file_hash,
             'doc_name': filename,
             'chunk_index': i,
-            'text': chunk,
-            'metadata': metadata or {}
+            'text': chunk.text,
+            'tokens': chunk.tokens,
+            'term_freqs': chunk.term_freqs,
+            'features': chunk_features(chunk.text),
+            'metadata': chunk_metadata
         }
+    return doc_info, new_chunks
+
+
+def _registered_uploads(files: List[Tuple[str, bytes]], metadata: Optional[Dict]) -> Tuple[List[str], Dict[int, Dict]]:
+    """
+    Looks uploads up in the document registry by content hash.
     
-    # Save chunks database
-    save_all_chunks(all_chunks)
+    Content that is already stored is not written, extracted or indexed
+    again. Under its stored filename it is 'unchanged' (a new category is
+    applied to the stored copy in place); under another filename the upload
+    is rejected as a 'duplicate' and the stored document, filename
+    included, is left as it is.
     
-    return doc_info
+    Returns:
+        (content hash per file, {position in `files`: document info} for stored
+        content, with 'status' 'unchanged' or 'duplicate')
+    """
+    hashes = [compute_file_hash(content) for _, content in files]
+    store = get_chunk_store()
+    registered = store.find_documents(set(hashes))
+    results = {}
+    for position, ((filename, _), file_hash) in enumerate(zip(files, hashes)):
+        doc = registered.get(file_hash)
+        if doc is None:
+            continue
+        if doc['filename'] != filename:
+            results[position] = {**doc, 'status': 'duplicate'}
+            continue
+        if doc['metadata'] != (metadata or {}):
+            store.update_document_info(file_hash, filename, metadata or {})
+            doc = registered[file_hash] = {**doc, 'metadata': metadata or {}}
+        results[position] = {**doc, 'status': 'unchanged'}
+    return hashes, results
 
 
-def load_all_chunks() -> Dict:
-    """Load all document chunks from storage."""
-    if CHUNKS_FILE.exists():
+def _remove_raw_files(doc_id: str):
+    """Deletes a document's saved upload(s) from DOCUMENTS_DIR."""
+    for file in DOCUMENTS_DIR.glob(f"{doc_id}_*"):
         try:
-            with open(CHUNKS_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            file.unlink()
         except:
-            return {}
-    return {}
+            pass
+
+
+def _supersede_documents(filename: str, doc_id: str) -> List[str]:
+    """
+    Removes the chunks, postings and vectors of stored documents named
+    `filename` other than `doc_id` (call inside a knowledge-base transaction).
+    
+    Returns:
+        IDs of the documents removed; their raw files are left to the caller
+    """
+    previous = [other for other in get_chunk_store().documents_named(filename) if other != doc_id]
+    for other in previous:
+        get_chunk_store().delete_document(other)
+        get_document_index().remove_document(other)
+        if get_vector_store() is not None:
+            get_vector_store().delete_document(other)
+    return previous
+
+
+def _store_documents(documents: List[Tuple[Dict, Dict]]):
+    """
+    Stores documents' chunks, index entries and embeddings in one transaction.
+    A document uploaded under the filename of a stored one with different
+    content is a new version: the old version's chunks, postings and vectors
+    are removed, and doc_info gets 'version' and 'status' ('added' or 'updated').
+    """
+    kb = _open_knowledge_base()
+    replaced = []
+    with kb.transaction():
+        for doc_info, new_chunks in documents:
+            # Numbered before the old version is removed: its row may predate the history table
+            doc_info['version'] = get_chunk_store().record_version(
+                doc_info['filename'], doc_info['id'], doc_info['chunk_count'], doc_info['total_chars'])
+            previous = _supersede_documents(doc_info['filename'], doc_info['id'])
+            replaced.extend(previous)
+            doc_info['status'] = 'updated' if previous else 'added'
+            get_chunk_store().add_document(doc_info, new_chunks)
+            get_document_index().remove_document(doc_info['id'])
+            get_document_index().add_chunks(new_chunks)
+            if get_vector_store() is not None:
+                # Embeddings are computed once, at upload time
+                get_vector_store().delete_document(doc_info['id'])
+                get_vector_store().add_chunks(new_chunks)
+    
+    if get_vector_store() is not None:
+        get_vector_store().maybe_build_ivf()
+    for doc_id in replaced:
+        _remove_raw_files(doc_id)
+
+
+def save_document(filename: str, content: bytes, metadata: Dict = None) -> Dict:
+    """
+    Save an uploaded document and extract its text chunks.
+    
+    Args:
+        filename: Original filename
+        content: File content as bytes
+        metadata: Optional metadata (category, description, etc.)
+        
+    Returns:
+        Document info dict with id, chunks count, version, etc., and
+        'status': 'added', 'updated' (new version of the filename),
+        'unchanged' (identical content was already stored under this
+        filename) or 'duplicate' (the content is stored under the returned
+        document's filename; nothing was saved)
+        
+    Raises:
+        The parser's exception if the file cannot be read; nothing is stored
+    """
+    hashes, registered = _registered_uploads([(filename, content)], metadata)
+    if registered:
+        return registered[0]
+    file_hash, file_ext, file_path = _write_raw_file(filename, content, hashes[0])
+    
+    # Extract text from the saved file and chunk it as it streams. In-process
+    # only: a single upload never starts worker processes (see ingest_documents)
+    try:
+        total_chars, chunks = _extract_chunks(str(file_path), file_ext)
+    except Exception:
+        _remove_raw_files(file_hash)
+        raise
+    
+    doc_info, new_chunks = _document_records(file_hash, filename, file_path, file_ext, metadata,
+                                             total_chars, chunks)
+    _store_documents([(doc_info, new_chunks)])
+    return doc_info
+
+
+def _ingest_context():
+    """
+    Start method for ingestion workers. forkserver/spawn children start clean;
+    forking the multi-threaded Streamlit server could copy a held lock.
+    """
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')
+    context = multiprocessing.get_context('forkserver')
+    # Workers fork from a server that has already imported this module (and numpy)
+    context.set_forkserver_preload([__name__])
+    return context
+
+
+def ingest_documents(files: List[Tuple[str, bytes]], metadata: Dict = None, max_workers: int = None,
+                     progress: Callable[[int, int, Dict], None] = None) -> List[Dict]:
+    """
+    Save a batch of uploaded documents.
+    
+    Content already in the knowledge base (same hash) is not written or
+    extracted again; it is reported as 'unchanged', or as 'duplicate' when
+    uploaded under another filename. Raw files of the
+    rest are written first; text extraction and chunking (pypdf is
+    CPU-bound) then fan out across a process pool, and all documents are
+    stored in a single knowledge-base transaction at the end.
+    
+    Args:
+        files: (filename, content bytes) pairs
+        metadata: Metadata applied to every document (category, etc.)
+        max_workers: Worker processes (default HR_INGEST_WORKERS, or the CPU count);
+            batches under INGEST_POOL_MIN_BYTES are extracted in-process, where
+            a PDF of PDF_PARALLEL_MIN_PAGES or more still splits its pages
+            across this many processes
+        progress: Optional callback(done, total, result), called as each file
+            finishes extracting, with that file's entry of the return value
+        
+    Returns:
+        One dict per input file, in order: the document info (as from
+        save_document, with 'status'), or {'filename', 'error'} if the file failed
+    """
+    results: List[Optional[Dict]] = [None] * len(files)
+    total = len(files)
+    done = 0
+    hashes, registered = _registered_uploads(files, metadata)
+    for position, result in registered.items():
+        results[position] = result
+        done += 1
+        if progress:
+            progress(done, total, result)
+    
+    jobs = {}  # doc_id -> (filename, path, extension, positions in `files`)
+    batch_bytes = 0
+    for position, (filename, content) in enumerate(files):
+        if position in registered:
+            continue
+        try:
+            file_hash, file_ext, file_path = _write_raw_file(filename, content, hashes[position])
+        except Exception as e:
+            results[position] = {'filename': filename, 'error': str(e)}
+            done += 1
+            if progress:
+                progress(done, total, results[position])
+            continue
+        if file_hash in jobs:
+            # The same bytes twice in one batch: extract once, report for both
+            # (a different filename is a duplicate, as for stored content)
+            jobs[file_hash][3].append(position)
+        else:
+            jobs[file_hash] = (filename, file_path, file_ext, [position])
+            batch_bytes += len(content)
+    
+    documents = []
+    
+    def finish(file_hash, outcome):
+        nonlocal done
+        filename, file_path, file_ext, positions = jobs[file_hash]
+        if isinstance(outcome, Exception):
+            result = {'filename': filename, 'error': str(outcome)}
+            _remove_raw_files(file_hash)
+        else:
+            result, new_chunks = _document_records(file_hash, filename, file_path, file_ext, metadata, *outcome)
+            documents.append((result, new_chunks))
+        for position in positions:
+            if files[position][0] != filename and 'error' not in result:
+                results[position] = {**result, 'status': 'duplicate'}
+            else:
+                results[position] = result
+            done += 1
+            if progress:
+                progress(done, total, result)
+    
+    pending = set(jobs)
+    workers = min(max_workers or INGEST_WORKERS, len(jobs))
+    if workers > 1 and batch_bytes >= INGEST_POOL_MIN_BYTES:
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=_ingest_context()) as pool:
+                # Absolute paths: workers may not share this process's working directory
+                futures = {pool.submit(_extract_chunks, str(Path(file_path).resolve()), file_ext): file_hash
+                           for file_hash, (_, file_path, file_ext, _) in jobs.items()}
+                for future in as_completed(futures):
+                    try:
+                        outcome = future.result()
+                    except BrokenProcessPool:
+                        raise
+                    except Exception as e:
+                        outcome = e
+                    pending.discard(futures[future])
+                    finish(futures[future], outcome)
+        except BrokenProcessPool:
+            # Workers failed to start or died (e.g. killed for memory): finish the rest here
+            pass
+    
+    for file_hash in [file_hash for file_hash in jobs if file_hash in pending]:
+        _, file_path, file_ext, _ = jobs[file_hash]
+        try:
+            # In-process: a long PDF can still spread its pages over worker processes
+            outcome = _extract_chunks(str(file_path), file_ext, max_workers or INGEST_WORKERS)
+        except Exception as e:
+            outcome = e
+        finish(file_hash, outcome)
+    
+    if documents:
+        _store_documents(documents)
+    return results
+
+
+# Process-wide cache of the parsed chunk store, shared by all sessions
+_chunk_cache = {'generation': None, 'chunks': {}}
+_chunk_cache_stats = {'hits': 0, 'misses': 0}
+_chunk_cache_lock = threading.Lock()
+
+
+def load_all_chunks() -> Dict:
+    """
+    Load all document chunks from storage.
+    Served from an in-process cache until the store changes; treat the
+    returned dict as read-only.
+    """
+    store = get_chunk_store()
+    with _chunk_cache_lock:
+        generation = store.generation()
+        if _chunk_cache['generation'] == generation:
+            _chunk_cache_stats['hits'] += 1
+            return _chunk_cache['chunks']
+        _chunk_cache_stats['misses'] += 1
+        chunks = store.load_all()
+        _chunk_cache['generation'] = generation
+        _chunk_cache['chunks'] = chunks
+        return chunks
+
+
+def get_chunk_cache_stats() -> Dict:
+    """Hit/miss counters for the chunk cache."""
+    with _chunk_cache_lock:
+        lookups = _chunk_cache_stats['hits'] + _chunk_cache_stats['misses']
+        return {
+            **_chunk_cache_stats,
+            'hit_rate': round(_chunk_cache_stats['hits'] / lookups, 3) if lookups else 0.0,
+            'cached_chunks': len(_chunk_cache['chunks']),
+        }
 
 
 def save_all_chunks(chunks: Dict):
-    """Save all document chunks to storage."""
-    with open(CHUNKS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(chunks, f, indent=2, ensure_ascii=False)
+    """Replace all document chunks in storage (and re-index them)."""
+    kb = _open_knowledge_base()
+    with kb.transaction():
+        get_chunk_store().replace_all(chunks)
+        get_document_index().rebuild(chunks)
+        if get_vector_store() is not None:
+            get_vector_store().rebuild(chunks)
+
+
+def compact_knowledge_base(force: bool = False) -> bool:
+    """
+    Reclaim space left behind by deleted and replaced documents.
+    
+    A maintenance call (the Documents page runs it on request): VACUUM
+    rewrites the whole database and blocks uploads and deletes meanwhile,
+    so deletes only tombstone and never compact.
+    
+    Args:
+        force: Compact even if little space would be reclaimed
+        
+    Returns:
+        True if the knowledge base was compacted
+    """
+    compacted = get_chunk_store().compact(force=force)
+    if compacted and get_vector_store() is not None:
+        get_vector_store().compact()
+    return compacted
 
 
 def delete_document(doc_id: str) -> bool:
@@ -252,44 +674,22 @@ def delete_document(doc_id: str) -> bool:
     Returns:
         True if deleted successfully
     """
-    all_chunks = load_all_chunks()
-    
-    # Find and remove chunks belonging to this document
-    chunks_to_remove = [cid for cid, chunk in all_chunks.items() if chunk['doc_id'] == doc_id]
-    
-    for chunk_id in chunks_to_remove:
-        del all_chunks[chunk_id]
-    
-    save_all_chunks(all_chunks)
+    kb = _open_knowledge_base()
+    with kb.transaction():
+        removed = get_chunk_store().delete_document(doc_id)
+        get_document_index().remove_document(doc_id)
+        if get_vector_store() is not None:
+            get_vector_store().delete_document(doc_id)
     
     # Try to remove the file
-    for file in DOCUMENTS_DIR.glob(f"{doc_id}_*"):
-        try:
-            file.unlink()
-        except:
-            pass
+    _remove_raw_files(doc_id)
     
-    return len(chunks_to_remove) > 0
+    return removed > 0
 
 
 def get_all_documents() -> List[Dict]:
     """Get list of all uploaded documents."""
-    all_chunks = load_all_chunks()
-    
-    # Group by document
-    docs = {}
-    for chunk_id, chunk in all_chunks.items():
-        doc_id = chunk['doc_id']
-        if doc_id not in docs:
-            docs[doc_id] = {
-                'id': doc_id,
-                'filename': chunk['doc_name'],
-                'chunk_count': 0,
-                'metadata': chunk.get('metadata', {})
-            }
-        docs[doc_id]['chunk_count'] += 1
-    
-    return list(docs.values())
+    return get_chunk_store().list_documents()
 
 
 # Synonym mappings for HR domain
@@ -337,6 +737,10 @@ STOPWORDS = {
 }
 
 
+# Compiled once: bidirectional term -> expansion weights (plus HR_THESAURUS files)
+SYNONYM_TABLE = build_synonym_table(HR_SYNONYMS)
+
+
 def expand_query_with_synonyms(query: str) -> set:
     """
     Expand query terms with synonyms for better recall.
@@ -346,33 +750,266 @@ def expand_query_with_synonyms(query: str) -> set:
         query: Original search query
         
     Returns:
-        Set of expanded query terms
+        Set of expanded query terms (multi-word synonyms as space-joined phrases)
+    """
+    tokens = tokenize(query)
+    expansions, query_phrases = SYNONYM_TABLE.expand(tokens, STOPWORDS)
+    return (set(tokens) - STOPWORDS) | set(expansions) | set(query_phrases)
+
+
+# Compensation patterns used to boost salary-related chunks
+DOLLAR_PATTERN = re.compile(r'\$[\d,]+(?:\.\d{2})?(?:\s*[-–]\s*\$[\d,]+(?:\.\d{2})?)?(?:\s*(?:per|\/)\s*(?:hour|hr|year|yr|month|mo|week|wk))?')
+SALARY_PATTERNS = [
+    re.compile(r'\d+k\s*[-–]\s*\d+k', re.IGNORECASE),  # 50k-60k
+    re.compile(r'\d{2,3},\d{3}', re.IGNORECASE),  # 50,000
+    re.compile(r'(?:salary|pay|hourly|rate|compensation).*?\d+', re.IGNORECASE),  # salary of 50000
+]
+COMPENSATION_TERMS = ['compensation', 'salary', 'pay', 'wage']
+
+
+def chunk_features(text: str) -> Dict:
+    """
+    Regex features of a chunk for the compensation boost, computed once at
+    ingest and stored with the chunk.
+    
+    Returns:
+        {'dollar_amounts': dollar amounts found, 'salary_patterns': number of SALARY_PATTERNS matching}
+    """
+    text = text.lower()
+    return {
+        'dollar_amounts': DOLLAR_PATTERN.findall(text),
+        'salary_patterns': sum(1 for pattern in SALARY_PATTERNS if pattern.search(text)),
+    }
+
+
+def _features_of(chunk: Dict) -> Dict:
+    """Stored features of a chunk record (computed now for chunks stored before features existed)."""
+    return chunk.get('features') or chunk_features(chunk['text'])
+
+
+def _compensation_score(features: Dict) -> float:
+    return len(features['dollar_amounts']) * 10 + features['salary_patterns'] * 5
+
+
+def _query_term_weights(query: str) -> Tuple[Dict[str, float], Dict[str, float], set]:
+    """
+    Weighted query terms: original words count 3x a direct synonym (6x a
+    sibling synonym), longer terms a bit more.
+    
+    Returns:
+        (word -> weight, phrase -> weight for multi-word terms, original words)
+    """
+    tokens = tokenize(query)
+    original_words = set(tokens) - STOPWORDS
+    expansions, query_phrases = SYNONYM_TABLE.expand(tokens, STOPWORDS)
+    expansions.update({word: 3.0 for word in original_words})
+    expansions.update({phrase: 3.0 for phrase in query_phrases})
+    
+    weights, phrase_weights = {}, {}
+    for term, weight in expansions.items():
+        if ' ' in term:
+            phrase_weights[term] = weight * (1 + len(term) / 10)
+        elif term not in STOPWORDS:
+            weights[term] = weight * (1 + len(term) / 10)
+    return weights, phrase_weights, original_words
+
+
+def _phrase_counts(all_chunks: Dict, phrase: str, candidates: Iterable[str]) -> Dict[str, int]:
+    """Chunk ID -> occurrences of a phrase, checked only in the candidate chunks."""
+    pattern = phrase_pattern(phrase)
+    counts = {}
+    for chunk_id in candidates:
+        chunk = all_chunks.get(chunk_id)
+        count = len(pattern.findall(chunk['text'].lower())) if chunk else 0
+        if count:
+            counts[chunk_id] = count
+    return counts
+
+
+def _phrase_postings(index: InvertedIndex, all_chunks: Dict, phrases: List[str]) -> Dict[str, Dict[str, int]]:
     """
-    query_lower = query.lower()
-    query_words = set(re.findall(r'\b\w+\b', query_lower))
+    Phrase -> {chunk_id: occurrences}. Candidates are chunks holding every
+    word of the phrase (from the index); only those are checked for the words
+    appearing next to each other.
+    """
+    postings = index.postings_for_terms({word for phrase in phrases for word in phrase.split()})
+    result = {}
+    for phrase in phrases:
+        words = phrase.split()
+        candidates = set(postings[words[0]]).intersection(*(postings[word] for word in words[1:]))
+        result[phrase] = _phrase_counts(all_chunks, phrase, candidates)
+    return result
+
+
+# Largest factor the proximity boost multiplies a score by
+PROXIMITY_MAX_BOOST = 3
+
+
+def _proximity_boost(text: str, query_phrase: str, word_patterns: List[re.Pattern]) -> float:
+    """
+    Score factor for query words appearing close together in a chunk's
+    lower-cased text (word_patterns: the query's original words, escaped).
+    """
+    if query_phrase in text:
+        return PROXIMITY_MAX_BOOST  # Strong boost for exact phrase
+    # Check for words appearing within 50 chars of each other
+    positions = sorted(match.start() for pattern in word_patterns for match in pattern.finditer(text))
+    if any(b - a < 50 for a, b in zip(positions, positions[1:])):
+        return 1.5
+    return 1
+
+
+_scorer_cache = {'generation': None, 'scorer': None}
+_scorer_lock = threading.Lock()
+
+
+def _keyword_scorer(index: InvertedIndex, all_chunks: Dict) -> Optional[KeywordScorer]:
+    """
+    The vectorized scorer for the current index (None without numpy), with
+    its compensation-boost array. Rebuilt when the store or index changes.
+    """
+    if not SCORER_AVAILABLE:
+        return None
+    with _scorer_lock:
+        generation = (get_chunk_store().generation(), index.generation())
+        if _scorer_cache['generation'] != generation:
+            scorer = KeywordScorer.from_index(index)
+            scorer.boosts['compensation'] = scorer.column_values({
+                chunk_id: _compensation_score(_features_of(chunk)) for chunk_id, chunk in all_chunks.items()})
+            _scorer_cache['scorer'] = scorer
+            _scorer_cache['generation'] = generation
+        return _scorer_cache['scorer']
+
+
+def _rank_vectorized(scorer: KeywordScorer, all_chunks: Dict, query: str, term_weights: Dict[str, float],
+                     phrase_weights: Dict[str, float], original_words: set,
+                     top_k: int) -> List[Tuple[str, float, List[str]]]:
+    """
+    simple_search ranking over the scorer's arrays: every chunk is scored at
+    once, top-k is picked with argpartition, and match labels are worked out
+    for the returned chunks only.
+    """
+    scores = scorer.term_scores(term_weights)
+    
+    phrase_columns = {}
+    for phrase in sorted(phrase_weights):
+        counts = _phrase_counts(all_chunks, phrase, scorer.chunks_with_all(phrase.split()))
+        columns, phrase_scores = scorer.bm25(counts)
+        scores[columns] += phrase_scores * phrase_weights[phrase]
+        phrase_columns[phrase] = set(columns.tolist())
     
-    # Remove stopwords
-    query_words = query_words - STOPWORDS
+    # Partial matches for longer words, only in chunks without the exact word
+    partial_words = []
+    for word in sorted(term_weights):
+        related = scorer.related_terms(word) if len(word) > 3 else []
+        if not related:
+            continue
+        weight = 1.5 if word in original_words else 0.5
+        scores[scorer.mask(related) & ~scorer.mask([word])] += weight
+        partial_words.append((word, related))
     
-    expanded = set(query_words)
+    compensation = any(w in original_words for w in COMPENSATION_TERMS)
+    if compensation:
+        scores += scorer.boosts['compensation']
     
-    # Add synonyms
-    for word in list(query_words):
-        if word in HR_SYNONYMS:
-            expanded.update(HR_SYNONYMS[word])
-        # Also check if any synonym maps to this word
-        for key, synonyms in HR_SYNONYMS.items():
-            if word in synonyms:
-                expanded.add(key)
-                expanded.update(synonyms)
+    # Only chunks that can still reach the top k are checked for proximity
+    if len(original_words) > 1:
+        query_phrase = query.lower()
+        word_patterns = [re.compile(re.escape(word)) for word in original_words]
+        
+        def boost(column):
+            chunk = all_chunks.get(scorer.chunk_ids[column])
+            return _proximity_boost(chunk['text'].lower(), query_phrase, word_patterns) if chunk else 1
+        
+        scorer.apply_boosts(scores, top_k, PROXIMITY_MAX_BOOST, boost)
+    
+    ranked = []
+    for column in scorer.top_k(scores, top_k):
+        chunk_id = scorer.chunk_ids[column]
+        chunk = all_chunks.get(chunk_id)
+        if chunk is None:
+            continue
+        matches = [word for word in sorted(term_weights) if scorer.contains(word, column)]
+        matches += [phrase for phrase in sorted(phrase_weights) if column in phrase_columns[phrase]]
+        for word, related in partial_words:
+            if not scorer.contains(word, column):
+                text_word = next((term for term in related if scorer.contains(term, column)), None)
+                if text_word:
+                    matches.append(f"{word}~{text_word}")
+        if compensation:
+            matches += _features_of(chunk)['dollar_amounts']
+        ranked.append((chunk_id, float(scores[column]), matches))
+    return ranked
+
+
+def _rank_with_index(index: InvertedIndex, all_chunks: Dict, query: str, term_weights: Dict[str, float],
+                     phrase_weights: Dict[str, float], original_words: set,
+                     top_k: int) -> List[Tuple[str, float, List[str]]]:
+    """simple_search ranking straight from the index's postings (used when numpy is unavailable)."""
+    scores = {}
+    matches = {}
+    
+    # Exact term matches, scored with BM25
+    postings = index.postings_for_terms(term_weights)
+    for word in sorted(term_weights):
+        for chunk_id, term_score in index.bm25_scores(word, postings[word]).items():
+            scores[chunk_id] = scores.get(chunk_id, 0) + term_score * term_weights[word]
+            matches.setdefault(chunk_id, []).append(word)
+    
+    # Multi-word terms ('time off'), scored with BM25 as one term where the words are adjacent
+    if phrase_weights:
+        phrase_postings = _phrase_postings(index, all_chunks, sorted(phrase_weights))
+        for phrase in sorted(phrase_weights):
+            for chunk_id, term_score in index.bm25_scores(phrase, phrase_postings[phrase]).items():
+                scores[chunk_id] = scores.get(chunk_id, 0) + term_score * phrase_weights[phrase]
+                matches.setdefault(chunk_id, []).append(phrase)
+    
+    # Partial matches for longer words, only in chunks without the exact word
+    for word in sorted(term_weights):
+        if len(word) <= 3:
+            continue
+        related = index.related_terms(word)
+        if not related:
+            continue
+        weight = 1.5 if word in original_words else 0.5
+        credited = set(postings[word])
+        for text_word, related_postings in index.postings_for_terms(related).items():
+            for chunk_id in related_postings:
+                if chunk_id in credited:
+                    continue
+                credited.add(chunk_id)
+                scores[chunk_id] = scores.get(chunk_id, 0) + weight
+                matches.setdefault(chunk_id, []).append(f"{word}~{text_word}")
+    
+    # Special patterns for compensation/salary info (these can match any chunk)
+    if any(w in original_words for w in COMPENSATION_TERMS):
+        for chunk_id, chunk in all_chunks.items():
+            features = _features_of(chunk)
+            bonus = _compensation_score(features)
+            if bonus:
+                scores[chunk_id] = scores.get(chunk_id, 0) + bonus
+                matches.setdefault(chunk_id, []).extend(features['dollar_amounts'])
     
-    return expanded
+    # Boost if query words appear close together (phrase matching)
+    if len(original_words) > 1:
+        query_phrase = query.lower()
+        word_patterns = [re.compile(re.escape(word)) for word in original_words]
+        for chunk_id in list(scores):
+            if chunk_id in all_chunks:
+                scores[chunk_id] *= _proximity_boost(all_chunks[chunk_id]['text'].lower(), query_phrase, word_patterns)
+    
+    ranked = [(chunk_id, score, matches.get(chunk_id, []))
+              for chunk_id, score in scores.items() if chunk_id in all_chunks and score > 0]
+    ranked.sort(key=lambda x: x[1], reverse=True)
+    return ranked[:top_k]
 
 
 def simple_search(query: str, top_k: int = 5) -> List[Dict]:
     """
     Robust keyword-based search through document chunks with synonym expansion.
-    Uses enhanced TF-IDF-like scoring for better relevance.
+    Chunks are ranked with BM25, weighted by the synonym/original-word weights,
+    plus compensation and phrase boosts; with numpy installed every chunk is
+    scored at once by a KeywordScorer over the in-memory index.
     
     Args:
         query: Search query
@@ -386,127 +1023,161 @@ def simple_search(query: str, top_k: int = 5) -> List[Dict]:
     if not all_chunks:
         return []
     
+    index = _sync_index(all_chunks)
+    
     # Expand query with synonyms
-    query_words = expand_query_with_synonyms(query)
-    original_words = set(re.findall(r'\b\w+\b', query.lower())) - STOPWORDS
+    term_weights, phrase_weights, original_words = _query_term_weights(query)
+    
+    scorer = _keyword_scorer(index, all_chunks)
+    if scorer is not None:
+        ranked = _rank_vectorized(scorer, all_chunks, query, term_weights, phrase_weights, original_words, top_k)
+    else:
+        ranked = _rank_with_index(index, all_chunks, query, term_weights, phrase_weights, original_words, top_k)
     
     results = []
-    for chunk_id, chunk in all_chunks.items():
-        text = chunk['text'].lower()
-        text_words = set(re.findall(r'\b\w+\b', text))
-        
-        # Calculate relevance score
-        score = 0
-        matches = []
-        
-        for word in query_words:
-            # Skip stopwords
-            if word in STOPWORDS:
-                continue
-            # Check both exact word and partial matches
-            if word in text_words:
-                # Higher weight for original query words
-                weight = 3.0 if word in original_words else 1.0
-                # Longer words get higher weight
-                weight *= (1 + len(word) / 10)
-                # Count occurrences
-                count = text.count(word)
-                word_score = count * weight
-                score += word_score
-                matches.append(word)
-            elif len(word) > 3:
-                # Partial match for longer words
-                for text_word in text_words:
-                    if word in text_word or text_word in word:
-                        weight = 1.5 if word in original_words else 0.5
-                        score += weight
-                        matches.append(f"{word}~{text_word}")
-                        break
-        
-        # Special patterns for compensation/salary info
-        if any(w in original_words for w in ['compensation', 'salary', 'pay', 'wage']):
-            # Look for dollar amounts
-            dollar_pattern = r'\$[\d,]+(?:\.\d{2})?(?:\s*[-–]\s*\$[\d,]+(?:\.\d{2})?)?(?:\s*(?:per|\/)\s*(?:hour|hr|year|yr|month|mo|week|wk))?'
-            dollar_matches = re.findall(dollar_pattern, text)
-            if dollar_matches:
-                score += len(dollar_matches) * 10
-                matches.extend(dollar_matches)
-            
-            # Look for salary range patterns
-            salary_patterns = [
-                r'\d+k\s*[-–]\s*\d+k',  # 50k-60k
-                r'\d{2,3},\d{3}',  # 50,000
-                r'(?:salary|pay|hourly|rate|compensation).*?\d+',  # salary of 50000
-            ]
-            for pattern in salary_patterns:
-                if re.search(pattern, text, re.IGNORECASE):
-                    score += 5
-        
-        # Boost if query words appear close together (phrase matching)
-        if len(original_words) > 1:
-            query_phrase = query.lower()
-            if query_phrase in text:
-                score *= 3  # Strong boost for exact phrase
-            else:
-                # Check for words appearing within 50 chars of each other
-                positions = []
-                for word in original_words:
-                    for match in re.finditer(re.escape(word), text):
-                        positions.append(match.start())
-                if len(positions) >= 2:
-                    positions.sort()
-                    for i in range(len(positions) - 1):
-                        if positions[i+1] - positions[i] < 50:
-                            score *= 1.5
-                            break
+    for chunk_id, score, matches in ranked:
+        chunk = all_chunks[chunk_id]
+        results.append({
+            'chunk_id': chunk_id,
+            'doc_id': chunk['doc_id'],
+            'doc_name': chunk['doc_name'],
+            'text': chunk['text'],
+            'score': score,
+            'matches': matches[:10],  # Include what matched
+            'metadata': chunk.get('metadata', {})
+        })
+    return results
+
+
+# Reciprocal rank fusion constant (higher = flatter blend of the two rankings)
+RRF_K = 60
+
+
+def vector_search(query: str, top_k: int = 5) -> List[Dict]:
+    """
+    Embedding-based search over all chunks (cosine similarity).
+    
+    Args:
+        query: Search query
+        top_k: Number of results to return
         
-        if score > 0:
-            results.append({
-                'chunk_id': chunk_id,
-                'doc_id': chunk['doc_id'],
-                'doc_name': chunk['doc_name'],
-                'text': chunk['text'],
-                'score': score,
-                'matches': matches[:10],  # Include what matched
-                'metadata': chunk.get('metadata', {})
-            })
+    Returns:
+        List of chunks with 'vector_score' similarity
+    """
+    all_chunks = load_all_chunks()
+    vectors = get_vector_store() if all_chunks else None
+    if vectors is None:
+        return []
     
-    # Sort by score descending
-    results.sort(key=lambda x: x['score'], reverse=True)
+    results = []
+    for chunk_id, similarity in vectors.search(query, top_k=top_k):
+        chunk = all_chunks.get(chunk_id)
+        if chunk is None or similarity <= 0:
+            continue
+        results.append({
+            'chunk_id': chunk_id,
+            'doc_id': chunk['doc_id'],
+            'doc_name': chunk['doc_name'],
+            'text': chunk['text'],
+            'score': similarity,
+            'vector_score': similarity,
+            'matches': [],
+            'metadata': chunk.get('metadata', {})
+        })
+    return results
+
+
+def fuse_results(keyword_results: List[Dict], vector_results: List[Dict], top_k: int = 5) -> List[Dict]:
+    """
+    Blend keyword and vector rankings with reciprocal rank fusion.
+    Keyword scores are kept in 'score'; the blend is in 'fusion_score'.
+    """
+    fused = {}
+    for rank, result in enumerate(keyword_results):
+        entry = fused.setdefault(result['chunk_id'], dict(result))
+        entry['fusion_score'] = entry.get('fusion_score', 0) + 1 / (RRF_K + rank + 1)
+    for rank, result in enumerate(vector_results):
+        entry = fused.get(result['chunk_id'])
+        if entry is None:
+            entry = fused[result['chunk_id']] = dict(result)
+        else:
+            entry['vector_score'] = result['vector_score']
+        entry['fusion_score'] = entry.get('fusion_score', 0) + 1 / (RRF_K + rank + 1)
     
-    return results[:top_k]
+    ranked = sorted(fused.values(), key=lambda r: r['fusion_score'], reverse=True)
+    return ranked[:top_k]
 
 
-def semantic_search_with_gemini(query: str, top_k: int = 5) -> List[Dict]:
+class RetrievalContext:
     """
-    Use Gemini to find the most relevant chunks for a query.
-    This is a simple but effective approach without embeddings.
+    Request-scoped document retrieval for one question.
+    
+    The keyword and vector searches each run once, at the deepest top_k any
+    step needs, and classification, context assembly and source attribution
+    all slice those result lists.
+    """
+    
+    SEARCH_DEPTH = 20
+    
+    def __init__(self, query: str):
+        self.query = query
+        self.search_count = 0
+        self._results = None
+        self._depth = 0
+        self._vector_results = None
+    
+    def results(self, top_k: int = 5) -> List[Dict]:
+        """Top keyword search results (computed on first use)."""
+        if self._results is None or top_k > self._depth:
+            self._depth = max(top_k, self.SEARCH_DEPTH)
+            self._results = simple_search(self.query, top_k=self._depth)
+            self.search_count += 1
+        return self._results[:top_k]
+    
+    def vector_results(self) -> List[Dict]:
+        """Top embedding search results (computed on first use)."""
+        if self._vector_results is None:
+            self._vector_results = vector_search(self.query, top_k=self.SEARCH_DEPTH)
+        return self._vector_results
+    
+    def hybrid_results(self, top_k: int = 5) -> List[Dict]:
+        """Keyword and vector results fused into one ranking."""
+        return fuse_results(self.results(self.SEARCH_DEPTH), self.vector_results(), top_k)
+    
+    def top_score(self) -> float:
+        """Keyword score of the best matching chunk (0 if nothing matched)."""
+        top = self.results(1)
+        return top[0].get('score', 0) if top else 0
+    
+    def sources(self, top_k: int = 3) -> List[str]:
+        """Distinct document names among the top hybrid results."""
+        return list(set(r['doc_name'] for r in self.hybrid_results(top_k)))
+
+
+def semantic_search_with_gemini(query: str, top_k: int = 5, retrieval: RetrievalContext = None) -> List[Dict]:
+    """
+    Find the most relevant chunks for a query: keyword (BM25) results fused
+    with embedding similarity, so paraphrased questions still find their chunks.
+    Falls back to keyword results alone when numpy is not installed.
     
     Args:
         query: User's question
         top_k: Number of results to return
+        retrieval: Optional request-scoped context to reuse search results from
         
     Returns:
         List of relevant chunks
     """
-    all_chunks = load_all_chunks()
-    
-    if not all_chunks:
+    if not has_uploaded_documents():
         return []
     
-    # First, do a simple keyword search to narrow down candidates
-    keyword_results = simple_search(query, top_k=20)
-    
-    if not keyword_results:
-        # If no keyword matches, return random sample
-        import random
-        chunk_list = list(all_chunks.values())
-        return random.sample(chunk_list, min(top_k, len(chunk_list)))
-    
-    return keyword_results[:top_k]
+    if retrieval is None:
+        retrieval = RetrievalContext(query)
+    return retrieval.hybrid_results(top_k)
 
 
-def get_context_for_query(query: str, max_chunks: int = 3, max_chars: int = 3000) -> str:
+def get_context_for_query(query: str, max_chunks: int = 3, max_chars: int = 3000,
+                          retrieval: RetrievalContext = None) -> str:
     """
     Get relevant document context for a query.
     
@@ -514,11 +1185,12 @@ def get_context_for_query(query: str, max_chunks: int = 3, max_chars: int = 3000
         query: User's question
         max_chunks: Maximum number of chunks to include
         max_chars: Maximum total characters
+        retrieval: Optional request-scoped context to reuse search results from
         
     Returns:
         Combined context string from relevant documents
     """
-    results = semantic_search_with_gemini(query, top_k=max_chunks)
+    results = semantic_search_with_gemini(query, top_k=max_chunks, retrieval=retrieval)
     
     if not results:
         return ""
@@ -529,6 +1201,9 @@ def get_context_for_query(query: str, max_chunks: int = 3, max_chars: int = 3000
     for result in results:
         text = result['text'] if isinstance(result, dict) else result.get('text', '')
         doc_name = result.get('doc_name', 'Unknown Document')
+        section = (result.get('metadata') or {}).get('section')
+        if section:
+            doc_name = f"{doc_name} - {section}"
         
         if total_chars + len(text) > max_chars:
             # Truncate if needed
@@ -546,4 +1221,4 @@ def get_context_for_query(query: str, max_chunks: int = 3, max_chars: int = 3000
 
 def has_uploaded_documents() -> bool:
     """Check if there are any uploaded documents."""
-    return bool(load_all_chunks())
+    return get_chunk_store().chunk_count() > 0
@@ -0,0 +1,559 @@
+"""
+Embeddings and Vector Search Module
+Pluggable chunk embedders, a float32 memory-mapped vector store and an
+optional IVF (inverted file) approximate index for semantic search.
+Works offline: the default embedder is a local feature-hashing model.
+"""
+
+import math
+import os
+import threading
+import zlib
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+    EMBEDDINGS_AVAILABLE = True
+except ImportError:
+    np = None
+    EMBEDDINGS_AVAILABLE = False
+
+from document_index import KnowledgeBaseConnection, tokenize
+
+
+# Vector storage (memory-mapped float32 matrix, one row per chunk)
+VECTORS_FILE = Path("chunk_vectors.f32")
+IVF_FILE = Path("chunk_vectors.ivf.npz")
+
+EMBEDDING_DIM = 256
+DEFAULT_EMBEDDER = os.getenv('HR_EMBEDDER', 'hashing')
+
+# Below this many vectors an exact scan is already fast enough
+IVF_MIN_ROWS = 50000
+# Rebuild the IVF index once this share of rows was added after the last build
+IVF_REBUILD_RATIO = 0.2
+IVF_NPROBE = 32
+
+
+# ============================================================================
+# EMBEDDERS
+# ============================================================================
+
+class Embedder:
+    """
+    Base class for chunk embedders.
+    Subclasses set `name` and `dim` and implement embed().
+    """
+
+    name = 'base'
+    dim = EMBEDDING_DIM
+
+    def embed(self, texts: List[str]):
+        """
+        Embeds texts into L2-normalized float32 vectors.
+
+        Returns:
+            numpy.ndarray of shape (len(texts), dim)
+        """
+        raise NotImplementedError
+
+    def embed_tokens(self, token_lists: List[List[str]]):
+        """
+        Embeds pre-tokenized texts (document_index.tokenize output).
+        Embedders that work on tokens override this to skip tokenizing.
+        """
+        return self.embed([' '.join(tokens) for tokens in token_lists])
+
+
+class HashingEmbedder(Embedder):
+    """
+    Local embedder using signed feature hashing of words and word bigrams,
+    with sublinear term frequency. Needs no training and no network access.
+    """
+
+    name = 'hashing'
+
+    def __init__(self, dim: int = EMBEDDING_DIM, stopwords: Iterable[str] = ()):
+        self.dim = dim
+        self.stopwords = frozenset(stopwords)
+
+    def _features(self, tokens: List[str]) -> Dict[str, float]:
+        words = [w for w in tokens if w not in self.stopwords]
+        features = {}
+        for word in words:
+            features[word] = features.get(word, 0) + 1.0
+        for first, second in zip(words, words[1:]):
+            bigram = first + ' ' + second
+            features[bigram] = features.get(bigram, 0) + 0.5
+        return features
+
+    def embed(self, texts: List[str]):
+        return self.embed_tokens([tokenize(text) for text in texts])
+
+    def embed_tokens(self, token_lists: List[List[str]]):
+        vectors = np.zeros((len(token_lists), self.dim), dtype=np.float32)
+        for i, tokens in enumerate(token_lists):
+            row = vectors[i]
+            for feature, count in self._features(tokens).items():
+                h = zlib.crc32(feature.encode('utf-8'))
+                sign = 1.0 if (h // self.dim) & 1 else -1.0
+                row[h % self.dim] += sign * (1 + math.log(count))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+_EMBEDDER_FACTORIES: Dict[str, Callable[..., Embedder]] = {
+    'hashing': HashingEmbedder,
+}
+
+
+def register_embedder(name: str, factory: Callable[..., Embedder]):
+    """
+    Registers a custom embedder (e.g. a sentence-transformer wrapper).
+    The factory receives keyword options such as `stopwords` and may ignore them.
+    Select it with the HR_EMBEDDER environment variable.
+    """
+    _EMBEDDER_FACTORIES[name] = factory
+
+
+def create_embedder(name: str = None, **options) -> Embedder:
+    """Creates the configured embedder."""
+    name = name or DEFAULT_EMBEDDER
+    if name not in _EMBEDDER_FACTORIES:
+        raise ValueError(f"Unknown embedder '{name}'. Registered: {', '.join(_EMBEDDER_FACTORIES)}")
+    return _EMBEDDER_FACTORIES[name](**options)
+
+
+# ============================================================================
+# IVF APPROXIMATE INDEX
+# ============================================================================
+
+class IVFIndex:
+    """
+    Inverted-file index: k-means centroids plus the rows assigned to each.
+    A query scores the centroids, then only the rows in the nprobe closest lists.
+    """
+
+    def __init__(self, centroids, list_offsets, list_rows, built_rows: int):
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_rows = list_rows
+        self.built_rows = built_rows
+
+    @classmethod
+    def build(cls, matrix, num_rows: int, nlist: int = None, iterations: int = 8,
+              sample_size: int = 100000, seed: int = 0) -> 'IVFIndex':
+        """
+        Trains centroids on a sample of rows (spherical k-means) and assigns all rows.
+
+        Args:
+            matrix: Vector matrix (rows beyond num_rows are ignored)
+            num_rows: Number of rows to index
+            nlist: Number of lists (defaults to ~sqrt(num_rows))
+        """
+        rng = np.random.default_rng(seed)
+        nlist = nlist or max(1, int(math.sqrt(num_rows)))
+        sample_rows = np.sort(rng.choice(num_rows, size=min(num_rows, max(sample_size, nlist)), replace=False))
+        sample = np.asarray(matrix[sample_rows], dtype=np.float32)
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+
+        for _ in range(iterations):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            empty = norms[:, 0] == 0
+            sums[empty] = centroids[empty]
+            norms[empty] = 1.0
+            centroids = sums / norms
+
+        assignments = np.empty(num_rows, dtype=np.int32)
+        for start in range(0, num_rows, 65536):
+            block = np.asarray(matrix[start:min(start + 65536, num_rows)])
+            assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+
+        order = np.argsort(assignments, kind='stable').astype(np.int64)
+        counts = np.bincount(assignments, minlength=nlist)
+        offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        return cls(centroids.astype(np.float32), offsets, order, num_rows)
+
+    def candidate_rows(self, query_vector, nprobe: int = IVF_NPROBE):
+        """Rows in the nprobe lists closest to the query."""
+        nprobe = min(nprobe, len(self.centroids))
+        closest = np.argpartition(-(self.centroids @ query_vector), nprobe - 1)[:nprobe]
+        return np.concatenate([
+            self.list_rows[self.list_offsets[c]:self.list_offsets[c + 1]] for c in closest
+        ])
+
+    def save(self, path: Path):
+        np.savez(path, centroids=self.centroids, list_offsets=self.list_offsets,
+                 list_rows=self.list_rows, built_rows=self.built_rows)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional['IVFIndex']:
+        if not Path(path).exists():
+            return None
+        data = np.load(path)
+        return cls(data['centroids'], data['list_offsets'], data['list_rows'], int(data['built_rows']))
+
+
+# ============================================================================
+# VECTOR STORE
+# ============================================================================
+
+class VectorStore:
+    """
+    Chunk vectors in a memory-mapped float32 matrix.
+
+    The row -> chunk mapping lives in the knowledge base (kb_vectors), so adds
+    and deletes commit together with the chunk store. Deleted rows are
+    tombstoned and dropped by compact(). rebuild() and compact() write a new
+    file beside the old one and move it into place only after the new
+    mapping has committed, so a crash or rollback never leaves the mapping
+    pointing into the wrong file. Searches read a snapshot of the mapping
+    through a read-only map of the file, without the write lock.
+    """
+
+    def __init__(self, kb: KnowledgeBaseConnection, embedder: Embedder,
+                 vectors_path: Path = VECTORS_FILE, ivf_path: Path = IVF_FILE):
+        self.kb = kb
+        self.embedder = embedder
+        self.dim = embedder.dim
+        self.vectors_path = Path(vectors_path)
+        self.ivf_path = Path(ivf_path)
+        self._matrix = None
+        self._capacity = 0
+        self._write_generation = 0
+        self._state_generation = None
+        self._row_chunk_ids = []
+        self._live_mask = None
+        self._num_rows = 0
+        self._ivf = None
+        self._ivf_loaded = False
+        self._search_matrix = None
+        # Writes share the knowledge base lock so store, index and vectors never
+        # deadlock; the search state has its own, taken after it if at all
+        self._lock = kb.lock
+        self._state_lock = threading.Lock()
+        self.ensure_schema()
+
+    def ensure_schema(self):
+        """Creates the mapping tables; resets vectors if the embedder changed."""
+        signature = f'{self.embedder.name}:{self.dim}'
+        changed = False
+        with self.kb.transaction() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS kb_vectors (
+                    row INTEGER PRIMARY KEY,
+                    chunk_id TEXT NOT NULL,
+                    doc_id TEXT NOT NULL,
+                    deleted INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_kb_vectors_chunk ON kb_vectors(chunk_id)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_kb_vectors_doc ON kb_vectors(doc_id)')
+            conn.execute('CREATE TABLE IF NOT EXISTS kb_vector_meta (key TEXT PRIMARY KEY, value TEXT)')
+            stored = conn.execute("SELECT value FROM kb_vector_meta WHERE key = 'embedder'").fetchone()
+            if stored is None or stored[0] != signature:
+                conn.execute('DELETE FROM kb_vectors')
+                conn.execute("DELETE FROM kb_vector_meta WHERE key = 'replacement'")
+                conn.execute("INSERT OR REPLACE INTO kb_vector_meta (key, value) VALUES ('embedder', ?)",
+                             (signature,))
+                changed = True
+        # Only once the empty mapping has committed
+        if changed:
+            self._reset_files()
+        # A replacement committed just before a crash
+        self._finish_replacement()
+
+    def _reset_files(self):
+        self._matrix = None
+        self._capacity = 0
+        self._ivf = None
+        self._ivf_loaded = True
+        for path in (self.vectors_path, self.ivf_path, self._replacement_path):
+            if path.exists():
+                path.unlink()
+
+    # ------------------------------------------------------------------
+    # Matrix file
+    # ------------------------------------------------------------------
+
+    def _open_matrix(self, min_rows: int = 0):
+        """Maps the vector file, growing it (doubling) to hold min_rows rows."""
+        row_bytes = self.dim * 4
+        file_rows = self.vectors_path.stat().st_size // row_bytes if self.vectors_path.exists() else 0
+        if file_rows < min_rows:
+            new_rows = max(min_rows, file_rows * 2, 1024)
+            with open(self.vectors_path, 'ab') as f:
+                f.truncate(new_rows * row_bytes)
+            file_rows = new_rows
+            self._matrix = None
+        if self._matrix is None or self._capacity != file_rows:
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode='r+',
+                                     shape=(file_rows, self.dim)) if file_rows else None
+            self._capacity = file_rows
+        return self._matrix
+
+    @property
+    def _replacement_path(self) -> Path:
+        return self.vectors_path.with_name(self.vectors_path.name + '.new')
+
+    def _write_replacement(self, num_rows: int, batches: Iterable[Tuple[int, object]]):
+        """Writes (start row, vectors) batches into the replacement file and syncs it to disk."""
+        path = self._replacement_path
+        with open(path, 'wb') as f:
+            f.truncate(num_rows * self.dim * 4)
+        if num_rows:
+            matrix = np.memmap(path, dtype=np.float32, mode='r+', shape=(num_rows, self.dim))
+            for start, vectors in batches:
+                matrix[start:start + len(vectors)] = vectors
+            matrix.flush()
+            del matrix
+        with open(path, 'rb+') as f:
+            os.fsync(f.fileno())
+
+    def _commit_replacement(self, conn, keys: List[Tuple[str, str]]):
+        """
+        Maps rows 0..len(keys) of the replacement file, in the caller's
+        transaction, and marks the file as waiting to be moved into place.
+        """
+        conn.execute('DELETE FROM kb_vectors')
+        conn.executemany('INSERT INTO kb_vectors (row, chunk_id, doc_id) VALUES (?, ?, ?)', [
+            (i, cid, doc_id) for i, (cid, doc_id) in enumerate(keys)
+        ])
+        conn.execute("INSERT OR REPLACE INTO kb_vector_meta (key, value) VALUES ('replacement', ?)",
+                     (self._replacement_path.name,))
+        self._write_generation += 1
+
+    def _finish_replacement(self):
+        """
+        Moves a committed replacement file over the vector file. Runs after
+        the commit, here or in whichever process next refreshes, so a crash
+        in between is finished later; inside an open transaction the marker
+        could still roll back, so it waits.
+        """
+        if self.kb.in_transaction():
+            return
+        if not self.kb.execute("SELECT 1 FROM kb_vector_meta WHERE key = 'replacement'"):
+            return
+        with self._lock, self._state_lock, self.kb.transaction() as conn:
+            # Another process may have finished it first
+            if conn.execute("SELECT 1 FROM kb_vector_meta WHERE key = 'replacement'").fetchone():
+                self._matrix = None
+                if self._replacement_path.exists():
+                    os.replace(self._replacement_path, self.vectors_path)
+                    # Built over the old row numbers
+                    if self.ivf_path.exists():
+                        self.ivf_path.unlink()
+                conn.execute("DELETE FROM kb_vector_meta WHERE key = 'replacement'")
+            self._matrix = None
+            self._capacity = 0
+            self._ivf = None
+            self._ivf_loaded = True
+            self._write_generation += 1
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def _embed(self, chunks: Dict[str, Dict]):
+        chunk_ids = list(chunks.keys())
+        if all('tokens' in chunks[cid] for cid in chunk_ids):
+            # Chunker output: embed the tokens it already produced
+            return self.embedder.embed_tokens([chunks[cid]['tokens'] for cid in chunk_ids])
+        return self.embedder.embed([chunks[cid]['text'] for cid in chunk_ids])
+
+    def add_chunks(self, chunks: Dict[str, Dict]):
+        """
+        Embeds and stores vectors for chunks (replacing older vectors of the same IDs).
+
+        Args:
+            chunks: Mapping of chunk IDs to chunk records
+        """
+        if not chunks:
+            return
+        self.add_vectors([(cid, chunk['doc_id']) for cid, chunk in chunks.items()], self._embed(chunks))
+
+    def add_vectors(self, keys: List[Tuple[str, str]], vectors):
+        """
+        Stores precomputed, normalized vectors.
+
+        Args:
+            keys: (chunk_id, doc_id) for each vector
+            vectors: float32 array of shape (len(keys), dim)
+        """
+        with self._lock, self.kb.transaction() as conn:
+            conn.executemany('UPDATE kb_vectors SET deleted = 1 WHERE chunk_id = ?',
+                             [(cid,) for cid, _ in keys])
+            start = conn.execute('SELECT COALESCE(MAX(row) + 1, 0) FROM kb_vectors').fetchone()[0]
+            matrix = self._open_matrix(start + len(keys))
+            # Vectors land in the file before the mapping commits; uncommitted
+            # rows are simply overwritten by the next add.
+            matrix[start:start + len(keys)] = vectors
+            matrix.flush()
+            conn.executemany('INSERT INTO kb_vectors (row, chunk_id, doc_id) VALUES (?, ?, ?)', [
+                (start + i, cid, doc_id) for i, (cid, doc_id) in enumerate(keys)
+            ])
+            self._write_generation += 1
+
+    def delete_document(self, doc_id: str) -> int:
+        """Tombstones every vector of a document."""
+        with self._lock, self.kb.transaction() as conn:
+            self._write_generation += 1
+            return conn.execute('UPDATE kb_vectors SET deleted = 1 WHERE doc_id = ? AND deleted = 0',
+                                (doc_id,)).rowcount
+
+    def rebuild(self, all_chunks: Dict[str, Dict], batch_size: int = 512):
+        """
+        Re-embeds every chunk into a fresh vector file. Inside an outer
+        transaction the file is swapped in on the first read after it commits.
+        """
+        items = list(all_chunks.items())
+        with self._lock:
+            with self.kb.transaction() as conn:
+                self._write_replacement(len(items), (
+                    (start, self._embed(dict(items[start:start + batch_size])))
+                    for start in range(0, len(items), batch_size)))
+                self._commit_replacement(conn, [(cid, chunk['doc_id']) for cid, chunk in items])
+            self._finish_replacement()
+
+    def compact(self):
+        """Rewrites the vector file without tombstoned rows."""
+        with self._lock:
+            with self.kb.transaction() as conn:
+                rows = conn.execute(
+                    'SELECT row, chunk_id, doc_id FROM kb_vectors WHERE deleted = 0 ORDER BY row').fetchall()
+                matrix = self._open_matrix()
+                live = np.array([row[0] for row in rows], dtype=np.int64)
+                self._write_replacement(len(rows), (
+                    (start, matrix[live[start:start + 65536]]) for start in range(0, len(live), 65536)))
+                self._commit_replacement(conn, [(chunk_id, doc_id) for _, chunk_id, doc_id in rows])
+            self._finish_replacement()
+
+    # ------------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------------
+
+    def _refresh_state(self):
+        """Reloads the row mapping if the store changed (call without holding _state_lock)."""
+        generation = (self._write_generation, self.kb.data_version())
+        if self._state_generation == generation:
+            return
+        while True:
+            with self.kb.snapshot() as conn:
+                pending = conn.execute("SELECT 1 FROM kb_vector_meta WHERE key = 'replacement'").fetchone()
+                rows = conn.execute('SELECT row, chunk_id, deleted FROM kb_vectors ORDER BY row').fetchall()
+            # A committed mapping must not be read against the file it replaces
+            if not pending or self.kb.in_transaction():
+                break
+            self._finish_replacement()
+            generation = (self._write_generation, self.kb.data_version())
+        # Inside the transaction that wrote it, the mapping is the replacement file's
+        path = self._replacement_path if pending else self.vectors_path
+        num_rows = rows[-1][0] + 1 if rows else 0
+        row_chunk_ids = [None] * num_rows
+        live_mask = np.zeros(num_rows, dtype=bool)
+        for row, chunk_id, deleted in rows:
+            row_chunk_ids[row] = chunk_id
+            live_mask[row] = not deleted
+        # Searches use their own read-only map: writers may grow or replace the file meanwhile
+        matrix = np.memmap(path, dtype=np.float32, mode='r',
+                           shape=(num_rows, self.dim)) if num_rows else None
+        with self._state_lock:
+            self._num_rows = num_rows
+            self._row_chunk_ids = row_chunk_ids
+            self._live_mask = live_mask
+            self._search_matrix = matrix
+            self._matrix = None  # writers re-map too: another process may have replaced the file
+            if not self._ivf_loaded:
+                self._ivf = IVFIndex.load(self.ivf_path)
+                self._ivf_loaded = True
+            if self._ivf is not None and (self._ivf.built_rows > self._num_rows
+                                          or self._ivf.centroids.shape[1] != self.dim):
+                self._ivf = None
+            self._state_generation = generation
+
+    def live_count(self) -> int:
+        """Number of live (non-deleted) vectors."""
+        self._refresh_state()
+        with self._state_lock:
+            return int(self._live_mask.sum()) if self._live_mask is not None else 0
+
+    def build_ivf(self, nlist: int = None):
+        """Builds (or rebuilds) the approximate IVF index over all current rows."""
+        with self._lock:
+            self._refresh_state()
+            if self._num_rows == 0:
+                return
+            ivf = IVFIndex.build(self._open_matrix(), self._num_rows, nlist=nlist)
+            ivf.save(self.ivf_path)
+            with self._state_lock:
+                self._ivf = ivf
+
+    def maybe_build_ivf(self):
+        """Builds the IVF index once the store is large enough, or refreshes a stale one."""
+        with self._lock:
+            self._refresh_state()
+            if self._num_rows < IVF_MIN_ROWS:
+                return False
+            if self._ivf is not None and \
+                    self._num_rows - self._ivf.built_rows <= IVF_REBUILD_RATIO * self._ivf.built_rows:
+                return False
+            self.build_ivf()
+            return True
+
+    def search_vector(self, query_vector, top_k: int = 5, exact: bool = False) -> List[Tuple[str, float]]:
+        """
+        Cosine-similarity search for a normalized query vector.
+
+        Args:
+            query_vector: Normalized float32 vector of length dim
+            top_k: Number of results
+            exact: Scan every row even if an IVF index exists
+
+        Returns:
+            List of (chunk_id, similarity), best first
+        """
+        self._refresh_state()
+        with self._state_lock:
+            num_rows, matrix, live_mask = self._num_rows, self._search_matrix, self._live_mask
+            row_chunk_ids, ivf = self._row_chunk_ids, self._ivf
+        if num_rows == 0:
+            return []
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+
+        if ivf is not None and not exact:
+            # Rows added since the IVF build are always scanned
+            candidates = np.concatenate([
+                ivf.candidate_rows(query_vector),
+                np.arange(ivf.built_rows, num_rows, dtype=np.int64),
+            ])
+            candidates = np.sort(candidates[live_mask[candidates]])
+            scores = matrix[candidates] @ query_vector
+        else:
+            scores = np.asarray(matrix[:num_rows] @ query_vector)
+            scores[~live_mask] = -np.inf
+            candidates = None
+
+        k = min(top_k, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        results = []
+        for i in top:
+            if not np.isfinite(scores[i]):
+                continue
+            row = int(candidates[i]) if candidates is not None else int(i)
+            results.append((row_chunk_ids[row], float(scores[i])))
+        return results
+
+    def search(self, query: str, top_k: int = 5) -> List[Tuple[str, float]]:
+        """Embeds a query and returns the most similar chunks."""
+        query_vector = self.embedder.embed([query])[0]
+        if not query_vector.any():
+            return []
+        return self.search_vector(query_vector, top_k)
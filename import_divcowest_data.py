@@ -1,12 +1,31 @@
 """
 Import DivcoWest directory data into the HR database.
 Generates realistic values for missing fields like salary, status, hire_date, etc.
+
+The directory is streamed from the CSV and inserted in batches inside one
+transaction; synthetic transfers and feedback are generated in SQL.
+With --sync, only the differences are applied: people are matched on a
+stable name+department key, changed rows are upserted (keeping generated
+salaries and dates), and people missing from the CSV are soft-deleted.
+
+    python import_divcowest_data.py --csv divcowest_directory.csv --batch-size 5000
+    python import_divcowest_data.py --sync
 """
 
-import sqlite3
+import argparse
 import csv
+import hashlib
+import json
 import random
+import re
+import sqlite3
+import time
+from collections import Counter
 from datetime import datetime, timedelta
+from functools import lru_cache
+from itertools import islice
+
+from db_utils import DB_PATH, apply_migrations, bump_data_version
 
 # Salary ranges based on title level
 SALARY_RANGES = {
@@ -32,6 +51,7 @@ SALARY_RANGES = {
     'Default': (50000, 90000)
 }
 
+@lru_cache(maxsize=4096)
 def get_salary_range(title):
     """Get appropriate salary range based on title."""
     title_upper = title.upper()
@@ -47,19 +67,21 @@ def generate_email(name):
         return f"{parts[0][0]}{parts[-1]}@divcowest.com"
     return f"{parts[0]}@divcowest.com"
 
+# Employee ID prefix per directory department
+DEPARTMENT_CODES = {
+    'EXECUTIVE TEAM': 'EXE',
+    'EXECUTIVE LEADERSHIP': 'EXL',
+    'INVESTMENTS': 'INV',
+    'CONSTRUCTION & DEVELOPMENT': 'CND',
+    'CAPITAL FORMATION & PORTFOLIO MGMT': 'CAP',
+    'PROPERTY MANAGEMENT': 'PRM',
+    'LEASING & MARKETING': 'LMK',
+    'FINANCE LEGAL & ADMIN': 'FLA'
+}
+
 def generate_employee_id(index, department):
     """Generate employee ID."""
-    dept_codes = {
-        'EXECUTIVE TEAM': 'EXE',
-        'EXECUTIVE LEADERSHIP': 'EXL',
-        'INVESTMENTS': 'INV',
-        'CONSTRUCTION & DEVELOPMENT': 'CND',
-        'CAPITAL FORMATION & PORTFOLIO MGMT': 'CAP',
-        'PROPERTY MANAGEMENT': 'PRM',
-        'LEASING & MARKETING': 'LMK',
-        'FINANCE LEGAL & ADMIN': 'FLA'
-    }
-    code = dept_codes.get(department, 'EMP')
+    code = DEPARTMENT_CODES.get(department, 'EMP')
     return f"{code}{str(index).zfill(4)}"
 
 def generate_hire_date():
@@ -67,118 +89,523 @@ def generate_hire_date():
     days_ago = random.randint(30, 3650)  # 1 month to 10 years
     return (datetime.now() - timedelta(days=days_ago)).strftime('%Y-%m-%d')
 
-def main():
-    # Read CSV
-    employees = []
-    with open('divcowest_directory.csv', 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            employees.append(row)
-    
-    print(f"Read {len(employees)} employees from CSV")
+# Rows per executemany() call
+DEFAULT_BATCH_SIZE = 5000
+
+# Seconds between progress callbacks during the employee load
+PROGRESS_INTERVAL = 0.5
+
+# Kinds of change a sync reports, and how many names it lists for each
+SYNC_CHANGE_KINDS = ('added', 'updated', 'restored', 'moved', 'linked', 'removed')
+SYNC_EXAMPLES = 5
+
+# Applied for the duration of the load and restored afterwards. synchronous=OFF
+# is safe here: the load is one transaction, and a crash leaves the old data
+PRAGMAS_DURING_LOAD = {
+    'synchronous': 'OFF',
+    'cache_size': -256000,   # ~256 MB page cache
+    'temp_store': 'MEMORY',
+    'analysis_limit': 1000,  # ANALYZE samples each index instead of reading all of it
+}
+
+STATUSES = ['Active', 'Active', 'Active', 'Active', 'Active', 'Active', 'Active', 'Active', 'On Leave', 'Terminated']
+TRANSFER_REASONS = ['Promotion', 'Restructuring', 'Career Development', 'Team Expansion', 'Skills Match']
+FEEDBACK_TYPES = ['Performance Review', 'Peer Feedback', '360 Review', 'Manager Feedback', 'Self Assessment']
+REVIEWERS = ['HR Team', 'Direct Manager', 'Department Head', 'Peer Review Committee', 'Self']
+FEEDBACK_COMMENTS = [
+    "Excellent performance and team collaboration.",
+    "Consistently meets expectations and deadlines.",
+    "Shows great initiative and leadership potential.",
+    "Good work ethic, room for improvement in communication.",
+    "Outstanding contribution to recent projects.",
+    "Reliable team member with strong technical skills.",
+    "Demonstrates excellent problem-solving abilities.",
+    "Great attention to detail and quality work.",
+    "Strong communication and interpersonal skills.",
+    "Proactive in identifying and resolving issues."
+]
+
+INSERT_EMPLOYEE_SQL = """
+    INSERT INTO employees (employee_id, first_name, last_name, email, department, position, salary, hire_date, status,
+                           source_key)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Sync: directory columns are overwritten, generated ones (ID, salary, hire date) kept;
+# a soft-deleted person who reappears becomes Active again
+UPSERT_EMPLOYEE_SQL = INSERT_EMPLOYEE_SQL + """
+    ON CONFLICT(source_key) DO UPDATE SET
+        first_name = excluded.first_name,
+        last_name = excluded.last_name,
+        email = excluded.email,
+        department = excluded.department,
+        position = excluded.position,
+        status = CASE WHEN employees.removed_at IS NULL THEN employees.status ELSE 'Active' END,
+        removed_at = NULL
+"""
+
+# Sync: re-keys an existing row (a department move, or a row imported before keys existed)
+REKEY_EMPLOYEE_SQL = """
+    UPDATE employees
+    SET source_key = ?, first_name = ?, last_name = ?, email = ?, department = ?, position = ?,
+        status = CASE WHEN removed_at IS NULL THEN status ELSE 'Active' END,
+        removed_at = NULL
+    WHERE id = ?
+"""
+
+SOFT_DELETE_EMPLOYEE_SQL = """
+    UPDATE employees SET status = 'Terminated', removed_at = date('now', 'localtime')
+    WHERE id = ? AND removed_at IS NULL
+"""
+
+INSERT_MOVE_TRANSFER_SQL = """
+    INSERT INTO transfers (employee_id, from_department, to_department, transfer_date, reason)
+    VALUES (?, ?, ?, date('now', 'localtime'), 'Directory Update')
+"""
+
+RECORD_IMPORT_SQL = """
+    INSERT OR REPLACE INTO directory_import (id, csv_sha256, imported_at) VALUES (1, ?, datetime('now'))
+"""
+
+_ID_NUMBER = re.compile(r'(\d+)$')
+
+def _random_pick(param):
+    """SQL expression picking a random element of a JSON-array parameter."""
+    return f"json_extract(:{param}, printf('$[%d]', abs(random() % json_array_length(:{param}))))"
+
+# Transfers into each sampled employee's current department from a random other one
+INSERT_TRANSFERS_SQL = f"""
+    INSERT INTO transfers (employee_id, from_department, to_department, transfer_date, reason)
+    SELECT employee_id, from_department, department,
+           date('now', 'localtime', printf('-%d days', 30 + abs(random() % 336))),
+           {_random_pick('reasons')}
+    FROM (
+        SELECT e.employee_id, e.department,
+               (SELECT value FROM json_each(:departments) WHERE value <> e.department
+                ORDER BY random() LIMIT 1) AS from_department
+        FROM (SELECT employee_id, department FROM employees ORDER BY random() LIMIT :count) e
+    )
+    WHERE from_department IS NOT NULL
+"""
+
+# Ratings 3/4/5 with probability 10/45/45%
+INSERT_FEEDBACK_SQL = f"""
+    INSERT INTO feedback (employee_id, feedback_date, rating, feedback_type, comments, reviewer)
+    SELECT employee_id,
+           date('now', 'localtime', printf('-%d days', 1 + abs(random() % 180))),
+           CASE WHEN r < 10 THEN 3 WHEN r < 55 THEN 4 ELSE 5 END,
+           {_random_pick('feedback_types')}, {_random_pick('comments')}, {_random_pick('reviewers')}
+    FROM (SELECT employee_id, abs(random() % 100) AS r FROM employees ORDER BY random() LIMIT :count)
+"""
+
+def file_sha256(path):
+    """SHA-256 of a file, read in 1 MB blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def normalize_name(name):
+    """Lower-cased name with collapsed whitespace (the name part of source_key)."""
+    return ' '.join(name.lower().split())
+
+def source_key(name, department):
+    """Stable directory key for a person: normalized "name|department"."""
+    return f"{normalize_name(name)}|{normalize_name(department)}"
+
+def split_name(name):
+    """First and last name from a directory name ("Unknown" when missing)."""
+    name_parts = name.replace('.', '').replace(',', '').split()
+    first_name = name_parts[0] if name_parts else 'Unknown'
+    last_name = name_parts[-1] if len(name_parts) > 1 else 'Unknown'
+    return first_name, last_name
+
+def read_directory(csv_path, stats):
+    """
+    Streams directory rows from the CSV, skipping people already seen
+    (some appear in several departments). Names are compared normalized, as
+    in source_key, so every row yielded has its own key.
     
-    # Remove duplicates based on name (some people appear in multiple departments)
+    Args:
+        csv_path: Directory CSV with department, name and title columns
+        stats: Dict updated with 'read' and 'duplicates' counts
+        
+    Yields:
+        tuple: (department, name, title) once per unique name
+    """
     seen_names = set()
-    unique_employees = []
-    for emp in employees:
-        if emp['name'] not in seen_names:
-            seen_names.add(emp['name'])
-            unique_employees.append(emp)
+    with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        # Plain reader with column positions: DictReader builds a dict per row
+        columns = [header.index(column) for column in ('department', 'name', 'title')]
+        for row in reader:
+            stats['read'] += 1
+            department, name, title = (row[i] if i < len(row) else '' for i in columns)
+            normalized = normalize_name(name)
+            if normalized in seen_names:
+                stats['duplicates'] += 1
+                continue
+            seen_names.add(normalized)
+            yield department, name, title
+
+def employee_rows(directory, departments, start_index=1):
+    """
+    Turns directory rows into employees insert tuples, generating salary,
+    email, ID, hire date and status.
     
-    print(f"Unique employees: {len(unique_employees)}")
+    Args:
+        directory: Iterable of (department, name, title)
+        departments: Set collecting the departments seen
+        start_index: Number used for the first generated employee ID
+        
+    Yields:
+        tuple: Values for INSERT_EMPLOYEE_SQL
+    """
+    today = datetime.now()
+    # Same range as generate_hire_date, formatted once instead of per row
+    hire_dates = [(today - timedelta(days=days_ago)).strftime('%Y-%m-%d') for days_ago in range(30, 3651)]
+    rand = random.random
     
-    # Connect to database
-    conn = sqlite3.connect('hr_peopleops.db')
-    cursor = conn.cursor()
+    for i, (department, name, title) in enumerate(directory, start_index):
+        first_name, last_name = split_name(name)
+        
+        title = title if title else 'Employee'
+        departments.add(department)
+        
+        low, high = get_salary_range(title)
+        yield (generate_employee_id(i, department), first_name, last_name, generate_email(name),
+               department, title, low + int(rand() * (high - low + 1)),
+               hire_dates[int(rand() * len(hire_dates))], STATUSES[int(rand() * len(STATUSES))],
+               source_key(name, department))
+
+def _set_pragmas(conn, pragmas):
+    """Applies pragmas and returns their previous values."""
+    previous = {}
+    for name, value in pragmas.items():
+        previous[name] = conn.execute(f'PRAGMA {name}').fetchone()[0]
+        conn.execute(f'PRAGMA {name} = {value}').fetchall()
+    return previous
+
+def _drop_secondary_indexes(conn, tables):
+    """
+    Drops the explicit indexes on `tables` and returns their CREATE statements;
+    rebuilding an index once after the load is cheaper than updating it per row.
+    """
+    placeholders = ', '.join('?' for _ in tables)
+    indexes = conn.execute(f"""
+        SELECT name, sql FROM sqlite_master
+        WHERE type = 'index' AND sql IS NOT NULL AND tbl_name IN ({placeholders})
+    """, list(tables)).fetchall()
+    for name, _ in indexes:
+        conn.execute(f'DROP INDEX "{name}"')
+    return [sql for _, sql in indexes]
+
+def import_directory(csv_path, db_path=DB_PATH, batch_size=DEFAULT_BATCH_SIZE,
+                     num_transfers=20, num_feedback=40, progress=None):
+    """
+    Replaces the employees, transfers and feedback tables with the directory.
+    
+    Everything happens in one transaction, so readers see either the old
+    data or the complete import.
     
-    # Clear existing data
-    cursor.execute("DELETE FROM employees")
-    cursor.execute("DELETE FROM transfers")
-    cursor.execute("DELETE FROM feedback")
-    conn.commit()
-    print("Cleared existing data")
-    
-    # Insert employees
-    statuses = ['Active', 'Active', 'Active', 'Active', 'Active', 'Active', 'Active', 'Active', 'On Leave', 'Terminated']
-    
-    for i, emp in enumerate(unique_employees, 1):
-        name = emp['name']
-        name_parts = name.replace('.', '').replace(',', '').split()
-        first_name = name_parts[0] if name_parts else 'Unknown'
-        last_name = name_parts[-1] if len(name_parts) > 1 else 'Unknown'
+    Args:
+        csv_path: Directory CSV
+        db_path: SQLite database path
+        batch_size: Rows per executemany() call
+        num_transfers: Synthetic transfers to generate
+        num_feedback: Synthetic feedback records to generate
+        progress: Optional callback(stage, rows, elapsed_seconds), called every
+            PROGRESS_INTERVAL seconds during the employee load and after each stage
         
-        title = emp['title'] if emp['title'] else 'Employee'
-        department = emp['department']
-        location = emp['location'] if emp['location'] else random.choice(['San Francisco', 'Cambridge', 'Los Angeles', 'New York'])
+    Returns:
+        dict: Row counts and timings
+    """
+    start = time.perf_counter()
+    report = progress or (lambda stage, rows, elapsed: None)
+    stats = {'read': 0, 'duplicates': 0, 'employees': 0}
+    departments = set()
+    
+    conn = sqlite3.connect(db_path)
+    try:
+        apply_migrations(conn)
+        previous_pragmas = _set_pragmas(conn, PRAGMAS_DURING_LOAD)
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Clear existing data (the version bump invalidates the dashboard's result cache)
+            conn.execute("DELETE FROM employees")
+            conn.execute("DELETE FROM transfers")
+            conn.execute("DELETE FROM feedback")
+            index_sql = _drop_secondary_indexes(conn, ('employees', 'transfers', 'feedback'))
+            
+            rows = employee_rows(read_directory(csv_path, stats), departments)
+            next_report = start + PROGRESS_INTERVAL
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                conn.executemany(INSERT_EMPLOYEE_SQL, batch)
+                stats['employees'] += len(batch)
+                now = time.perf_counter()
+                if now >= next_report:
+                    report('employees', stats['employees'], now - start)
+                    next_report = now + PROGRESS_INTERVAL
+            employees_seconds = time.perf_counter() - start
+            report('employees', stats['employees'], employees_seconds)
+            
+            sorted_departments = json.dumps(sorted(departments))
+            stats['transfers'] = conn.execute(INSERT_TRANSFERS_SQL, {
+                'count': num_transfers, 'departments': sorted_departments,
+                'reasons': json.dumps(TRANSFER_REASONS),
+            }).rowcount
+            report('transfers', stats['transfers'], time.perf_counter() - start)
+            stats['feedback'] = conn.execute(INSERT_FEEDBACK_SQL, {
+                'count': num_feedback, 'feedback_types': json.dumps(FEEDBACK_TYPES),
+                'comments': json.dumps(FEEDBACK_COMMENTS), 'reviewers': json.dumps(REVIEWERS),
+            }).rowcount
+            report('feedback', stats['feedback'], time.perf_counter() - start)
+            
+            for sql in index_sql:
+                conn.execute(sql)
+            conn.execute('ANALYZE')
+            report('indexes', len(index_sql), time.perf_counter() - start)
+            
+            conn.execute(RECORD_IMPORT_SQL, (file_sha256(csv_path),))
+            bump_data_version(conn)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            _set_pragmas(conn, previous_pragmas)
+        # The whole load went through the WAL; fold it back into the database file
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchall()
+    finally:
+        conn.close()
+    
+    stats['seconds'] = time.perf_counter() - start
+    stats['employees_per_second'] = stats['employees'] / employees_seconds if employees_seconds else 0.0
+    return stats
+
+def _diff_directory(conn, directory):
+    """
+    Compares the directory with the employees table.
+    
+    Args:
+        conn: SQLite connection
+        directory: {source_key: (department, name, title)}
         
-        # Generate missing data
-        salary_range = get_salary_range(title)
-        salary = random.randint(salary_range[0], salary_range[1])
-        email = generate_email(name)
-        employee_id = generate_employee_id(i, department)
-        hire_date = generate_hire_date()
-        status = random.choice(statuses)
+    Returns:
+        dict: 'added' (keys); 'updated', 'restored', 'moved' and 'linked'
+        ((row id, key) pairs); 'removed' ((row id, name) pairs);
+        'unchanged' (count)
+    """
+    changes = {'added': [], 'updated': [], 'restored': [], 'moved': [], 'linked': [], 'removed': [],
+               'unchanged': 0}
+    # Plain tuples of just the compared columns: this loop touches every employee
+    keyed, unkeyed = {}, {}
+    for row_id, key, first_name, last_name, department, position, removed_at in conn.execute("""
+        SELECT id, source_key, first_name, last_name, department, position, removed_at FROM employees
+    """):
+        if key is None:
+            unkeyed[(first_name.lower(), last_name.lower(), department.lower())] = row_id
+        else:
+            keyed[key] = (row_id, (first_name, last_name, department, position), removed_at)
+    
+    added = []
+    for key, (department, name, title) in directory.items():
+        stored = keyed.pop(key, None)
+        if stored is None:
+            first_name, last_name = split_name(name)
+            row_id = unkeyed.pop((first_name.lower(), last_name.lower(), department.lower()), None)
+            if row_id is not None:
+                changes['linked'].append((row_id, key))
+            else:
+                added.append(key)
+        elif stored[2] is not None:
+            changes['restored'].append((stored[0], key))
+        elif stored[1] != (*split_name(name), department, title):
+            changes['updated'].append((stored[0], key))
+        else:
+            changes['unchanged'] += 1
+    
+    # Whatever is left in `keyed` has left the directory. A missing person who
+    # reappears under another department with the same title is a move, not a
+    # removal plus a hire, but only when exactly one person with that name and
+    # title left and exactly one arrived; otherwise the row could be handed to
+    # a different person with the same name
+    departed = {}
+    for key, (row_id, (first_name, last_name, _, position), removed_at) in keyed.items():
+        if removed_at is None:
+            departed.setdefault((key.split('|', 1)[0], position), []).append((row_id, f"{first_name} {last_name}"))
+    arrivals = Counter((key.split('|', 1)[0], directory[key][2]) for key in added)
+    for key in added:
+        identity = (key.split('|', 1)[0], directory[key][2])
+        people = departed.get(identity)
+        if people is not None and len(people) == 1 and arrivals[identity] == 1:
+            changes['moved'].append((departed.pop(identity)[0][0], key))
+        else:
+            changes['added'].append(key)
+    changes['removed'] = [person for people in departed.values() for person in people]
+    return changes
+
+def _batches(rows, batch_size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+def _stored_rows(conn, row_ids):
+    """{id: (employee_id, department, salary, hire_date, status)} for the given rows."""
+    stored = {}
+    for batch in _batches(row_ids, 500):
+        placeholders = ', '.join('?' for _ in batch)
+        for row in conn.execute(f"""
+            SELECT id, employee_id, department, salary, hire_date, status FROM employees WHERE id IN ({placeholders})
+        """, batch):
+            stored[row[0]] = row[1:]
+    return stored
+
+def _apply_changes(conn, changes, directory, batch_size):
+    """Writes the changes found by _diff_directory."""
+    # New people get generated fields, numbered after the highest existing ID
+    if changes['added']:
+        next_index = 1
+        for (employee_id,) in conn.execute('SELECT employee_id FROM employees'):
+            number = _ID_NUMBER.search(employee_id)
+            if number:
+                next_index = max(next_index, int(number.group(1)) + 1)
+        new_rows = employee_rows((directory[key] for key in changes['added']), set(), next_index)
+        for batch in _batches(new_rows, batch_size):
+            conn.executemany(UPSERT_EMPLOYEE_SQL, batch)
+    
+    def directory_columns(key):
+        department, name, title = directory[key]
+        return (*split_name(name), generate_email(name), department, title)
+    
+    # Changed and restored rows pass their stored generated fields; the
+    # upsert only overwrites the directory columns
+    upserted = changes['updated'] + changes['restored']
+    stored = _stored_rows(conn, [row_id for row_id, _ in upserted + changes['moved']])
+    changed_rows = (
+        (stored[row_id][0], *directory_columns(key), *stored[row_id][2:], key)
+        for row_id, key in upserted
+    )
+    for batch in _batches(changed_rows, batch_size):
+        conn.executemany(UPSERT_EMPLOYEE_SQL, batch)
+    
+    rekeyed = ((key, *directory_columns(key), row_id) for row_id, key in changes['moved'] + changes['linked'])
+    for batch in _batches(rekeyed, batch_size):
+        conn.executemany(REKEY_EMPLOYEE_SQL, batch)
+    conn.executemany(INSERT_MOVE_TRANSFER_SQL, [
+        (stored[row_id][0], stored[row_id][1], directory[key][0]) for row_id, key in changes['moved']
+    ])
+    
+    removed = ((row_id,) for row_id, _ in changes['removed'])
+    for batch in _batches(removed, batch_size):
+        conn.executemany(SOFT_DELETE_EMPLOYEE_SQL, batch)
+
+def sync_directory(csv_path, db_path=DB_PATH, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Applies only the differences between the directory CSV and the database.
+    
+    People are matched on source_key (normalized name + department). New
+    people are inserted, changed names or titles are upserted, people who
+    moved department (same name and title, unambiguously) keep their row and
+    get a transfer record, and people missing from the CSV
+    are soft-deleted (status Terminated, removed_at set). Salaries, hire
+    dates and employee IDs of existing rows are kept. The data version is
+    only bumped when something changed, so an unchanged refresh leaves the
+    dashboard caches warm; a CSV identical to the last one imported is not
+    even parsed.
+    
+    Args:
+        csv_path: Directory CSV
+        db_path: SQLite database path
+        batch_size: Rows per executemany() call
         
-        cursor.execute("""
-            INSERT INTO employees (employee_id, first_name, last_name, email, department, position, salary, hire_date, status)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (employee_id, first_name, last_name, email, department, title, salary, hire_date, status))
-    
-    conn.commit()
-    print(f"Inserted {len(unique_employees)} employees")
-    
-    # Get list of employee IDs
-    cursor.execute("SELECT employee_id, first_name, last_name, department FROM employees")
-    all_emps = cursor.fetchall()
-    
-    # Get unique departments
-    departments = list(set(emp[3] for emp in all_emps))
-    
-    # Generate some transfers (for about 20 employees)
-    for emp_id, first, last, current_dept in random.sample(all_emps, min(20, len(all_emps))):
-        other_depts = [d for d in departments if d != current_dept]
-        if other_depts:
-            from_dept = random.choice(other_depts)
-            transfer_date = (datetime.now() - timedelta(days=random.randint(30, 365))).strftime('%Y-%m-%d')
-            cursor.execute("""
-                INSERT INTO transfers (employee_id, from_department, to_department, transfer_date, reason)
-                VALUES (?, ?, ?, ?, ?)
-            """, (emp_id, from_dept, current_dept, transfer_date, random.choice([
-                'Promotion', 'Restructuring', 'Career Development', 'Team Expansion', 'Skills Match'
-            ])))
-    
-    conn.commit()
-    print("Inserted transfers")
-    
-    # Generate feedback (for about 40 employees)
-    feedback_types = ['Performance Review', 'Peer Feedback', '360 Review', 'Manager Feedback', 'Self Assessment']
-    reviewers = ['HR Team', 'Direct Manager', 'Department Head', 'Peer Review Committee', 'Self']
-    
-    for emp_id, first, last, dept in random.sample(all_emps, min(40, len(all_emps))):
-        feedback_date = (datetime.now() - timedelta(days=random.randint(1, 180))).strftime('%Y-%m-%d')
-        rating = random.choices([3, 4, 5, 4, 5], weights=[10, 25, 35, 20, 10])[0]
-        cursor.execute("""
-            INSERT INTO feedback (employee_id, feedback_date, rating, feedback_type, comments, reviewer)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (emp_id, feedback_date, rating, random.choice(feedback_types), 
-              random.choice([
-                  "Excellent performance and team collaboration.",
-                  "Consistently meets expectations and deadlines.",
-                  "Shows great initiative and leadership potential.",
-                  "Good work ethic, room for improvement in communication.",
-                  "Outstanding contribution to recent projects.",
-                  "Reliable team member with strong technical skills.",
-                  "Demonstrates excellent problem-solving abilities.",
-                  "Great attention to detail and quality work.",
-                  "Strong communication and interpersonal skills.",
-                  "Proactive in identifying and resolving issues."
-              ]),
-              random.choice(reviewers)))
-    
-    conn.commit()
-    print("Inserted feedback")
-    
-    # Summary
+    Returns:
+        dict: Change counts ('added', 'updated', 'restored', 'moved', 'linked',
+        'removed', 'unchanged'), 'changed' total, 'skipped' (CSV identical to
+        the last import), 'seconds', and 'names' (a few example names per
+        kind of change)
+    """
+    start = time.perf_counter()
+    stats = {'read': 0, 'duplicates': 0}
+    summary = dict.fromkeys(SYNC_CHANGE_KINDS, 0)
+    summary.update(changed=0, skipped=False, names={})
+    csv_sha256 = file_sha256(csv_path)
+    
+    conn = sqlite3.connect(db_path)
+    try:
+        apply_migrations(conn)
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            last_import = conn.execute('SELECT csv_sha256 FROM directory_import WHERE id = 1').fetchone()
+            if last_import and last_import[0] == csv_sha256:
+                summary['skipped'] = True
+                summary['unchanged'] = conn.execute(
+                    'SELECT COUNT(*) FROM employees WHERE removed_at IS NULL').fetchone()[0]
+                conn.rollback()
+            else:
+                directory = {}
+                for department, name, title in read_directory(csv_path, stats):
+                    directory[source_key(name, department)] = (department, name, title if title else 'Employee')
+                changes = _diff_directory(conn, directory)
+                summary['changed'] = sum(len(changes[kind]) for kind in SYNC_CHANGE_KINDS)
+                if summary['changed']:
+                    _apply_changes(conn, changes, directory, batch_size)
+                    bump_data_version(conn)
+                conn.execute(RECORD_IMPORT_SQL, (csv_sha256,))
+                conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    finally:
+        conn.close()
+    
+    summary.update(read=stats['read'], duplicates=stats['duplicates'], seconds=time.perf_counter() - start)
+    if summary['skipped']:
+        return summary
+    summary['unchanged'] = changes['unchanged']
+    for kind in SYNC_CHANGE_KINDS:
+        examples = changes[kind][:SYNC_EXAMPLES]
+        summary[kind] = len(changes[kind])
+        if kind == 'added':
+            summary['names'][kind] = [directory[key][1] for key in examples]
+        elif kind == 'removed':
+            summary['names'][kind] = [name for _, name in examples]
+        elif kind == 'moved':
+            summary['names'][kind] = [f"{directory[key][1]} (-> {directory[key][0]})" for _, key in examples]
+        else:
+            summary['names'][kind] = [directory[key][1] for _, key in examples]
+    return summary
+
+def print_sync_summary(summary):
+    """Prints the change summary returned by sync_directory."""
+    if summary['skipped']:
+        print(f"Directory unchanged since the last import ({summary['unchanged']:,} current employees); "
+              f"nothing to do")
+        return
+    print(f"Read {summary['read']} rows, {summary['duplicates']} duplicate names skipped")
+    print(f"\n=== Sync Complete ({summary['seconds']:.2f}s) ===")
+    print(f"Unchanged: {summary['unchanged']:,}")
+    for kind in SYNC_CHANGE_KINDS:
+        if summary[kind]:
+            more = summary[kind] - len(summary['names'][kind])
+            examples = ', '.join(summary['names'][kind]) + (f", ... (+{more:,})" if more else '')
+            print(f"{kind.capitalize()}: {summary[kind]:,}  {examples}")
+    if not summary['changed']:
+        print("No changes; data version left as is")
+
+def print_summary(db_path=DB_PATH):
+    """Prints row counts, department sizes and sample employees."""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    
     cursor.execute("SELECT COUNT(*) FROM employees")
     emp_count = cursor.fetchone()[0]
     cursor.execute("SELECT COUNT(*) FROM transfers")
@@ -204,5 +631,39 @@ def main():
     
     conn.close()
 
+def print_progress(stage, rows, elapsed):
+    """Progress callback for the command line: employees rate, then each stage."""
+    if stage == 'employees':
+        print(f"\r  employees: {rows:,} rows ({rows / max(elapsed, 1e-9):,.0f} rows/s)", end='', flush=True)
+    elif stage == 'transfers':
+        print(f"\n  transfers: {rows:,} rows")
+    else:
+        print(f"  {stage}: {rows:,} ({elapsed:.2f}s elapsed)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Import the DivcoWest directory into the HR database")
+    parser.add_argument('--csv', default='divcowest_directory.csv', help="Directory CSV")
+    parser.add_argument('--db', default=DB_PATH, help="SQLite database")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="Rows per executemany()")
+    parser.add_argument('--transfers', type=int, default=20, help="Synthetic transfers to generate")
+    parser.add_argument('--feedback', type=int, default=40, help="Synthetic feedback records to generate")
+    parser.add_argument('--sync', action='store_true',
+                        help="Apply only the changes since the last import instead of reloading")
+    args = parser.parse_args()
+    
+    if args.sync:
+        print(f"Syncing {args.csv} into {args.db}")
+        print_sync_summary(sync_directory(args.csv, args.db, args.batch_size))
+        return
+    
+    print(f"Importing {args.csv} into {args.db}")
+    stats = import_directory(args.csv, args.db, args.batch_size, args.transfers, args.feedback,
+                             progress=print_progress)
+    print(f"Read {stats['read']} rows, {stats['duplicates']} duplicate names skipped")
+    print(f"Imported {stats['employees']:,} employees in {stats['seconds']:.2f}s "
+          f"({stats['employees_per_second']:,.0f} employees/s)")
+    
+    print_summary(args.db)
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,220 @@
+"""
+Keyword Scorer Module
+Vectorized BM25 scoring of every chunk at once: the inverted index is held
+in memory as a CSR term x chunk matrix of BM25 term weights, so a query is a
+row gather and one bincount instead of per-chunk Python loops
+"""
+
+import heapq
+import math
+from typing import Callable, Dict, Iterable, List, Tuple
+
+try:
+    import numpy as np
+    SCORER_AVAILABLE = True
+except ImportError:
+    np = None
+    SCORER_AVAILABLE = False
+
+from document_index import BM25_B, BM25_K1, InvertedIndex, TermLookup
+
+
+# Columns selected per requested result before apply_boosts sorts them
+BOOST_CANDIDATES_PER_RESULT = 4
+
+
+class KeywordScorer:
+    """
+    Read-only snapshot of the inverted index as CSR arrays.
+
+    Row t of the matrix holds term t's postings: chunk columns in
+    indices[indptr[t]:indptr[t + 1]] (ascending) and their BM25 weights
+    (idf x saturated, length-normalized tf) in weights[...], the same values
+    InvertedIndex.bm25_scores computes. Build one per index generation.
+
+    Attributes:
+        chunk_ids: Column -> chunk ID
+        columns: Chunk ID -> column
+        vocabulary: Row -> term
+        term_lookup: Substring lookups over the vocabulary, for partial matches
+        boosts: Named per-chunk score arrays set by the caller (see column_values)
+    """
+
+    def __init__(self, terms: List[str], chunk_ids: List[str], indptr, indices, tfs, lengths):
+        self.vocabulary = terms
+        self.rows = {term: row for row, term in enumerate(terms)}
+        self.chunk_ids = chunk_ids
+        self.columns = {chunk_id: column for column, chunk_id in enumerate(chunk_ids)}
+        self.indptr = indptr
+        self.indices = indices
+        self.num_chunks = len(chunk_ids)
+        self.avg_length = (float(lengths.sum()) / self.num_chunks if self.num_chunks else 0.0) or 1.0
+        self._norms = BM25_K1 * (1 - BM25_B + BM25_B * lengths / self.avg_length)
+        df = np.diff(indptr)
+        idf = np.log(1 + (max(self.num_chunks, 1) - df + 0.5) / (df + 0.5))
+        self.weights = np.repeat(idf, df) * tfs * (BM25_K1 + 1) / (tfs + self._norms[indices])
+        self.boosts = {}
+        self.term_lookup = TermLookup(terms)
+
+    @classmethod
+    def from_index(cls, index: InvertedIndex) -> 'KeywordScorer':
+        """Loads the index tables into CSR arrays (postings grouped per term by SQLite)."""
+        with index.kb.snapshot() as conn:
+            chunk_rows = conn.execute('SELECT chunk_id, length FROM index_chunks ORDER BY rowid').fetchall()
+            term_rows = conn.execute(
+                'SELECT term, group_concat(chunk_id), group_concat(tf) FROM index_postings GROUP BY term').fetchall()
+
+        chunk_ids = [row[0] for row in chunk_rows]
+        lengths = np.array([row[1] for row in chunk_rows], dtype=np.float64)
+        terms = [row[0] for row in term_rows]
+        df = np.array([row[1].count(',') + 1 for row in term_rows], dtype=np.int64)
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(df)
+        if not terms:
+            return cls(terms, chunk_ids, indptr, np.zeros(0, dtype=np.int64), np.zeros(0), lengths)
+
+        # Columns follow upload order; sort each term's postings by column
+        columns_of = {chunk_id: column for column, chunk_id in enumerate(chunk_ids)}
+        columns = np.array([columns_of[chunk_id] for chunk_id in ','.join(row[1] for row in term_rows).split(',')],
+                           dtype=np.int64)
+        tfs = np.array(','.join(row[2] for row in term_rows).split(','), dtype=np.float64)
+        order = np.argsort(np.repeat(np.arange(len(terms), dtype=np.int64), df) * len(chunk_ids) + columns,
+                           kind='stable')
+        return cls(terms, chunk_ids, indptr, columns[order], tfs[order], lengths)
+
+    # ------------------------------------------------------------------
+    # Scoring
+    # ------------------------------------------------------------------
+
+    def _row(self, term: str) -> Tuple[int, int]:
+        row = self.rows.get(term)
+        if row is None:
+            return 0, 0
+        return self.indptr[row], self.indptr[row + 1]
+
+    def term_scores(self, term_weights: Dict[str, float]):
+        """
+        Weighted BM25 sum over the given terms for every chunk.
+
+        Returns:
+            float64 array with one score per column
+        """
+        spans = [self._row(term) for term in term_weights]
+        if not any(stop > start for start, stop in spans):
+            return np.zeros(self.num_chunks)
+        positions = np.concatenate([np.arange(start, stop) for start, stop in spans])
+        factors = np.concatenate([np.full(stop - start, weight)
+                                  for (start, stop), weight in zip(spans, term_weights.values())])
+        return np.bincount(self.indices[positions], weights=self.weights[positions] * factors,
+                           minlength=self.num_chunks)
+
+    def column_values(self, values: Dict[str, float]):
+        """Per-chunk values (chunk ID -> value) as a score array; missing chunks are 0."""
+        result = np.zeros(self.num_chunks)
+        for chunk_id, value in values.items():
+            column = self.columns.get(chunk_id)
+            if column is not None:
+                result[column] = value
+        return result
+
+    def bm25(self, counts: Dict[str, int]) -> Tuple[object, object]:
+        """
+        BM25 of a pseudo-term (e.g. a phrase) from its per-chunk counts.
+
+        Returns:
+            (columns, scores) arrays
+        """
+        columns = np.array([self.columns[chunk_id] for chunk_id in counts if chunk_id in self.columns],
+                           dtype=np.int64)
+        if not len(columns):
+            return columns, np.zeros(0)
+        tfs = np.array([counts[self.chunk_ids[column]] for column in columns], dtype=np.float64)
+        df = len(columns)
+        idf = math.log(1 + (self.num_chunks - df + 0.5) / (df + 0.5))
+        return columns, idf * tfs * (BM25_K1 + 1) / (tfs + self._norms[columns])
+
+    def chunks_with_all(self, terms: Iterable[str]) -> List[str]:
+        """IDs of chunks containing every one of the terms."""
+        common = None
+        for term in terms:
+            start, stop = self._row(term)
+            columns = self.indices[start:stop]
+            common = columns if common is None else np.intersect1d(common, columns, assume_unique=True)
+            if not len(common):
+                return []
+        return [self.chunk_ids[column] for column in common] if common is not None else []
+
+    def mask(self, terms: Iterable[str]):
+        """Boolean array: chunk contains at least one of the terms."""
+        result = np.zeros(self.num_chunks, dtype=bool)
+        for term in terms:
+            start, stop = self._row(term)
+            result[self.indices[start:stop]] = True
+        return result
+
+    def contains(self, term: str, column: int) -> bool:
+        """Whether one chunk contains a term (binary search in the term's row)."""
+        start, stop = self._row(term)
+        position = start + np.searchsorted(self.indices[start:stop], column)
+        return position < stop and self.indices[position] == column
+
+    def related_terms(self, word: str) -> List[str]:
+        """Vocabulary terms (longer than 3 letters) containing, or contained in, a word."""
+        return self.term_lookup.related(word)
+
+    @staticmethod
+    def apply_boosts(scores, k: int, max_boost: float, boost: Callable[[int], float]) -> int:
+        """
+        Multiplies scores in place by boost(column), a factor between 1 and
+        max_boost, for every positive-scoring column that could still make
+        the top k. Columns are visited best first, and the pass stops once
+        even max_boost cannot lift the next one to the k-th best boosted
+        score; the columns skipped cannot enter the top k either way.
+
+        Only the best BOOST_CANDIDATES_PER_RESULT * k columns are selected
+        (argpartition) and sorted first. If the bound is not reached among
+        them, the rest are cut to the columns that could still pass it, and
+        only those are sorted.
+
+        Returns:
+            Number of columns boosted
+        """
+        positive = np.flatnonzero(scores > 0)
+        if k <= 0:
+            for column in positive:
+                scores[column] *= boost(column)
+            return len(positive)
+        size = k * BOOST_CANDIDATES_PER_RESULT
+        if len(positive) > size:
+            # Everything outside the window scores no higher than the window
+            split = np.argpartition(-scores[positive], size - 1)
+            windows = [positive[split[:size]], positive[split[size:]]]
+        else:
+            windows = [positive]
+        best = []  # min-heap of the k best boosted scores so far
+        visited = 0
+        for window in windows:
+            if len(best) == k:
+                window = window[scores[window] * max_boost >= best[0]]
+            # Best first; ties keep column order
+            for column in window[np.lexsort((window, -scores[window]))]:
+                if len(best) == k and scores[column] * max_boost < best[0]:
+                    return visited
+                scores[column] *= boost(column)
+                visited += 1
+                if len(best) < k:
+                    heapq.heappush(best, scores[column])
+                else:
+                    heapq.heappushpop(best, scores[column])
+        return visited
+
+    @staticmethod
+    def top_k(scores, k: int):
+        """Columns of the k highest positive scores, best first (argpartition, then sort of k)."""
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64)
+        positive = np.flatnonzero(scores > 0)
+        if len(positive) > k:
+            positive = positive[np.argpartition(-scores[positive], k - 1)[:k]]
+        # Ties keep column (upload) order
+        return positive[np.lexsort((positive, -scores[positive]))]
@@ -0,0 +1,179 @@
+"""
+LLM Response Cache Module
+Persistent SQLite cache for Gemini responses (generated SQL, general answers),
+keyed by normalized question + prompt context version + model, with TTL and
+LRU eviction
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+
+# Cache storage and limits
+LLM_CACHE_DB = os.getenv('HR_LLM_CACHE_DB', 'llm_cache.db')
+LLM_CACHE_TTL = float(os.getenv('HR_LLM_CACHE_TTL', 7 * 24 * 3600))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('HR_LLM_CACHE_SIZE', 2000))
+
+_WHITESPACE = re.compile(r'\s+')
+_TRAILING_PUNCTUATION = re.compile(r'[\s?!.]+$')
+
+
+def normalize_question(question: str) -> str:
+    """
+    Canonical form of a question for cache lookups: case, repeated whitespace
+    and trailing punctuation are ignored.
+    """
+    question = _WHITESPACE.sub(' ', question.strip().lower())
+    return _TRAILING_PUNCTUATION.sub('', question)
+
+
+def context_version(text: str) -> str:
+    """Short hash of prompt context (e.g. the database schema)."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+
+class LLMCache:
+    """
+    Disk-backed response cache.
+
+    Entries expire after `ttl` seconds; once more than `max_entries` are
+    stored, the least recently used ones are evicted. Because the context
+    version is part of the key, a schema change never serves a stale answer.
+    """
+
+    def __init__(self, db_path: str = LLM_CACHE_DB, ttl: float = LLM_CACHE_TTL,
+                 max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode = WAL').fetchall()
+        self._conn.execute('PRAGMA synchronous = NORMAL').fetchall()
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                cache_key TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                model TEXT NOT NULL,
+                context_version TEXT NOT NULL,
+                question TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                hit_count INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache(last_used)')
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0, 'stores': 0}
+
+    @staticmethod
+    def make_key(kind: str, question: str, context: str, model: str) -> str:
+        raw = '\x1f'.join([kind, model, context, normalize_question(question)])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, kind: str, question: str, context: str, model: str) -> Optional[str]:
+        """
+        Looks up a cached response.
+
+        Args:
+            kind: Response type ('sql', 'general', ...)
+            question: User question (normalized before lookup)
+            context: Context version the prompt was built from
+            model: Model the response was requested from
+
+        Returns:
+            The cached response text, or None
+        """
+        key = self.make_key(kind, question, context, model)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT response, created_at FROM llm_cache WHERE cache_key = ?', (key,)).fetchone()
+            if row is None:
+                self._stats['misses'] += 1
+                return None
+            if now - row[1] > self.ttl:
+                self._conn.execute('DELETE FROM llm_cache WHERE cache_key = ?', (key,))
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._conn.execute(
+                'UPDATE llm_cache SET last_used = ?, hit_count = hit_count + 1 WHERE cache_key = ?',
+                (now, key))
+            self._stats['hits'] += 1
+            return row[0]
+
+    def put(self, kind: str, question: str, context: str, model: str, response: str):
+        """Stores a response and evicts least recently used entries beyond the limit."""
+        key = self.make_key(kind, question, context, model)
+        now = time.time()
+        with self._lock:
+            self._conn.execute('''
+                INSERT OR REPLACE INTO llm_cache (cache_key, kind, model, context_version, question,
+                                                  response, created_at, last_used)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (key, kind, model, context, normalize_question(question), response, now, now))
+            self._stats['stores'] += 1
+            count = self._conn.execute('SELECT COUNT(*) FROM llm_cache').fetchone()[0]
+            if count > self.max_entries:
+                evicted = self._conn.execute('''
+                    DELETE FROM llm_cache WHERE cache_key IN (
+                        SELECT cache_key FROM llm_cache ORDER BY last_used LIMIT ?
+                    )
+                ''', (count - self.max_entries,)).rowcount
+                self._stats['evictions'] += evicted
+
+    def invalidate(self, kind: str = None, keep_context: str = None) -> int:
+        """
+        Deletes cached entries.
+
+        Args:
+            kind: Only delete entries of this kind (default: all)
+            keep_context: Keep entries built from this context version
+
+        Returns:
+            Number of entries deleted
+        """
+        clauses, params = [], []
+        if kind is not None:
+            clauses.append('kind = ?')
+            params.append(kind)
+        if keep_context is not None:
+            clauses.append('context_version != ?')
+            params.append(keep_context)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        with self._lock:
+            return self._conn.execute(f'DELETE FROM llm_cache {where}', params).rowcount
+
+    def stats(self) -> Dict:
+        """Hit/miss counters for this process plus the number of stored entries."""
+        with self._lock:
+            entries = self._conn.execute('SELECT COUNT(*) FROM llm_cache').fetchone()[0]
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['entries'] = entries
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMCache:
+    """Get the process-wide LLM cache, opening it on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMCache()
+    return _cache
@@ -0,0 +1,313 @@
+"""
+LLM Gateway Module
+Async front end for Gemini: one shared client, a bounded number of in-flight
+requests, coalescing of identical concurrent prompts and hedged requests
+across fallback models
+"""
+
+import asyncio
+import hashlib
+import os
+import queue
+import threading
+from typing import Callable, Dict, List, Optional
+
+from rate_limiter import QuotaExhaustedError, RateLimiter, RetryBudget
+
+
+# Concurrency and latency limits (overridable through the environment)
+MAX_IN_FLIGHT = int(os.getenv('HR_LLM_MAX_IN_FLIGHT', '4'))
+HEDGE_AFTER_SECONDS = float(os.getenv('HR_LLM_HEDGE_AFTER', '4.0'))
+REQUEST_TIMEOUT_SECONDS = float(os.getenv('HR_LLM_TIMEOUT', '60'))
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """True for quota / rate-limit errors (HTTP 429, RESOURCE_EXHAUSTED)."""
+    error_str = str(error)
+    return '429' in error_str or 'RESOURCE_EXHAUSTED' in error_str or 'quota' in error_str.lower()
+
+
+class LLMGateway:
+    """
+    Runs Gemini requests on a background asyncio loop shared by all sessions.
+
+    - At most `max_in_flight` requests are sent at once (per process).
+    - Identical prompts requested while one is in flight share its response.
+    - Each call goes to the most preferred model with client-side quota left
+      (see rate_limiter.RateLimiter); when none has any, the request waits
+      for the earliest refill instead of sending calls that would get a 429.
+    - A model that answers with a rate-limit error hands over to the next
+      model with quota; a model that is merely slow gets a hedged request to
+      another model after `hedge_after` seconds, and the first success wins.
+    - Retries and waits are bounded by a per-request RetryBudget.
+
+    Sync callers (the Streamlit script thread) use generate(); async code can
+    await agenerate() from the gateway's loop.
+    """
+
+    def __init__(self, client_factory: Callable, models: List[str],
+                 max_in_flight: int = MAX_IN_FLIGHT, hedge_after: float = HEDGE_AFTER_SECONDS,
+                 timeout: float = REQUEST_TIMEOUT_SECONDS, rate_limiter: RateLimiter = None):
+        self._client_factory = client_factory
+        self._client = None
+        self.models = list(models)
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.hedge_after = hedge_after
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self._semaphore = None
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._stats = {
+            'requests': 0,
+            'coalesced': 0,
+            'model_calls': 0,
+            'hedged': 0,
+            'fallbacks': 0,
+            'quota_waits': 0,
+            'streams': 0,
+            'errors': 0,
+            'in_flight': 0,
+            'max_in_flight_seen': 0,
+        }
+
+    # ------------------------------------------------------------------
+    # Event loop
+    # ------------------------------------------------------------------
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def run():
+                    asyncio.set_event_loop(loop)
+                    self._semaphore = asyncio.Semaphore(self.max_in_flight)
+                    ready.set()
+                    loop.run_forever()
+
+                self._thread = threading.Thread(target=run, name='llm-gateway', daemon=True)
+                self._thread.start()
+                ready.wait()
+                self._loop = loop
+            return self._loop
+
+    @property
+    def client(self):
+        """The shared Gemini client (created on first use)."""
+        with self._lock:
+            if self._client is None:
+                self._client = self._client_factory()
+            return self._client
+
+    def close(self):
+        """Stops the background loop."""
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is not None:
+            loop.call_soon_threadsafe(loop.stop)
+            self._thread.join(timeout=5)
+            loop.close()
+
+    # ------------------------------------------------------------------
+    # Requests
+    # ------------------------------------------------------------------
+
+    def generate(self, prompt: str):
+        """
+        Blocking call for sync code: sends the prompt and returns the response.
+
+        Args:
+            prompt: Prompt text
+
+        Returns:
+            The model response (has a .text attribute)
+        """
+        loop = self._ensure_loop()
+        budget = RetryBudget()
+        self._local.retry_budget = budget
+        future = asyncio.run_coroutine_threadsafe(self.agenerate(prompt, budget), loop)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            future.cancel()
+            raise TimeoutError(f"Gemini request timed out after {self.timeout:.0f}s")
+
+    def stream(self, prompt: str):
+        """
+        Blocking generator for sync code: yields the response text in chunks
+        as the model produces them (no hedging; a model that is rate limited
+        before its first chunk hands over to the next one with quota).
+
+        Args:
+            prompt: Prompt text
+
+        Yields:
+            str: Text chunks
+        """
+        loop = self._ensure_loop()
+        budget = RetryBudget()
+        self._local.retry_budget = budget
+        chunks = queue.Queue()
+        done = object()
+
+        async def produce():
+            tried = []
+            try:
+                while True:
+                    model = self.rate_limiter.acquire(self.models, exclude=tried) if budget.try_attempt() else None
+                    if model is None:
+                        raise QuotaExhaustedError(self.rate_limiter.wait_time(self.models))
+                    tried.append(model)
+                    started = False
+                    try:
+                        async with self._semaphore:
+                            self._stats['model_calls'] += 1
+                            self._stats['streams'] += 1
+                            response = await self.client.aio.models.generate_content_stream(
+                                model=model, contents=prompt)
+                            async for chunk in response:
+                                if chunk.text:
+                                    started = True
+                                    chunks.put(chunk.text)
+                        self.rate_limiter.record_success(model)
+                        return
+                    except Exception as error:
+                        if started or not is_rate_limit_error(error):
+                            raise
+                        self.rate_limiter.record_rate_limit(model, error)
+                        self._stats['fallbacks'] += 1
+            except Exception as error:
+                self._stats['errors'] += 1
+                chunks.put(error)
+            finally:
+                chunks.put(done)
+
+        future = asyncio.run_coroutine_threadsafe(produce(), loop)
+        try:
+            while True:
+                try:
+                    item = chunks.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise TimeoutError(f"Gemini stream stalled for {self.timeout:.0f}s")
+                if item is done:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            future.cancel()
+
+    def last_retry_budget(self) -> Optional[Dict]:
+        """Retry budget of the calling thread's most recent request."""
+        budget = getattr(self._local, 'retry_budget', None)
+        return budget.snapshot() if budget is not None else None
+
+    async def agenerate(self, prompt: str, budget: RetryBudget = None):
+        """Coalescing entry point; must run on the gateway loop."""
+        self._stats['requests'] += 1
+        key = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        pending = self._pending.get(key)
+        if pending is not None:
+            self._stats['coalesced'] += 1
+            return await asyncio.shield(pending)
+
+        task = asyncio.ensure_future(self._generate_hedged(prompt, budget or RetryBudget()))
+        self._pending[key] = task
+        task.add_done_callback(lambda _: self._pending.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _call_model(self, model: str, prompt: str):
+        async with self._semaphore:
+            # The model may have hit its quota while this call queued for a slot
+            blocked_for = self.rate_limiter.blocked_for(model)
+            if blocked_for > 0:
+                raise QuotaExhaustedError(blocked_for)
+            self._stats['model_calls'] += 1
+            self._stats['in_flight'] += 1
+            self._stats['max_in_flight_seen'] = max(self._stats['max_in_flight_seen'],
+                                                    self._stats['in_flight'])
+            try:
+                return await self.client.aio.models.generate_content(model=model, contents=prompt)
+            finally:
+                self._stats['in_flight'] -= 1
+
+    async def _generate_hedged(self, prompt: str, budget: RetryBudget):
+        if not self.models:
+            raise Exception("All Gemini models are unavailable")
+
+        attempts = {}
+        last_error = None
+
+        def launch() -> bool:
+            """Starts a call on the best model with quota that isn't already running."""
+            if not budget.try_attempt():
+                return False
+            model = self.rate_limiter.acquire(self.models, exclude=attempts.values())
+            if model is None:
+                budget.refund()
+                return False
+            attempts[asyncio.ensure_future(self._call_model(model, prompt))] = model
+            return True
+
+        try:
+            while True:
+                if not attempts and not launch():
+                    # Nothing running and no quota: wait for the earliest refill if the budget allows
+                    wait = self.rate_limiter.wait_time(self.models)
+                    if not budget.can_attempt() or wait > budget.time_left():
+                        break
+                    self._stats['quota_waits'] += 1
+                    budget.waited += wait
+                    await asyncio.sleep(wait)
+                    continue
+
+                can_hedge = len(attempts) < len(self.models) and budget.can_attempt()
+                done, _ = await asyncio.wait(
+                    attempts.keys(),
+                    timeout=self.hedge_after if can_hedge else None,
+                    return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    # Slow model: race another model with quota against it
+                    if launch():
+                        self._stats['hedged'] += 1
+                    else:
+                        # No quota to hedge with: wait for what is running
+                        done, _ = await asyncio.wait(attempts.keys(), return_when=asyncio.FIRST_COMPLETED)
+                    if not done:
+                        continue
+
+                for task in done:
+                    model = attempts.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        response = task.result()
+                        headers = getattr(getattr(response, 'sdk_http_response', None), 'headers', None)
+                        self.rate_limiter.record_success(model, headers)
+                        return response
+                    last_error = error
+                    if is_rate_limit_error(error):
+                        # Block the model for its retry delay; the loop moves on to one with quota
+                        if not isinstance(error, QuotaExhaustedError):
+                            self.rate_limiter.record_rate_limit(model, error)
+                        self._stats['fallbacks'] += 1
+                    elif not attempts:
+                        self._stats['errors'] += 1
+                        raise error
+        finally:
+            for task in attempts:
+                task.cancel()
+
+        self._stats['errors'] += 1
+        if last_error is not None and not is_rate_limit_error(last_error):
+            raise last_error
+        raise QuotaExhaustedError(self.rate_limiter.wait_time(self.models))
+
+    def stats(self) -> Dict:
+        """Request, coalescing, hedging and concurrency counters, plus rate limiter state."""
+        return {**self._stats, 'rate_limiter': self.rate_limiter.stats()}
@@ -0,0 +1,213 @@
+"""
+Query Engine Module
+Sandboxed execution of AI-generated SQL: read-only connections, a hard time
+limit, row and byte caps on the result, and per-query cost reporting
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List
+from urllib.parse import quote
+
+import db_utils
+from sql_validator import (QUERY_TIME_BUDGET, QueryTimeoutError, SQLRejectedError, check_query_plan,
+                           query_time_budget, validate_sql)
+
+
+# Result caps (overridable through the environment)
+MAX_RESULT_ROWS = int(os.getenv('HR_SQL_MAX_ROWS', '1000'))
+MAX_RESULT_BYTES = int(os.getenv('HR_SQL_MAX_BYTES', str(4 * 1024 * 1024)))
+MAX_VALUE_BYTES = 1024 * 1024  # longest string/blob one expression may build
+FETCH_BATCH_SIZE = 256
+ENGINE_POOL_SIZE = int(os.getenv('HR_SQL_POOL_SIZE', '4'))
+
+# Reader-side pragmas; the page cache is kept smaller than the app's pool
+READ_ONLY_PRAGMAS = {
+    'query_only': 'ON',
+    'cache_size': -8000,
+    'mmap_size': 268435456,
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,
+}
+
+
+def open_read_only(db_path):
+    """
+    Opens the database in read-only URI mode (mode=ro) with query_only set,
+    so generated SQL cannot write even if validation missed something.
+    """
+    conn = sqlite3.connect(f"file:{quote(os.path.abspath(db_path))}?mode=ro", uri=True,
+                           check_same_thread=False, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    for name, value in READ_ONLY_PRAGMAS.items():
+        conn.execute(f'PRAGMA {name} = {value}').fetchall()
+    if hasattr(conn, 'setlimit'):  # Python 3.11+
+        # Stops printf('%.999999999c', ...) and friends from building huge values
+        conn.setlimit(sqlite3.SQLITE_LIMIT_LENGTH, MAX_VALUE_BYTES)
+    return conn
+
+
+def _value_size(value) -> int:
+    if value is None:
+        return 0
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    return 8
+
+
+class QueryResult:
+    """
+    Columnar query result.
+
+    Attributes:
+        columns: Column names, in query order
+        data: {column: [values]}
+        row_count: Rows returned (after caps)
+        truncated: Reason the result was cut short ('rows' or 'bytes'), or None
+        elapsed_ms: Wall-clock time for plan check, execution and fetch
+        vm_steps: SQLite VM instructions executed, to a resolution of
+            PROGRESS_CHECK_STEPS; a measure of rows scanned and work done
+        result_bytes: Approximate size of the returned values
+    """
+
+    def __init__(self, columns: List[str], rows: List[tuple], truncated=None,
+                 elapsed_ms=0.0, vm_steps=0, result_bytes=0):
+        self.columns = list(columns)
+        self.data = {column: [row[i] for row in rows] for i, column in enumerate(self.columns)}
+        self.row_count = len(rows)
+        self.truncated = truncated
+        self.elapsed_ms = elapsed_ms
+        self.vm_steps = vm_steps
+        self.result_bytes = result_bytes
+
+    def __len__(self):
+        return self.row_count
+
+    def to_records(self) -> List[Dict]:
+        """Rows as dicts (the shape answer formatting expects)."""
+        columns = [self.data[column] for column in self.columns]
+        return [dict(zip(self.columns, values)) for values in zip(*columns)]
+
+    def stats(self) -> Dict:
+        return {
+            'rows': self.row_count,
+            'truncated': self.truncated,
+            'elapsed_ms': round(self.elapsed_ms, 1),
+            'vm_steps': self.vm_steps,
+            'result_bytes': self.result_bytes,
+        }
+
+
+class QueryEngine:
+    """
+    Runs generated SQL on its own pool of read-only connections.
+
+    Each query is validated (sql_validator.validate_sql), plan-checked for
+    cross joins, interrupted after `time_budget` seconds, and fetched in
+    batches until `max_rows` rows or `max_bytes` of values; the rest of the
+    result is never materialized.
+    """
+
+    def __init__(self, db_path: str, pool_size: int = ENGINE_POOL_SIZE,
+                 time_budget: float = QUERY_TIME_BUDGET, max_rows: int = MAX_RESULT_ROWS,
+                 max_bytes: int = MAX_RESULT_BYTES):
+        self.db_path = db_path
+        self.time_budget = time_budget
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self._pool = db_utils.ConnectionPool(db_path, pool_size, connect=open_read_only)
+        self._lock = threading.Lock()
+        self._stats = {'queries': 0, 'rejected': 0, 'timeouts': 0, 'errors': 0, 'truncated': 0, 'total_ms': 0.0}
+
+    def execute(self, sql: str, params=()) -> QueryResult:
+        """
+        Validates and runs one generated query.
+
+        Args:
+            sql: Generated SQL
+            params: Values for the query's ? placeholders
+
+        Returns:
+            QueryResult
+
+        Raises:
+            sql_validator.SQLRejectedError: If validation or the plan check fails
+            sql_validator.QueryTimeoutError: If the query ran out of time
+        """
+        start = time.perf_counter()
+        try:
+            query = validate_sql(sql)
+            with self._pool.reader() as conn:
+                check_query_plan(conn, query, params)
+                with query_time_budget(conn, self.time_budget) as budget:
+                    cursor = conn.execute(query.sql, params)
+                    columns = [description[0] for description in cursor.description or ()]
+                    rows, size, truncated = self._fetch(cursor)
+                    cursor.close()
+        except SQLRejectedError:
+            self._record(start, 'rejected')
+            raise
+        except QueryTimeoutError:
+            self._record(start, 'timeouts')
+            raise
+        except Exception:
+            self._record(start, 'errors')
+            raise
+        self._record(start, 'truncated' if truncated else None)
+        return QueryResult(columns, rows, truncated, (time.perf_counter() - start) * 1000,
+                           budget.steps, size)
+
+    def _record(self, start, outcome):
+        with self._lock:
+            self._stats['queries'] += 1
+            self._stats['total_ms'] += (time.perf_counter() - start) * 1000
+            if outcome:
+                self._stats[outcome] += 1
+
+    def _fetch(self, cursor):
+        """Fetches in batches until the row or byte cap; returns (rows, bytes, truncated)."""
+        rows, size = [], 0
+        while True:
+            batch = cursor.fetchmany(FETCH_BATCH_SIZE)
+            if not batch:
+                return rows, size, None
+            for row in batch:
+                if len(rows) >= self.max_rows:
+                    return rows, size, 'rows'
+                row_size = sum(_value_size(value) for value in row)
+                if size + row_size > self.max_bytes:
+                    return rows, size, 'bytes'
+                rows.append(tuple(row))
+                size += row_size
+
+    def stats(self) -> Dict:
+        """Query, rejection, timeout, error and truncation counters plus pool state."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['avg_ms'] = round(stats['total_ms'] / stats['queries'], 1) if stats['queries'] else 0.0
+        stats['total_ms'] = round(stats['total_ms'], 1)
+        stats['pool'] = self._pool.stats()
+        return stats
+
+    def close(self):
+        self._pool.close()
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_query_engine() -> QueryEngine:
+    """
+    Returns the process-wide engine for the current database
+    (recreated if db_utils.configure_pool pointed the app elsewhere).
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is None or _engine.db_path != db_utils.DB_PATH:
+            if _engine is not None:
+                _engine.close()
+            _engine = QueryEngine(db_utils.DB_PATH)
+        return _engine
@@ -0,0 +1,257 @@
+"""
+Rate Limiter Module
+Client-side quota tracking for Gemini models: per-model token buckets learned
+from responses and 429 errors, exponential backoff with full jitter, and
+per-request retry budgets
+"""
+
+import os
+import random
+import re
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+
+# Free-tier requests per minute, used until a model's real limit is learned
+DEFAULT_MODEL_RPM = {
+    'gemini-2.5-flash': 10,
+    'gemini-2.0-flash': 15,
+    'gemini-2.0-flash-lite': 30,
+}
+FALLBACK_RPM = int(os.getenv('HR_LLM_DEFAULT_RPM', '10'))
+
+# Backoff: full jitter over an exponentially growing window
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_CAP_SECONDS = 30.0
+
+# Per-request retry budget
+RETRY_MAX_ATTEMPTS = int(os.getenv('HR_LLM_MAX_ATTEMPTS', '5'))
+RETRY_DEADLINE_SECONDS = float(os.getenv('HR_LLM_RETRY_DEADLINE', '20'))
+
+_RETRY_DELAY_PATTERN = re.compile(r'retryDelay[\'"]?\s*:\s*[\'"]?(\d+(?:\.\d+)?)s')
+_QUOTA_VALUE_PATTERN = re.compile(r'quotaValue[\'"]?\s*:\s*[\'"]?(\d+)')
+_QUOTA_ID_PATTERN = re.compile(r'quotaId[\'"]?\s*:\s*[\'"]?([\w-]+)')
+
+
+def backoff_delay(attempt: int, base: float = BACKOFF_BASE_SECONDS, cap: float = BACKOFF_CAP_SECONDS) -> float:
+    """
+    Exponential backoff with full jitter: uniform in [0, min(cap, base * 2**attempt)].
+    Spreading retries over the whole window avoids synchronized retry storms.
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def parse_rate_limit_error(error: Exception) -> Dict:
+    """
+    Extracts retry hints from a Gemini 429 error.
+
+    Returns:
+        dict with 'retry_after' (seconds or None), 'quota_limit' (requests per
+        window or None) and 'per_day' (True for daily quotas)
+    """
+    text = str(error)
+    retry_after = None
+    match = _RETRY_DELAY_PATTERN.search(text)
+    if match:
+        retry_after = float(match.group(1))
+    else:
+        headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+        try:
+            retry_after = float(headers.get('retry-after'))
+        except (TypeError, ValueError):
+            pass
+    match = _QUOTA_VALUE_PATTERN.search(text)
+    quota_id = _QUOTA_ID_PATTERN.search(text)
+    return {
+        'retry_after': retry_after,
+        'quota_limit': int(match.group(1)) if match else None,
+        'per_day': bool(quota_id and 'PerDay' in quota_id.group(1)),
+    }
+
+
+class QuotaExhaustedError(Exception):
+    """
+    Raised without a network call when the client-side limiter knows a model
+    (or every model) is out of quota within the request's retry budget.
+    """
+
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(f"429 RESOURCE_EXHAUSTED: client-side quota exhausted, "
+                         f"retry in {retry_after:.0f}s")
+
+
+class TokenBucket:
+    """
+    Requests-per-minute bucket for one model.
+    A 429 empties the bucket and blocks it until the server's retry delay
+    (or a jittered backoff) has passed.
+    """
+
+    def __init__(self, rpm: float):
+        self.rpm = max(1.0, float(rpm))
+        self.tokens = self.rpm
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.consecutive_limits = 0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.rpm, self.tokens + (now - self.updated) * self.rpm / 60.0)
+        self.updated = now
+
+    def try_acquire(self, now: float) -> bool:
+        self._refill(now)
+        if now < self.blocked_until or self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until a token is available."""
+        self._refill(now)
+        refill_wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) * 60.0 / self.rpm
+        return max(self.blocked_until - now, refill_wait, 0.0)
+
+
+class RetryBudget:
+    """
+    Attempts and time one request may still spend on retries and fallbacks.
+    """
+
+    def __init__(self, max_attempts: int = RETRY_MAX_ATTEMPTS, deadline: float = RETRY_DEADLINE_SECONDS):
+        self.max_attempts = max_attempts
+        self.attempts = 0
+        self.started = time.monotonic()
+        self.deadline = deadline
+        self.waited = 0.0
+
+    def try_attempt(self) -> bool:
+        if self.attempts >= self.max_attempts:
+            return False
+        self.attempts += 1
+        return True
+
+    def refund(self):
+        self.attempts = max(0, self.attempts - 1)
+
+    def can_attempt(self) -> bool:
+        return self.attempts < self.max_attempts and self.time_left() > 0
+
+    def time_left(self) -> float:
+        return max(0.0, self.deadline - (time.monotonic() - self.started))
+
+    def snapshot(self) -> Dict:
+        return {
+            'attempts_used': self.attempts,
+            'attempts_left': max(0, self.max_attempts - self.attempts),
+            'seconds_left': round(self.time_left(), 1),
+            'seconds_waited': round(self.waited, 1),
+        }
+
+
+class RateLimiter:
+    """
+    Per-model token buckets plus a quota-aware model choice.
+    Thread-safe; shared by every request in the process.
+    """
+
+    def __init__(self, model_rpm: Dict[str, float] = None):
+        self._model_rpm = dict(DEFAULT_MODEL_RPM if model_rpm is None else model_rpm)
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+        self._stats = {'acquired': 0, 'throttled': 0, 'rate_limited': 0, 'learned_limits': 0}
+
+    def _bucket(self, model: str) -> TokenBucket:
+        bucket = self._buckets.get(model)
+        if bucket is None:
+            bucket = self._buckets[model] = TokenBucket(self._model_rpm.get(model, FALLBACK_RPM))
+        return bucket
+
+    def acquire(self, models: Iterable[str], exclude: Iterable[str] = ()) -> Optional[str]:
+        """
+        Takes a token from the first model (in preference order) that has quota.
+
+        Returns:
+            The model to call, or None if every model is out of quota
+        """
+        exclude = set(exclude)
+        now = time.monotonic()
+        with self._lock:
+            for model in models:
+                if model not in exclude and self._bucket(model).try_acquire(now):
+                    self._stats['acquired'] += 1
+                    return model
+            self._stats['throttled'] += 1
+            return None
+
+    def blocked_for(self, model: str) -> float:
+        """Seconds a model stays blocked after a 429 (0 if it isn't)."""
+        with self._lock:
+            return max(0.0, self._bucket(model).blocked_until - time.monotonic())
+
+    def wait_time(self, models: Iterable[str]) -> float:
+        """Seconds until any of the models has quota again."""
+        now = time.monotonic()
+        with self._lock:
+            return min((self._bucket(m).wait_time(now) for m in models), default=0.0)
+
+    def record_success(self, model: str, headers: Dict = None):
+        """Resets a model's backoff and learns its limit from response headers, if sent."""
+        with self._lock:
+            bucket = self._bucket(model)
+            bucket.consecutive_limits = 0
+            if headers:
+                limit = headers.get('x-ratelimit-limit-requests')
+                remaining = headers.get('x-ratelimit-remaining-requests')
+                try:
+                    if limit is not None:
+                        bucket.rpm = max(1.0, float(limit))
+                        self._stats['learned_limits'] += 1
+                    if remaining is not None:
+                        bucket.tokens = min(bucket.tokens, float(remaining))
+                except ValueError:
+                    pass
+
+    def record_rate_limit(self, model: str, error: Exception) -> float:
+        """
+        Blocks a model after a 429: until the server's retryDelay if given,
+        otherwise for a jittered exponential backoff. A reported quota value
+        becomes the bucket's new rate.
+
+        Returns:
+            Seconds the model is blocked for
+        """
+        hints = parse_rate_limit_error(error)
+        now = time.monotonic()
+        with self._lock:
+            self._stats['rate_limited'] += 1
+            bucket = self._bucket(model)
+            bucket._refill(now)
+            bucket.tokens = 0
+            if hints['quota_limit'] and not hints['per_day']:
+                bucket.rpm = max(1.0, float(hints['quota_limit']))
+                self._stats['learned_limits'] += 1
+            delay = hints['retry_after']
+            if delay is None:
+                delay = BACKOFF_BASE_SECONDS + backoff_delay(bucket.consecutive_limits)
+            else:
+                # Small jitter so waiting requests don't all return at the same instant
+                delay += random.uniform(0, 1.0)
+            bucket.consecutive_limits += 1
+            bucket.blocked_until = max(bucket.blocked_until, now + delay)
+            return delay
+
+    def stats(self) -> Dict:
+        """Counters plus per-model rate, tokens and remaining block time."""
+        now = time.monotonic()
+        with self._lock:
+            models = {}
+            for model, bucket in self._buckets.items():
+                bucket._refill(now)
+                models[model] = {
+                    'rpm': bucket.rpm,
+                    'tokens': round(bucket.tokens, 2),
+                    'blocked_for': round(max(0.0, bucket.blocked_until - now), 1),
+                }
+            return {**self._stats, 'models': models}
@@ -0,0 +1,176 @@
+"""
+Result Formatter Module
+Renders SQL query results as markdown (summaries, tables, rankings and
+group-by comparisons) from their column names and value types, without an
+LLM call
+"""
+
+import re
+from typing import Dict, List, Optional
+
+
+# Rows shown in tables and rankings before "...and N more"
+MAX_TABLE_ROWS = 20
+
+_MONEY_COLUMNS = re.compile(r'salary|pay|compensation|wage|bonus|cost', re.IGNORECASE)
+_RATING_COLUMNS = re.compile(r'rating|score', re.IGNORECASE)
+_COUNT_COLUMNS = re.compile(r'count|total|number|num_|headcount', re.IGNORECASE)
+_ORDER_BY = re.compile(r'ORDER\s+BY\s+(?:\w+\.)?(\w+)(?:\s+(ASC|DESC))?', re.IGNORECASE)
+_HIDDEN_COLUMNS = {'id'}
+
+_COLUMN_LABELS = {
+    'employee_count': 'Employees',
+    'avg_salary': 'Average Salary',
+    'average_salary': 'Average Salary',
+    'min_salary': 'Min Salary',
+    'max_salary': 'Max Salary',
+    'avg_rating': 'Average Rating',
+    'average_rating': 'Average Rating',
+    'employee_id': 'Employee ID',
+    'employee_name': 'Employee',
+    'from_department': 'From',
+    'to_department': 'To',
+}
+
+
+def column_label(column: str) -> str:
+    """Human-readable header for a result column."""
+    return _COLUMN_LABELS.get(column.lower(), column.replace('_', ' ').title())
+
+
+def format_value(column: str, value) -> str:
+    """Formats one value based on its column name and type."""
+    if value is None:
+        return '—'
+    if isinstance(value, bool):
+        return 'Yes' if value else 'No'
+    if isinstance(value, (int, float)):
+        if _MONEY_COLUMNS.search(column):
+            return f"${value:,.0f}" if float(value).is_integer() else f"${value:,.2f}"
+        if _RATING_COLUMNS.search(column):
+            return f"{value:.2f}".rstrip('0').rstrip('.') if isinstance(value, float) else str(value)
+        if isinstance(value, float) and not value.is_integer():
+            return f"{value:,.2f}"
+        return f"{int(value):,}"
+    return str(value).replace('|', '\\|').replace('\n', ' ')
+
+
+def _is_numeric(results: List[Dict], column: str) -> bool:
+    values = [row[column] for row in results if row.get(column) is not None]
+    return bool(values) and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values)
+
+
+def _display_columns(results: List[Dict]) -> List[str]:
+    """Result columns with first/last name merged into one 'name' column."""
+    columns = [c for c in results[0].keys() if c.lower() not in _HIDDEN_COLUMNS]
+    if 'first_name' in columns and 'last_name' in columns:
+        position = columns.index('first_name')
+        columns = [c for c in columns if c not in ('first_name', 'last_name')]
+        columns.insert(position, 'name')
+    return columns
+
+
+def _cell(row: Dict, column: str):
+    if column == 'name' and 'name' not in row:
+        return f"{row.get('first_name', '')} {row.get('last_name', '')}".strip()
+    return row.get(column)
+
+
+def _person_label(row: Dict) -> Optional[str]:
+    if 'first_name' in row or 'last_name' in row:
+        return f"{row.get('first_name', '')} {row.get('last_name', '')}".strip()
+    for column in ('employee_name', 'name'):
+        if row.get(column):
+            return str(row[column])
+    return None
+
+
+def markdown_table(results: List[Dict], columns: List[str] = None, max_rows: int = MAX_TABLE_ROWS) -> str:
+    """Renders rows as a markdown table."""
+    columns = columns or _display_columns(results)
+    lines = [
+        '| ' + ' | '.join(column_label(c) for c in columns) + ' |',
+        '|' + '|'.join('---:' if _is_numeric(results, c) else '---' for c in columns) + '|',
+    ]
+    for row in results[:max_rows]:
+        lines.append('| ' + ' | '.join(format_value(c, _cell(row, c)) for c in columns) + ' |')
+    table = '\n'.join(lines)
+    if len(results) > max_rows:
+        table += f"\n\n_...and {len(results) - max_rows} more rows_"
+    return table
+
+
+def _ranking_column(results: List[Dict], sql_query: str):
+    """(column, descending) if the query ranks rows by a numeric column."""
+    match = _ORDER_BY.search(sql_query or '')
+    if not match or match.group(1) not in results[0] or not _is_numeric(results, match.group(1)):
+        return None
+    return match.group(1), (match.group(2) or 'ASC').upper() == 'DESC'
+
+
+def _format_group_by(label_column: str, value_columns: List[str], results: List[Dict]) -> str:
+    """Aggregates per group: summary of the extremes, then a table."""
+    primary = value_columns[0]
+    ranked = sorted((r for r in results if r.get(primary) is not None), key=lambda r: r[primary], reverse=True)
+    group = column_label(label_column).lower()
+    summary = f"**{column_label(primary)} by {group}** ({len(results)} {group}s)"
+    if len(ranked) >= 2:
+        top, bottom = ranked[0], ranked[-1]
+        summary += (f"\n\n- Highest: **{top[label_column]}** ({format_value(primary, top[primary])})"
+                    f"\n- Lowest: **{bottom[label_column]}** ({format_value(primary, bottom[primary])})")
+        if top[primary] and bottom[primary]:
+            difference = top[primary] - bottom[primary]
+            summary += (f"\n- Difference: {format_value(primary, difference)} "
+                        f"({difference / bottom[primary]:.0%} above the lowest)")
+        if _COUNT_COLUMNS.search(primary) and not _MONEY_COLUMNS.search(primary):
+            summary += f"\n- Total: {format_value(primary, sum(r[primary] for r in ranked))}"
+    return summary + '\n\n' + markdown_table(results, [label_column] + value_columns)
+
+
+def _format_ranking(column: str, descending: bool, results: List[Dict]) -> str:
+    """Numbered list of people ranked by a numeric column."""
+    direction = 'highest' if descending else 'lowest'
+    lines = [f"**{len(results)} result(s), ranked by {column_label(column).lower()} ({direction} first):**", '']
+    detail_columns = [c for c in _display_columns(results) if c not in ('name', column)]
+    for i, row in enumerate(results[:MAX_TABLE_ROWS], 1):
+        label = _person_label(row)
+        details = ', '.join(format_value(c, row[c]) for c in detail_columns
+                            if c != 'employee_name' and row.get(c) is not None)
+        line = f"{i}. **{label}** — {format_value(column, row[column])}"
+        lines.append(line + (f" ({details})" if details else ''))
+    if len(results) > MAX_TABLE_ROWS:
+        lines.append(f"\n_...and {len(results) - MAX_TABLE_ROWS} more_")
+    return '\n'.join(lines)
+
+
+def format_results(results: List[Dict], sql_query: str = None) -> str:
+    """
+    Formats multi-row query results as markdown.
+
+    - One text column plus numeric columns: group-by aggregate summary + table
+    - Rows ordered by a numeric column: ranking
+    - Anything else: summary line + table
+
+    Args:
+        results: Result rows as dicts
+        sql_query: The executed SQL (used to detect rankings)
+
+    Returns:
+        str: Markdown answer
+    """
+    if not results:
+        return "No data found matching your query."
+
+    columns = _display_columns(results)
+    numeric = [c for c in columns if c != 'name' and _is_numeric(results, c)]
+    text = [c for c in columns if c not in numeric]
+
+    if len(text) == 1 and numeric and text[0] != 'name' and _person_label(results[0]) is None:
+        return _format_group_by(text[0], numeric, results)
+
+    ranking = _ranking_column(results, sql_query)
+    if ranking and _person_label(results[0]) is not None:
+        return _format_ranking(ranking[0], ranking[1], results)
+
+    noun = 'employee' if 'first_name' in results[0] else 'result'
+    return f"**Found {len(results)} {noun}(s):**\n\n" + markdown_table(results, columns)
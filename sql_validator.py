@@ -0,0 +1,319 @@
+"""
+SQL Validator Module
+Checks generated SQL before it runs: a tokenizer-based check that it is one
+read-only SELECT over the known tables, a query-plan check that rejects
+cross joins, and a time budget enforced through SQLite's progress handler.
+query_engine.QueryEngine runs validated queries
+"""
+
+import os
+import re
+import sqlite3
+import time
+from collections import defaultdict, namedtuple
+from contextlib import contextmanager
+
+
+# Tables generated queries may read
+KNOWN_TABLES = frozenset({'employees', 'transfers', 'feedback'})
+
+# Rows returned when the query has no LIMIT of its own
+DEFAULT_ROW_LIMIT = 100
+
+# Wall-clock budget per query (seconds) and how often SQLite checks it (VM steps)
+QUERY_TIME_BUDGET = float(os.getenv('HR_SQL_TIME_BUDGET', '2.0'))
+PROGRESS_CHECK_STEPS = 1000
+
+# Words that never belong in a read-only query, wherever they appear
+FORBIDDEN_KEYWORDS = frozenset({
+    'INSERT', 'UPDATE', 'DELETE', 'DROP', 'ALTER', 'CREATE', 'ATTACH', 'DETACH',
+    'PRAGMA', 'VACUUM', 'REINDEX', 'ANALYZE', 'TRUNCATE', 'EXEC', 'EXECUTE',
+    'BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE',
+})
+
+# Functions that touch the file system or build huge values
+FORBIDDEN_FUNCTIONS = frozenset({
+    'load_extension', 'readfile', 'writefile', 'edit', 'fts3_tokenizer', 'randomblob', 'zeroblob',
+})
+
+# Keywords that end a FROM clause
+_FROM_CLAUSE_END = frozenset({
+    'WHERE', 'GROUP', 'HAVING', 'ORDER', 'LIMIT', 'UNION', 'INTERSECT', 'EXCEPT', 'WINDOW', 'SELECT',
+})
+
+# Keywords that can follow a table name, so are not its alias
+_NOT_ALIASES = _FROM_CLAUSE_END | {
+    'ON', 'USING', 'JOIN', 'LEFT', 'RIGHT', 'FULL', 'INNER', 'OUTER', 'CROSS', 'NATURAL', 'INDEXED', 'NOT',
+}
+
+_TOKEN_PATTERN = re.compile(r"""
+      (?P<space>\s+)
+    | (?P<comment>--[^\n]*|/\*.*?(?:\*/|\Z))
+    | (?P<string>'(?:[^']|'')*')
+    | (?P<blob>[xX]'[0-9a-fA-F]*')
+    | (?P<quoted>"(?:[^"]|"")*"|`(?:[^`]|``)*`|\[[^\]]*\])
+    | (?P<number>0[xX][0-9a-fA-F]+|(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+    | (?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+    | (?P<param>\?\d*|[:@$][A-Za-z_][A-Za-z0-9_]*)
+    | (?P<op>\|\||<<|>>|<=|>=|==|!=|<>|->>|->|[-+*/%<>=~&|(),.;])
+""", re.VERBOSE | re.DOTALL)
+
+_FULL_SCAN = re.compile(r'SCAN (\S+)')
+
+Token = namedtuple('Token', ['kind', 'value', 'start'])
+
+# sql: the statement to run (LIMIT added if missing); tables: base tables read;
+# sources: names the base tables go by in the query (table names and aliases)
+ValidatedQuery = namedtuple('ValidatedQuery', ['sql', 'tables', 'sources'])
+
+
+class SQLRejectedError(ValueError):
+    """The query is not a safe, read-only SELECT over the known tables."""
+
+
+class QueryTimeoutError(Exception):
+    """The query ran past its time budget and was interrupted."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        super().__init__(f"Query stopped after exceeding its {seconds:g}s time budget")
+
+
+def tokenize(sql):
+    """
+    Splits SQL into tokens, dropping whitespace and comments.
+
+    Returns:
+        list: Token(kind, value, start) with kind one of word, quoted,
+        string, blob, number, param, op
+
+    Raises:
+        SQLRejectedError: On characters SQLite would not accept (e.g. an
+        unterminated string)
+    """
+    tokens = []
+    position = 0
+    while position < len(sql):
+        match = _TOKEN_PATTERN.match(sql, position)
+        if match is None:
+            raise SQLRejectedError(f"Unexpected character {sql[position]!r} in query")
+        kind = match.lastgroup
+        if kind not in ('space', 'comment'):
+            tokens.append(Token(kind, match.group(), position))
+        position = match.end()
+    return tokens
+
+
+def _name(token):
+    """Identifier text of a word or quoted token."""
+    if token.kind == 'quoted':
+        return token.value[1:-1]
+    return token.value
+
+
+def _keyword(token):
+    return token.value.upper() if token.kind == 'word' else None
+
+
+def _cte_names(tokens):
+    """Names defined by WITH clauses: `name [(columns)] AS [NOT] [MATERIALIZED] (`."""
+    names = set()
+    for i, token in enumerate(tokens):
+        if token.kind not in ('word', 'quoted') or i == 0:
+            continue
+        if _keyword(tokens[i - 1]) not in ('WITH', 'RECURSIVE') and tokens[i - 1].value != ',':
+            continue
+        j = i + 1
+        if j < len(tokens) and tokens[j].value == '(':
+            while j < len(tokens) and tokens[j].value != ')':
+                j += 1
+            j += 1
+        if j < len(tokens) and _keyword(tokens[j]) == 'AS':
+            j += 1
+            while j < len(tokens) and _keyword(tokens[j]) in ('NOT', 'MATERIALIZED'):
+                j += 1
+            if j < len(tokens) and tokens[j].value == '(':
+                names.add(_name(token).lower())
+    return names
+
+
+def validate_sql(sql, default_limit=DEFAULT_ROW_LIMIT):
+    """
+    Checks that SQL is a single read-only SELECT (or WITH ... SELECT) over the
+    known tables. Keywords inside strings and identifiers such as created_at
+    don't count; only real tokens do.
+
+    Args:
+        sql: Generated SQL
+        default_limit: LIMIT appended when the query has none at the top level
+
+    Returns:
+        ValidatedQuery
+
+    Raises:
+        SQLRejectedError: With a user-facing reason
+    """
+    if not sql or not sql.strip():
+        raise SQLRejectedError("Empty query")
+
+    tokens = tokenize(sql)
+    while tokens and tokens[-1].value == ';':
+        tokens.pop()
+    if not tokens:
+        raise SQLRejectedError("Empty query")
+    if any(token.value == ';' for token in tokens):
+        raise SQLRejectedError("Only a single statement is permitted")
+    if _keyword(tokens[0]) not in ('SELECT', 'WITH'):
+        raise SQLRejectedError("Only SELECT queries are permitted")
+
+    ctes = _cte_names(tokens)
+    tables, sources = set(), set()
+    depth = 0
+    from_depths = set()
+    expect_source = False
+    has_limit = False
+
+    for i, token in enumerate(tokens):
+        keyword = _keyword(token)
+        following = tokens[i + 1] if i + 1 < len(tokens) else None
+
+        if keyword in FORBIDDEN_KEYWORDS:
+            raise SQLRejectedError(f"Query contains forbidden operation: {keyword}")
+        if keyword == 'RECURSIVE':
+            raise SQLRejectedError("Recursive queries are not permitted")
+        if token.kind == 'word' and following is not None and following.value == '(' \
+                and token.value.lower() in FORBIDDEN_FUNCTIONS:
+            raise SQLRejectedError(f"Function not permitted: {token.value}")
+
+        if token.value == '(':
+            depth += 1
+            if expect_source:
+                from_depths.add(depth)
+            continue
+        if token.value == ')':
+            from_depths.discard(depth)
+            depth -= 1
+            continue
+        if keyword == 'LIMIT' and depth == 0:
+            has_limit = True
+        if keyword in ('FROM', 'JOIN') and not (keyword == 'FROM' and i and _keyword(tokens[i - 1]) == 'DISTINCT'):
+            expect_source = True
+            from_depths.add(depth)
+            continue
+        if keyword in _FROM_CLAUSE_END:
+            from_depths.discard(depth)
+            expect_source = False
+        if token.value == ',' and depth in from_depths:
+            expect_source = True
+            continue
+
+        if expect_source and token.kind in ('word', 'quoted') and keyword not in ('SELECT', 'WITH', 'VALUES'):
+            expect_source = False
+            name = _name(token).lower()
+            if following is not None and following.value == '.':
+                raise SQLRejectedError("Schema-qualified table names are not permitted")
+            if following is not None and following.value == '(':
+                raise SQLRejectedError(f"Table-valued function not permitted: {_name(token)}")
+            if name in ctes:
+                continue
+            if name not in KNOWN_TABLES:
+                raise SQLRejectedError(f"Unknown table: {_name(token)}")
+            tables.add(name)
+            sources.add(name)
+            # Alias: `table AS alias` or `table alias`
+            alias = None
+            if following is not None and _keyword(following) == 'AS' and i + 2 < len(tokens):
+                alias = tokens[i + 2]
+            elif following is not None and following.kind in ('word', 'quoted') \
+                    and _keyword(following) not in _NOT_ALIASES:
+                alias = following
+            if alias is not None:
+                sources.add(_name(alias).lower())
+        elif expect_source and token.kind not in ('word', 'quoted'):
+            expect_source = False
+
+    if depth != 0:
+        raise SQLRejectedError("Unbalanced parentheses in query")
+
+    # Up to the last token: drops a trailing semicolon and comments, which
+    # would otherwise swallow an appended LIMIT
+    last = tokens[-1]
+    statement = sql[:last.start + len(last.value)]
+    if not has_limit:
+        statement += f' LIMIT {int(default_limit)}'
+    return ValidatedQuery(statement, frozenset(tables), frozenset(sources))
+
+
+def check_query_plan(conn, query, params=()):
+    """
+    Rejects query plans that scan two base tables in full inside the same
+    nested loop: a cross join (or a join without a usable condition), whose
+    cost is the product of the table sizes.
+
+    Args:
+        conn: SQLite connection
+        query: ValidatedQuery
+        params: Query parameters
+
+    Returns:
+        list: EXPLAIN QUERY PLAN rows (id, parent, notused, detail)
+
+    Raises:
+        SQLRejectedError: For cross joins
+    """
+    plan = [tuple(row) for row in conn.execute('EXPLAIN QUERY PLAN ' + query.sql, params)]
+    full_scans = defaultdict(list)
+    for node_id, parent, _, detail in plan:
+        match = _FULL_SCAN.match(detail)
+        if match and match.group(1).lower() in query.sources:
+            full_scans[parent].append(match.group(1))
+    for scans in full_scans.values():
+        if len(scans) >= 2:
+            raise SQLRejectedError(
+                f"Query would combine every row of {' × '.join(scans)} (cross join). "
+                f"Join the tables on a shared column such as employee_id")
+    return plan
+
+
+class QueryBudget:
+    """Deadline state for one statement; `steps` counts VM instructions run."""
+
+    def __init__(self, seconds, check_every):
+        self.seconds = seconds
+        self.check_every = check_every
+        self.deadline = time.monotonic() + seconds
+        self.steps = 0
+        self.expired = False
+
+    def check(self):
+        self.steps += self.check_every
+        if time.monotonic() > self.deadline:
+            self.expired = True
+            return 1
+        return 0
+
+
+@contextmanager
+def query_time_budget(conn, seconds=QUERY_TIME_BUDGET, check_every=PROGRESS_CHECK_STEPS):
+    """
+    Interrupts statements on `conn` that run longer than `seconds`.
+    SQLite calls the progress handler every `check_every` VM instructions;
+    returning non-zero aborts the statement.
+
+    Yields:
+        QueryBudget: steps executed so far (to `check_every` resolution)
+
+    Raises:
+        QueryTimeoutError: If the budget ran out
+    """
+    budget = QueryBudget(seconds, check_every)
+    conn.set_progress_handler(budget.check, check_every)
+    try:
+        yield budget
+    except sqlite3.OperationalError as e:
+        if budget.expired:
+            raise QueryTimeoutError(seconds) from e
+        raise
+    finally:
+        # Pooled connections are reused; never leave the handler behind
+        conn.set_progress_handler(None, 0)
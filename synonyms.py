@@ -0,0 +1,202 @@
+"""
+Synonym Expansion Module
+Query-time synonym expansion from a table compiled once: a bidirectional
+term -> expansions map with weights, multi-word synonyms ('time off')
+matched as phrases, and pluggable loaders for larger domain thesauri
+"""
+
+import json
+import os
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from document_index import tokenize
+
+
+# Extra thesaurus files merged into the built-in synonyms (os.pathsep-separated)
+THESAURUS_PATHS = [path for path in os.getenv('HR_THESAURUS', '').split(os.pathsep) if path]
+
+# Expansion weights, relative to a query word's own weight of 1
+DIRECT_WEIGHT = 1.0  # a synonym listed for the word, or the entry the word is listed under
+SIBLING_WEIGHT = 0.5  # another synonym listed under the same entry
+
+
+def normalize_term(term: str) -> str:
+    """Index form of a term or phrase: its tokens joined by single spaces ('' if none)."""
+    return ' '.join(tokenize(term))
+
+
+@lru_cache(maxsize=4096)
+def phrase_pattern(phrase: str) -> re.Pattern:
+    """Regex matching a normalized phrase's words next to each other in lower-cased text."""
+    return re.compile(r'\b' + r'\W+'.join(map(re.escape, phrase.split())) + r'\b')
+
+
+class SynonymTable:
+    """
+    Compiled synonym dictionary.
+
+    Every listed synonym expands to its entry and the entry to its synonyms
+    (weight DIRECT_WEIGHT); synonyms of one entry also expand to each other
+    (SIBLING_WEIGHT). Terms are stored in index form, so a lookup is one dict
+    access per query word or word n-gram, whatever the dictionary's size.
+
+    Attributes:
+        expansions: Term or phrase -> {expansion: weight}
+        max_phrase_words: Longest term in the table, in words
+    """
+
+    def __init__(self, groups: Dict[str, Iterable[str]] = None):
+        self.expansions: Dict[str, Dict[str, float]] = {}
+        self.max_phrase_words = 1
+        if groups:
+            self.add_groups(groups)
+
+    def add_groups(self, groups: Dict[str, Iterable[str]]):
+        """
+        Adds synonym groups.
+
+        Args:
+            groups: Entry -> synonyms (the shape of HR_SYNONYMS)
+        """
+        for entry, synonyms in groups.items():
+            entry = normalize_term(entry)
+            if not entry:
+                continue
+            synonyms = list(dict.fromkeys(
+                synonym for synonym in map(normalize_term, synonyms) if synonym and synonym != entry))
+            for synonym in synonyms:
+                self._link(entry, synonym, DIRECT_WEIGHT)
+                self._link(synonym, entry, DIRECT_WEIGHT)
+                for sibling in synonyms:
+                    if sibling != synonym:
+                        self._link(synonym, sibling, SIBLING_WEIGHT)
+
+    def _link(self, term: str, expansion: str, weight: float):
+        targets = self.expansions.setdefault(term, {})
+        if weight > targets.get(expansion, 0.0):
+            targets[expansion] = weight
+        self.max_phrase_words = max(self.max_phrase_words, term.count(' ') + 1)
+
+    def expand(self, tokens: List[str], stopwords: Iterable[str] = ()) -> Tuple[Dict[str, float], List[str]]:
+        """
+        Expansions for a tokenized query.
+
+        Args:
+            tokens: Query tokens, in order (document_index.tokenize)
+            stopwords: Single words that are not expanded (phrases may contain them)
+
+        Returns:
+            ({expansion: weight}, phrases of the table found in the query)
+        """
+        stopwords = stopwords if isinstance(stopwords, (set, frozenset)) else set(stopwords)
+        expansions: Dict[str, float] = {}
+        query_phrases = []
+        for i, token in enumerate(tokens):
+            for size in range(1, min(self.max_phrase_words, len(tokens) - i) + 1):
+                if size == 1:
+                    if token in stopwords:
+                        continue
+                    term = token
+                else:
+                    term = ' '.join(tokens[i:i + size])
+                targets = self.expansions.get(term)
+                if not targets:
+                    continue
+                if size > 1:
+                    query_phrases.append(term)
+                for expansion, weight in targets.items():
+                    if weight > expansions.get(expansion, 0.0):
+                        expansions[expansion] = weight
+        return expansions, query_phrases
+
+    def __len__(self):
+        return len(self.expansions)
+
+
+# ============================================================================
+# THESAURUS LOADERS
+# ============================================================================
+
+def _load_json_thesaurus(path: Path) -> Dict[str, List[str]]:
+    """{"entry": ["synonym", ...]} or [["term", "synonym", ...], ...] (first term is the entry)."""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        return {entry: list(synonyms) for entry, synonyms in data.items()}
+    return {group[0]: list(group[1:]) for group in data if group}
+
+
+def _load_text_thesaurus(path: Path) -> Dict[str, List[str]]:
+    """
+    Solr-style synonym lines: "pto, vacation, time off" (the first term is
+    the entry) or "wfh, telework => remote work" (each term on the left is
+    an entry for the terms on the right). '#' starts a comment. Like all
+    groups, the table links the terms in both directions.
+    """
+    groups: Dict[str, List[str]] = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            if '=>' in line:
+                sources, targets = line.split('=>', 1)
+                targets = [term.strip() for term in targets.split(',') if term.strip()]
+                for source in sources.split(','):
+                    if source.strip():
+                        groups.setdefault(source.strip(), []).extend(targets)
+            else:
+                terms = [term.strip() for term in line.split(',') if term.strip()]
+                if terms:
+                    groups.setdefault(terms[0], []).extend(terms[1:])
+    return groups
+
+
+_THESAURUS_LOADERS: Dict[str, Callable[[Path], Dict[str, List[str]]]] = {
+    '.json': _load_json_thesaurus,
+    '.txt': _load_text_thesaurus,
+}
+
+
+def register_thesaurus_loader(suffix: str, loader: Callable[[Path], Dict[str, List[str]]]):
+    """
+    Makes a thesaurus file format available to load_thesaurus.
+
+    Args:
+        suffix: File extension, e.g. '.csv'
+        loader: Callable(path) returning {entry: [synonyms]}
+    """
+    _THESAURUS_LOADERS[suffix.lower()] = loader
+
+
+def load_thesaurus(path) -> Dict[str, List[str]]:
+    """
+    Reads a thesaurus file with the loader registered for its extension
+    (Solr-style text for unknown extensions).
+
+    Returns:
+        {entry: [synonyms]}
+    """
+    path = Path(path)
+    loader = _THESAURUS_LOADERS.get(path.suffix.lower(), _load_text_thesaurus)
+    return loader(path)
+
+
+def build_synonym_table(groups: Dict[str, Iterable[str]], thesaurus_paths: Iterable = None) -> SynonymTable:
+    """
+    Compiles built-in synonym groups plus thesaurus files into one table.
+
+    Args:
+        groups: Built-in {entry: [synonyms]}
+        thesaurus_paths: Extra thesaurus files (default: HR_THESAURUS)
+
+    Returns:
+        SynonymTable
+    """
+    table = SynonymTable(groups)
+    for path in THESAURUS_PATHS if thesaurus_paths is None else thesaurus_paths:
+        table.add_groups(load_thesaurus(path))
+    return table
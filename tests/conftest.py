@@ -0,0 +1,47 @@
+"""Shared fixtures: the modules live at the project root and use paths relative to the working directory."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Runs the test in an empty directory (databases and uploads are created relative to it)."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def knowledge_base(workdir, monkeypatch):
+    """document_processor with a fresh, empty knowledge base in the test directory."""
+    import document_processor as dp
+
+    for name in ('_knowledge_base', '_store', '_index', '_vectors'):
+        monkeypatch.setattr(dp, name, None)
+    monkeypatch.setattr(dp, '_chunk_cache', {'generation': None, 'chunks': {}})
+    monkeypatch.setattr(dp, '_scorer_cache', {'generation': None, 'scorer': None})
+    yield dp
+    if dp._knowledge_base is not None:
+        dp._knowledge_base.close()
+
+
+@pytest.fixture
+def hr_database(workdir):
+    """Points db_utils' connection pool at a migrated, empty HR database in the test directory."""
+    import db_utils
+
+    original = db_utils.DB_PATH
+    path = str(workdir / 'hr_peopleops.db')
+    db_utils.configure_pool(path)
+    db_utils.invalidate_result_cache()
+    with db_utils.write_connection() as conn:
+        db_utils.apply_migrations(conn)
+    yield path
+    db_utils.get_pool().close()
+    db_utils._pool = None
+    db_utils.DB_PATH = original
+    db_utils.invalidate_result_cache()
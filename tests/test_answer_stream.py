@@ -0,0 +1,52 @@
+import random
+
+import pytest
+
+import ai_utils
+import benchmarks
+import db_utils
+
+
+@pytest.mark.parametrize('text', [
+    "SSN on file: 123-45-6789 for this employee.",
+    "Call 555-123-4567 or 555.987.6543 today.",
+    "Card 4111 1111 1111 1111 was charged.",
+])
+def test_pii_split_at_every_offset_is_masked(text):
+    expected = ai_utils.apply_output_guardrails(text)
+    assert expected != text
+    for cut in range(1, len(text)):
+        assert ''.join(ai_utils._mask_streamed_text([text[:cut], text[cut:]])) == expected, cut
+
+
+def test_streamed_masking_matches_whole_text_masking():
+    rng = random.Random(3)
+    for _ in range(2000):
+        text = benchmarks._fuzz_text(rng, ai_utils.HRSecurityGuardrails)
+        cuts = sorted(rng.sample(range(len(text) + 1), min(len(text) + 1, rng.randint(1, 8))))
+        chunks = [text[start:end] for start, end in zip([0] + cuts, cuts + [len(text)])]
+        assert ''.join(ai_utils._mask_streamed_text(chunks)) == ai_utils.apply_output_guardrails(text), chunks
+
+
+def test_stream_result_matches_answer_hr_question(hr_database, knowledge_base):
+    with db_utils.write_connection() as conn:
+        conn.executemany("""INSERT INTO employees (employee_id, first_name, last_name, email, department,
+                                                   position, hire_date, salary)
+                            VALUES (?, 'Test', ?, ?, ?, 'Analyst', '2020-01-01', 50000)""",
+                         [(f'EMP{i:04d}', f'Name{i}', f'emp{i}@example.com', ['Sales', 'Finance'][i % 2])
+                          for i in range(5)])
+        db_utils.bump_data_version(conn)
+    question = "How many employees are in each department?"
+    expected = ai_utils.answer_hr_question(question)
+    assert expected['fast_path']
+
+    shown = []
+    stream = ai_utils.AnswerStream(question, on_results=shown.append)
+    text = ''.join(stream)
+    result = dict(stream.result)
+    assert set(result.pop('timings')) == {'results_ms', 'first_text_ms', 'total_ms'}
+    # Query timings differ from run to run
+    for response in (result, expected):
+        response['query_stats'] = dict(response['query_stats'], elapsed_ms=None)
+    assert result == expected
+    assert text.strip() == expected['answer'] and shown == [expected['results']]
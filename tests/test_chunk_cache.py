@@ -0,0 +1,37 @@
+import sqlite3
+
+
+def _stats(dp):
+    stats = dp.get_chunk_cache_stats()
+    return stats['hits'], stats['misses']
+
+
+def test_repeated_loads_are_served_from_the_cache(knowledge_base):
+    dp = knowledge_base
+    dp.save_document('leave.txt', b"Parental leave is twelve weeks.")
+    first = dp.load_all_chunks()
+    hits, misses = _stats(dp)
+    assert dp.load_all_chunks() is first
+    assert _stats(dp) == (hits + 1, misses)
+
+
+def test_uploads_and_deletes_invalidate_the_cache(knowledge_base):
+    dp = knowledge_base
+    leave = dp.save_document('leave.txt', b"Parental leave is twelve weeks.")
+    assert {c['doc_name'] for c in dp.load_all_chunks().values()} == {'leave.txt'}
+    dp.save_document('badges.txt', b"Badges are required on site.")
+    assert {c['doc_name'] for c in dp.load_all_chunks().values()} == {'leave.txt', 'badges.txt'}
+    dp.delete_document(leave['id'])
+    assert {c['doc_name'] for c in dp.load_all_chunks().values()} == {'badges.txt'}
+
+
+def test_writes_from_another_connection_invalidate_the_cache(knowledge_base):
+    dp = knowledge_base
+    dp.save_document('leave.txt', b"Parental leave is twelve weeks.")
+    dp.load_all_chunks()
+    # Another process editing the same knowledge base file
+    other = sqlite3.connect(str(dp.INDEX_DB))
+    with other:
+        other.execute("UPDATE kb_chunks SET text = 'Parental leave is sixteen weeks.'")
+    other.close()
+    assert [c['text'] for c in dp.load_all_chunks().values()] == ['Parental leave is sixteen weeks.']
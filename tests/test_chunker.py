@@ -0,0 +1,77 @@
+import pickle
+import random
+from collections import Counter
+
+import pytest
+
+from chunker import chunk_document, iter_chunks
+from document_index import tokenize
+
+
+def _prose(rng, sentences):
+    words = ['leave', 'policy', 'employee', 'benefits', 'Manager', 'hours', 'week', 'pay', 'PTO', 'team']
+    return ' '.join(' '.join(rng.choice(words) for _ in range(rng.randint(3, 18))) + rng.choice('.!?')
+                    for _ in range(sentences))
+
+
+def test_chunks_cover_the_text_with_overlap():
+    text = _prose(random.Random(1), 200)
+    words = text.split()
+    chunks = chunk_document(text, chunk_size=50, overlap=10)
+    assert chunks[0].start == 0 and chunks[-1].end == len(words)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk.start == previous.end - 10
+    for chunk in chunks:
+        assert chunk.end - chunk.start <= 50
+        assert chunk.text == ' '.join(words[chunk.start:chunk.end])
+
+
+def test_chunks_end_on_sentence_boundaries():
+    text = _prose(random.Random(2), 100)
+    for chunk in chunk_document(text, chunk_size=60, overlap=10):
+        assert chunk.text[-1] in '.!?'
+
+
+def test_sentence_longer_than_a_chunk_is_cut_at_the_word_limit():
+    chunks = chunk_document(' '.join(['word'] * 25) + '.', chunk_size=10, overlap=2)
+    assert [chunk.end - chunk.start for chunk in chunks[:-1]] == [10] * (len(chunks) - 1)
+
+
+def test_tokens_and_term_frequencies_match_the_index_tokenizer():
+    text = "Employees' PTO: 15 days/year. Part-time staff accrue PTO pro-rata!"
+    (chunk,) = chunk_document(text)
+    assert chunk.tokens == tokenize(chunk.text)
+    assert chunk.term_freqs == Counter(tokenize(chunk.text))
+
+
+def test_headings_start_sections_without_overlap():
+    leave = _prose(random.Random(3), 8)
+    pay = _prose(random.Random(4), 8)
+    text = f"# Benefits\n## Leave\n{leave}\n## Pay\n{pay}\n"
+    chunks = chunk_document(text, chunk_size=200, overlap=20, min_section_words=5)
+    assert [chunk.section for chunk in chunks] == ['Benefits > Leave', 'Benefits > Pay']
+    assert chunks[1].start == chunks[0].end
+    assert chunks[1].text.startswith('Pay ')
+
+
+def test_short_sections_share_a_chunk():
+    chunks = chunk_document("# Intro\nWelcome aboard.\n# Leave\nTwelve weeks.\n", chunk_size=200)
+    assert len(chunks) == 1 and chunks[0].text == "Intro Welcome aboard. Leave Twelve weeks."
+
+
+@pytest.mark.parametrize('chunk_size, overlap', [(20, 5), (50, 10), (250, 50)])
+def test_streamed_parts_chunk_like_the_whole_text(chunk_size, overlap):
+    rng = random.Random(chunk_size)
+    lines = [f"## Section {i}" if i % 7 == 0 else _prose(rng, rng.randint(1, 5)) for i in range(60)]
+    text = '\n'.join(lines) + '\n'
+    parts = ['\n'.join(lines[i:i + 4]) + '\n' for i in range(0, len(lines), 4)]
+    whole = [(c.text, c.start, c.end, c.section) for c in chunk_document(text, chunk_size, overlap)]
+    streamed = [(c.text, c.start, c.end, c.section) for c in iter_chunks(parts, chunk_size, overlap)]
+    assert streamed == whole
+
+
+def test_chunks_survive_pickling():
+    (chunk,) = chunk_document("# Leave\nParental leave is twelve weeks.")
+    copy = pickle.loads(pickle.dumps(chunk))
+    assert (copy.text, copy.tokens, copy.term_freqs, copy.section) == \
+           (chunk.text, chunk.tokens, chunk.term_freqs, chunk.section)
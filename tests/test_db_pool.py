@@ -0,0 +1,75 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from db_utils import ConnectionPool
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'pool.db'), pool_size=2)
+    with pool.writer() as conn:
+        conn.execute('CREATE TABLE items (name TEXT)')
+    yield pool
+    pool.close()
+
+
+def test_readers_are_bounded_by_pool_size(pool):
+    in_use, peak = 0, 0
+    lock = threading.Lock()
+
+    def read():
+        nonlocal in_use, peak
+        with pool.reader() as conn:
+            with lock:
+                in_use += 1
+                peak = max(peak, in_use)
+            conn.execute('SELECT COUNT(*) FROM items').fetchone()
+            time.sleep(0.02)
+            with lock:
+                in_use -= 1
+
+    threads = [threading.Thread(target=read) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = pool.stats()
+    assert peak <= 2 and stats['open_connections'] <= 2
+    assert stats['waits'] > 0 and stats['in_use_connections'] == 0
+
+
+def test_nested_readers_share_the_thread_connection(pool):
+    with pool.reader() as outer:
+        with pool.reader() as inner:
+            assert inner is outer
+    assert pool.stats()['checkouts'] == 1
+
+
+def test_writer_commits_or_rolls_back(pool):
+    with pool.writer() as conn:
+        conn.execute("INSERT INTO items VALUES ('kept')")
+    with pytest.raises(RuntimeError):
+        with pool.writer() as conn:
+            conn.execute("INSERT INTO items VALUES ('dropped')")
+            raise RuntimeError
+    with pool.reader() as conn:
+        assert [row['name'] for row in conn.execute('SELECT name FROM items')] == ['kept']
+
+
+def test_health_check_drops_broken_connections(pool):
+    with pool.reader() as conn:
+        pass
+    conn.close()
+    assert pool.health_check() == {'healthy': 0, 'dropped': 1}
+    with pool.reader() as fresh:
+        assert fresh is not conn and fresh.execute('SELECT 1').fetchone()[0] == 1
+
+
+def test_closed_pool_refuses_checkouts(pool):
+    pool.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        with pool.reader():
+            pass
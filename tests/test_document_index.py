@@ -0,0 +1,28 @@
+import random
+
+from document_index import InvertedIndex, KnowledgeBaseConnection, TermLookup
+
+
+def _scan(vocabulary, word):
+    return [v for v in vocabulary if v != word and len(v) > 3 and (word in v or v in word)]
+
+
+def test_term_lookup_matches_vocabulary_scan():
+    rng = random.Random(3)
+    vocabulary = sorted({''.join(rng.choice('abcde') for _ in range(rng.randint(1, 9))) for _ in range(3000)}
+                        | {'intern', 'interns', 'internship', 'pay', 'payroll', 'hour', 'hourly'})
+    lookup = TermLookup(vocabulary)
+    words = vocabulary[::7] + ['internships', 'interns', 'ab', 'abcdeabcde', 'zzzz', 'hourly']
+    for word in words:
+        assert lookup.related(word) == _scan(vocabulary, word), word
+
+
+def test_related_terms_follow_index_updates(workdir):
+    index = InvertedIndex(KnowledgeBaseConnection(workdir / 'kb.db'))
+    index.add_chunks({'d_0': {'doc_id': 'd', 'text': 'Interns are paid hourly'}})
+    assert index.related_terms('intern') == ['interns']
+    index.add_chunks({'e_0': {'doc_id': 'e', 'text': 'The internship program'}})
+    assert index.related_terms('intern') == ['interns', 'internship']
+    assert index.related_terms('hour') == ['hourly']
+    index.remove_document('d')
+    assert index.related_terms('intern') == ['internship']
@@ -0,0 +1,75 @@
+import pytest
+
+import ai_utils
+import db_utils
+
+
+@pytest.mark.parametrize('question', [
+    "who is available?",
+    "tell me about benefits",
+    "who is on leave",
+    "find engineering",
+])
+def test_lowercase_words_are_not_name_lookups(hr_database, question):
+    assert ai_utils.parse_fast_path(question) is None
+
+
+@pytest.mark.parametrize('question, params', [
+    ("Who is Ada Lovelace?", ('%Ada%', '%Lovelace%')),
+    ("is there an employee named Grace", ('%Grace%', '%Grace%')),
+    ("FIND Alan Turing", ('%Alan%', '%Turing%')),
+])
+def test_capitalized_names_are_name_lookups(hr_database, question, params):
+    sql, sql_params, intent = ai_utils.parse_fast_path(question)
+    assert intent == 'employee_by_name' and sql_params == params
+
+
+def _add_employee(first_name, last_name, department):
+    with db_utils.write_connection() as conn:
+        conn.execute("""INSERT INTO employees (employee_id, first_name, last_name, email, department, position,
+                                               hire_date, salary)
+                        VALUES (?, ?, ?, 'x@example.com', ?, 'Analyst', '2020-01-01', 50000)""",
+                     (f'EMP-{first_name}', first_name, last_name, department))
+        db_utils.bump_data_version(conn)
+
+
+@pytest.mark.parametrize('question', [
+    "Tell me about Benefits",
+    "Who is HR?",
+    "Find Payroll",
+    "Find Customer Success",
+])
+def test_topics_and_departments_are_not_name_lookups(hr_database, question):
+    _add_employee('Ada', 'Lovelace', 'Customer Success')
+    assert ai_utils.parse_fast_path(question) is None
+
+
+def test_name_lookup_without_matches_falls_back_to_generated_sql(hr_database, monkeypatch):
+    _add_employee('Ada', 'Lovelace', 'Sales')
+    asked = []
+
+    def generate_sql_query(question):
+        asked.append(question)
+        return "SELECT COUNT(*) AS employee_count FROM employees", "generated"
+
+    monkeypatch.setattr(ai_utils, 'generate_sql_query', generate_sql_query)
+    query, _ = ai_utils._query_database("Who is Ada?")
+    assert query[2] == 'employee_by_name' and query[3][0]['first_name'] == 'Ada' and asked == []
+
+    query, _ = ai_utils._query_database("Tell me about Wellness")
+    assert asked == ["Tell me about Wellness"]
+    assert query[2] is None and query[3] == [{'employee_count': 1}]
+
+
+def test_fast_path_stats_are_counted_across_threads(monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    monkeypatch.setattr(ai_utils, '_fast_path_stats', {'hits': 0, 'misses': 0, 'by_intent': ai_utils.Counter()})
+    monkeypatch.setattr(ai_utils, 'parse_fast_path', lambda question: ('SELECT 1', (), 'count_total'))
+    # Stop right after the stats update: the query is rejected by validation
+    monkeypatch.setattr(ai_utils.HRSecurityGuardrails, 'validate_sql_query', staticmethod(lambda sql: (False, 'no')))
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(ai_utils._query_database, ["How many employees do we have?"] * 400))
+    assert all(result[1]['blocked'] for result in results)
+    stats = ai_utils.get_fast_path_stats()
+    assert stats['hits'] == 400 and stats['by_intent'] == {'count_total': 400} and stats['hit_ratio'] == 1.0
@@ -0,0 +1,47 @@
+import random
+
+import pytest
+
+import benchmarks
+from ai_utils import HRSecurityGuardrails as guardrails
+
+
+@pytest.fixture(scope='module')
+def texts():
+    rng = random.Random(7)
+    return [benchmarks._fuzz_text(rng, guardrails) for _ in range(3000)]
+
+
+def test_blocked_patterns_match_per_pattern_search(texts):
+    for text in texts:
+        if 3 <= len(' '.join(text.strip().split())) <= 1000:
+            blocked = guardrails.sanitize_input(text)[0] is None
+            assert blocked == benchmarks._legacy_is_blocked(guardrails, text), text
+
+
+def test_pii_masking_matches_three_pass_substitution(texts):
+    for text in texts:
+        assert guardrails.mask_pii_in_output(text) == benchmarks._legacy_mask_pii(guardrails, text), text
+
+
+def test_sensitive_topics_match_substring_scan(texts):
+    rng = random.Random(11)
+    topics = guardrails.SENSITIVE_TOPICS
+    queries = texts + [f"{rng.choice(texts)[:40]} {topic.upper()} {rng.choice(texts)[:40]}"
+                       for topic in topics for _ in range(20)]
+    # Two topics, in either order
+    queries += [f"{rng.choice(texts)[:40]} {first} {rng.choice(texts)[:20]} {second}"
+                for first in topics for second in topics if first != second]
+    for query in queries:
+        assert guardrails.check_sensitive_topic(query) == benchmarks._legacy_sensitive_topic(guardrails, query), query
+
+
+def test_sensitive_topic_returns_matched_topic():
+    assert guardrails.check_sensitive_topic("Any open Harassment complaints?") == (True, 'harassment')
+    assert guardrails.check_sensitive_topic("How many people are in Sales?") == (False, None)
+
+
+def test_sensitive_topic_follows_list_priority():
+    assert guardrails.check_sensitive_topic("complaint about harassment") == (True, 'harassment')
+    assert guardrails.check_sensitive_topic("investigation into a discrimination complaint") == \
+        (True, 'discrimination')
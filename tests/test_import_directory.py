@@ -0,0 +1,96 @@
+import csv
+import sqlite3
+
+import import_divcowest_data as importer
+
+
+def _write_directory(path, rows):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['department', 'name', 'title'])
+        writer.writerows(rows)
+    return str(path)
+
+
+def _employees(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return {row[0]: row[1:] for row in conn.execute(
+            'SELECT source_key, employee_id, department, position, removed_at FROM employees')}
+
+
+def _transfers(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute('SELECT employee_id, from_department, to_department FROM transfers '
+                            "WHERE reason = 'Directory Update'").fetchall()
+
+
+BASE = [
+    ('Engineering', 'Ada Lovelace', 'Engineer'),
+    ('Sales', 'John Smith', 'Account Manager'),
+    ('Finance', 'Grace Hopper', 'Analyst'),
+]
+
+
+def test_import_skips_names_that_normalize_alike(workdir):
+    db_path = str(workdir / 'hr.db')
+    csv_path = _write_directory(workdir / 'dir.csv', BASE + [('Sales', 'john  SMITH', 'Associate')])
+    stats = importer.import_directory(csv_path, db_path, num_transfers=0, num_feedback=0)
+    assert stats['employees'] == 3 and stats['duplicates'] == 1
+    assert 'john smith|sales' in _employees(db_path)
+
+
+def test_sync_moves_person_with_same_name_and_title(workdir):
+    db_path = str(workdir / 'hr.db')
+    importer.import_directory(_write_directory(workdir / 'a.csv', BASE), db_path, num_transfers=0, num_feedback=0)
+    before = _employees(db_path)['john smith|sales']
+    moved = BASE[:1] + [('Marketing', 'John Smith', 'Account Manager')] + BASE[2:]
+    summary = importer.sync_directory(_write_directory(workdir / 'b.csv', moved), db_path)
+    assert summary['moved'] == 1 and summary['added'] == 0 and summary['removed'] == 0
+    after = _employees(db_path)
+    assert 'john smith|sales' not in after
+    assert after['john smith|marketing'][0] == before[0]
+    assert _transfers(db_path) == [(before[0], 'Sales', 'Marketing')]
+
+
+def test_sync_does_not_hand_a_departed_row_to_a_namesake(workdir):
+    db_path = str(workdir / 'hr.db')
+    importer.import_directory(_write_directory(workdir / 'a.csv', BASE), db_path, num_transfers=0, num_feedback=0)
+    departed_id = _employees(db_path)['john smith|sales'][0]
+    # A different John Smith, with another title, joins Marketing as the Sales one leaves
+    newcomer = BASE[:1] + [('Marketing', 'John Smith', 'Engineer')] + BASE[2:]
+    summary = importer.sync_directory(_write_directory(workdir / 'b.csv', newcomer), db_path)
+    assert (summary['moved'], summary['added'], summary['removed']) == (0, 1, 1)
+    after = _employees(db_path)
+    assert after['john smith|sales'][0] == departed_id and after['john smith|sales'][3] is not None
+    assert after['john smith|marketing'][0] != departed_id
+    assert _transfers(db_path) == []
+
+
+def test_sync_ambiguous_departures_are_removals(workdir):
+    db_path = str(workdir / 'hr.db')
+    importer.import_directory(_write_directory(workdir / 'a.csv', BASE), db_path, num_transfers=0, num_feedback=0)
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("""INSERT INTO employees (employee_id, first_name, last_name, email, department, position,
+                                               hire_date, salary, source_key)
+                        VALUES ('EMP9999', 'John', 'Smith', 'js@example.com', 'Legal', 'Account Manager',
+                                '2020-01-01', 1, 'john smith|legal')""")
+    moved = BASE[:1] + [('Marketing', 'John Smith', 'Account Manager')] + BASE[2:]
+    summary = importer.sync_directory(_write_directory(workdir / 'b.csv', moved), db_path)
+    assert (summary['moved'], summary['added'], summary['removed']) == (0, 1, 2)
+
+
+def test_removed_employees_are_not_current(hr_database):
+    import ai_utils
+    import db_utils
+
+    importer.import_directory(_write_directory('a.csv', BASE), hr_database, num_transfers=0, num_feedback=0)
+    importer.sync_directory(_write_directory('b.csv', BASE[:2]), hr_database)
+    names = {(row['first_name'], row['last_name']) for row in db_utils.get_all_employees()}
+    assert ('Grace', 'Hopper') not in names and len(names) == 2
+    assert 'Finance' not in db_utils.get_departments()
+
+    sql, params, intent = ai_utils.parse_fast_path("How many employees do we have?")
+    assert db_utils.execute_query(sql, params)[0]['count'] == 2
+    sql, params, intent = ai_utils.parse_fast_path("Who is the lowest paid employee?")
+    assert intent == 'top_paid'
+    assert all(row['first_name'] != 'Grace' for row in db_utils.execute_query(sql, params))
@@ -0,0 +1,89 @@
+import io
+
+import pytest
+
+pypdf = pytest.importorskip('pypdf')
+
+
+def _blank_pdf(pages):
+    writer = pypdf.PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=72, height=72)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def test_unreadable_pdf_is_rejected(knowledge_base):
+    dp = knowledge_base
+    with pytest.raises(Exception):
+        dp.save_document('broken.pdf', b'%PDF-1.4 not really a pdf')
+    assert dp.get_all_documents() == []
+    assert not list(dp.DOCUMENTS_DIR.glob('*'))
+
+
+def test_unreadable_file_in_batch_is_reported(knowledge_base):
+    dp = knowledge_base
+    results = dp.ingest_documents([('broken.pdf', b'%PDF-1.4 not really a pdf'),
+                                   ('policy.txt', b'Badges are required on site.')], max_workers=1)
+    assert 'error' in results[0] and results[1]['status'] == 'added'
+    assert [doc['filename'] for doc in dp.get_all_documents()] == ['policy.txt']
+    assert [path.name.split('_', 1)[1] for path in dp.DOCUMENTS_DIR.glob('*')] == ['policy.txt']
+
+
+def test_extract_text_raises_instead_of_returning_error_text(workdir):
+    import document_processor as dp
+    with pytest.raises(Exception):
+        dp.extract_text_from_file('broken.pdf', b'%PDF-1.4 not really a pdf', '.pdf')
+
+
+def test_single_upload_never_starts_page_workers(knowledge_base, monkeypatch):
+    dp = knowledge_base
+
+    def no_pool(*args, **kwargs):
+        raise AssertionError('save_document started a process pool')
+
+    monkeypatch.setattr(dp, 'ProcessPoolExecutor', no_pool)
+    monkeypatch.setattr(dp, 'PDF_PARALLEL_MIN_PAGES', 2)
+    monkeypatch.setattr(dp, 'INGEST_WORKERS', 4)
+    doc = dp.save_document('handbook.pdf', _blank_pdf(8))
+    assert doc['status'] == 'added'
+
+
+def test_new_version_of_a_filename_supersedes_the_old_one(knowledge_base):
+    dp = knowledge_base
+    store = dp.get_chunk_store()
+    old = dp.save_document('handbook.txt', b'Badges are required on site.')
+    same = dp.save_document('handbook.txt', b'Badges are required on site.')
+    assert same['status'] == 'unchanged' and same['version'] == 1
+
+    new = dp.save_document('handbook.txt', b'Badges are optional on weekends.')
+    assert new['status'] == 'updated' and new['version'] == 2
+    assert [doc['filename'] for doc in dp.get_all_documents()] == ['handbook.txt']
+    assert store.get_document(old['id']) is None
+    assert [entry['id'] for entry in store.version_history('handbook.txt')] == [old['id'], new['id']]
+    assert not list(dp.DOCUMENTS_DIR.glob(f"{old['id']}_*"))
+
+
+def test_same_content_under_another_filename_is_a_duplicate(knowledge_base):
+    dp = knowledge_base
+    store = dp.get_chunk_store()
+    handbook = dp.save_document('handbook.txt', b'Badges are required on site.')
+    draft = dp.save_document('draft.txt', b'Parking is free on weekends.')
+
+    duplicate = dp.save_document('handbook.txt', b'Parking is free on weekends.')
+    assert duplicate['status'] == 'duplicate'
+    assert duplicate['id'] == draft['id'] and duplicate['filename'] == 'draft.txt'
+    # Both stored documents are untouched
+    assert sorted(doc['filename'] for doc in dp.get_all_documents()) == ['draft.txt', 'handbook.txt']
+    assert store.get_document(handbook['id'])['version'] == 1
+    assert [entry['id'] for entry in store.version_history('handbook.txt')] == [handbook['id']]
+    assert [result['doc_name'] for result in dp.simple_search("parking weekends")] == ['draft.txt']
+    assert [result['doc_name'] for result in dp.simple_search("badges required")] == ['handbook.txt']
+
+    results = dp.ingest_documents([('copy.txt', b'Parking is free on weekends.'),
+                                   ('new.txt', b'Lockers are assigned by HR.'),
+                                   ('new-copy.txt', b'Lockers are assigned by HR.')], max_workers=1)
+    assert [result['status'] for result in results] == ['duplicate', 'added', 'duplicate']
+    assert results[2]['filename'] == 'new.txt'
+    assert sorted(doc['filename'] for doc in dp.get_all_documents()) == ['draft.txt', 'handbook.txt', 'new.txt']
@@ -0,0 +1,80 @@
+import pytest
+
+pytest.importorskip('numpy')
+
+DOCUMENTS = {
+    'pay.txt': "Intern pay is $20.00 per hour. Interns get paid hourly, and the salary review happens in March.",
+    'leave.txt': "Vacation policy: interns get time off after 90 days. Parental leave is twelve weeks.",
+    'remote.txt': "Remote and hybrid work: the office schedule rules apply to every team. Hourly staff log hours.",
+    'bonus.txt': "Manager bonus: $5,000 per year. The internship program pays a stipend of 45,000 yearly.",
+}
+QUERIES = [
+    "What is the intern pay?",
+    "vacation time off for interns",
+    "remote office schedule rules",
+    "salary and bonus",
+    "internship hours",
+]
+
+
+@pytest.fixture
+def loaded(knowledge_base):
+    for name, text in DOCUMENTS.items():
+        knowledge_base.save_document(name, text.encode('utf-8'))
+    return knowledge_base
+
+
+def _ranked(dp, rank, target, query):
+    all_chunks = dp.load_all_chunks()
+    weights, phrases, words = dp._query_term_weights(query)
+    return rank(target, all_chunks, query, weights, phrases, words, 10)
+
+
+def test_vectorized_ranking_matches_index_path(loaded):
+    dp = loaded
+    all_chunks = dp.load_all_chunks()
+    index = dp._sync_index(all_chunks)
+    scorer = dp._keyword_scorer(index, all_chunks)
+    for query in QUERIES:
+        vectorized = _ranked(dp, dp._rank_vectorized, scorer, query)
+        postings = _ranked(dp, dp._rank_with_index, index, query)
+        assert [chunk_id for chunk_id, _, _ in vectorized] == [chunk_id for chunk_id, _, _ in postings], query
+        for (_, a, matches_a), (_, b, matches_b) in zip(vectorized, postings):
+            assert a == pytest.approx(b)
+            assert sorted(matches_a) == sorted(matches_b)
+
+
+def test_compensation_features_stored_at_ingest(loaded):
+    features = [chunk['features'] for chunk in loaded.load_all_chunks().values() if chunk['doc_name'] == 'pay.txt']
+    assert features == [{'dollar_amounts': ['$20.00 per hour'], 'salary_patterns': 1}]
+
+
+def test_scorer_rebuilt_after_upload(loaded):
+    dp = loaded
+    assert not dp.simple_search("quarterly offsite")
+    dp.save_document('offsite.txt', b"The quarterly offsite is in June.")
+    assert dp.simple_search("quarterly offsite")[0]['doc_name'] == 'offsite.txt'
+
+
+def test_partial_matches_use_term_lookup(loaded):
+    all_chunks = loaded.load_all_chunks()
+    scorer = loaded._keyword_scorer(loaded._sync_index(all_chunks), all_chunks)
+    assert scorer.related_terms('intern') == ['interns', 'internship']
+    assert 'hour' in scorer.related_terms('hourly') and 'hours' not in scorer.related_terms('hourly')
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_pruned_boosts_pick_the_same_top_k_as_boosting_everything(seed):
+    import numpy as np
+    from keyword_scorer import KeywordScorer
+
+    rng = np.random.default_rng(seed)
+    scores = rng.exponential(size=20000) * (rng.random(20000) < 0.9)
+    factors = 1 + 2 * (rng.random(20000) < 0.05)  # a few chunks get the full 3x boost
+    for k in (1, 5, 50):
+        pruned, full = scores.copy(), scores * factors
+        boosted = KeywordScorer.apply_boosts(pruned, k, 3.0, lambda column: factors[column])
+        assert boosted < np.count_nonzero(scores) // 10
+        top = KeywordScorer.top_k(pruned, k)
+        assert list(top) == list(KeywordScorer.top_k(full, k))
+        assert np.allclose(pruned[top], full[top])
@@ -0,0 +1,83 @@
+import threading
+
+import pytest
+
+from chunk_store import ChunkStore
+
+
+def _in_thread(function):
+    result = {}
+    thread = threading.Thread(target=lambda: result.setdefault('value', function()), daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+    assert not thread.is_alive(), 'blocked behind the write transaction'
+    return result['value']
+
+
+@pytest.fixture
+def loaded(knowledge_base):
+    knowledge_base.save_document('leave.txt', b"Parental leave is twelve weeks.")
+    return knowledge_base
+
+
+def test_searches_do_not_wait_for_an_open_write(loaded):
+    dp = loaded
+    kb = dp._open_knowledge_base()
+    writing, release = threading.Event(), threading.Event()
+
+    def write():
+        try:
+            with kb.transaction():
+                dp.get_chunk_store().delete_document(dp.get_all_documents()[0]['id'])
+                writing.set()
+                release.wait(10)
+                raise RuntimeError('roll back')
+        except RuntimeError:
+            pass
+
+    writer = threading.Thread(target=write, daemon=True)
+    writer.start()
+    assert writing.wait(10)
+    try:
+        # The uncommitted delete is invisible to other threads
+        assert [r['doc_name'] for r in _in_thread(lambda: dp.simple_search("parental leave"))] == ['leave.txt']
+        if dp.get_vector_store() is not None:
+            assert [r['doc_name'] for r in _in_thread(lambda: dp.vector_search("parental leave"))] == ['leave.txt']
+        assert _in_thread(lambda: dp.get_chunk_store().chunk_count()) == 1
+    finally:
+        release.set()
+        writer.join(10)
+    assert [r['doc_name'] for r in dp.simple_search("parental leave")] == ['leave.txt']
+
+
+def test_reads_inside_a_transaction_see_its_writes(loaded):
+    dp = loaded
+    store = dp.get_chunk_store()
+    doc_id = store.list_documents()[0]['id']
+    with pytest.raises(RuntimeError):
+        with dp._open_knowledge_base().transaction():
+            store.delete_document(doc_id)
+            assert store.chunk_count() == 0 and store.get_document(doc_id) is None
+            assert dp.load_all_chunks() == {}
+            raise RuntimeError('roll back')
+    assert store.chunk_count() == 1
+    assert len(dp.load_all_chunks()) == 1
+
+
+def test_delete_does_not_vacuum(loaded, monkeypatch):
+    dp = loaded
+    monkeypatch.setattr(ChunkStore, 'compact', lambda self, force=False: pytest.fail('compacted on delete'))
+    doc_id = dp.get_all_documents()[0]['id']
+    assert dp.delete_document(doc_id)
+    assert dp.get_all_documents() == []
+
+
+def test_compaction_is_an_explicit_call(loaded):
+    dp = loaded
+    dp.delete_document(dp.get_all_documents()[0]['id'])
+    dp.save_document('badges.txt', b"Badges are required on site.")
+    assert dp.compact_knowledge_base(force=True)
+    assert [r['doc_name'] for r in dp.simple_search("badges required")] == ['badges.txt']
+    if dp.get_vector_store() is not None:
+        assert dp.get_vector_store().live_count() == 1
+        assert [r['doc_name'] for r in dp.vector_search("badges required")] == ['badges.txt']
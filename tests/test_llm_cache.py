@@ -0,0 +1,84 @@
+import pytest
+
+import ai_utils
+import llm_cache
+from llm_cache import LLMCache, context_version, normalize_question
+
+SCHEMA = context_version("CREATE TABLE employees (employee_id TEXT)")
+MODEL = 'gemini-2.5-flash'
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(llm_cache, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def cache(workdir, clock):
+    cache = LLMCache(str(workdir / 'llm_cache.db'), ttl=3600, max_entries=3)
+    yield cache
+    cache.close()
+
+
+@pytest.mark.parametrize('variant', [
+    "How many employees are in Sales?",
+    "  how many   EMPLOYEES are in sales ?? ",
+    "How many employees\nare in Sales.",
+])
+def test_questions_are_normalized_for_lookup(cache, variant):
+    cache.put('sql', "How many employees are in Sales?", SCHEMA, MODEL, "SELECT 1")
+    assert normalize_question(variant) == "how many employees are in sales"
+    assert cache.get('sql', variant, SCHEMA, MODEL) == "SELECT 1"
+
+
+def test_kind_model_and_context_are_part_of_the_key(cache):
+    cache.put('sql', "Who is in Sales?", SCHEMA, MODEL, "SELECT 1")
+    assert cache.get('general', "Who is in Sales?", SCHEMA, MODEL) is None
+    assert cache.get('sql', "Who is in Sales?", SCHEMA, 'gemini-2.0-flash') is None
+    assert cache.get('sql', "Who is in Sales?", context_version("CREATE TABLE staff (id)"), MODEL) is None
+    # Words that change the meaning are kept
+    assert cache.get('sql', "Who is not in Sales?", SCHEMA, MODEL) is None
+
+
+def test_entries_expire_after_the_ttl(cache, clock):
+    cache.put('sql', "Who is in Sales?", SCHEMA, MODEL, "SELECT 1")
+    clock.now += 3600
+    assert cache.get('sql', "Who is in Sales?", SCHEMA, MODEL) == "SELECT 1"
+    clock.now += 1
+    assert cache.get('sql', "Who is in Sales?", SCHEMA, MODEL) is None
+    assert cache.stats()['expired'] == 1 and cache.stats()['entries'] == 0
+
+
+def test_least_recently_used_entries_are_evicted(cache, clock):
+    for question in ("one", "two", "three"):
+        clock.now += 1
+        cache.put('sql', question, SCHEMA, MODEL, f"SELECT '{question}'")
+    clock.now += 1
+    assert cache.get('sql', "one", SCHEMA, MODEL) == "SELECT 'one'"
+    clock.now += 1
+    cache.put('sql', "four", SCHEMA, MODEL, "SELECT 'four'")
+    assert [cache.get('sql', q, SCHEMA, MODEL) is not None for q in ("one", "two", "three", "four")] == \
+        [True, False, True, True]
+    assert cache.stats()['evictions'] == 1
+
+
+def test_schema_change_purges_cached_sql(cache, monkeypatch):
+    monkeypatch.setattr(ai_utils, 'get_llm_cache', lambda: cache)
+    monkeypatch.setattr(ai_utils, '_cached_schema_version', None)
+    old = ai_utils._schema_cache_context("CREATE TABLE employees (employee_id TEXT)")
+    cache.put('sql', "Who is in Sales?", old, MODEL, "SELECT 1")
+    cache.put('general', "What is PTO?", 'kb', MODEL, "Paid time off.")
+    new = ai_utils._schema_cache_context("CREATE TABLE employees (employee_id TEXT, badge TEXT)")
+    assert new != old
+    assert cache.get('sql', "Who is in Sales?", old, MODEL) is None
+    assert cache.get('general', "What is PTO?", 'kb', MODEL) == "Paid time off."
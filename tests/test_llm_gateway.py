@@ -0,0 +1,73 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from llm_gateway import LLMGateway
+from rate_limiter import RateLimiter
+
+
+class FakeModels:
+    """Stands in for client.aio.models: counts calls and how many run at once."""
+
+    def __init__(self, delays):
+        self.delays = delays
+        self.calls = []
+        self.in_flight = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    async def generate_content(self, model, contents):
+        with self._lock:
+            self.calls.append((model, contents))
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.delays.get(model, 0.05))
+            return SimpleNamespace(text=f"{model}: {contents}")
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+@pytest.fixture
+def make_gateway():
+    gateways = []
+
+    def make(delays=None, models=('primary',), **kwargs):
+        fake = FakeModels(delays or {})
+        gateway = LLMGateway(lambda: SimpleNamespace(aio=SimpleNamespace(models=fake)), list(models),
+                             rate_limiter=RateLimiter({model: 10000 for model in models}), **kwargs)
+        gateways.append(gateway)
+        return gateway, fake
+
+    yield make
+    for gateway in gateways:
+        gateway.close()
+
+
+def test_identical_concurrent_prompts_share_one_call(make_gateway):
+    gateway, fake = make_gateway({'primary': 0.3})
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        responses = list(pool.map(gateway.generate, ["How many days of PTO?"] * 8))
+    assert [response.text for response in responses] == ["primary: How many days of PTO?"] * 8
+    assert len(fake.calls) == 1
+    assert gateway.stats()['coalesced'] == 7
+
+
+def test_in_flight_calls_never_exceed_the_limit(make_gateway):
+    gateway, fake = make_gateway({'primary': 0.05}, max_in_flight=3)
+    with ThreadPoolExecutor(max_workers=12) as pool:
+        responses = list(pool.map(gateway.generate, [f"question {i}" for i in range(24)]))
+    assert len(responses) == 24 and len(fake.calls) == 24
+    assert fake.peak == 3
+    assert gateway.stats()['max_in_flight_seen'] <= 3
+
+
+def test_slow_model_is_hedged_with_the_next_one(make_gateway):
+    gateway, fake = make_gateway({'slow': 2.0, 'fast': 0.01}, models=('slow', 'fast'), hedge_after=0.05)
+    assert gateway.generate("Who approves leave?").text == "fast: Who approves leave?"
+    assert [model for model, _ in fake.calls] == ['slow', 'fast']
+    assert gateway.stats()['hedged'] == 1
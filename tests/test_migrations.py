@@ -0,0 +1,61 @@
+import sqlite3
+
+import pytest
+
+import db_utils
+
+
+def _schema(conn):
+    return conn.execute("SELECT type, name, sql FROM sqlite_master WHERE name NOT LIKE 'sqlite_stat%' "
+                        "ORDER BY type, name").fetchall()
+
+
+@pytest.fixture
+def legacy_db(tmp_path):
+    """A database created before migrations existed: the base tables, data and user_version 0."""
+    conn = sqlite3.connect(str(tmp_path / 'legacy.db'), isolation_level=None)
+    for statement in db_utils.SCHEMA_MIGRATIONS[0][2]:
+        conn.execute(statement)
+    conn.execute("""INSERT INTO employees (employee_id, first_name, last_name, email, department, position,
+                                           hire_date, salary)
+                    VALUES ('EMP0001', 'Ada', 'Lovelace', 'ada@example.com', 'Sales', 'Analyst', '2020-01-01', 1)""")
+    yield conn
+    conn.close()
+
+
+def test_version_zero_database_upgrades_to_the_current_schema(legacy_db):
+    assert db_utils.get_schema_version(legacy_db) == 0
+    assert db_utils.apply_migrations(legacy_db) == db_utils.SCHEMA_VERSION
+    assert db_utils.get_schema_version(legacy_db) == db_utils.SCHEMA_VERSION
+    assert legacy_db.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+
+    indexes = {row[0] for row in legacy_db.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {'idx_employees_department_status', 'idx_employees_hire_date', 'idx_transfers_employee_date',
+            'idx_transfers_transfer_date', 'idx_feedback_employee_date', 'idx_employees_source_key'} <= indexes
+    columns = {row[1] for row in legacy_db.execute('PRAGMA table_info(employees)')}
+    assert {'source_key', 'removed_at'} <= columns
+    assert legacy_db.execute('SELECT version FROM data_version').fetchall() == [(0,)]
+    # Existing rows survive
+    assert legacy_db.execute('SELECT first_name FROM employees').fetchall() == [('Ada',)]
+
+
+def test_second_run_changes_nothing(legacy_db):
+    db_utils.apply_migrations(legacy_db)
+    schema = _schema(legacy_db)
+    assert db_utils.apply_migrations(legacy_db) == db_utils.SCHEMA_VERSION
+    assert _schema(legacy_db) == schema
+
+
+def test_migrations_stop_at_the_target_version(legacy_db):
+    assert db_utils.apply_migrations(legacy_db, target_version=2) == 2
+    assert legacy_db.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'data_version'").fetchone()[0] == 0
+    assert db_utils.apply_migrations(legacy_db) == db_utils.SCHEMA_VERSION
+
+
+def test_failed_migration_rolls_back_its_version(legacy_db, monkeypatch):
+    broken = db_utils.SCHEMA_MIGRATIONS + [(99, 'Broken', ['CREATE TABLE extra (id)', 'NOT SQL'])]
+    monkeypatch.setattr(db_utils, 'SCHEMA_MIGRATIONS', broken)
+    with pytest.raises(sqlite3.OperationalError):
+        db_utils.apply_migrations(legacy_db, target_version=99)
+    assert db_utils.get_schema_version(legacy_db) == db_utils.SCHEMA_VERSION
+    assert legacy_db.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'extra'").fetchone()[0] == 0
@@ -0,0 +1,63 @@
+import sqlite3
+
+import pytest
+
+import db_utils
+import query_engine
+from query_engine import QueryEngine
+from sql_validator import QueryTimeoutError, ValidatedQuery
+
+
+@pytest.fixture
+def engine(hr_database):
+    with db_utils.write_connection() as conn:
+        conn.executemany("""INSERT INTO employees (employee_id, first_name, last_name, email, department,
+                                                   position, hire_date, salary)
+                            VALUES (?, 'Test', ?, ?, 'Sales', 'Analyst', '2020-01-01', ?)""",
+                         [(f'EMP{i:05d}', 'x' * 100, f'emp{i}@example.com', 40000 + i) for i in range(3000)])
+    engine = QueryEngine(hr_database, pool_size=1)
+    yield engine
+    engine.close()
+
+
+def test_writes_fail_on_the_read_only_connection(engine, monkeypatch):
+    # Skip validation and query_only so only mode=ro stands between the SQL and the file
+    monkeypatch.setattr(query_engine, 'validate_sql', lambda sql: ValidatedQuery(sql, set(), set()))
+    monkeypatch.setattr(query_engine, 'READ_ONLY_PRAGMAS', {'query_only': 'OFF'})
+    engine = QueryEngine(engine.db_path, pool_size=1)
+    with pytest.raises(sqlite3.OperationalError, match='readonly'):
+        engine.execute("DELETE FROM employees")
+    engine.close()
+    with db_utils.read_connection() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM employees').fetchone()[0] == 3000
+
+
+def test_runaway_queries_are_interrupted(engine):
+    engine.time_budget = 0.05
+    with pytest.raises(QueryTimeoutError):
+        engine.execute("SELECT SUM((SELECT COUNT(*) FROM employees b WHERE b.salary < a.salary + 0)) "
+                       "FROM employees a")
+    assert engine.stats()['timeouts'] == 1
+    # The pooled connection is usable afterwards
+    assert engine.execute("SELECT COUNT(*) AS n FROM employees").to_records() == [{'n': 3000}]
+
+
+def test_row_cap_truncates_the_result(engine):
+    engine.max_rows = 10
+    result = engine.execute("SELECT employee_id FROM employees LIMIT 500")
+    assert result.row_count == 10 and result.truncated == 'rows'
+    assert result.to_records()[0] == {'employee_id': 'EMP00000'}
+    assert engine.stats()['truncated'] == 1
+
+
+def test_byte_cap_truncates_the_result(engine):
+    engine.max_bytes = 1000
+    result = engine.execute("SELECT last_name FROM employees LIMIT 500")
+    assert result.row_count == 10 and result.truncated == 'bytes'
+    assert result.result_bytes == 1000
+
+
+def test_results_within_the_caps_are_complete(engine):
+    result = engine.execute("SELECT department, COUNT(*) AS n FROM employees GROUP BY department")
+    assert result.truncated is None
+    assert result.data == {'department': ['Sales'], 'n': [3000]}
@@ -0,0 +1,93 @@
+from types import SimpleNamespace
+
+import pytest
+
+import rate_limiter
+from llm_gateway import LLMGateway
+from rate_limiter import QuotaExhaustedError, RateLimiter, RetryBudget, TokenBucket, parse_rate_limit_error
+
+RATE_LIMIT_ERROR = (
+    "429 RESOURCE_EXHAUSTED. {'error': {'code': 429, 'status': 'RESOURCE_EXHAUSTED', 'details': ["
+    "{'@type': 'type.googleapis.com/google.rpc.QuotaFailure', 'violations': [{"
+    "'quotaId': 'GenerateRequestsPerMinutePerProjectPerModel-FreeTier', 'quotaValue': '10'}]}, "
+    "{'@type': 'type.googleapis.com/google.rpc.RetryInfo', 'retryDelay': '37s'}]}}")
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter, 'time', clock)
+    return clock
+
+
+def test_bucket_refills_at_its_rate(clock):
+    bucket = TokenBucket(rpm=2)
+    assert bucket.try_acquire(clock.now) and bucket.try_acquire(clock.now)
+    assert not bucket.try_acquire(clock.now)
+    assert bucket.wait_time(clock.now) == pytest.approx(30.0)
+    clock.now += 29
+    assert not bucket.try_acquire(clock.now)
+    clock.now += 1
+    assert bucket.try_acquire(clock.now)
+    # Idle time never fills the bucket past one minute's worth
+    clock.now += 600
+    assert [bucket.try_acquire(clock.now) for _ in range(3)] == [True, True, False]
+
+
+def test_budget_runs_out_of_attempts_and_time(clock):
+    budget = RetryBudget(max_attempts=2, deadline=10)
+    assert budget.try_attempt() and budget.try_attempt()
+    assert not budget.try_attempt() and not budget.can_attempt()
+    budget.refund()
+    assert budget.can_attempt()
+    clock.now += 10
+    assert budget.time_left() == 0 and not budget.can_attempt()
+
+
+def test_exhausted_quota_raises_without_a_call(clock):
+    calls = []
+
+    async def generate_content(model, contents):
+        calls.append(model)
+        return SimpleNamespace(text='ok')
+
+    client = SimpleNamespace(aio=SimpleNamespace(models=SimpleNamespace(generate_content=generate_content)))
+    gateway = LLMGateway(lambda: client, ['primary'], rate_limiter=RateLimiter({'primary': 1}))
+    try:
+        assert gateway.generate("first").text == 'ok'
+        # The next token is 60s away, past the 20s retry deadline
+        with pytest.raises(QuotaExhaustedError) as raised:
+            gateway.generate("second")
+        assert raised.value.retry_after == pytest.approx(60.0)
+        assert calls == ['primary']
+    finally:
+        gateway.close()
+
+
+def test_retry_delay_and_quota_are_parsed_from_a_429():
+    assert parse_rate_limit_error(Exception(RATE_LIMIT_ERROR)) == \
+        {'retry_after': 37.0, 'quota_limit': 10, 'per_day': False}
+    daily = RATE_LIMIT_ERROR.replace('PerMinute', 'PerDay')
+    assert parse_rate_limit_error(Exception(daily))['per_day'] is True
+
+    error = Exception("429 Too Many Requests")
+    error.response = SimpleNamespace(headers={'retry-after': '12'})
+    assert parse_rate_limit_error(error) == {'retry_after': 12.0, 'quota_limit': None, 'per_day': False}
+
+
+def test_rate_limit_blocks_the_model_and_learns_its_quota(clock):
+    limiter = RateLimiter({'primary': 30, 'backup': 30})
+    delay = limiter.record_rate_limit('primary', Exception(RATE_LIMIT_ERROR))
+    assert 37.0 <= delay < 38.0
+    assert limiter.acquire(['primary', 'backup']) == 'backup'
+    assert limiter.stats()['models']['primary']['rpm'] == 10
+    clock.now += delay
+    assert limiter.acquire(['primary']) == 'primary'
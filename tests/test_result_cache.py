@@ -0,0 +1,49 @@
+import sqlite3
+
+import db_utils
+
+
+def _add_employee(conn, employee_id, department):
+    conn.execute("""INSERT INTO employees (employee_id, first_name, last_name, email, department, position,
+                                           hire_date, salary)
+                    VALUES (?, 'Test', ?, ?, ?, 'Analyst', '2020-01-01', 50000)""",
+                 (employee_id, employee_id, f'{employee_id}@example.com', department))
+
+
+def _hits():
+    return db_utils.get_result_cache_stats()['hits']
+
+
+def test_results_are_cached_until_an_in_process_write(hr_database):
+    with db_utils.write_connection() as conn:
+        _add_employee(conn, 'EMP0001', 'Sales')
+        db_utils.bump_data_version(conn)
+    assert len(db_utils.get_all_employees()) == 1
+    hits = _hits()
+    assert len(db_utils.get_all_employees()) == 1
+    assert _hits() == hits + 1
+
+    with db_utils.write_connection() as conn:
+        _add_employee(conn, 'EMP0002', 'Sales')
+        db_utils.bump_data_version(conn)
+    assert len(db_utils.get_all_employees()) == 2
+    assert _hits() == hits + 1
+
+
+def test_results_are_invalidated_by_another_process(hr_database):
+    assert db_utils.get_departments() == []
+    # A separate connection stands in for the importer running in another process
+    other = sqlite3.connect(hr_database)
+    with other:
+        _add_employee(other, 'EMP0001', 'Finance')
+        db_utils.bump_data_version(other)
+    other.close()
+    assert db_utils.get_departments() == ['Finance']
+
+
+def test_cached_results_are_copies(hr_database):
+    with db_utils.write_connection() as conn:
+        _add_employee(conn, 'EMP0001', 'Sales')
+        db_utils.bump_data_version(conn)
+    db_utils.get_departments().append('Mutated')
+    assert db_utils.get_departments() == ['Sales']
@@ -0,0 +1,71 @@
+import pytest
+
+from ai_utils import format_answer
+from result_formatter import MAX_TABLE_ROWS, format_results, format_value
+
+
+@pytest.mark.parametrize('results, answer', [
+    ([{'employee_count': 1}], "**Result:** 1 employee"),
+    ([{'employee_count': 12}], "**Result:** 12 employees"),
+    ([{'avg_salary': 72500.5}], "**Result:** $72,500.50"),
+    ([{'department': 'Sales'}], "**Result:** Sales"),
+])
+def test_single_values(results, answer):
+    assert format_answer("question", results, "SELECT ...") == answer
+
+
+@pytest.mark.parametrize('column, value, text', [
+    ('salary', 90000, '$90,000'),
+    ('avg_salary', 65000.256, '$65,000.26'),
+    ('bonus', 1500.0, '$1,500'),
+    ('avg_rating', 4.25, '4.25'),
+    ('rating', 4.0, '4'),
+    ('employee_count', 1200, '1,200'),
+    ('department', 'R|D', 'R\\|D'),
+    ('manager', None, '—'),
+])
+def test_values_are_formatted_by_column(column, value, text):
+    assert format_value(column, value) == text
+
+
+def test_group_by_summary_and_table():
+    results = [
+        {'department': 'Sales', 'employee_count': 12, 'avg_salary': 65000.0},
+        {'department': 'Finance', 'employee_count': 4, 'avg_salary': 80000.25},
+    ]
+    assert format_results(results, "SELECT department, COUNT(*) ... GROUP BY department") == (
+        "**Employees by department** (2 departments)\n\n"
+        "- Highest: **Sales** (12)\n"
+        "- Lowest: **Finance** (4)\n"
+        "- Difference: 8 (200% above the lowest)\n"
+        "- Total: 16\n\n"
+        "| Department | Employees | Average Salary |\n"
+        "|---|---:|---:|\n"
+        "| Sales | 12 | $65,000 |\n"
+        "| Finance | 4 | $80,000.25 |")
+
+
+def test_rankings_follow_the_order_by_column():
+    results = [
+        {'first_name': 'Ada', 'last_name': 'Lovelace', 'department': 'Sales', 'salary': 90000},
+        {'first_name': 'Alan', 'last_name': 'Turing', 'department': 'HR', 'salary': 55000.5},
+    ]
+    sql = "SELECT first_name, last_name, department, salary FROM employees ORDER BY e.salary DESC LIMIT 2"
+    assert format_results(results, sql) == (
+        "**2 result(s), ranked by salary (highest first):**\n\n"
+        "1. **Ada Lovelace** — $90,000 (Sales)\n"
+        "2. **Alan Turing** — $55,000.50 (HR)")
+
+
+def test_other_results_become_a_table():
+    results = [{'id': i, 'first_name': 'Ada', 'last_name': f'L{i}', 'hire_date': '2020-01-01'}
+               for i in range(MAX_TABLE_ROWS + 5)]
+    answer = format_results(results, "SELECT * FROM employees")
+    assert answer.startswith(f"**Found {MAX_TABLE_ROWS + 5} employee(s):**\n\n| Name | Hire Date |\n|---|---|\n")
+    assert "| Ada L0 | 2020-01-01 |" in answer and "Ada L20" not in answer
+    assert answer.endswith("_...and 5 more rows_")
+
+
+def test_empty_results():
+    assert format_results([]) == "No data found matching your query."
+    assert format_answer("question", [], "SELECT ...") == "No data found matching your query."
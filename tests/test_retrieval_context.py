@@ -0,0 +1,58 @@
+from types import SimpleNamespace
+
+import pytest
+
+import ai_utils
+
+HANDBOOK = (b"Parental leave policy. Employees receive twelve weeks of paid parental leave after the birth "
+            b"or adoption of a child. Parental leave requests go to the People Ops team thirty days ahead. "
+            b"Parental leave can be split into two blocks within the first year.")
+
+
+@pytest.fixture
+def searches(hr_database, knowledge_base, monkeypatch):
+    """Counts keyword and vector searches, and the RetrievalContexts created, per question."""
+    dp = knowledge_base
+    dp.save_document('handbook.txt', HANDBOOK)
+    counts = {'keyword': 0, 'vector': 0, 'contexts': []}
+
+    def counting(name, function):
+        def wrapper(*args, **kwargs):
+            counts[name] += 1
+            return function(*args, **kwargs)
+        return wrapper
+
+    class RecordingContext(dp.RetrievalContext):
+        def __init__(self, query):
+            super().__init__(query)
+            counts['contexts'].append(self)
+
+    monkeypatch.setattr(dp, 'simple_search', counting('keyword', dp.simple_search))
+    monkeypatch.setattr(dp, 'vector_search', counting('vector', dp.vector_search))
+    monkeypatch.setattr(ai_utils, 'RetrievalContext', RecordingContext)
+    monkeypatch.setattr(ai_utils, 'call_gemini_with_fallback', lambda prompt: SimpleNamespace(text="Twelve weeks."))
+    monkeypatch.setattr(ai_utils, 'get_llm_gateway',
+                        lambda: SimpleNamespace(stream=lambda prompt: iter(["Twelve ", "weeks."])))
+    return counts
+
+
+@pytest.mark.parametrize('question, question_type', [
+    ("What is the parental leave policy?", 'document'),
+    ("parental leave split into blocks within the first year", 'document'),
+    ("How many employees do we have?", None),
+])
+def test_each_question_searches_once(searches, question, question_type):
+    result = ai_utils.answer_hr_question(question)
+    assert result['status'] == 'success' and result.get('type') == question_type
+    assert len(searches['contexts']) == 1
+    assert searches['contexts'][0].search_count == searches['keyword'] == 1
+    assert searches['vector'] == (1 if question_type == 'document' else 0)
+    if question_type == 'document':
+        assert result['sources'] == ['handbook.txt']
+
+
+def test_streamed_answers_search_once(searches):
+    stream = ai_utils.AnswerStream("What is the parental leave policy?")
+    assert ''.join(stream).startswith("Twelve weeks.")
+    assert stream.result['sources'] == ['handbook.txt']
+    assert len(searches['contexts']) == 1 and searches['keyword'] == 1 and searches['vector'] == 1
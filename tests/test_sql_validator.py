@@ -0,0 +1,71 @@
+import sqlite3
+
+import pytest
+
+from sql_validator import (QueryTimeoutError, SQLRejectedError, check_query_plan, query_time_budget,
+                           validate_sql)
+
+
+@pytest.mark.parametrize('sql', [
+    "SELECT first_name, created_at FROM employees WHERE notes = 'DROP TABLE employees'",
+    "select e.first_name, t.to_department from employees e join transfers t on e.employee_id = t.employee_id",
+    "WITH recent AS (SELECT * FROM transfers) SELECT COUNT(*) FROM recent",
+    "SELECT department, AVG(salary) FROM employees GROUP BY department;",
+    "SELECT * FROM employees WHERE employee_id IN (SELECT employee_id FROM feedback)",
+])
+def test_read_only_selects_pass(sql):
+    validate_sql(sql)
+
+
+@pytest.mark.parametrize('sql, reason', [
+    ("DELETE FROM employees", "Only SELECT"),
+    ("SELECT * FROM employees; DROP TABLE employees", "single statement"),
+    ("SELECT * FROM employees WHERE 1 = 1 UNION SELECT * FROM sqlite_master", "Unknown table"),
+    ("SELECT * FROM main.employees", "Schema-qualified"),
+    ("SELECT load_extension('x')", "Function not permitted"),
+    ("WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT * FROM n", "Recursive"),
+    ("SELECT * FROM employees, pragma_table_info('employees')", "Table-valued function"),
+    ("SELECT (1 FROM employees", "Unbalanced"),
+    ("   ", "Empty"),
+])
+def test_unsafe_queries_are_rejected(sql, reason):
+    with pytest.raises(SQLRejectedError, match=reason):
+        validate_sql(sql)
+
+
+def test_limit_is_added_after_trailing_comments():
+    query = validate_sql("SELECT * FROM employees -- every employee", default_limit=25)
+    assert query.sql == "SELECT * FROM employees LIMIT 25"
+    assert validate_sql("SELECT * FROM employees LIMIT 5").sql == "SELECT * FROM employees LIMIT 5"
+    assert validate_sql("SELECT * FROM (SELECT * FROM employees LIMIT 5)").sql.endswith(" LIMIT 100")
+
+
+def test_tables_and_aliases_are_reported():
+    query = validate_sql("SELECT * FROM employees AS e JOIN feedback f ON e.employee_id = f.employee_id")
+    assert query.tables == {'employees', 'feedback'}
+    assert query.sources == {'employees', 'e', 'feedback', 'f'}
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE employees (employee_id TEXT PRIMARY KEY, department TEXT)')
+    conn.execute('CREATE TABLE transfers (employee_id TEXT, to_department TEXT)')
+    yield conn
+    conn.close()
+
+
+def test_cross_joins_are_rejected_by_the_plan(conn):
+    with pytest.raises(SQLRejectedError, match='cross join'):
+        check_query_plan(conn, validate_sql("SELECT * FROM employees, transfers"))
+    check_query_plan(conn, validate_sql(
+        "SELECT * FROM transfers t JOIN employees e ON e.employee_id = t.employee_id"))
+
+
+def test_long_queries_are_interrupted(conn):
+    with pytest.raises(QueryTimeoutError):
+        with query_time_budget(conn, seconds=0.05, check_every=100):
+            conn.execute("WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) "
+                         "SELECT COUNT(*) FROM n").fetchone()
+    # The handler is removed afterwards
+    assert conn.execute('SELECT 1').fetchone() == (1,)
@@ -0,0 +1,52 @@
+import pytest
+
+import document_processor as dp
+from synonyms import (DIRECT_WEIGHT, SIBLING_WEIGHT, SynonymTable, build_synonym_table, load_thesaurus,
+                      phrase_pattern)
+
+
+def test_groups_link_both_ways_with_sibling_weights():
+    table = SynonymTable({'Vacation': ['PTO', 'time off', 'vacation', '']})
+    assert table.expansions['vacation'] == {'pto': DIRECT_WEIGHT, 'time off': DIRECT_WEIGHT}
+    assert table.expansions['pto'] == {'vacation': DIRECT_WEIGHT, 'time off': SIBLING_WEIGHT}
+    assert table.max_phrase_words == 2 and len(table) == 3
+
+
+def test_direct_links_outrank_sibling_links():
+    table = SynonymTable({'leave': ['pto', 'vacation'], 'vacation': ['pto']})
+    assert table.expansions['pto']['vacation'] == DIRECT_WEIGHT
+
+
+def test_expand_matches_phrases_and_skips_stopwords():
+    table = SynonymTable({'vacation': ['time off'], 'off': ['away']})
+    expansions, phrases = table.expand(['request', 'time', 'off'], stopwords={'off'})
+    assert expansions == {'vacation': DIRECT_WEIGHT}
+    assert phrases == ['time off']
+
+
+def test_thesaurus_files_are_merged(tmp_path):
+    text = tmp_path / 'extra.txt'
+    text.write_text("# remote work\nwfh, telework => remote work\nsabbatical, career break\n")
+    json_file = tmp_path / 'extra.json'
+    json_file.write_text('[["badge", "access card"]]')
+    assert load_thesaurus(text) == {'wfh': ['remote work'], 'telework': ['remote work'],
+                                    'sabbatical': ['career break']}
+    table = build_synonym_table({'pto': ['vacation']}, [text, json_file])
+    assert table.expansions['remote work'] == {'wfh': DIRECT_WEIGHT, 'telework': DIRECT_WEIGHT}
+    assert 'access card' in table.expansions['badge'] and 'vacation' in table.expansions['pto']
+
+
+@pytest.mark.parametrize('text, found', [
+    ("request time off early", True),
+    ("request time-off early", True),
+    ("overtime offsets", False),
+    ("time spent off site", False),
+])
+def test_phrase_pattern_needs_adjacent_whole_words(text, found):
+    assert bool(phrase_pattern('time off').search(text)) is found
+
+
+def test_query_expansion_uses_the_compiled_table():
+    terms = dp.expand_query_with_synonyms("How much time off do I get?")
+    assert {'time', 'off', 'time off', 'vacation', 'pto', 'leave'} <= terms
+    assert not terms & {'how', 'do', 'i'}
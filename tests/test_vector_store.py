@@ -0,0 +1,84 @@
+import pytest
+
+pytest.importorskip('numpy')
+
+from document_index import KnowledgeBaseConnection
+from embeddings import HashingEmbedder, VectorStore
+import embeddings
+
+TEXTS = ["vacation policy for interns", "dental insurance plan", "remote work schedule",
+         "parental leave weeks", "expense report deadline", "badge access on site"]
+
+
+@pytest.fixture
+def store(workdir):
+    kb = KnowledgeBaseConnection(workdir / 'kb.db')
+    vectors = VectorStore(kb, HashingEmbedder(), workdir / 'vectors.f32', workdir / 'vectors.ivf.npz')
+    vectors.add_chunks({f'doc{i}_0': {'doc_id': f'doc{i}', 'text': text} for i, text in enumerate(TEXTS)})
+    for i in (0, 2, 4):
+        vectors.delete_document(f'doc{i}')
+    yield vectors
+    kb.close()
+
+
+def _top(vectors, query):
+    return [chunk_id for chunk_id, _ in vectors.search(query, top_k=2)]
+
+
+def test_compact_drops_tombstones(store):
+    before = {text: _top(store, text) for text in TEXTS}
+    store.compact()
+    assert store.live_count() == 3 and store._num_rows == 3
+    assert {text: _top(store, text) for text in TEXTS} == before
+
+
+def test_compact_rolled_back_keeps_the_old_file(store, monkeypatch):
+    before = {text: _top(store, text) for text in TEXTS}
+
+    def fail(conn, keys):
+        raise RuntimeError('crash before commit')
+
+    monkeypatch.setattr(store, '_commit_replacement', fail)
+    with pytest.raises(RuntimeError):
+        store.compact()
+    assert store._num_rows == 6
+    assert {text: _top(store, text) for text in TEXTS} == before
+
+
+def test_compact_interrupted_after_commit_is_finished_on_reopen(store, monkeypatch, workdir):
+    before = {text: _top(store, text) for text in TEXTS}
+
+    def crash(source, target):
+        raise OSError('crash after commit')
+
+    monkeypatch.setattr(embeddings.os, 'replace', crash)
+    with pytest.raises(OSError):
+        store.compact()
+    monkeypatch.undo()
+
+    reopened = VectorStore(store.kb, HashingEmbedder(), store.vectors_path, store.ivf_path)
+    assert not reopened._replacement_path.exists()
+    assert reopened.live_count() == 3
+    assert {text: _top(reopened, text) for text in TEXTS} == before
+
+
+def test_vector_search_does_not_embed_on_the_query_path(knowledge_base, monkeypatch):
+    dp = knowledge_base
+    dp.save_document('leave.txt', b"Parental leave is twelve weeks.")
+    monkeypatch.setattr(VectorStore, 'rebuild', lambda *args, **kwargs: pytest.fail('rebuilt at query time'))
+    assert [result['doc_name'] for result in dp.vector_search("parental leave")] == ['leave.txt']
+
+
+def test_missing_vectors_are_embedded_when_the_knowledge_base_opens(knowledge_base):
+    dp = knowledge_base
+    dp.save_document('leave.txt', b"Parental leave is twelve weeks.")
+    dp._knowledge_base.close()
+    dp._knowledge_base = dp._store = dp._index = dp._vectors = None
+    embeddings.VECTORS_FILE.unlink()
+    kb = KnowledgeBaseConnection(dp.INDEX_DB)
+    with kb.transaction() as conn:
+        conn.execute('DELETE FROM kb_vectors')
+    kb.close()
+
+    assert dp.get_vector_store().live_count() == 1
+    assert [result['doc_name'] for result in dp.vector_search("parental leave")] == ['leave.txt']